@@ -141,7 +141,12 @@ def eye(
         from file_methods import Persistent_Dict
         from version_utils import VersionFormat
         from methods import normalize, denormalize, timer
-        from av_writer import JPEG_Writer, MPEG_Writer, NonMonotonicTimestampError
+        from av_writer import (
+            JPEG_Writer,
+            MPEG_Writer,
+            Async_Writer,
+            NonMonotonicTimestampError,
+        )
         from ndsi import H264Writer
         from video_capture import source_classes, manager_classes
         from roi import Roi
@@ -500,6 +505,13 @@ def eye(
                             )
                         else:
                             g_pool.writer = MPEG_Writer(video_path, start_time_synced)
+                        queue_size = notification.get("video_writer_queue_size", 0)
+                        if queue_size > 0 and not isinstance(g_pool.writer, H264Writer):
+                            g_pool.writer = Async_Writer(
+                                g_pool.writer,
+                                queue_size=queue_size,
+                                backpressure=notification["video_writer_backpressure"],
+                            )
                 elif subject == "recording.stopped":
                     if g_pool.writer:
                         logger.info("Done recording.")
@@ -507,6 +519,14 @@ def eye(
                             g_pool.writer.release()
                         except RuntimeError:
                             logger.error("No eye video recorded")
+                        if isinstance(g_pool.writer, Async_Writer):
+                            ipc_socket.notify(
+                                {
+                                    "subject": "recording.video_writer_stats",
+                                    "source": "eye{}".format(eye_id),
+                                    **g_pool.writer.stats(),
+                                }
+                            )
                         g_pool.writer = None
                 elif subject.startswith("meta.should_doc"):
                     ipc_socket.notify(
@@ -167,7 +167,7 @@ def world(
             Base_Manager,
             Base_Source,
         )
-        from pupil_data_relay import Pupil_Data_Relay
+        from pupil_data_relay import Pupil_Data_Relay, send_recent_events
         from remote_recorder import Remote_Recorder
         from audio_capture import Audio_Capture
         from accuracy_visualizer import Accuracy_Visualizer
@@ -661,24 +661,8 @@ def world(
             # check if a plugin need to be destroyed
             g_pool.plugins.clean()
 
-            # "blacklisted" events that were already sent
-            del events["pupil"]
-            del events["gaze"]
-            # delete if exists. More expensive than del, so only use it when key might not exist
-            events.pop("annotation", None)
-
             # send new events to ipc:
-            if "frame" in events:
-                del events["frame"]  # send explicitly with frame publisher
-            if "depth_frame" in events:
-                del events["depth_frame"]
-            if "audio_packets" in events:
-                del events["audio_packets"]
-            del events["dt"]  # no need to send this
-            for data in events.values():
-                assert isinstance(data, (list, tuple))
-                for d in data:
-                    ipc_pub.send(d)
+            send_recent_events(ipc_pub, events)
 
             glfw.glfwMakeContextCurrent(main_window)
             # render visual feedback from loaded plugins
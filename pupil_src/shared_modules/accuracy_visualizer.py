@@ -18,7 +18,7 @@ from pyglui import ui
 from pyglui.cygl.utils import draw_points_norm, draw_polyline_norm, RGBA
 from scipy.spatial import ConvexHull
 
-from calibration_routines.data_processing import closest_matches_monocular
+from calibration_routines.data_processing import closest_matches_monocular_idc
 from plugin import Plugin
 
 logger = logging.getLogger(__name__)
@@ -222,18 +222,24 @@ class Accuracy_Visualizer(Plugin):
     ):
         width, height = intrinsics.resolution
 
-        # reuse closest_matches_monocular to correlate one label to each prediction
-        # correlated['ref']: prediction, correlated['pupil']: label location
-        correlated = closest_matches_monocular(gaze_pos, ref_pos)
-        # [[pred.x, pred.y, label.x, label.y], ...], shape: n x 4
-        locations = np.array(
-            [(*e["ref"]["norm_pos"], *e["pupil"]["norm_pos"]) for e in correlated]
+        # reuse closest_matches_monocular_idc to correlate one label to each
+        # prediction, gaze_idc: prediction indices, ref_idc: label indices
+        gaze_idc, ref_idc = closest_matches_monocular_idc(
+            np.fromiter((g["timestamp"] for g in gaze_pos), float, len(gaze_pos)),
+            np.fromiter((r["timestamp"] for r in ref_pos), float, len(ref_pos)),
         )
-        if locations.size == 0:
+        if gaze_idc.size == 0:
             accuracy_result = Calculation_Result(0.0, 0, 0)
             precision_result = Calculation_Result(0.0, 0, 0)
             error_lines = np.array([])
             return accuracy_result, precision_result, error_lines
+        # [[pred.x, pred.y, label.x, label.y], ...], shape: n x 4
+        locations = np.hstack(
+            (
+                np.array([gaze_pos[i]["norm_pos"] for i in gaze_idc.tolist()]),
+                np.array([ref_pos[i]["norm_pos"] for i in ref_idc.tolist()]),
+            )
+        ).astype(np.float64)
         error_lines = locations.copy()  # n x 4
         locations[:, ::2] *= width
         locations[:, 1::2] = (1.0 - locations[:, 1::2]) * height
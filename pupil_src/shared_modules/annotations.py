@@ -249,7 +249,9 @@ class Annotation_Player(AnnotationPlugin, Analysis_Plugin_Base):
     def cleanup(self):
         with fm.PLData_Writer(self.g_pool.rec_dir, "annotation_player") as writer:
             for ts, annotation in zip(self.annotations.timestamps, self.annotations):
-                writer.append_serialized(ts, "annotation", annotation.serialized)
+                writer.append_serialized(
+                    ts, "annotation", annotation.serialized, annotation
+                )
 
     def customize_menu(self):
         self.menu.label = "View and Edit Annotations"
@@ -15,6 +15,7 @@ import logging
 import collections
 import multiprocessing as mp
 import os
+import threading
 import typing as T
 from fractions import Fraction
 
@@ -251,6 +252,147 @@ class AV_Writer(abc.ABC):
         """Desired video stream codec."""
 
 
+class Async_Writer:
+    """Wraps an AV_Writer and encodes frames in a background thread.
+
+    Frames are handed over to a bounded queue, such that the calling loop does not
+    block on encoding and muxing. Frames must not be modified after handing them
+    over. Timestamps are still checked in the calling thread, i.e.
+    NonMonotonicTimestampError is raised by write_video_frame() directly.
+
+    backpressure: What to do when the queue is full.
+        - "block": Wait until the encoder thread has taken a frame off the queue.
+        - "drop_oldest": Drop the oldest queued frame and count it as dropped.
+    """
+
+    backpressure_policies = ("block", "drop_oldest")
+
+    def __init__(self, writer: AV_Writer, queue_size: int = 30, backpressure="block"):
+        if queue_size < 1:
+            raise ValueError(f"Queue size needs to be positive, got {queue_size}")
+        if backpressure not in self.backpressure_policies:
+            raise ValueError(f"Unknown backpressure policy `{backpressure}`")
+
+        self.writer = writer
+        self.queue_size = queue_size
+        self.backpressure = backpressure
+        self.closed = False
+
+        self.frames_queued = 0
+        self.frames_dropped = 0
+        self.max_queue_fill = 0
+        self._last_ts = None
+
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self._should_stop = False
+        self._encoder_error = None
+        self._thread = threading.Thread(
+            target=self._encode_queued_frames,
+            name=f"Encoder {os.path.basename(writer.output_file_path)}",
+            daemon=True,
+        )
+        self._thread.start()
+
+    @property
+    def timestamps(self):
+        return self.writer.timestamps
+
+    def write_video_frame(self, input_frame):
+        """Queue a frame for encoding."""
+        if self.closed:
+            logger.warning("Container was closed already!")
+            return
+
+        ts = input_frame.timestamp
+        if ts < self.writer.start_time:
+            logger.debug("Skipping frame that arrived before sync time.")
+            return
+
+        if self._last_ts is not None and ts < self._last_ts:
+            last_ts = self._last_ts
+            self.release()
+            raise NonMonotonicTimestampError(
+                "Non-monotonic timestamps!"
+                f"Last timestamp: {last_ts}. Given timestamp: {ts}"
+            )
+
+        with self._condition:
+            if len(self._queue) >= self.queue_size:
+                if self.backpressure == "block":
+                    self._condition.wait_for(
+                        lambda: len(self._queue) < self.queue_size
+                        or self._encoder_error is not None
+                    )
+                else:
+                    self._queue.popleft()
+                    self.frames_dropped += 1
+            self._raise_encoder_error()
+            self._queue.append(input_frame)
+            self.frames_queued += 1
+            self.max_queue_fill = max(self.max_queue_fill, len(self._queue))
+            self._condition.notify_all()
+        self._last_ts = ts
+
+    def stats(self) -> dict:
+        """Frame counters of the encoder queue."""
+        with self._condition:
+            return {
+                "queued": self.frames_queued,
+                "encoded": len(self.writer.timestamps),
+                "dropped": self.frames_dropped,
+                "queue_fill": len(self._queue),
+                "max_queue_fill": self.max_queue_fill,
+                "queue_size": self.queue_size,
+                "backpressure": self.backpressure,
+            }
+
+    def close(self, timestamp_export_format="npy"):
+        """Encode remaining frames and close writer, triggering timestamp save."""
+        if self.closed:
+            logger.warning("Trying to close container multiple times!")
+            return
+
+        with self._condition:
+            self._should_stop = True
+            self._condition.notify_all()
+        self._thread.join()
+        self.closed = True
+
+        try:
+            self.writer.close(timestamp_export_format)
+        finally:
+            self._raise_encoder_error()
+
+    def release(self):
+        """Close writer, triggering stream and timestamp save."""
+        self.close()
+
+    def _raise_encoder_error(self):
+        if self._encoder_error is not None:
+            error, self._encoder_error = self._encoder_error, None
+            raise error
+
+    def _encode_queued_frames(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._queue or self._should_stop)
+                if not self._queue:
+                    return
+                input_frame = self._queue.popleft()
+                self._condition.notify_all()
+
+            try:
+                self.writer.write_video_frame(input_frame)
+            except Exception as err:
+                logger.debug(f"Encoder thread failed: {err}")
+                with self._condition:
+                    self._encoder_error = err
+                    self._queue.clear()
+                    self._condition.notify_all()
+                return
+
+
 class MPEG_Writer(AV_Writer):
     """AV_Writer with MPEG4 encoding."""
 
@@ -366,6 +508,70 @@ class MPEG_Audio_Writer(MPEG_Writer):
         ).iterate_audio_packets()
 
 
+def concatenate_segments(
+    segment_paths, output_file_path, audio_dir=None, timestamp_export_format="npy"
+):
+    """Concatenates video segments without re-encoding them.
+
+    The segments need to be written by the same kind of AV_Writer with the same
+    start time, e.g. consecutive frame ranges of one export. Audio is added from
+    `audio_dir` in the same way as in MPEG_Audio_Writer.
+    Yields the number of segments that were concatenated so far.
+    """
+    timestamps = np.concatenate(
+        [
+            np.load(os.path.splitext(path)[0] + "_timestamps.npy")
+            for path in segment_paths
+        ]
+    )
+    output = av.open(output_file_path, "w")
+    try:
+        first_segment = av.open(segment_paths[0])
+        video_stream = output.add_stream(template=first_segment.streams.video[0])
+        first_segment.close()
+
+        audio_packets = iter(())
+        if audio_dir is not None and len(timestamps):
+            try:
+                audio_parts = audio_utils.load_audio(audio_dir)
+            except audio_utils.NoAudioLoadedError:
+                logger.debug("Could not mux audio. File not found.")
+            else:
+                audio_export_stream = MPEG_Audio_Writer._add_stream(
+                    container=output, template=audio_parts[0].stream
+                )
+                audio_packets = _AudioPacketIterator(
+                    start_time=timestamps[0],
+                    audio_export_stream=audio_export_stream,
+                    audio_parts=audio_parts,
+                    fill_gaps=True,
+                ).iterate_audio_packets()
+
+        for segment_idx, path in enumerate(segment_paths):
+            segment = av.open(path)
+            segment_stream = segment.streams.video[0]
+            for packet in segment.demux(segment_stream):
+                if packet.pts is None:
+                    continue  # flushing packet
+                packet_ts = packet.pts * segment_stream.time_base
+                packet.stream = video_stream
+                output.mux(packet)
+
+                # mux all audio packets up to current packet timestamp
+                for audio_packet in audio_packets:
+                    audio_ts = audio_packet.pts * audio_packet.stream.time_base
+                    output.mux(audio_packet)
+                    if audio_ts > packet_ts:
+                        break
+            segment.close()
+            yield segment_idx + 1
+    finally:
+        output.close()
+
+    if timestamp_export_format is not None:
+        write_timestamps(output_file_path, timestamps, timestamp_export_format)
+
+
 class _AudioPacketIterator:
     def __init__(self, start_time, audio_parts, audio_export_stream, fill_gaps=True):
         self.start_time = start_time
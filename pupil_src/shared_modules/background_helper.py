@@ -9,6 +9,7 @@ See COPYING and COPYING.LESSER for license details.
 ---------------------------------------------------------------------------~(*)
 """
 
+import collections
 import logging
 import multiprocessing as mp
 import signal
@@ -17,6 +18,7 @@ from ctypes import c_bool
 import zmq
 
 import zmq_tools
+from tasklib.background.transport import BatchReceiver, BatchSender
 
 logger = logging.getLogger(__name__)
 
@@ -46,8 +48,9 @@ class Task_Proxy:
             target=self._wrapper, name=name, args=wrapper_args, kwargs=kwargs
         )
         self.process.daemon = True
+        self.pipe = BatchReceiver(pipe_recv)
         self.process.start()
-        self.pipe = pipe_recv
+        pipe_send.close()
 
     def _wrapper(self, pipe, _should_terminate_flag, generator, *args, **kwargs):
         """Executed in background, pipes generator results to foreground
@@ -66,6 +69,7 @@ class Task_Proxy:
             # for shutting down the background process properly
 
         signal.signal(signal.SIGINT, interrupt_handler)
+        sender = BatchSender(pipe)
         try:
             self._change_logging_behavior()
             logger.debug("Entering _wrapper")
@@ -73,18 +77,24 @@ class Task_Proxy:
             for datum in generator(*args, **kwargs):
                 if _should_terminate_flag.value:
                     raise EarlyCancellationError("Task was cancelled")
-                pipe.send(datum)
+                sender.send(datum)
         except Exception as e:
-            pipe.send(e)
+            final_item = e
             if not isinstance(e, EarlyCancellationError):
                 import traceback
 
                 logger.info(traceback.format_exc())
         else:
-            pipe.send(StopIteration())
-        finally:
-            pipe.close()
-            logger.debug("Exiting _wrapper")
+            final_item = StopIteration()
+        # a yielded datum that cannot be pickled is raised in the foreground
+        sender.send_final([final_item], self._on_send_error)
+        pipe.close()
+        logger.debug("Exiting _wrapper")
+
+    @staticmethod
+    def _on_send_error(exception, traceback):
+        logger.info(traceback)
+        return exception
 
     def _prepare_wrapper_args(self, *args):
         return list(args)
@@ -124,8 +134,17 @@ class Task_Proxy:
                 pass
         if self.process is not None:
             self.process.join(timeout)
+            if not self.process.is_alive():
+                # unlink shared arrays of results that were not fetched anymore
+                self.pipe.discard()
+                self._canceled = not self.completed
             self.process = None
 
+    @property
+    def transport_stats(self):
+        """Throughput of the results received from the background process"""
+        return self.pipe.stats()
+
     @property
     def completed(self):
         return self._completed
@@ -162,6 +181,79 @@ class IPC_Logging_Task_Proxy(Task_Proxy):
         logger.root.setLevel(logging.NOTSET)
 
 
+class Pooled_Task_Proxy:
+    """Task_Proxy that runs its generator on the shared pool of worker processes
+
+    Instead of starting a new process per task, the generator is queued in the
+    default tasklib scheduler, which bounds the number of concurrently running
+    tasks and starts queued tasks by priority. The generator and its arguments
+    need to be picklable.
+    """
+
+    def __init__(self, name, generator, args=(), kwargs={}, priority=...):
+        import tasklib.background
+        from tasklib.background.scheduler import PRIORITY_DEFAULT
+
+        if priority is ...:
+            priority = PRIORITY_DEFAULT
+
+        self._completed = False
+        self._canceled = False
+        self._results = collections.deque()
+        self._exception = None
+
+        self.task = tasklib.background.create(
+            name, generator, args=args, kwargs=dict(kwargs), priority=priority
+        )
+        self.task.add_observer("on_yield", self._results.append)
+        self.task.add_observer("on_completed", self._on_completed)
+        self.task.add_observer("on_exception", self._on_exception)
+        self.task.add_observer("on_canceled_or_killed", self._on_canceled)
+        self.task.start()
+
+    def _on_completed(self, _):
+        self._completed = True
+
+    def _on_exception(self, exception):
+        self._exception = exception
+
+    def _on_canceled(self):
+        self._canceled = True
+
+    def fetch(self):
+        """Fetches progress and available results from background"""
+        if self.task.running:
+            self.task.update()
+
+        while self._results:
+            yield self._results.popleft()
+        if self._exception is not None:
+            exception, self._exception = self._exception, None
+            raise exception
+
+    def cancel(self, timeout=1):
+        if self.task.running:
+            self.task.kill(grace_period=timeout)
+        self._results.clear()
+
+    @property
+    def queued(self):
+        """True while the task waits for a free worker process"""
+        return self.task.queued
+
+    @property
+    def progress(self):
+        return self.task.progress
+
+    @property
+    def completed(self):
+        return self._completed
+
+    @property
+    def canceled(self):
+        return self._canceled
+
+
 if __name__ == "__main__":
     logging.basicConfig(
         level=logging.DEBUG,
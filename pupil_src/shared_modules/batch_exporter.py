@@ -16,8 +16,8 @@ import sys
 import time
 
 from ctypes import c_bool, c_int
-from multiprocessing import cpu_count
 import background_helper as bh
+from tasklib.background.scheduler import PRIORITY_EXPORT, default_scheduler
 
 import logging
 
@@ -98,6 +98,7 @@ class Batch_Export(System_Plugin_Base):
 
     def recent_events(self, events):
         if self.process:
+            self.in_queue = self.process.queued
             try:
                 recent = [d for d in self.process.fetch()]
             except Exception as e:
@@ -105,10 +106,13 @@ class Batch_Export(System_Plugin_Base):
             else:
                 if recent:
                     self.status, self.progress = recent[-1]
+                elif self.in_queue:
+                    self.status = "In queue"
 
             # Update status if process has been canceled or completed
             if self.process.canceled:
                 self.process = None
+                self.in_queue = False
                 self.status = "Export has been canceled."
                 self.notify_all(
                     {
@@ -158,7 +162,6 @@ class Batch_Export(System_Plugin_Base):
                 self.alive = False
 
     def init_export(self):
-        self.in_queue = False
         args = (
             self.rec_dir,
             self.g_pool.user_dir,
@@ -169,10 +172,11 @@ class Batch_Export(System_Plugin_Base):
             self.out_file_path,
             {},
         )
-        self.process = bh.IPC_Logging_Task_Proxy(
+        self.process = bh.Pooled_Task_Proxy(
             "Pupil Batch Export {}".format(self.out_file_path),
             export_function,
             args=args,
+            priority=PRIORITY_EXPORT,
         )
         self.notify_all(
             {"subject": "batch_export.started", "out_file_path": self.out_file_path}
@@ -215,10 +219,9 @@ class Batch_Exporter(Analysis_Plugin_Base):
         self.source_dir = os.path.expanduser(source_dir)
 
         self.search_task = None
-        self.worker_count = cpu_count() - 1
         logger.info(
             "Using a maximum of {} CPUs to process visualizations in parallel...".format(
-                cpu_count() - 1
+                default_scheduler().max_workers
             )
         )
 
@@ -371,10 +374,8 @@ class Batch_Exporter(Analysis_Plugin_Base):
             if n["out_file_path"] in self.active_exports:
                 self.active_exports.remove(n["out_file_path"])
 
-        # Add queued exports to active queue
-        for queued in self.queued_exports[
-            : self.worker_count - len(self.active_exports)
-        ]:
+        # The shared worker pool bounds the number of concurrent exports
+        for queued in self.queued_exports[:]:
             self.start_export(queued)
 
     def recent_events(self, events):
@@ -37,6 +37,136 @@ blink_color = cygl_utils.RGBA(0.9961, 0.3789, 0.5313, 0.8)
 threshold_color = cygl_utils.RGBA(0.9961, 0.8438, 0.3984, 0.8)
 
 
+class Confidence_Step_Filter(object):
+    """Step filter response over the pupil confidence of a sliding time window.
+
+    The window holds the pupil data of the last `history_length` seconds plus one
+    older datum. The response is the summed confidence of the older half of the
+    window minus the summed confidence of the newer half, divided by the window
+    size. For odd window sizes the center datum is ignored.
+
+    Data is kept in a ring buffer and both half sums are updated incrementally, as
+    window boundaries only ever move forward. Each datum therefore costs O(1),
+    independent of the window size.
+    """
+
+    def __init__(self, capacity=256):
+        self._capacity = capacity
+        self._data = [None] * capacity
+        self._timestamps = [0.0] * capacity
+        self._confidences = [0.0] * capacity
+        self.clear()
+
+    def clear(self):
+        # The window, and the ranges of both half sums, are given as absolute
+        # [start, stop) indices. Index i is stored at i % capacity.
+        self._start = self._stop = 0
+        self._older_range = (0, 0)
+        self._older_sum = 0.0
+        self._newer_range = (0, 0)
+        self._newer_sum = 0.0
+
+    def __len__(self):
+        return self._stop - self._start
+
+    def _timestamp(self, idx):
+        return self._timestamps[idx % self._capacity]
+
+    def _append(self, datum):
+        if len(self) == self._capacity:
+            self._grow()
+        idx = self._stop % self._capacity
+        self._data[idx] = datum
+        self._timestamps[idx] = datum["timestamp"]
+        self._confidences[idx] = datum["confidence"]
+        self._stop += 1
+
+    def _grow(self):
+        old_capacity = self._capacity
+        new_capacity = 2 * old_capacity
+        buffers = (self._data, self._timestamps, self._confidences)
+        new_buffers = (
+            [None] * new_capacity,
+            [0.0] * new_capacity,
+            [0.0] * new_capacity,
+        )
+        for idx in range(self._start, self._stop):
+            for buffer, new_buffer in zip(buffers, new_buffers):
+                new_buffer[idx % new_capacity] = buffer[idx % old_capacity]
+        self._data, self._timestamps, self._confidences = new_buffers
+        self._capacity = new_capacity
+
+    def extend(self, pupil_data, history_length):
+        """Adds pupil data and drops data that is older than the window.
+
+        Returns False if timestamps are not increasing, which requires a reset.
+        """
+        for datum in pupil_data:
+            self._append(datum)
+        if len(self) < 2:
+            return True
+        if self._timestamp(self._stop - 1) < self._timestamp(self._start):
+            return False
+
+        age_threshold = self._timestamp(self._stop - 1) - history_length
+        # drop data until only one datum below the age threshold remains:
+        while (
+            self._start + 1 < self._stop
+            and self._timestamp(self._start + 1) < age_threshold
+        ):
+            self._start += 1
+
+        half_size = len(self) // 2
+        self._older_sum = self._moved_sum(
+            self._older_sum, self._older_range, (self._start, self._start + half_size)
+        )
+        self._older_range = (self._start, self._start + half_size)
+        self._newer_sum = self._moved_sum(
+            self._newer_sum, self._newer_range, (self._stop - half_size, self._stop)
+        )
+        self._newer_range = (self._stop - half_size, self._stop)
+        return True
+
+    def _moved_sum(self, old_sum, old_range, new_range):
+        """Sum over `new_range`, updated from the sum over `old_range`.
+
+        Both boundaries of `new_range` are at or after those of `old_range`.
+        """
+        if new_range[0] >= old_range[1]:
+            return self._sum(*new_range)
+        return (
+            old_sum
+            + self._sum(old_range[1], new_range[1])
+            - self._sum(old_range[0], new_range[0])
+        )
+
+    def _sum(self, start, stop):
+        return sum(
+            self._confidences[idx % self._capacity] for idx in range(start, stop)
+        )
+
+    def response(self, history_length):
+        """Filter response, or None if the window does not span `history_length`"""
+        if len(self) < 2:
+            return None
+        if self._timestamp(self._stop - 1) - self._timestamp(self._start) < (
+            history_length
+        ):
+            return None
+        # The theoretical response maximum is +-0.5
+        # Response of +-0.45 seems sufficient for a confidence of 1.
+        return (self._older_sum - self._newer_sum) / len(self) / 0.45
+
+    def data(self):
+        """Pupil data in the window, oldest first"""
+        return [
+            self._data[idx % self._capacity] for idx in range(self._start, self._stop)
+        ]
+
+    def center(self):
+        return self._data[(self._start + len(self) // 2) % self._capacity]
+
+
 class Blink_Detection(Analysis_Plugin_Base):
     """
     This plugin implements a blink detection algorithm, based on sudden drops in the
@@ -65,7 +195,7 @@ class Blink_Detection(Analysis_Plugin_Base):
         self.onset_confidence_threshold = onset_confidence_threshold
         self.offset_confidence_threshold = offset_confidence_threshold
 
-        self.history = deque()
+        self.history = Confidence_Step_Filter()
         self.menu = None
         self._recent_blink = None
 
@@ -115,37 +245,14 @@ class Blink_Detection(Analysis_Plugin_Base):
     def recent_events(self, events={}):
         events["blinks"] = []
         self._recent_blink = None
-        self.history.extend(events.get("pupil", []))
-
-        try:
-            ts_oldest = self.history[0]["timestamp"]
-            ts_newest = self.history[-1]["timestamp"]
-            inconsistent_timestamps = ts_newest < ts_oldest
-            if inconsistent_timestamps:
-                self.reset_history()
-                return
-
-            age_threshold = ts_newest - self.history_length
-            # pop elements until only one element below the age threshold remains:
-            while self.history[1]["timestamp"] < age_threshold:
-                self.history.popleft()  # remove outdated gaze points
-        except IndexError:
-            pass
-
-        filter_size = len(self.history)
-        if filter_size < 2 or ts_newest - ts_oldest < self.history_length:
+        consistent = self.history.extend(events.get("pupil", []), self.history_length)
+        if not consistent:
+            self.reset_history()
             return
 
-        activity = np.fromiter((pp["confidence"] for pp in self.history), dtype=float)
-        blink_filter = np.ones(filter_size) / filter_size
-        blink_filter[filter_size // 2 :] *= -1
-
-        if filter_size % 2 == 1:  # make filter symmetrical
-            blink_filter[filter_size // 2] = 0.0
-
-        # The theoretical response maximum is +-0.5
-        # Response of +-0.45 seems sufficient for a confidence of 1.
-        filter_response = activity @ blink_filter / 0.45
+        filter_response = self.history.response(self.history_length)
+        if filter_response is None:
+            return
 
         if (
             -self.offset_confidence_threshold
@@ -167,8 +274,8 @@ class Blink_Detection(Analysis_Plugin_Base):
             "topic": "blinks",
             "type": blink_type,
             "confidence": confidence,
-            "base_data": list(self.history),
-            "timestamp": self.history[len(self.history) // 2]["timestamp"],
+            "base_data": self.history.data(),
+            "timestamp": self.history.center()["timestamp"],
             "record": True,
         }
         events["blinks"].append(blink_entry)
@@ -63,7 +63,8 @@ def _filter_pupil_list_by_confidence(pupil_list, threshold):
         return []
 
     len_pre_filter = len(pupil_list)
-    pupil_list = [p for p in pupil_list if p["confidence"] >= threshold]
+    confidence = _extract_field(pupil_list, "confidence")
+    pupil_list = [pupil_list[i] for i in np.flatnonzero(confidence >= threshold)]
     len_post_filter = len(pupil_list)
     dismissed_percentage = 100 * (1.0 - len_post_filter / len_pre_filter)
     logger.info(
@@ -73,17 +74,41 @@ def _filter_pupil_list_by_confidence(pupil_list, threshold):
     return pupil_list
 
 
+def _extract_field(data, key):
+    """Returns the numeric field `key` of all datums as float array"""
+    return np.fromiter((d[key] for d in data), dtype=np.float64, count=len(data))
+
+
+def _split_by_id(data):
+    """Returns the datums with id 0 and 1, in their original order"""
+    ids = _extract_field(data, "id")
+    data0 = [data[i] for i in np.flatnonzero(ids == 0)]
+    data1 = [data[i] for i in np.flatnonzero(ids == 1)]
+    return data0, data1
+
+
 def _match_data(pupil_list, ref_list):
     """Returns binocular and monocular matched pupil datums and ref points.
     Uses a dispersion criterion to dismiss matches which are too far apart.
     """
 
-    pupil0 = [p for p in pupil_list if p["id"] == 0]
-    pupil1 = [p for p in pupil_list if p["id"] == 1]
+    pupil0, pupil1 = _split_by_id(pupil_list)
+    ref_ts = _extract_field(ref_list, "timestamp")
+    pupil0_ts = _extract_field(pupil0, "timestamp")
+    pupil1_ts = _extract_field(pupil1, "timestamp")
 
-    matched_binocular_data = closest_matches_binocular(ref_list, pupil0, pupil1)
-    matched_pupil0_data = closest_matches_monocular(ref_list, pupil0)
-    matched_pupil1_data = closest_matches_monocular(ref_list, pupil1)
+    matched_binocular_data = _matched_data(
+        closest_matches_binocular_idc(ref_ts, pupil0_ts, pupil1_ts),
+        ref_list,
+        pupil0,
+        pupil1,
+    )
+    matched_pupil0_data = _matched_data(
+        closest_matches_monocular_idc(ref_ts, pupil0_ts), ref_list, pupil0
+    )
+    matched_pupil1_data = _matched_data(
+        closest_matches_monocular_idc(ref_ts, pupil1_ts), ref_list, pupil1
+    )
 
     if len(matched_pupil0_data) > len(matched_pupil1_data):
         matched_monocular_data = matched_pupil0_data
@@ -109,24 +134,13 @@ def closest_matches_binocular(ref_pts, pupil0, pupil1, max_dispersion=1 / 15.0):
     if not (ref_pts and pupil0 and pupil1):
         return []
 
-    pupil0_ts = np.array([p["timestamp"] for p in pupil0])
-    pupil1_ts = np.array([p["timestamp"] for p in pupil1])
-
-    matched = []
-    for r in ref_pts:
-        closest_p0_idx = _find_nearest_idx(pupil0_ts, r["timestamp"])
-        closest_p0 = pupil0[closest_p0_idx]
-        closest_p1_idx = _find_nearest_idx(pupil1_ts, r["timestamp"])
-        closest_p1 = pupil1[closest_p1_idx]
-
-        dispersion = max(
-            closest_p0["timestamp"], closest_p1["timestamp"], r["timestamp"]
-        ) - min(closest_p0["timestamp"], closest_p1["timestamp"], r["timestamp"])
-        if dispersion < max_dispersion:
-            matched.append({"ref": r, "pupil": closest_p0, "pupil1": closest_p1})
-        else:
-            logger.debug("Binocular match rejected due to time dispersion criterion")
-    return matched
+    matched_idc = closest_matches_binocular_idc(
+        _extract_field(ref_pts, "timestamp"),
+        _extract_field(pupil0, "timestamp"),
+        _extract_field(pupil1, "timestamp"),
+        max_dispersion,
+    )
+    return _matched_data(matched_idc, ref_pts, pupil0, pupil1)
 
 
 def closest_matches_monocular(ref_pts, pupil, max_dispersion=1 / 15.0):
@@ -137,31 +151,101 @@ def closest_matches_monocular(ref_pts, pupil, max_dispersion=1 / 15.0):
     if not (ref_pts and pupil):
         return []
 
-    pupil_ts = np.array([p["timestamp"] for p in pupil])
+    matched_idc = closest_matches_monocular_idc(
+        _extract_field(ref_pts, "timestamp"),
+        _extract_field(pupil, "timestamp"),
+        max_dispersion,
+    )
+    return _matched_data(matched_idc, ref_pts, pupil)
+
+
+def closest_matches_binocular_idc(
+    ref_ts, pupil0_ts, pupil1_ts, max_dispersion=1 / 15.0
+):
+    """Get indices of pupil timestamps closest in time to ref timestamps.
+    Pupil timestamps need to be sorted.
+    Return index arrays of matching ref, pupil0 and pupil1 triplets.
+    """
 
-    matched = []
-    for r in ref_pts:
-        closest_p_idx = _find_nearest_idx(pupil_ts, r["timestamp"])
-        closest_p = pupil[closest_p_idx]
-        dispersion = max(closest_p["timestamp"], r["timestamp"]) - min(
-            closest_p["timestamp"], r["timestamp"]
+    if not (len(ref_ts) and len(pupil0_ts) and len(pupil1_ts)):
+        return _empty_idc(3)
+
+    ref_ts = np.asarray(ref_ts, dtype=np.float64)
+    pupil0_ts = np.asarray(pupil0_ts, dtype=np.float64)
+    pupil1_ts = np.asarray(pupil1_ts, dtype=np.float64)
+
+    closest_p0_idc = _find_nearest_idc(pupil0_ts, ref_ts)
+    closest_p1_idc = _find_nearest_idc(pupil1_ts, ref_ts)
+
+    matched_ts = np.stack(
+        (pupil0_ts[closest_p0_idc], pupil1_ts[closest_p1_idc], ref_ts)
+    )
+    dispersion = matched_ts.max(axis=0) - matched_ts.min(axis=0)
+    matched_ref_idc = np.flatnonzero(dispersion < max_dispersion)
+
+    num_rejected = ref_ts.size - matched_ref_idc.size
+    if num_rejected:
+        logger.debug(
+            f"{num_rejected} binocular matches rejected due to time dispersion "
+            "criterion"
         )
-        if dispersion < max_dispersion:
-            matched.append({"ref": r, "pupil": closest_p})
-    return matched
+    return (
+        matched_ref_idc,
+        closest_p0_idc[matched_ref_idc],
+        closest_p1_idc[matched_ref_idc],
+    )
 
 
-def _find_nearest_idx(array, value):
-    """Find the index of the element in array which is closest to value"""
+def closest_matches_monocular_idc(ref_ts, pupil_ts, max_dispersion=1 / 15.0):
+    """Get indices of pupil timestamps closest in time to ref timestamps.
+    Pupil timestamps need to be sorted.
+    Return index arrays of matching ref and pupil pairs.
+    """
 
-    idx = np.searchsorted(array, value, side="left")
-    try:
-        if abs(value - array[idx - 1]) < abs(value - array[idx]):
-            return idx - 1
-        else:
-            return idx
-    except IndexError:
-        return idx - 1
+    if not (len(ref_ts) and len(pupil_ts)):
+        return _empty_idc(2)
+
+    ref_ts = np.asarray(ref_ts, dtype=np.float64)
+    pupil_ts = np.asarray(pupil_ts, dtype=np.float64)
+
+    closest_p_idc = _find_nearest_idc(pupil_ts, ref_ts)
+    dispersion = np.abs(pupil_ts[closest_p_idc] - ref_ts)
+    matched_ref_idc = np.flatnonzero(dispersion < max_dispersion)
+    return matched_ref_idc, closest_p_idc[matched_ref_idc]
+
+
+def _find_nearest_idc(array, values):
+    """Find the indices of the elements in array which are closest to values.
+    Ties are resolved towards the later element.
+    """
+
+    idc = np.searchsorted(array, values, side="left")
+    prev_idc = np.clip(idc - 1, 0, array.size - 1)
+    next_idc = np.minimum(idc, array.size - 1)
+    prev_is_closer = np.abs(values - array[prev_idc]) < np.abs(values - array[next_idc])
+    return np.where(prev_is_closer, prev_idc, next_idc)
+
+
+def _empty_idc(count):
+    return tuple(np.empty(0, dtype=np.intp) for _ in range(count))
+
+
+def _matched_data(matched_idc, ref_pts, pupil0, pupil1=None):
+    """Builds matched data dicts from the index arrays of the closest_matches_*_idc
+    functions.
+    """
+
+    if pupil1 is None:
+        ref_idc, pupil_idc = matched_idc
+        return [
+            {"ref": ref_pts[r], "pupil": pupil0[p]}
+            for r, p in zip(ref_idc.tolist(), pupil_idc.tolist())
+        ]
+    ref_idc, pupil0_idc, pupil1_idc = matched_idc
+    return [
+        {"ref": ref_pts[r], "pupil": pupil0[p0], "pupil1": pupil1[p1]}
+        for r, p0, p1 in zip(ref_idc.tolist(), pupil0_idc.tolist(), pupil1_idc.tolist())
+    ]
 
 
 def _extract_3d_data(g_pool, matched_data):
@@ -269,10 +353,8 @@ def _match_data_hmd(pupil_list, ref_list):
     Uses a dispersion criterion to dismiss matches which are too far apart.
     """
 
-    ref0 = [r for r in ref_list if r["id"] == 0]
-    ref1 = [r for r in ref_list if r["id"] == 1]
-    pupil0 = [p for p in pupil_list if p["id"] == 0]
-    pupil1 = [p for p in pupil_list if p["id"] == 1]
+    ref0, ref1 = _split_by_id(ref_list)
+    pupil0, pupil1 = _split_by_id(pupil_list)
 
     matched_binocular_data = closest_matches_binocular(ref_list, pupil0, pupil1)
     matched_pupil0_data = closest_matches_monocular(ref0, pupil0)
@@ -9,12 +9,15 @@ See COPYING and COPYING.LESSER for license details.
 ---------------------------------------------------------------------------~(*)
 """
 
+import itertools
+import typing as T
 from collections import deque
 
 import cv2
 import numpy as np
 from pyglui import ui
 
+import file_methods as fm
 import math_helper
 from calibration_routines.optimization_calibration import calibrate_2d
 from methods import normalize
@@ -30,6 +33,139 @@ def _clamp_norm_point(pos):
     return min(100.0, max(-100.0, pos[0])), min(100.0, max(-100.0, pos[1]))
 
 
+def _clamp_norm_points(points):
+    """Vectorized `_clamp_norm_point` for (N, 2) arrays, including its NaN handling"""
+    points = np.where(points > -100.0, points, -100.0)
+    return np.where(points < 100.0, points, 100.0)
+
+
+def _normalize_image_points(image_points, resolution):
+    """Vectorized `methods.normalize(..., flip_y=True)` for (N, 2) arrays"""
+    width, height = resolution
+    x = image_points[:, 0] / float(width)
+    y = image_points[:, 1] / float(height)
+    return np.column_stack((x, 1 - y))
+
+
+def _transform_points(matrix, points):
+    """Applies a 4x4 transformation matrix to (N, 3) points"""
+    points = np.column_stack((points, np.ones(len(points))))
+    return (points @ matrix.T)[:, :3]
+
+
+# Pupil data as consumed by `Gaze_Mapping_Plugin.map_batch_array()`. 3d fields are
+# NaN for data without 3d model, i.e. if `is_3d` is False.
+PUPIL_DATA_DTYPE = np.dtype(
+    [
+        ("id", "<i8"),
+        ("timestamp", "<f8"),
+        ("confidence", "<f8"),
+        ("norm_pos", "<f8", (2,)),
+        ("is_3d", "?"),
+        ("sphere_center", "<f8", (3,)),
+        ("circle_normal", "<f8", (3,)),
+    ]
+)
+
+# Gaze data as returned by `Gaze_Mapping_Plugin.map_batch_array()`. `base_idc` are
+# the rows of the pupil data array that were mapped, with -1 as second index for
+# monocular gaze. Fields that are not provided by a mapper are NaN.
+GAZE_DATA_DTYPE = np.dtype(
+    [
+        ("timestamp", "<f8"),
+        ("confidence", "<f8"),
+        ("norm_pos", "<f8", (2,)),
+        ("base_idc", "<i8", (2,)),
+        ("eye_centers_3d", "<f8", (2, 3)),
+        ("gaze_normals_3d", "<f8", (2, 3)),
+        ("gaze_point_3d", "<f8", (3,)),
+    ]
+)
+_GAZE_DATA_3D_FIELDS = ("eye_centers_3d", "gaze_normals_3d", "gaze_point_3d")
+
+
+class _Gaze_Row(T.NamedTuple):
+    """Single row of `GAZE_DATA_DTYPE` as Python values"""
+
+    timestamp: float
+    confidence: float
+    norm_pos: list
+    base_idc: list
+    eye_centers_3d: list
+    gaze_normals_3d: list
+    gaze_point_3d: list
+    # Eye id of the first base datum
+    eye_id: int
+
+
+def pupil_data_array(pupil_list, with_3d=False):
+    """Converts pupil data to a structured array of `PUPIL_DATA_DTYPE`.
+
+    Fixed-size fields are read from the columnar store if `pupil_list` is a
+    `PLData_Columns` view. 3d model fields are only extracted if `with_3d` is True.
+    """
+    pupil_data = np.empty(len(pupil_list), dtype=PUPIL_DATA_DTYPE)
+    pupil_data["is_3d"] = False
+    pupil_data["sphere_center"] = np.nan
+    pupil_data["circle_normal"] = np.nan
+    if not len(pupil_list):
+        return pupil_data
+
+    if isinstance(pupil_list, fm.PLData_Columns) and not with_3d:
+        for key in ("id", "timestamp", "confidence", "norm_pos"):
+            pupil_data[key] = pupil_list.column(key)
+        return pupil_data
+
+    # Read datum by datum, such that every serialized datum is only unpacked once
+    # instead of once per field.
+    rows = []
+    rows_3d = []
+    for idx, p in enumerate(pupil_list):
+        rows.append((p["id"], p["timestamp"], p["confidence"], *p["norm_pos"]))
+        if with_3d and "3d" in p["method"]:
+            rows_3d.append((idx, *p["sphere"]["center"], *p["circle_3d"]["normal"]))
+
+    rows = np.array(rows, dtype=np.float64)
+    pupil_data["id"] = rows[:, 0]
+    pupil_data["timestamp"] = rows[:, 1]
+    pupil_data["confidence"] = rows[:, 2]
+    pupil_data["norm_pos"] = rows[:, 3:5]
+    if rows_3d:
+        rows_3d = np.array(rows_3d, dtype=np.float64)
+        idc_3d = rows_3d[:, 0].astype(np.int64)
+        pupil_data["is_3d"][idc_3d] = True
+        pupil_data["sphere_center"][idc_3d] = rows_3d[:, 1:4]
+        pupil_data["circle_normal"][idc_3d] = rows_3d[:, 4:7]
+    return pupil_data
+
+
+def _map_norm_pos_per_eye(batch_map_fns, pupil_data, idc):
+    """Evaluates the batch map function of the corresponding eye for every datum"""
+    gaze_points = np.empty((len(idc), 2))
+    eye_ids = pupil_data["id"][idc]
+    for eye_id, batch_map_fn in enumerate(batch_map_fns):
+        is_eye = eye_ids == eye_id
+        gaze_points[is_eye] = batch_map_fn(pupil_data["norm_pos"][idc[is_eye]])
+    return gaze_points
+
+
+def _empty_gaze_data(pupil_data, idc0, idc1=None):
+    """Gaze array for the given base data, with averaged timestamps if binocular"""
+    gaze_data = np.empty(len(idc0), dtype=GAZE_DATA_DTYPE)
+    for key in ("norm_pos", "eye_centers_3d", "gaze_normals_3d", "gaze_point_3d"):
+        gaze_data[key] = np.nan
+    gaze_data["base_idc"][:, 0] = idc0
+    if idc1 is None:
+        gaze_data["base_idc"][:, 1] = -1
+        gaze_data["timestamp"] = pupil_data["timestamp"][idc0]
+    else:
+        gaze_data["base_idc"][:, 1] = idc1
+        gaze_data["timestamp"] = (
+            pupil_data["timestamp"][idc0] + pupil_data["timestamp"][idc1]
+        ) / 2.0
+    return gaze_data
+
+
 class Gaze_Mapping_Plugin(Plugin):
     """base class for all gaze mapping routines"""
 
@@ -42,15 +178,64 @@ class Gaze_Mapping_Plugin(Plugin):
         super().__init__(g_pool)
         self.g_pool.active_gaze_mapping_plugin = self
 
+    # Subclasses that implement `map_batch_array()` set this to True
+    supports_batch_mapping = False
+    requires_3d_pupil_data = False
+
     def on_pupil_datum(self, p):
         raise NotImplementedError()
 
     def map_batch(self, pupil_list):
+        if self.supports_batch_mapping:
+            pupil_data = pupil_data_array(pupil_list, self.requires_3d_pupil_data)
+            gaze_data = self.map_batch_array(pupil_data)
+            return self.gaze_data_from_array(gaze_data, pupil_data, pupil_list)
+
         results = []
         for p in pupil_list:
             results.extend(self.on_pupil_datum(p))
         return results
 
+    def map_batch_array(self, pupil_data):
+        """Maps pupil data of `PUPIL_DATA_DTYPE` to gaze data of `GAZE_DATA_DTYPE`.
+
+        Results are identical to calling `on_pupil_datum()` for every datum in order.
+        """
+        raise NotImplementedError()
+
+    def gaze_data_from_array(self, gaze_data, pupil_data, pupil_list):
+        """Creates gaze datums from the result of `map_batch_array()`.
+
+        `pupil_list` contains the pupil datums of `pupil_data`, in the same order.
+        They are only referenced as base data and never accessed, such that
+        serialized pupil data does not need to be unpacked again.
+        """
+        # 3d fields are only converted for mappers that can produce them
+        columns = [
+            gaze_data[key].tolist()
+            if self.requires_3d_pupil_data or key not in _GAZE_DATA_3D_FIELDS
+            else itertools.repeat(None)
+            for key in GAZE_DATA_DTYPE.names
+        ]
+        columns.append(pupil_data["id"][gaze_data["base_idc"][:, 0]].tolist())
+        results = []
+        for row in zip(*columns):
+            g = _Gaze_Row._make(row)
+            idx0, idx1 = g.base_idc
+            if idx1 < 0:
+                results.append(self._monocular_gaze_datum(g, pupil_list[idx0]))
+            else:
+                results.append(
+                    self._binocular_gaze_datum(g, pupil_list[idx0], pupil_list[idx1])
+                )
+        return results
+
+    def _monocular_gaze_datum(self, g, p):
+        raise NotImplementedError()
+
+    def _binocular_gaze_datum(self, g, p0, p1):
+        raise NotImplementedError()
+
     def add_menu(self):
         super().add_menu()
         self.menu_icon.order = 0.31
@@ -69,6 +254,12 @@ class Monocular_Gaze_Mapper_Base(Gaze_Mapping_Plugin):
         else:
             return []
 
+    def map_batch_array(self, pupil_data):
+        gaze_data, valid = self._map_monocular_batch(
+            pupil_data, np.arange(len(pupil_data))
+        )
+        return gaze_data[valid]
+
 
 class Binocular_Gaze_Mapper_Base(Gaze_Mapping_Plugin):
     """Base class to implement the map callback"""
@@ -86,17 +277,25 @@ class Binocular_Gaze_Mapper_Base(Gaze_Mapping_Plugin):
         return len(cache) >= 2
 
     def estimate_frame_rate_raw(self, cache):
-        return np.mean(np.diff([d["timestamp"] for d in cache]))
+        # mean of timestamp differences
+        return (cache[-1]["timestamp"] - cache[0]["timestamp"]) / (len(cache) - 1)
 
     def estimate_framerate_smoothed(self, eye0_cache, eye1_cache):
-        if self.is_cache_valid(eye0_cache) and self.is_cache_valid(eye1_cache):
+        eye0_framerate_raw = None
+        eye1_framerate_raw = None
+        if self.is_cache_valid(eye0_cache):
             eye0_framerate_raw = self.estimate_frame_rate_raw(eye0_cache)
+        if self.is_cache_valid(eye1_cache):
             eye1_framerate_raw = self.estimate_frame_rate_raw(eye1_cache)
+        return self._smooth_framerate(eye0_framerate_raw, eye1_framerate_raw)
+
+    def _smooth_framerate(self, eye0_framerate_raw, eye1_framerate_raw):
+        if eye0_framerate_raw is not None and eye1_framerate_raw is not None:
             estimated_framerate_raw = max(eye0_framerate_raw, eye1_framerate_raw)
-        elif self.is_cache_valid(eye0_cache):
-            estimated_framerate_raw = self.estimate_frame_rate_raw(eye0_cache)
-        elif self.is_cache_valid(eye1_cache):
-            estimated_framerate_raw = self.estimate_frame_rate_raw(eye1_cache)
+        elif eye0_framerate_raw is not None:
+            estimated_framerate_raw = eye0_framerate_raw
+        elif eye1_framerate_raw is not None:
+            estimated_framerate_raw = eye1_framerate_raw
         else:
             return self.recently_estimated_framerate
 
@@ -108,13 +307,73 @@ class Binocular_Gaze_Mapper_Base(Gaze_Mapping_Plugin):
     def map_batch(self, pupil_list):
         current_caches = self._caches
         self._caches = (deque(), deque())
-        results = []
-        for p in pupil_list:
-            results.extend(self.on_pupil_datum(p))
-
+        results = super().map_batch(pupil_list)
         self._caches = current_caches
         return results
 
+    def map_batch_array(self, pupil_data):
+        pairs = self._pair_binocular(pupil_data)
+        is_binocular = pairs[:, 1] != -1
+        gaze_data = np.empty(len(pairs), dtype=GAZE_DATA_DTYPE)
+        valid = np.empty(len(pairs), dtype=bool)
+        gaze_data[~is_binocular], valid[~is_binocular] = self._map_monocular_batch(
+            pupil_data, pairs[~is_binocular, 0]
+        )
+        gaze_data[is_binocular], valid[is_binocular] = self._map_binocular_batch(
+            pupil_data, pairs[is_binocular, 0], pairs[is_binocular, 1]
+        )
+        return gaze_data[valid]
+
+    def _pair_binocular(self, pupil_data):
+        """Replays the pairing of `on_pupil_datum()` on arrays of pupil data.
+
+        Returns (N, 2) pupil data indices in mapping order. The second index is -1
+        for data that is mapped monocularly.
+        """
+        eye_ids = pupil_data["id"].tolist()
+        timestamps = pupil_data["timestamp"].tolist()
+        low_confidence = (pupil_data["confidence"] < self.min_pupil_confidence).tolist()
+
+        def framerate_raw(cache):
+            if len(cache) < 2:
+                return None
+            return (timestamps[cache[-1]] - timestamps[cache[0]]) / (len(cache) - 1)
+
+        caches = (deque(), deque())
+        pairs = []
+        for idx, eye_id in enumerate(eye_ids):
+            caches[eye_id].append(idx)
+            temporal_cutoff = 2 * self._smooth_framerate(
+                framerate_raw(caches[0]), framerate_raw(caches[1])
+            )
+
+            # map low confidence pupil data monocularly
+            if caches[0] and low_confidence[caches[0][0]]:
+                pairs.append((caches[0].popleft(), -1))
+            elif caches[1] and low_confidence[caches[1][0]]:
+                pairs.append((caches[1].popleft(), -1))
+            # map high confidence data binocularly if available
+            elif caches[0] and caches[1]:
+                if timestamps[caches[0][0]] < timestamps[caches[1][0]]:
+                    idx0 = caches[0].popleft()
+                    idx1 = caches[1][0]
+                    older_idx = idx0
+                else:
+                    idx0 = caches[0][0]
+                    idx1 = caches[1].popleft()
+                    older_idx = idx1
+
+                if abs(timestamps[idx0] - timestamps[idx1]) < temporal_cutoff:
+                    pairs.append((idx0, idx1))
+                else:
+                    pairs.append((older_idx, -1))
+            elif len(caches[0]) > self.sample_cutoff:
+                pairs.append((caches[0].popleft(), -1))
+            elif len(caches[1]) > self.sample_cutoff:
+                pairs.append((caches[1].popleft(), -1))
+
+        return np.array(pairs, dtype=np.int64).reshape(-1, 2)
+
     def on_pupil_datum(self, p):
         self._caches[p["id"]].append(p)
         temporal_cutoff = 2 * self.estimate_framerate_smoothed(*self._caches)
@@ -195,6 +454,7 @@ class Monocular_Gaze_Mapper(Monocular_Gaze_Mapper_Base, Gaze_Mapping_Plugin):
         super().__init__(g_pool)
         self.params = params
         self.map_fn = calibrate_2d.make_map_function(*self.params)
+        self.batch_map_fn = calibrate_2d.make_batch_map_function(*self.params)
 
     def _map_monocular(self, p):
         gaze_point = self.map_fn(p["norm_pos"])
@@ -207,6 +467,24 @@ class Monocular_Gaze_Mapper(Monocular_Gaze_Mapper_Base, Gaze_Mapping_Plugin):
             "base_data": [p],
         }
 
+    supports_batch_mapping = True
+
+    def _map_monocular_batch(self, pupil_data, idc):
+        gaze_data = _empty_gaze_data(pupil_data, idc)
+        gaze_data["confidence"] = pupil_data["confidence"][idc]
+        gaze_data["norm_pos"] = self.batch_map_fn(pupil_data["norm_pos"][idc])
+        return gaze_data, np.ones(len(idc), dtype=bool)
+
+    def _monocular_gaze_datum(self, row, p):
+        return {
+            "topic": "gaze.2d.{}.".format(row.eye_id),
+            "norm_pos": tuple(row.norm_pos),
+            "confidence": row.confidence,
+            "id": row.eye_id,
+            "timestamp": row.timestamp,
+            "base_data": [p],
+        }
+
     def get_init_dict(self):
         return {"params": self.params}
 
@@ -222,6 +500,10 @@ class Dual_Monocular_Gaze_Mapper(Monocular_Gaze_Mapper_Base, Gaze_Mapping_Plugin
             calibrate_2d.make_map_function(*self.params0),
             calibrate_2d.make_map_function(*self.params1),
         )
+        self.batch_map_fns = (
+            calibrate_2d.make_batch_map_function(*self.params0),
+            calibrate_2d.make_batch_map_function(*self.params1),
+        )
 
     def _map_monocular(self, p):
         gaze_point = self.map_fns[p["id"]](p["norm_pos"])
@@ -234,6 +516,26 @@ class Dual_Monocular_Gaze_Mapper(Monocular_Gaze_Mapper_Base, Gaze_Mapping_Plugin
             "base_data": [p],
         }
 
+    supports_batch_mapping = True
+
+    def _map_monocular_batch(self, pupil_data, idc):
+        gaze_data = _empty_gaze_data(pupil_data, idc)
+        gaze_data["confidence"] = pupil_data["confidence"][idc]
+        gaze_data["norm_pos"] = _map_norm_pos_per_eye(
+            self.batch_map_fns, pupil_data, idc
+        )
+        return gaze_data, np.ones(len(idc), dtype=bool)
+
+    def _monocular_gaze_datum(self, row, p):
+        return {
+            "topic": "gaze.2d.{}.".format(row.eye_id),
+            "norm_pos": tuple(row.norm_pos),
+            "confidence": row.confidence,
+            "id": row.eye_id,
+            "timestamp": row.timestamp,
+            "base_data": [p],
+        }
+
     def get_init_dict(self):
         return {"params0": self.params0, "params1": self.params1}
 
@@ -249,6 +551,11 @@ class Binocular_Gaze_Mapper(Binocular_Gaze_Mapper_Base, Gaze_Mapping_Plugin):
         self.map_fn_fallback = []
         self.map_fn_fallback.append(calibrate_2d.make_map_function(*self.params_eye0))
         self.map_fn_fallback.append(calibrate_2d.make_map_function(*self.params_eye1))
+        self.batch_map_fn = calibrate_2d.make_batch_map_function(*self.params)
+        self.batch_map_fn_fallback = (
+            calibrate_2d.make_batch_map_function(*self.params_eye0),
+            calibrate_2d.make_batch_map_function(*self.params_eye1),
+        )
 
     def init_ui(self):
         self.add_menu()
@@ -288,6 +595,49 @@ class Binocular_Gaze_Mapper(Binocular_Gaze_Mapper_Base, Gaze_Mapping_Plugin):
             "base_data": [p],
         }
 
+    supports_batch_mapping = True
+
+    def _map_binocular_batch(self, pupil_data, idc0, idc1):
+        gaze_data = _empty_gaze_data(pupil_data, idc0, idc1)
+        confidence = pupil_data["confidence"]
+        gaze_data["confidence"] = (confidence[idc0] + confidence[idc1]) / 2.0
+        norm_pos0 = pupil_data["norm_pos"][idc0]
+        norm_pos1 = pupil_data["norm_pos"][idc1]
+        if self.multivariate:
+            gaze_points = self.batch_map_fn(np.hstack((norm_pos0, norm_pos1)))
+        else:
+            gaze_points_eye0 = self.batch_map_fn_fallback[0](norm_pos0)
+            gaze_points_eye1 = self.batch_map_fn_fallback[1](norm_pos1)
+            gaze_points = (gaze_points_eye0 + gaze_points_eye1) / 2.0
+        gaze_data["norm_pos"] = gaze_points
+        return gaze_data, np.ones(len(idc0), dtype=bool)
+
+    def _map_monocular_batch(self, pupil_data, idc):
+        gaze_data = _empty_gaze_data(pupil_data, idc)
+        gaze_data["confidence"] = pupil_data["confidence"][idc]
+        gaze_data["norm_pos"] = _map_norm_pos_per_eye(
+            self.batch_map_fn_fallback, pupil_data, idc
+        )
+        return gaze_data, np.ones(len(idc), dtype=bool)
+
+    def _binocular_gaze_datum(self, row, p0, p1):
+        return {
+            "topic": "gaze.2d.01.",
+            "norm_pos": tuple(row.norm_pos),
+            "confidence": row.confidence,
+            "timestamp": row.timestamp,
+            "base_data": [p0, p1],
+        }
+
+    def _monocular_gaze_datum(self, row, p):
+        return {
+            "topic": "gaze.2d.{}.".format(row.eye_id),
+            "norm_pos": tuple(row.norm_pos),
+            "confidence": row.confidence,
+            "timestamp": row.timestamp,
+            "base_data": [p],
+        }
+
     def get_init_dict(self):
         return {
             "params": self.params,
@@ -392,6 +742,47 @@ class Vector_Gaze_Mapper(Monocular_Gaze_Mapper_Base, Gaze_Mapping_Plugin):
             self.sphere["radius"] = p["sphere"]["radius"]
         return g
 
+    supports_batch_mapping = True
+    requires_3d_pupil_data = True
+
+    def _map_monocular_batch(self, pupil_data, idc):
+        gaze_data = _empty_gaze_data(pupil_data, idc)
+        gaze_data["confidence"] = pupil_data["confidence"][idc]
+        valid = pupil_data["is_3d"][idc]
+        idc = idc[valid]
+        if not len(idc):
+            return gaze_data, valid
+
+        sphere_center = pupil_data["sphere_center"][idc]
+        circle_normal = pupil_data["circle_normal"][idc]
+        gaze_point = circle_normal * self.gaze_distance + sphere_center
+
+        intrinsics = self.g_pool.capture.intrinsics
+        image_points = intrinsics.projectPoints(
+            gaze_point, self.rotation_vector, self.translation_vector
+        )
+        image_points = image_points.reshape(-1, 2)
+        image_points = _normalize_image_points(image_points, intrinsics.resolution)
+        gaze_data["norm_pos"][valid] = _clamp_norm_points(image_points)
+
+        matrix = self.eye_camera_to_world_matrix
+        gaze_data["eye_centers_3d"][valid, 0] = _transform_points(matrix, sphere_center)
+        gaze_data["gaze_point_3d"][valid] = _transform_points(matrix, gaze_point)
+        gaze_data["gaze_normals_3d"][valid, 0] = circle_normal @ self.rotation_matrix.T
+        return gaze_data, valid
+
+    def _monocular_gaze_datum(self, row, p):
+        return {
+            "topic": "gaze.3d.{}.".format(row.eye_id),
+            "norm_pos": tuple(row.norm_pos),
+            "eye_center_3d": row.eye_centers_3d[0],
+            "gaze_normal_3d": row.gaze_normals_3d[0],
+            "gaze_point_3d": row.gaze_point_3d,
+            "confidence": row.confidence,
+            "timestamp": row.timestamp,
+            "base_data": [p],
+        }
+
     def gl_display(self):
         self.visualizer.update_window(self.g_pool, self.gaze_pts_debug, self.sphere)
         self.gaze_pts_debug = []
@@ -641,6 +1032,172 @@ class Binocular_Vector_Gaze_Mapper(Binocular_Gaze_Mapper_Base, Gaze_Mapping_Plug
 
         return g
 
+    supports_batch_mapping = True
+    requires_3d_pupil_data = True
+
+    def map_batch_array(self, pupil_data):
+        pairs = self._pair_binocular(pupil_data)
+        is_binocular = pairs[:, 1] != -1
+        gaze_data = np.empty(len(pairs), dtype=GAZE_DATA_DTYPE)
+        valid = np.empty(len(pairs), dtype=bool)
+        binocular_data, binocular_valid = self._map_binocular_batch(
+            pupil_data, pairs[is_binocular, 0], pairs[is_binocular, 1]
+        )
+        gaze_data[is_binocular] = binocular_data
+        valid[is_binocular] = binocular_valid
+
+        # Monocular mapping depends on `last_gaze_distance`, which is updated by
+        # every successful binocular mapping if backprojecting.
+        gaze_distances = np.full(len(pairs), self.last_gaze_distance)
+        if self.backproject:
+            binocular_data = binocular_data[binocular_valid]
+            cyclop_center = (
+                binocular_data["eye_centers_3d"][:, 0]
+                + binocular_data["eye_centers_3d"][:, 1]
+            ) / 2.0
+            cyclop_gaze = binocular_data["gaze_point_3d"] - cyclop_center
+            update_idc = np.flatnonzero(is_binocular)[binocular_valid]
+            updated_distances = np.full(len(pairs), np.nan)
+            updated_distances[update_idc] = np.sqrt(
+                np.einsum("ij,ij->i", cyclop_gaze, cyclop_gaze)
+            )
+            is_update = np.zeros(len(pairs), dtype=bool)
+            is_update[update_idc] = True
+            latest_update = np.maximum.accumulate(
+                np.where(is_update, np.arange(len(pairs)), -1)
+            )
+            has_update = latest_update >= 0
+            gaze_distances[has_update] = updated_distances[latest_update[has_update]]
+            if update_idc.size:
+                self.last_gaze_distance = float(updated_distances[update_idc[-1]])
+
+        gaze_data[~is_binocular], valid[~is_binocular] = self._map_monocular_batch(
+            pupil_data, pairs[~is_binocular, 0], gaze_distances[~is_binocular]
+        )
+        return gaze_data[valid]
+
+    def _map_monocular_batch(self, pupil_data, idc, gaze_distances=None):
+        if gaze_distances is None:
+            gaze_distances = np.full(len(idc), self.last_gaze_distance)
+        gaze_data = _empty_gaze_data(pupil_data, idc)
+        gaze_data["confidence"] = pupil_data["confidence"][idc]
+        valid = pupil_data["is_3d"][idc]
+        idc = idc[valid]
+        gaze_distances = gaze_distances[valid]
+        rows = np.flatnonzero(valid)
+        eye_ids = pupil_data["id"][idc]
+        intrinsics = self.g_pool.capture.intrinsics
+
+        for eye_id in (0, 1):
+            is_eye = eye_ids == eye_id
+            if not is_eye.any():
+                continue
+            eye_rows = rows[is_eye]
+            sphere_center = pupil_data["sphere_center"][idc[is_eye]]
+            circle_normal = pupil_data["circle_normal"][idc[is_eye]]
+            gaze_point = (
+                circle_normal * gaze_distances[is_eye, np.newaxis] + sphere_center
+            )
+
+            if self.backproject:
+                image_points = intrinsics.projectPoints(
+                    gaze_point,
+                    self.rotation_vectors[eye_id],
+                    self.translation_vectors[eye_id],
+                )
+                image_points = image_points.reshape(-1, 2)
+                image_points = _normalize_image_points(
+                    image_points, intrinsics.resolution
+                )
+                gaze_data["norm_pos"][eye_rows] = _clamp_norm_points(image_points)
+
+            matrix = self.eye_camera_to_world_matricies[eye_id]
+            rotation = self.rotation_matricies[eye_id]
+            gaze_data["eye_centers_3d"][eye_rows, 0] = _transform_points(
+                matrix, sphere_center
+            )
+            gaze_data["gaze_point_3d"][eye_rows] = _transform_points(matrix, gaze_point)
+            gaze_data["gaze_normals_3d"][eye_rows, 0] = circle_normal @ rotation.T
+
+        return gaze_data, valid
+
+    def _map_binocular_batch(self, pupil_data, idc0, idc1):
+        gaze_data = _empty_gaze_data(pupil_data, idc0, idc1)
+        confidence = pupil_data["confidence"]
+        gaze_data["confidence"] = np.minimum(confidence[idc0], confidence[idc1])
+        valid = pupil_data["is_3d"][idc0] & pupil_data["is_3d"][idc1]
+        idc0 = idc0[valid]
+        idc1 = idc1[valid]
+        if not len(idc0):
+            return gaze_data, valid
+
+        # find the nearest intersection point of the two gaze lines, see
+        # `_map_binocular()` for details
+        s0_center = _transform_points(
+            self.eye_camera_to_world_matricies[0], pupil_data["sphere_center"][idc0]
+        )
+        s1_center = _transform_points(
+            self.eye_camera_to_world_matricies[1], pupil_data["sphere_center"][idc1]
+        )
+        s0_normal = pupil_data["circle_normal"][idc0] @ self.rotation_matricies[0].T
+        s1_normal = pupil_data["circle_normal"][idc1] @ self.rotation_matricies[1].T
+
+        cyclop_normal = (s0_normal + s1_normal) / 2.0
+        gaze_plane = np.cross(cyclop_normal, s1_center - s0_center)
+        gaze_plane /= np.linalg.norm(gaze_plane, axis=1)[:, np.newaxis]
+
+        def project_on_plane(normal):
+            distance = np.einsum("ij,ij->i", gaze_plane, normal)
+            return normal - distance[:, np.newaxis] * gaze_plane
+
+        gaze_line0 = [s0_center, s0_center + project_on_plane(s0_normal)]
+        gaze_line1 = [s1_center, s1_center + project_on_plane(s1_normal)]
+        intersection_points, _ = math_helper.nearest_intersections(
+            gaze_line0, gaze_line1
+        )
+
+        if self.backproject:
+            intrinsics = self.g_pool.capture.intrinsics
+            image_points = intrinsics.projectPoints(intersection_points)
+            image_points = image_points.reshape(-1, 2)
+            image_points = _normalize_image_points(image_points, intrinsics.resolution)
+            gaze_data["norm_pos"][valid] = _clamp_norm_points(image_points)
+
+        gaze_data["eye_centers_3d"][valid, 0] = s0_center
+        gaze_data["eye_centers_3d"][valid, 1] = s1_center
+        gaze_data["gaze_normals_3d"][valid, 0] = s0_normal
+        gaze_data["gaze_normals_3d"][valid, 1] = s1_normal
+        gaze_data["gaze_point_3d"][valid] = intersection_points
+        return gaze_data, valid
+
+    def _monocular_gaze_datum(self, row, p):
+        g = {
+            "topic": "gaze.3d.{}.".format(row.eye_id),
+            "eye_center_3d": row.eye_centers_3d[0],
+            "gaze_normal_3d": row.gaze_normals_3d[0],
+            "gaze_point_3d": row.gaze_point_3d,
+            "confidence": row.confidence,
+            "timestamp": row.timestamp,
+            "base_data": [p],
+        }
+        if self.backproject:
+            g["norm_pos"] = tuple(row.norm_pos)
+        return g
+
+    def _binocular_gaze_datum(self, row, p0, p1):
+        g = {
+            "topic": "gaze.3d.01.",
+            "eye_centers_3d": {0: row.eye_centers_3d[0], 1: row.eye_centers_3d[1]},
+            "gaze_normals_3d": {0: row.gaze_normals_3d[0], 1: row.gaze_normals_3d[1]},
+            "gaze_point_3d": row.gaze_point_3d,
+            "confidence": row.confidence,
+            "timestamp": row.timestamp,
+            "base_data": [p0, p1],
+        }
+        if self.backproject:
+            g["norm_pos"] = tuple(row.norm_pos)
+        return g
+
     def gl_display(self):
         self.visualizer.update_window(
             self.g_pool,
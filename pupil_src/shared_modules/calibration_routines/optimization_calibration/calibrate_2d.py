@@ -10,6 +10,7 @@ See COPYING and COPYING.LESSER for license details.
 """
 
 import logging
+import operator
 
 import numpy as np
 
@@ -106,282 +107,107 @@ def fit_error_screen(err_x, err_y, screen_pos):
     return err_dist, err_mean, err_rms
 
 
+# Number of input coordinates per model, i.e. a single point (X, Y) for monocular and
+# a pair of points (X0, Y0, X1, Y1) for binocular models.
+_MODEL_INPUT_SIZE = {3: 2, 5: 4, 7: 2, 9: 2, 13: 4, 17: 4}
+
+
 def make_model(cal_pt_cloud, n=7):
-    n_points = cal_pt_cloud.shape[0]
-
-    if n == 3:
-        X = cal_pt_cloud[:, 0]
-        Y = cal_pt_cloud[:, 1]
-        Ones = np.ones(n_points)
-        ZX = cal_pt_cloud[:, 2]
-        ZY = cal_pt_cloud[:, 3]
-        M = np.array([X, Y, Ones, ZX, ZY]).transpose()
-
-    elif n == 5:
-        X0 = cal_pt_cloud[:, 0]
-        Y0 = cal_pt_cloud[:, 1]
-        X1 = cal_pt_cloud[:, 2]
-        Y1 = cal_pt_cloud[:, 3]
-        Ones = np.ones(n_points)
-        ZX = cal_pt_cloud[:, 4]
-        ZY = cal_pt_cloud[:, 5]
-        M = np.array([X0, Y0, X1, Y1, Ones, ZX, ZY]).transpose()
+    features = make_features(cal_pt_cloud[:, :-2], n)
+    return np.column_stack((features, cal_pt_cloud[:, -2:]))
 
-    elif n == 7:
-        X = cal_pt_cloud[:, 0]
-        Y = cal_pt_cloud[:, 1]
-        XX = X * X
-        YY = Y * Y
-        XY = X * Y
-        XXYY = XX * YY
-        Ones = np.ones(n_points)
-        ZX = cal_pt_cloud[:, 2]
-        ZY = cal_pt_cloud[:, 3]
-        M = np.array([X, Y, XX, YY, XY, XXYY, Ones, ZX, ZY]).transpose()
-
-    elif n == 9:
-        X = cal_pt_cloud[:, 0]
-        Y = cal_pt_cloud[:, 1]
-        XX = X * X
-        YY = Y * Y
-        XY = X * Y
-        XXYY = XX * YY
-        XXY = XX * Y
-        YYX = YY * X
-        Ones = np.ones(n_points)
-        ZX = cal_pt_cloud[:, 2]
-        ZY = cal_pt_cloud[:, 3]
-        M = np.array([X, Y, XX, YY, XY, XXYY, XXY, YYX, Ones, ZX, ZY]).transpose()
-
-    elif n == 13:
-        X0 = cal_pt_cloud[:, 0]
-        Y0 = cal_pt_cloud[:, 1]
-        X1 = cal_pt_cloud[:, 2]
-        Y1 = cal_pt_cloud[:, 3]
-        XX0 = X0 * X0
-        YY0 = Y0 * Y0
-        XY0 = X0 * Y0
-        XXYY0 = XX0 * YY0
-        XX1 = X1 * X1
-        YY1 = Y1 * Y1
-        XY1 = X1 * Y1
-        XXYY1 = XX1 * YY1
-        Ones = np.ones(n_points)
-        ZX = cal_pt_cloud[:, 4]
-        ZY = cal_pt_cloud[:, 5]
-        M = np.array(
-            [X0, Y0, X1, Y1, XX0, YY0, XY0, XXYY0, XX1, YY1, XY1, XXYY1, Ones, ZX, ZY]
-        ).transpose()
-
-    elif n == 17:
-        X0 = cal_pt_cloud[:, 0]
-        Y0 = cal_pt_cloud[:, 1]
-        X1 = cal_pt_cloud[:, 2]
-        Y1 = cal_pt_cloud[:, 3]
-        XX0 = X0 * X0
-        YY0 = Y0 * Y0
-        XY0 = X0 * Y0
-        XXYY0 = XX0 * YY0
-        XX1 = X1 * X1
-        YY1 = Y1 * Y1
-        XY1 = X1 * Y1
-        XXYY1 = XX1 * YY1
-
-        X0X1 = X0 * X1
-        X0Y1 = X0 * Y1
-        Y0X1 = Y0 * X1
-        Y0Y1 = Y0 * Y1
-
-        Ones = np.ones(n_points)
-
-        ZX = cal_pt_cloud[:, 4]
-        ZY = cal_pt_cloud[:, 5]
-        M = np.array(
-            [
-                X0,
-                Y0,
-                X1,
-                Y1,
-                XX0,
-                YY0,
-                XY0,
-                XXYY0,
-                XX1,
-                YY1,
-                XY1,
-                XXYY1,
-                X0X1,
-                X0Y1,
-                Y0X1,
-                Y0Y1,
-                Ones,
-                ZX,
-                ZY,
-            ]
-        ).transpose()
 
-    else:
-        raise Exception("ERROR: Model n needs to be 3, 5, 7 or 9")
+def make_features(points, n):
+    """Evaluates the polynomial terms of the model with n coefficients.
+
+    `points` are (N, 2) pupil positions for monocular and (N, 4) pairs of pupil
+    positions for binocular models. Returns the (N, n) feature matrix, the last
+    column being the constant term.
+    """
+    return _feature_rows(points, n).T
+
+
+def _feature_rows(points, n):
+    # Terms are written to contiguous rows, which is considerably faster than
+    # filling the strided columns of an (N, n) array.
+    if n not in _MODEL_INPUT_SIZE:
+        raise Exception("ERROR: Model n needs to be 3, 5, 7, 9, 13 or 17")
+    points = np.asarray(points, dtype=np.float64).reshape(-1, _MODEL_INPUT_SIZE[n])
+    M = np.empty((n, points.shape[0]))
+    for row, term in enumerate(_polynomial_terms(n, *points.T)):
+        M[row] = term
+    M[-1] = 1.0
     return M
 
 
-def make_map_function(cx, cy, n):
-    if n == 3:
+def _polynomial_terms(n, *coords):
+    """Non-constant terms of the model with n coefficients, for scalar or array
+    coordinates X, Y or X0, Y0, X1, Y1.
+    """
+    terms = list(coords)
+    if n == 9:
+        #  X  Y  XX  YY  XY  XXYY  XXY  YYX
+        X, Y = coords
+        XX, YY = X * X, Y * Y
+        terms += [XX, YY, X * Y, XX * YY, XX * Y, YY * X]
+    elif n == 7:
+        #  X  Y  XX  YY  XY  XXYY
+        X, Y = coords
+        XX, YY = X * X, Y * Y
+        terms += [XX, YY, X * Y, XX * YY]
+    elif n in (13, 17):
+        #  X0  Y0  X1  Y1  XX0  YY0  XY0  XXYY0  XX1  YY1  XY1  XXYY1
+        X0, Y0, X1, Y1 = coords
+        XX0, YY0, XX1, YY1 = X0 * X0, Y0 * Y0, X1 * X1, Y1 * Y1
+        terms += [XX0, YY0, X0 * Y0, XX0 * YY0, XX1, YY1, X1 * Y1, XX1 * YY1]
+        if n == 17:
+            #  X0X1  X0Y1  Y0X1  Y0Y1
+            terms += [X0 * X1, X0 * Y1, Y0 * X1, Y0 * Y1]
+    return terms
+
+
+def make_batch_map_function(cx, cy, n):
+    """Returns a function that maps (N, 2) pupil positions, or (N, 4) pairs of pupil
+    positions for binocular models, to (N, 2) gaze positions.
+    """
+    if n not in _MODEL_INPUT_SIZE:
+        raise Exception("ERROR: unsopported number of coefficiants.")
+    coefficients = np.array((cx, cy), dtype=np.float64)
 
-        def fn(pt):
-            X, Y = pt
-            x2 = cx[0] * X + cx[1] * Y + cx[2]
-            y2 = cy[0] * X + cy[1] * Y + cy[2]
-            return x2, y2
+    def fn(points):
+        return (coefficients @ _feature_rows(points, n)).T
 
-    elif n == 5:
+    return fn
 
-        def fn(pt_0, pt_1):
-            #        X0        Y0        X1        Y1        Ones
-            X0, Y0 = pt_0
-            X1, Y1 = pt_1
-            x2 = cx[0] * X0 + cx[1] * Y0 + cx[2] * X1 + cx[3] * Y1 + cx[4]
-            y2 = cy[0] * X0 + cy[1] * Y0 + cy[2] * X1 + cy[3] * Y1 + cy[4]
-            return x2, y2
 
-    elif n == 7:
+def make_map_function(cx, cy, n):
+    """Returns a function that maps a single pupil position, or a pair of pupil
+    positions for binocular models, to a gaze position tuple.
 
-        def fn(pt):
-            X, Y = pt
-            x2 = (
-                cx[0] * X
-                + cx[1] * Y
-                + cx[2] * X * X
-                + cx[3] * Y * Y
-                + cx[4] * X * Y
-                + cx[5] * Y * Y * X * X
-                + cx[6]
-            )
-            y2 = (
-                cy[0] * X
-                + cy[1] * Y
-                + cy[2] * X * X
-                + cy[3] * Y * Y
-                + cy[4] * X * Y
-                + cy[5] * Y * Y * X * X
-                + cy[6]
-            )
-            return x2, y2
+    Evaluates the same terms as `make_batch_map_function()`, but on Python floats,
+    which is faster than numpy for single data.
+    """
+    if n not in _MODEL_INPUT_SIZE:
+        raise Exception("ERROR: unsopported number of coefficiants.")
+    cx = [float(c) for c in cx]
+    cy = [float(c) for c in cy]
+    cx_terms, cx_const = cx[:-1], cx[-1]
+    cy_terms, cy_const = cy[:-1], cy[-1]
 
-    elif n == 9:
+    if _MODEL_INPUT_SIZE[n] == 2:
 
         def fn(pt):
-            #          X         Y         XX         YY         XY         XXYY         XXY         YYX         Ones
-            X, Y = pt
-            x2 = (
-                cx[0] * X
-                + cx[1] * Y
-                + cx[2] * X * X
-                + cx[3] * Y * Y
-                + cx[4] * X * Y
-                + cx[5] * Y * Y * X * X
-                + cx[6] * Y * X * X
-                + cx[7] * Y * Y * X
-                + cx[8]
-            )
-            y2 = (
-                cy[0] * X
-                + cy[1] * Y
-                + cy[2] * X * X
-                + cy[3] * Y * Y
-                + cy[4] * X * Y
-                + cy[5] * Y * Y * X * X
-                + cy[6] * Y * X * X
-                + cy[7] * Y * Y * X
-                + cy[8]
-            )
+            terms = _polynomial_terms(n, *pt)
+            x2 = sum(map(operator.mul, cx_terms, terms), cx_const)
+            y2 = sum(map(operator.mul, cy_terms, terms), cy_const)
             return x2, y2
 
-    elif n == 13:
-
-        def fn(pt_0, pt_1):
-            #        X0        Y0        X1         Y1            XX0        YY0            XY0            XXYY0                XX1            YY1            XY1            XXYY1        Ones
-            X0, Y0 = pt_0
-            X1, Y1 = pt_1
-            x2 = (
-                cx[0] * X0
-                + cx[1] * Y0
-                + cx[2] * X1
-                + cx[3] * Y1
-                + cx[4] * X0 * X0
-                + cx[5] * Y0 * Y0
-                + cx[6] * X0 * Y0
-                + cx[7] * X0 * X0 * Y0 * Y0
-                + cx[8] * X1 * X1
-                + cx[9] * Y1 * Y1
-                + cx[10] * X1 * Y1
-                + cx[11] * X1 * X1 * Y1 * Y1
-                + cx[12]
-            )
-            y2 = (
-                cy[0] * X0
-                + cy[1] * Y0
-                + cy[2] * X1
-                + cy[3] * Y1
-                + cy[4] * X0 * X0
-                + cy[5] * Y0 * Y0
-                + cy[6] * X0 * Y0
-                + cy[7] * X0 * X0 * Y0 * Y0
-                + cy[8] * X1 * X1
-                + cy[9] * Y1 * Y1
-                + cy[10] * X1 * Y1
-                + cy[11] * X1 * X1 * Y1 * Y1
-                + cy[12]
-            )
-            return x2, y2
-
-    elif n == 17:
+    else:
 
         def fn(pt_0, pt_1):
-            #        X0        Y0        X1         Y1            XX0        YY0            XY0            XXYY0                XX1            YY1            XY1            XXYY1            X0X1            X0Y1            Y0X1        Y0Y1           Ones
-            X0, Y0 = pt_0
-            X1, Y1 = pt_1
-            x2 = (
-                cx[0] * X0
-                + cx[1] * Y0
-                + cx[2] * X1
-                + cx[3] * Y1
-                + cx[4] * X0 * X0
-                + cx[5] * Y0 * Y0
-                + cx[6] * X0 * Y0
-                + cx[7] * X0 * X0 * Y0 * Y0
-                + cx[8] * X1 * X1
-                + cx[9] * Y1 * Y1
-                + cx[10] * X1 * Y1
-                + cx[11] * X1 * X1 * Y1 * Y1
-                + cx[12] * X0 * X1
-                + cx[13] * X0 * Y1
-                + cx[14] * Y0 * X1
-                + cx[15] * Y0 * Y1
-                + cx[16]
-            )
-            y2 = (
-                cy[0] * X0
-                + cy[1] * Y0
-                + cy[2] * X1
-                + cy[3] * Y1
-                + cy[4] * X0 * X0
-                + cy[5] * Y0 * Y0
-                + cy[6] * X0 * Y0
-                + cy[7] * X0 * X0 * Y0 * Y0
-                + cy[8] * X1 * X1
-                + cy[9] * Y1 * Y1
-                + cy[10] * X1 * Y1
-                + cy[11] * X1 * X1 * Y1 * Y1
-                + cy[12] * X0 * X1
-                + cy[13] * X0 * Y1
-                + cy[14] * Y0 * X1
-                + cy[15] * Y0 * Y1
-                + cy[16]
-            )
+            terms = _polynomial_terms(n, *pt_0, *pt_1)
+            x2 = sum(map(operator.mul, cx_terms, terms), cx_const)
+            y2 = sum(map(operator.mul, cy_terms, terms), cy_const)
             return x2, y2
 
-    else:
-        raise Exception("ERROR: unsopported number of coefficiants.")
-
     return fn
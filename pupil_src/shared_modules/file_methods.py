@@ -15,6 +15,8 @@ import copy
 import logging
 import os
 import pickle
+import shutil
+import time
 import traceback as tb
 import types
 from glob import iglob
@@ -154,38 +156,523 @@ def load_pldata_file(directory, topic):
     return PLData(data, data_ts, topics)
 
 
+PLDATA_COLUMNS = collections.OrderedDict(
+    # name: (dtype, values per datum)
+    offset=(np.uint64, 1),
+    size=(np.uint32, 1),
+    timestamp=(np.float64, 1),
+    confidence=(np.float64, 1),
+    norm_pos=(np.float64, 2),
+    diameter=(np.float64, 1),
+    id=(np.int16, 1),
+)
+
+
+def _pldata_columns_dir(directory, topic):
+    return os.path.join(directory, topic + "_columns")
+
+
+# Fields of a datum that are stored in the column sidecar
+_PLDATA_DATUM_FIELDS = ("confidence", "norm_pos", "diameter", "id")
+
+
+def pldata_column_fields(datum):
+    """The fields of `datum` that are stored in the column sidecar.
+
+    Can be passed as `datum` to `PLData_Writer.append_serialized()` instead of the
+    complete datum, e.g. to avoid sending the full datum between processes.
+    """
+    return {key: datum[key] for key in _PLDATA_DATUM_FIELDS if key in datum}
+
+
+def _pldata_column_datum(datum_serialized, datum):
+    """Returns a mapping with the column fields of a serialized datum.
+
+    Uses `datum` if given, which can be the deserialized datum, the result of
+    `pldata_column_fields()` or a `Serialized_Dict`. The serialized datum is only
+    unpacked if neither is available.
+    """
+    if isinstance(datum, Serialized_Dict):
+        datum = datum._data  # only use already deserialized data
+    if datum is None:
+        datum = msgpack.unpackb(datum_serialized, raw=False, use_list=False)
+    return datum
+
+
+def _pldata_column_row(offset, size, timestamp, datum):
+    """Extract the fixed-size column values of a single datum.
+
+    Missing or malformed fields are stored as NaN (or -1 for `id`).
+    """
+    try:
+        confidence = float(datum["confidence"])
+    except (KeyError, TypeError, ValueError):
+        confidence = np.nan
+    try:
+        norm_pos = tuple(map(float, datum["norm_pos"]))
+        assert len(norm_pos) == 2
+    except (KeyError, TypeError, ValueError, AssertionError):
+        norm_pos = (np.nan, np.nan)
+    try:
+        diameter = float(datum["diameter"])
+    except (KeyError, TypeError, ValueError):
+        diameter = np.nan
+    try:
+        id_ = int(datum["id"])
+    except (KeyError, TypeError, ValueError):
+        id_ = -1
+    return offset, size, timestamp, confidence, norm_pos, diameter, id_
+
+
+class _PLData_Columns_Writer(object):
+    """Appends column rows to the raw per-column files of a sidecar directory"""
+
+    flush_size = 1024
+
+    def __init__(self, columns_dir):
+        os.makedirs(columns_dir, exist_ok=True)
+        self.file_handles = [
+            open(os.path.join(columns_dir, name + ".bin"), "wb")
+            for name in PLDATA_COLUMNS
+        ]
+        self.rows = []
+
+    def append(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        for fh, (dtype, _), values in zip(
+            self.file_handles, PLDATA_COLUMNS.values(), zip(*self.rows)
+        ):
+            np.asarray(values, dtype=dtype).tofile(fh)
+        self.rows = []
+
+    def sync(self):
+        """Flush all rows to disk"""
+        self.flush()
+        for fh in self.file_handles:
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    def close(self):
+        self.flush()
+        for fh in self.file_handles:
+            fh.close()
+        self.file_handles = []
+
+
+def _open_pldata_columns(columns_dir, expected_pldata_size):
+    """Memory-map all column files of a sidecar directory.
+
+    Returns None if the sidecar is missing, incomplete or does not match the
+    pldata file it was built for.
+    """
+    columns = {}
+    num_rows = None
+    for name, (dtype, width) in PLDATA_COLUMNS.items():
+        path = os.path.join(columns_dir, name + ".bin")
+        try:
+            file_size = os.path.getsize(path)
+        except OSError:
+            return None
+        row_size = np.dtype(dtype).itemsize * width
+        if file_size % row_size or num_rows not in (None, file_size // row_size):
+            return None
+        num_rows = file_size // row_size
+        shape = (num_rows, width) if width > 1 else (num_rows,)
+        if num_rows:
+            columns[name] = np.memmap(path, dtype=dtype, mode="r", shape=shape)
+        else:
+            columns[name] = np.empty(shape, dtype=dtype)
+
+    if num_rows:
+        pldata_size = int(columns["offset"][-1]) + int(columns["size"][-1])
+    else:
+        pldata_size = 0
+    if pldata_size != expected_pldata_size:
+        return None
+    return columns
+
+
+def _iter_pldata_pairs(fh):
+    """Yields (offset, end, payload) for all complete pairs of a pldata file.
+
+    Stops at an incomplete or corrupt tail, e.g. left over by a crash.
+    """
+    unpacker = msgpack.Unpacker(fh, raw=False, use_list=False)
+    offset = 0
+    while True:
+        try:
+            _, payload = unpacker.unpack()
+        except msgpack.OutOfData:
+            return
+        except ValueError:
+            logger.warning(f"Skipping corrupt data at the end of {fh.name}")
+            return
+        end = unpacker.tell()
+        yield offset, end, payload
+        offset = end
+
+
+def _build_pldata_columns(directory, topic):
+    """Build the column sidecar for a pldata file written without one.
+
+    Returns the size of the pldata file up to its last complete datum.
+    """
+    ts_file = os.path.join(directory, topic + "_timestamps.npy")
+    msgpack_file = os.path.join(directory, topic + ".pldata")
+    columns_dir = _pldata_columns_dir(directory, topic)
+    try:
+        known_ts = np.load(ts_file)
+    except (FileNotFoundError, ValueError):
+        known_ts = None
+
+    writer = _PLData_Columns_Writer(columns_dir)
+    end = 0
+    try:
+        with open(msgpack_file, "rb") as fh:
+            for idx, (offset, end, payload) in enumerate(_iter_pldata_pairs(fh)):
+                datum = msgpack.unpackb(payload, raw=False, use_list=False)
+                if known_ts is not None and idx < len(known_ts):
+                    timestamp = known_ts[idx]
+                else:
+                    timestamp = datum.get("timestamp", np.nan)
+                writer.append(
+                    _pldata_column_row(offset, end - offset, timestamp, datum)
+                )
+    finally:
+        writer.close()
+    return end
+
+
+def _save_timestamps_from_column(columns_dir, ts_file):
+    """Write the timestamp column as `.npy` file without loading it into memory"""
+    column_file = os.path.join(columns_dir, "timestamp.bin")
+    dtype = np.dtype(PLDATA_COLUMNS["timestamp"][0])
+    count = os.path.getsize(column_file) // dtype.itemsize
+    header = {
+        "descr": np.lib.format.dtype_to_descr(dtype),
+        "fortran_order": False,
+        "shape": (count,),
+    }
+    with open(ts_file, "wb") as out, open(column_file, "rb") as column:
+        np.lib.format.write_array_header_1_0(out, header)
+        shutil.copyfileobj(column, out)
+
+
+def recover_pldata_file(directory, topic):
+    """Restore the timestamp file of a pldata file that was not closed properly.
+
+    Incomplete data at the end of the pldata file is removed and the timestamps
+    are read from the data itself. Does nothing if the timestamp file exists.
+    Returns True if the file was recovered.
+    """
+    ts_file = os.path.join(directory, topic + "_timestamps.npy")
+    msgpack_file = os.path.join(directory, topic + ".pldata")
+    if os.path.exists(ts_file) or not os.path.exists(msgpack_file):
+        return False
+
+    logger.warning(f"Recovering timestamps of incomplete file {msgpack_file}")
+    complete_size = _build_pldata_columns(directory, topic)
+    if complete_size < os.path.getsize(msgpack_file):
+        os.truncate(msgpack_file, complete_size)
+    _save_timestamps_from_column(_pldata_columns_dir(directory, topic), ts_file)
+    return True
+
+
+def load_pldata_columns(directory, topic):
+    """Open `<topic>.pldata` as a lazily decoded `PLData_Columns` store.
+
+    The column sidecar is built on first access for recordings that do not have
+    one yet. Only use this for files that are not rewritten while being
+    accessed, e.g. the original recording data. Returns an empty store if the
+    pldata file does not exist.
+    """
+    msgpack_file = os.path.join(directory, topic + ".pldata")
+    columns_dir = _pldata_columns_dir(directory, topic)
+    try:
+        pldata_size = os.path.getsize(msgpack_file)
+    except OSError:
+        return PLData_Columns.empty()
+
+    columns = _open_pldata_columns(columns_dir, pldata_size)
+    if columns is None:
+        logger.debug(f"Building column index for {msgpack_file}")
+        try:
+            _build_pldata_columns(directory, topic)
+        except OSError:
+            logger.warning(f"Could not write column index for {msgpack_file}")
+            logger.debug(tb.format_exc())
+        columns = _open_pldata_columns(columns_dir, pldata_size)
+    if columns is None:
+        logger.warning(f"Falling back to loading {msgpack_file} into memory.")
+        pldata = load_pldata_file(directory, topic)
+        return PLData_Columns.from_pldata(pldata)
+    return PLData_Columns(msgpack_file, columns_dir, columns)
+
+
+class PLData_Columns(object):
+    """Read-only, columnar view onto a pldata file.
+
+    Fixed-size fields (see `PLDATA_COLUMNS`) are memory-mapped from a sidecar
+    directory next to the pldata file. Indexing with an integer decodes a single
+    datum into a `Serialized_Dict`; slicing returns a new view without decoding
+    or copying any data.
+
+    Column values are cached per view. The most recently decoded data are cached
+    and shared between all views onto the same file.
+    """
+
+    decoded_cache_size = 10000
+
+    def __init__(self, pldata_path, columns_dir, columns, rows=None, payloads=None):
+        self._pldata_path = pldata_path
+        self._columns_dir = columns_dir
+        self._columns = columns
+        self._payloads = payloads
+        self._pldata_buffer = None
+        self._decoded = collections.OrderedDict()
+        self._column_cache = {}
+        if rows is None:
+            rows = range(len(columns["offset"]))
+        self._rows = rows
+
+    @classmethod
+    def empty(cls):
+        columns = {
+            name: np.empty((0, width) if width > 1 else (0,), dtype=dtype)
+            for name, (dtype, width) in PLDATA_COLUMNS.items()
+        }
+        return cls(None, None, columns, payloads=[])
+
+    @classmethod
+    def from_pldata(cls, pldata):
+        """In-memory fallback for `PLData` loaded via `load_pldata_file`"""
+        rows = [
+            _pldata_column_row(0, 0, ts, datum)
+            for ts, datum in zip(pldata.timestamps, pldata.data)
+        ]
+        columns = {
+            name: np.asarray(values, dtype=dtype).reshape(-1, width)
+            if width > 1
+            else np.asarray(values, dtype=dtype)
+            for (name, (dtype, width)), values in zip(
+                PLDATA_COLUMNS.items(),
+                zip(*rows) if rows else [()] * len(PLDATA_COLUMNS),
+            )
+        }
+        return cls(None, None, columns, payloads=list(pldata.data))
+
+    def column(self, name):
+        """Values of a column for all data in this view, e.g. `confidence`
+
+        The returned array is read-only.
+        """
+        try:
+            return self._column_cache[name]
+        except KeyError:
+            pass
+        rows = self._rows
+        if isinstance(rows, range):
+            if rows.step == 1 or len(rows) == 0:
+                rows = slice(rows.start, rows.start + len(rows))
+            else:
+                rows = np.asarray(rows)
+        values = self._columns[name][rows]
+        values.flags.writeable = False
+        self._column_cache[name] = values
+        return values
+
+    @property
+    def timestamps(self):
+        return self.column("timestamp")
+
+    def topic(self, idx):
+        return self._unpack_pair(self._rows[idx])[0]
+
+    def _unpack_pair(self, row):
+        if self._payloads is not None:
+            datum = self._payloads[row]
+            return datum.get("topic", None), datum
+        try:
+            self._decoded.move_to_end(row)
+            return self._decoded[row]
+        except KeyError:
+            pass
+        if self._pldata_buffer is None:
+            self._pldata_buffer = np.memmap(self._pldata_path, dtype=np.uint8, mode="r")
+        start = int(self._columns["offset"][row])
+        stop = start + int(self._columns["size"][row])
+        topic, payload = msgpack.unpackb(
+            self._pldata_buffer[start:stop], raw=False, use_list=False
+        )
+        pair = topic, Serialized_Dict(msgpack_bytes=payload)
+        self._decoded[row] = pair
+        if len(self._decoded) > self.decoded_cache_size:
+            self._decoded.popitem(last=False)
+        return pair
+
+    def _view(self, rows):
+        view = PLData_Columns(
+            self._pldata_path,
+            self._columns_dir,
+            self._columns,
+            rows=rows,
+            payloads=self._payloads,
+        )
+        view._pldata_buffer = self._pldata_buffer
+        view._decoded = self._decoded
+        return view
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self._view(self._rows[key])
+        if isinstance(key, np.ndarray) and key.dtype != object:
+            if key.dtype == bool:
+                key = np.flatnonzero(key)
+            if isinstance(self._rows, range):
+                rows = self._rows.start + self._rows.step * key
+            else:
+                rows = self._rows[key]
+            return self._view(np.asarray(rows, dtype=np.int64))
+        return self._unpack_pair(self._rows[key])[1]
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        for row in self._rows:
+            yield self._unpack_pair(row)[1]
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __repr__(self):
+        return f"<{type(self).__name__} of {self._pldata_path} with {len(self)} data>"
+
+    def __getstate__(self):
+        if self._columns_dir is None:
+            # in-memory fallback: ship the selected data only
+            return {"data": list(self), "timestamps": self.timestamps}
+        return {
+            "pldata_path": self._pldata_path,
+            "columns_dir": self._columns_dir,
+            "rows": self._rows,
+        }
+
+    def __setstate__(self, state):
+        if "data" in state:
+            pldata = PLData(state["data"], state["timestamps"], [])
+            other = PLData_Columns.from_pldata(pldata)
+        else:
+            pldata_size = os.path.getsize(state["pldata_path"])
+            columns = _open_pldata_columns(state["columns_dir"], pldata_size)
+            other = PLData_Columns(
+                state["pldata_path"], state["columns_dir"], columns, state["rows"]
+            )
+        self.__dict__.update(other.__dict__)
+
+
 class PLData_Writer(object):
-    """docstring for PLData_Writer"""
+    """Writes `<name>.pldata` and its timestamp and column sidecars
+
+    Timestamps are written to disk in chunks with the column sidecar, such that
+    memory usage does not grow with the number of data. The `.npy` timestamp file
+    is written on close. Use `recover_pldata_file()` for files that were not
+    closed, e.g. due to a crash.
 
-    def __init__(self, directory, name):
+    fsync_interval: Seconds between flushing written data to disk, or None to
+        leave this to the operating system.
+    """
+
+    def __init__(self, directory, name, fsync_interval=None):
         super().__init__()
         self.directory = directory
         self.name = name
-        self.ts_queue = collections.deque()
+        self.fsync_interval = fsync_interval
+        self.num_data = 0
         file_name = name + ".pldata"
         self.file_handle = open(os.path.join(directory, file_name), "wb")
+        self.offset = 0
+        self.columns_dir = _pldata_columns_dir(directory, name)
+        self.columns_writer = _PLData_Columns_Writer(self.columns_dir)
+        self.last_sync = time.monotonic()
+
+    def __len__(self):
+        return self.num_data
 
     def append(self, datum):
         datum_serialized = msgpack.packb(datum, use_bin_type=True)
-        self.append_serialized(datum["timestamp"], datum["topic"], datum_serialized)
+        self._append_pair(datum["timestamp"], datum["topic"], datum_serialized, datum)
 
-    def append_serialized(self, timestamp, topic, datum_serialized):
-        self.ts_queue.append(timestamp)
-        pair = msgpack.packb((topic, datum_serialized), use_bin_type=True)
+    def append_serialized(self, timestamp, topic, datum_serialized, datum=None):
+        """Append an already serialized datum.
+
+        datum: Column fields of `datum_serialized` for the column sidecar. Either
+            the deserialized datum, the result of `pldata_column_fields()` or the
+            `Serialized_Dict` of `datum_serialized`. Pass it whenever available,
+            `datum_serialized` is deserialized otherwise.
+        """
+        self._append_pair(timestamp, topic, datum_serialized, datum)
+
+    def _append_pair(self, timestamp, topic, datum_serialized, datum):
+        pair = self._pack_pair(timestamp, topic, datum_serialized, datum)
         self.file_handle.write(pair)
+        self._sync_if_due()
+
+    def _pack_pair(self, timestamp, topic, datum_serialized, datum):
+        pair = msgpack.packb((topic, datum_serialized), use_bin_type=True)
+        datum = _pldata_column_datum(datum_serialized, datum)
+        self.columns_writer.append(
+            _pldata_column_row(self.offset, len(pair), timestamp, datum)
+        )
+        self.offset += len(pair)
+        self.num_data += 1
+        return pair
 
     def extend(self, data):
         for datum in data:
             self.append(datum)
 
+    def extend_serialized(self, data):
+        """Append already serialized data with a single write.
+
+        data: Iterable of `(timestamp, topic, datum_serialized, datum)` tuples,
+            see `append_serialized()`.
+        """
+        pairs = []
+        for timestamp, topic, datum_serialized, datum in data:
+            pairs.append(self._pack_pair(timestamp, topic, datum_serialized, datum))
+        self.file_handle.write(b"".join(pairs))
+        self._sync_if_due()
+
+    def _sync_if_due(self):
+        if self.fsync_interval is None:
+            return
+        if time.monotonic() - self.last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        """Flush all written data to disk"""
+        # pldata first, such that the columns never refer to missing data
+        self.file_handle.flush()
+        os.fsync(self.file_handle.fileno())
+        self.columns_writer.sync()
+        self.last_sync = time.monotonic()
+
     def close(self):
         self.file_handle.close()
         self.file_handle = None
+        self.columns_writer.close()
+        self.columns_writer = None
 
         ts_file = self.name + "_timestamps.npy"
         ts_path = os.path.join(self.directory, ts_file)
-        np.save(ts_path, self.ts_queue)
-        self.ts_queue = None
+        _save_timestamps_from_column(self.columns_dir, ts_path)
 
     def __enter__(self):
         return self
@@ -259,6 +746,8 @@ class Serialized_Dict(object):
     def packing_hook(self, obj):
         if isinstance(obj, self):
             return msgpack.ExtType(self.MSGPACK_EXT_CODE, obj.serialized)
+        if isinstance(obj, PLData_Columns):
+            return list(obj)
         raise TypeError("can't serialize {}({})".format(type(obj), repr(obj)))
 
     @classmethod
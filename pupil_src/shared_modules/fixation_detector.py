@@ -29,6 +29,7 @@ Terms
 import csv
 import enum
 import logging
+import multiprocessing as mp
 import os
 import typing as T
 from bisect import bisect_left, bisect_right
@@ -50,6 +51,7 @@ from observable import Observable
 import player_methods as pm
 from methods import denormalize
 from plugin import Analysis_Plugin_Base
+from tasklib.background.scheduler import PRIORITY_DEFAULT
 
 logger = logging.getLogger(__name__)
 
@@ -109,6 +111,9 @@ class Fixation_Result_Factory(object):
 
     def from_data(self, *args, **kwargs):
         datum = fixation_from_data(*args, **kwargs)
+        return self.from_fixation(datum)
+
+    def from_fixation(self, datum):
         self._set_fixation_id(datum)
         fixation_start = datum["timestamp"]
         fixation_stop = fixation_start + (datum["duration"] / 1000)
@@ -133,11 +138,12 @@ def vector_dispersion(vectors):
     return dispersion
 
 
-def gaze_dispersion(capture, gaze_subset, method: FixationDetectionMethod) -> float:
+def gaze_vectors(capture, gaze_data, method: FixationDetectionMethod) -> np.ndarray:
+    """Unproject gaze data into 3d direction vectors of shape (N, 3)"""
     if method is FixationDetectionMethod.GAZE_3D:
-        vectors = np.array([gp["gaze_point_3d"] for gp in gaze_subset])
+        vectors = np.array([gp["gaze_point_3d"] for gp in gaze_data])
     elif method is FixationDetectionMethod.GAZE_2D:
-        locations = np.array([gp["norm_pos"] for gp in gaze_subset])
+        locations = np.array([gp["norm_pos"] for gp in gaze_data])
 
         # denormalize
         width, height = capture.frame_size
@@ -148,103 +154,480 @@ def gaze_dispersion(capture, gaze_subset, method: FixationDetectionMethod) -> fl
         vectors = capture.intrinsics.unprojectPoints(locations)
     else:
         raise ValueError(f"Unknown method '{method}'")
+    return vectors
 
+
+def gaze_dispersion(capture, gaze_subset, method: FixationDetectionMethod) -> float:
+    vectors = gaze_vectors(capture, gaze_subset, method)
     dist = vector_dispersion(vectors)
     return dist
 
 
+class Dispersion_Window(object):
+    """Sliding window `[start, stop)` over pre-computed gaze vectors.
+
+    For every vector in the window we keep the minimal dot product with all unit
+    vectors that were appended after it. Appending costs O(window size), removing
+    the oldest vector is O(1) and the window dispersion is the arccos of the
+    smallest tracked dot product. Decisions close to the dispersion threshold fall
+    back to `vector_dispersion` such that results match it exactly.
+    """
+
+    threshold_tolerance = 1e-8
+
+    def __init__(self, vectors, max_dispersion):
+        self.vectors = vectors
+        self.unit_vectors = vectors / np.linalg.norm(vectors, axis=1)[:, np.newaxis]
+        self.max_dispersion = max_dispersion
+        self.min_dot = np.full(len(vectors), np.inf)
+        self.start = 0
+        self.stop = 0
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def append(self):
+        new_idx = self.stop
+        self.min_dot[new_idx] = np.inf
+        if new_idx > self.start:
+            window = self.min_dot[self.start : new_idx]
+            dots = self.unit_vectors[self.start : new_idx] @ self.unit_vectors[new_idx]
+            np.minimum(window, dots, out=window)
+        self.stop += 1
+
+    def popleft(self):
+        self.start += 1
+
+    def reset(self, start):
+        self.start = start
+        self.stop = start
+
+    def dispersion(self, length=None):
+        stop = self.stop if length is None else self.start + length
+        return vector_dispersion(self.vectors[self.start : stop])
+
+    def exceeds_max_dispersion(self):
+        min_dot = self.min_dot[self.start : self.stop].min()
+        return self._exceeds(min_dot, len(self))
+
+    def prefix_min_dots(self):
+        """Smallest dot product within each prefix of the window.
+
+        Entry `k` corresponds to the prefix of length `k + 1`.
+        """
+        unit_vectors = self.unit_vectors[self.start : self.stop]
+        dots = unit_vectors @ unit_vectors.T
+        dots[np.tril_indices(len(dots))] = np.inf
+        return np.minimum.accumulate(dots.min(axis=0))
+
+    def prefix_exceeds_max_dispersion(self, prefix_min_dots, length):
+        return self._exceeds(prefix_min_dots[length - 1], length)
+
+    def _exceeds(self, min_dot, length):
+        dispersion = np.arccos(np.clip(min_dot, -1.0, 1.0))
+        if abs(dispersion - self.max_dispersion) < self.threshold_tolerance:
+            dispersion = self.dispersion(length)
+        return dispersion > self.max_dispersion
+
+
 def can_use_3d_gaze_mapping(gaze_data) -> bool:
     return all("gaze_point_3d" in gp for gp in gaze_data)
 
 
-def detect_fixations(
-    capture, gaze_data, max_dispersion, min_duration, max_duration, min_data_confidence
-):
-    yield "Detecting fixations...", ()
+def _load_fixation_gaze_vectors(capture, gaze_data, min_data_confidence, method=None):
+    """Deserialize, filter, and unproject gaze data for fixation detection.
+
+    Returns None if no data passes the confidence threshold. Otherwise returns
+    (gaze data, indices of the kept data, timestamps, vectors, method). If no
+    `method` is given, 3d gaze is used if all data provides it.
+    """
     gaze_data = (
         fm.Serialized_Dict(msgpack_bytes=serialized) for serialized in gaze_data
     )
-    gaze_data = [
-        datum for datum in gaze_data if datum["confidence"] > min_data_confidence
+    # extract all required fields while each datum is deserialized
+    gaze_fields = [
+        (
+            idx,
+            datum,
+            datum["timestamp"],
+            datum["norm_pos"],
+            datum.get("gaze_point_3d", None),
+        )
+        for idx, datum in enumerate(gaze_data)
+        if datum["confidence"] > min_data_confidence
     ]
-    if not gaze_data:
+    if not gaze_fields:
+        return None
+    kept_idc, gaze_data, timestamps, locations, points_3d = zip(*gaze_fields)
+
+    if method is None:
+        method = (
+            FixationDetectionMethod.GAZE_3D
+            if all(point is not None for point in points_3d)
+            else FixationDetectionMethod.GAZE_2D
+        )
+
+    # unproject all gaze data once instead of for every window change
+    timestamps = np.array(timestamps)
+    if method is FixationDetectionMethod.GAZE_3D:
+        vectors = np.array(points_3d)
+    else:
+        location_data = [{"norm_pos": location} for location in locations]
+        vectors = gaze_vectors(capture, location_data, method)
+    return gaze_data, np.array(kept_idc), timestamps, vectors, method
+
+
+def detect_fixations(
+    capture, gaze_data, max_dispersion, min_duration, max_duration, min_data_confidence
+):
+    yield "Detecting fixations...", ()
+    gaze = _load_fixation_gaze_vectors(capture, gaze_data, min_data_confidence)
+    if gaze is None:
         logger.warning("No data available to find fixations")
         return "Fixation detection failed", ()
+    gaze_data, _, timestamps, vectors, method = gaze
 
-    method = (
-        FixationDetectionMethod.GAZE_3D
-        if can_use_3d_gaze_mapping(gaze_data)
-        else FixationDetectionMethod.GAZE_2D
-    )
     logger.info(f"Starting fixation detection using {method.value} data...")
     fixation_result = Fixation_Result_Factory()
 
-    working_queue = deque()
-    remaining_gaze = deque(gaze_data)
+    fixation_windows = detect_fixation_windows(
+        vectors, timestamps, max_dispersion, min_duration, max_duration
+    )
+    for start, stop, dispersion in fixation_windows:
+        fixation = fixation_result.from_data(
+            dispersion, method, gaze_data[start:stop], capture.timestamps
+        )
+        yield "Detecting fixations...", fixation
+
+    yield "Fixation detection complete", ()
+
+
+def detect_fixations_in_chunk(
+    capture,
+    gaze_data,
+    chunk_start,
+    is_last_chunk,
+    max_dispersion,
+    min_duration,
+    max_duration,
+    min_data_confidence,
+    method=None,
+):
+    """Detect fixations in a chunk of the gaze data, starting without prior state.
+
+    Yields ("method", method value or None) first, followed by
+    ("fixation", (start, stop, fixation)) for every fixation, where `start:stop`
+    is the base data range in indices of the complete gaze data. Fixations that
+    might have been cut short by the end of the chunk are not yielded.
+    """
+    gaze = _load_fixation_gaze_vectors(capture, gaze_data, min_data_confidence, method)
+    if gaze is None:
+        yield "method", None
+        return
+    gaze_data, kept_idc, timestamps, vectors, method = gaze
+    yield "method", method.value
+
+    fixation_windows = detect_fixation_windows(
+        vectors, timestamps, max_dispersion, min_duration, max_duration
+    )
+    for start, stop, dispersion in fixation_windows:
+        # The maximal fixation window is only known if data beyond it was seen.
+        if not is_last_chunk and timestamps[start] + max_duration >= timestamps[-1]:
+            break
+        fixation = fixation_from_data(
+            dispersion, method, gaze_data[start:stop], capture.timestamps
+        )
+        base_data_range = (
+            chunk_start + int(kept_idc[start]),
+            chunk_start + int(kept_idc[stop - 1]) + 1,
+        )
+        yield "fixation", (*base_data_range, fixation)
+
+
+class _Fixation_Chunk(object):
+    __slots__ = ("start", "stop", "is_last", "is_exact", "task", "method", "results")
+
+    def __init__(self, start, stop, is_last, is_exact):
+        self.start = start
+        self.stop = stop
+        self.is_last = is_last
+        # exact chunks start at a position where a serial run has no state
+        self.is_exact = is_exact
+        self.task = None
+        self.method = ...  # method reported by task, ... if not reported yet
+        self.results = []
+
+    @property
+    def completed(self):
+        return self.task is not None and self.task.completed
+
+
+class Chunked_Fixation_Detection_Proxy(object):
+    """Runs fixation detection on overlapping gaze chunks in parallel.
+
+    Each chunk is processed by its own background task, starting without any
+    detector state. The detector resets its state after every fixation, i.e. two
+    runs that emit the same fixation are identical afterwards. Consecutive chunks
+    are therefore stitched at the first fixation they have in common. If there is
+    none, the chunk is detected again starting after the last stitched fixation.
+    The result is identical to running `detect_fixations` on all data.
+
+    Provides the same interface as `background_helper.Task_Proxy`.
+    """
+
+    min_chunk_duration = 60.0  # seconds
+    sync_duration = 10.0  # seconds of chunk overlap in addition to max_duration
+
+    def __init__(
+        self,
+        name,
+        capture,
+        gaze_positions,
+        max_dispersion,
+        min_duration,
+        max_duration,
+        min_data_confidence,
+        worker_count=None,
+    ):
+        self.name = name
+        self.capture = capture
+        self.gaze_data = [gp.serialized for gp in gaze_positions]
+        self.detection_args = (
+            max_dispersion,
+            min_duration,
+            max_duration,
+            min_data_confidence,
+        )
+        self.worker_count = worker_count or max(1, mp.cpu_count() - 1)
+        self.method = None  # forced detection method, see `_on_method_reported()`
+
+        self.chunks = self._split_into_chunks(gaze_positions.timestamps, max_duration)
+        self.pending = deque(self.chunks)
+        self.running = []
+        self.next_chunk_idx = 0
+        self.stitched = None  # exact fixations that were not published yet
+        self.stitched_start = 0  # gaze index at which `stitched` detection started
+        self.fixation_result = Fixation_Result_Factory()
+
+        self._completed = False
+        self._canceled = False
+        if not self.chunks:
+            logger.warning("No data available to find fixations")
+            self._completed = True
+
+    def _split_into_chunks(self, timestamps, max_duration):
+        if not len(timestamps):
+            return []
+        duration = timestamps[-1] - timestamps[0]
+        chunk_count = int(min(self.worker_count, duration // self.min_chunk_duration))
+        chunk_count = max(chunk_count, 1)
+        boundary_ts = np.linspace(timestamps[0], timestamps[-1], chunk_count + 1)
+        starts = np.searchsorted(timestamps, boundary_ts[:-1])
+        starts[0] = 0
+        starts = np.unique(starts)
+
+        overlap = max_duration + self.sync_duration
+        chunks = []
+        for start, next_start in zip(starts, starts[1:]):
+            stop = np.searchsorted(
+                timestamps, timestamps[next_start] + overlap, "right"
+            )
+            chunks.append(
+                _Fixation_Chunk(
+                    start, stop, is_last=stop == len(timestamps), is_exact=False
+                )
+            )
+        chunks.append(_Fixation_Chunk(starts[-1], len(timestamps), True, False))
+        chunks[0].is_exact = True
+        return chunks
+
+    def _start_tasks(self):
+        while self.pending and len(self.running) < self.worker_count:
+            chunk = self.pending.popleft()
+            chunk.method = ...
+            chunk.results = []
+            chunk.task = bh.Pooled_Task_Proxy(
+                f"{self.name} [{chunk.start}, {chunk.stop})",
+                detect_fixations_in_chunk,
+                args=(
+                    self.capture,
+                    self.gaze_data[chunk.start : chunk.stop],
+                    int(chunk.start),
+                    chunk.is_last,
+                    *self.detection_args,
+                    self.method,
+                ),
+                priority=PRIORITY_DEFAULT,
+            )
+            self.running.append(chunk)
+
+    def _restart(self, chunk):
+        if chunk.task is not None:
+            chunk.task.cancel()
+            chunk.task = None
+        if chunk in self.running:
+            self.running.remove(chunk)
+        if chunk not in self.pending:
+            self.pending.appendleft(chunk)
+
+    def _on_method_reported(self, chunk, method_value):
+        chunk.method = method_value
+        if method_value != FixationDetectionMethod.GAZE_2D.value:
+            if self.method is FixationDetectionMethod.GAZE_2D and method_value:
+                self._restart(chunk)
+            return
+        if self.method is None:
+            # 3d gaze can only be used if it is available in all chunks
+            self.method = FixationDetectionMethod.GAZE_2D
+            for other in self.chunks:
+                if other.task is not None and other.method in (
+                    ...,
+                    FixationDetectionMethod.GAZE_3D.value,
+                ):
+                    self._restart(other)
+
+    def fetch(self):
+        """Fetches progress and stitched fixations from background tasks"""
+        if self.completed or self.canceled:
+            return
+
+        self._start_tasks()
+        for chunk in self.running[:]:
+            if chunk.task is None:
+                continue
+            for kind, value in chunk.task.fetch():
+                if kind == "method":
+                    self._on_method_reported(chunk, value)
+                    if chunk.task is None:
+                        break  # restarted
+                else:
+                    chunk.results.append(value)
+            if chunk.task is not None and chunk.task.canceled:
+                self._canceled = True
+                return
+            if chunk.completed:
+                self.running.remove(chunk)
+
+        yield from self._stitch()
+        if self.next_chunk_idx == len(self.chunks):
+            yield from self._publish(self.stitched)
+            if all(chunk.method is None for chunk in self.chunks):
+                logger.warning("No data available to find fixations")
+            self._completed = True
+            yield "Fixation detection complete", ()
+        else:
+            yield "Detecting fixations...", ()
+
+    def _stitch(self):
+        if self.method is None and any(c.method is ... for c in self.chunks):
+            return  # detection method might still change
+        while self.next_chunk_idx < len(self.chunks):
+            chunk = self.chunks[self.next_chunk_idx]
+            if not chunk.completed:
+                return
+            if self.stitched is None or chunk.is_exact:
+                if self.stitched is not None:
+                    yield from self._publish(self.stitched)
+                self.stitched = chunk.results
+                self.stitched_start = chunk.start
+                self.next_chunk_idx += 1
+                continue
+
+            stitched_idc = {res[:2]: idx for idx, res in enumerate(self.stitched)}
+            for chunk_idx, result in enumerate(chunk.results):
+                stitched_idx = stitched_idc.get(result[:2])
+                if stitched_idx is not None:
+                    yield from self._publish(self.stitched[:stitched_idx])
+                    self.stitched = chunk.results[chunk_idx:]
+                    self.next_chunk_idx += 1
+                    break
+            else:
+                # no common fixation, detect again after last stitched fixation
+                yield from self._publish(self.stitched)
+                restart = self.stitched[-1][1] if self.stitched else self.stitched_start
+                exact_chunk = _Fixation_Chunk(restart, chunk.stop, chunk.is_last, True)
+                self.chunks[self.next_chunk_idx] = exact_chunk
+                self.pending.appendleft(exact_chunk)
+                self.stitched = []
+                return
+
+    def _publish(self, stitched_results):
+        for _, _, fixation in stitched_results:
+            yield "Detecting fixations...", self.fixation_result.from_fixation(fixation)
 
-    while remaining_gaze:
-        # check if working_queue contains enough data
+    def cancel(self, timeout=1):
+        for chunk in self.running:
+            chunk.task.cancel(timeout)
+        self.running = []
+        self.pending.clear()
+        if not self.completed:
+            self._canceled = True
+
+    @property
+    def completed(self):
+        return self._completed
+
+    @property
+    def canceled(self):
+        return self._canceled
+
+
+def detect_fixation_windows(
+    vectors, timestamps, max_dispersion, min_duration, max_duration
+):
+    """Dispersion-duration (I-DT) fixation detection on pre-computed gaze vectors.
+
+    Yields (start, stop, dispersion) for every detected fixation, where
+    `start:stop` is the slice of the base data. The dispersion is updated
+    incrementally while the window changes instead of being recomputed from
+    scratch.
+    """
+    window = Dispersion_Window(vectors, max_dispersion)
+    total = len(timestamps)
+
+    while window.stop < total:
+        # check if window contains enough data
         if (
-            len(working_queue) < 2
-            or (working_queue[-1]["timestamp"] - working_queue[0]["timestamp"])
-            < min_duration
+            len(window) < 2
+            or (timestamps[window.stop - 1] - timestamps[window.start]) < min_duration
         ):
-            datum = remaining_gaze.popleft()
-            working_queue.append(datum)
+            window.append()
             continue
 
         # min duration reached, check for fixation
-        dispersion = gaze_dispersion(capture, working_queue, method)
-        if dispersion > max_dispersion:
+        if window.exceeds_max_dispersion():
             # not a fixation, move forward
-            working_queue.popleft()
+            window.popleft()
             continue
 
-        left_idx = len(working_queue)
+        left_idx = len(window)
 
         # minimal fixation found. collect maximal data
         # to perform binary search for fixation end
-        while remaining_gaze:
-            datum = remaining_gaze[0]
-            if datum["timestamp"] > working_queue[0]["timestamp"] + max_duration:
-                break  # maximum data found
-            working_queue.append(remaining_gaze.popleft())
+        max_stop_ts = timestamps[window.start] + max_duration
+        while window.stop < total and timestamps[window.stop] <= max_stop_ts:
+            window.append()
 
         # check for fixation with maximum duration
-        dispersion = gaze_dispersion(capture, working_queue, method)
-        if dispersion <= max_dispersion:
-            fixation = fixation_result.from_data(
-                dispersion, method, working_queue, capture.timestamps
-            )
-            yield "Detecting fixations...", fixation
-            working_queue.clear()  # discard old Q
+        if not window.exceeds_max_dispersion():
+            yield window.start, window.stop, window.dispersion()
+            window.reset(window.stop)
             continue
 
-        slicable = list(working_queue)  # deque does not support slicing
-        right_idx = len(working_queue)
+        right_idx = len(window)
+        prefix_min_dots = window.prefix_min_dots()
 
         # binary search
         while left_idx < right_idx - 1:
             middle_idx = (left_idx + right_idx) // 2
-            dispersion = gaze_dispersion(capture, slicable[: middle_idx + 1], method,)
-            if dispersion <= max_dispersion:
-                left_idx = middle_idx
-            else:
+            if window.prefix_exceeds_max_dispersion(prefix_min_dots, middle_idx + 1):
                 right_idx = middle_idx
+            else:
+                left_idx = middle_idx
 
         # left_idx-1 is last valid base datum
-        final_base_data = slicable[:left_idx]
-        to_be_placed_back = slicable[left_idx:]
-        dispersion_result = gaze_dispersion(capture, final_base_data, method)
-
-        fixation = fixation_result.from_data(
-            dispersion_result, method, final_base_data, capture.timestamps
-        )
-        yield "Detecting fixations...", fixation
-        working_queue.clear()  # clear queue
-        remaining_gaze.extendleft(reversed(to_be_placed_back))
-
-    yield "Fixation detection complete", ()
+        yield window.start, window.start + left_idx, window.dispersion(left_idx)
+        window.reset(window.start + left_idx)
 
 
 class Offline_Fixation_Detector(Observable, Fixation_Detector_Base):
@@ -457,28 +840,24 @@ class Offline_Fixation_Detector(Observable, Fixation_Detector_Base):
         if self.bg_task:
             self.bg_task.cancel()
 
-        gaze_data = [gp.serialized for gp in self.g_pool.gaze_positions]
-
         cap = SimpleNamespace()
         cap.frame_size = self.g_pool.capture.frame_size
         cap.intrinsics = self.g_pool.capture.intrinsics
         cap.timestamps = self.g_pool.capture.timestamps
-        generator_args = (
+
+        self.fixation_data = deque()
+        self.fixation_start_ts = deque()
+        self.fixation_stop_ts = deque()
+        self.bg_task = Chunked_Fixation_Detection_Proxy(
+            "Fixation detection",
             cap,
-            gaze_data,
+            self.g_pool.gaze_positions,
             np.deg2rad(self.max_dispersion),
             self.min_duration / 1000,
             self.max_duration / 1000,
             self.g_pool.min_data_confidence,
         )
 
-        self.fixation_data = deque()
-        self.fixation_start_ts = deque()
-        self.fixation_stop_ts = deque()
-        self.bg_task = bh.IPC_Logging_Task_Proxy(
-            "Fixation detection", detect_fixations, args=generator_args
-        )
-
     def recent_events(self, events):
         if self.bg_task:
             for progress, fixation_result in self.bg_task.fetch():
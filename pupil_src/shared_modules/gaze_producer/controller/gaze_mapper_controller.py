@@ -9,7 +9,6 @@ See COPYING and COPYING.LESSER for license details.
 ---------------------------------------------------------------------------~(*)
 """
 import logging
-from itertools import chain
 
 import player_methods
 import tasklib
@@ -81,29 +80,109 @@ class GazeMapperController(Observable):
         gaze_mapper.gaze_ts = []
         gaze_mapper.accuracy_result = ""
         gaze_mapper.precision_result = ""
+        self._gaze_mapper_storage.delete_uncorrected_gaze(gaze_mapper)
 
     def _create_mapping_task(self, gaze_mapper, calibration):
         task = worker.map_gaze.create_task(gaze_mapper, calibration)
+        manual_correction = (
+            gaze_mapper.manual_correction_x,
+            gaze_mapper.manual_correction_y,
+        )
+        uncorrected_norm_pos = []
+        norm_pos_offsets = []
 
         def on_yield_gaze(mapped_gaze_ts_and_data):
             gaze_mapper.status = "Mapping {:.0f}% complete".format(task.progress * 100)
-            for timestamp, gaze_datum in mapped_gaze_ts_and_data:
+            num_gaze = len(gaze_mapper.gaze)
+            column_fields = []
+            for (
+                timestamp,
+                gaze_datum,
+                fields,
+                norm_pos,
+                offset,
+            ) in mapped_gaze_ts_and_data:
                 gaze_mapper.gaze.append(gaze_datum)
                 gaze_mapper.gaze_ts.append(timestamp)
+                column_fields.append(fields)
+                uncorrected_norm_pos.append(norm_pos)
+                norm_pos_offsets.append(offset)
+            self._gaze_mapper_storage.stream_gaze(
+                gaze_mapper,
+                gaze_mapper.gaze_ts[num_gaze:],
+                gaze_mapper.gaze[num_gaze:],
+                column_fields,
+            )
 
         def on_completed_mapping(_):
             gaze_mapper.status = "Successfully completed mapping"
+            self._gaze_mapper_storage.end_gaze_stream(gaze_mapper)
+            if all(offset >= 0 for offset in norm_pos_offsets):
+                self._gaze_mapper_storage.save_uncorrected_gaze(
+                    gaze_mapper,
+                    self._gaze_mapper_storage.uncorrected_gaze_key(
+                        gaze_mapper, calibration
+                    ),
+                    uncorrected_norm_pos,
+                    norm_pos_offsets,
+                )
+            # the correction might have been changed while mapping
+            if manual_correction != (
+                gaze_mapper.manual_correction_x,
+                gaze_mapper.manual_correction_y,
+            ):
+                self._apply_cached_manual_correction(gaze_mapper)
             self.publish_all_enabled_mappers()
             self.validate_gaze_mapper(gaze_mapper)
             self._gaze_mapper_storage.save_to_disk()
             self.on_gaze_mapping_calculated(gaze_mapper)
             logger.info("Complete gaze mapping for '{}'".format(gaze_mapper.name))
 
+        def on_ended_mapping():
+            # closes the mapping file if the task was canceled or raised an exception
+            self._gaze_mapper_storage.end_gaze_stream(gaze_mapper)
+
+        self._gaze_mapper_storage.begin_gaze_stream(gaze_mapper)
         task.add_observer("on_yield", on_yield_gaze)
         task.add_observer("on_completed", on_completed_mapping)
+        task.add_observer("on_ended", on_ended_mapping)
         task.add_observer("on_exception", tasklib.raise_exception)
         return task
 
+    def apply_manual_correction(self, gaze_mapper):
+        """Applies the current manual correction to already mapped gaze.
+
+        This only shifts the cached uncorrected gaze and does not map again. If
+        there is no cached gaze for the current calibration and mapping range, the
+        correction will be applied with the next calculation.
+        """
+        if not gaze_mapper.calculate_complete:
+            return
+        if self._apply_cached_manual_correction(gaze_mapper):
+            self.publish_all_enabled_mappers()
+        else:
+            gaze_mapper.status = "Recalculate to apply the manual correction"
+
+    def _apply_cached_manual_correction(self, gaze_mapper):
+        calibration = self.get_valid_calibration_or_none(gaze_mapper)
+        if calibration is None or calibration.result is None:
+            return False
+        key = self._gaze_mapper_storage.uncorrected_gaze_key(gaze_mapper, calibration)
+        uncorrected_gaze = self._gaze_mapper_storage.load_uncorrected_gaze(
+            gaze_mapper, key
+        )
+        if uncorrected_gaze is None:
+            return False
+        norm_pos, norm_pos_offsets = uncorrected_gaze
+        gaze_mapper.gaze = worker.map_gaze.apply_manual_correction_to_serialized(
+            gaze_mapper.gaze,
+            norm_pos,
+            norm_pos_offsets,
+            gaze_mapper.manual_correction_x,
+            gaze_mapper.manual_correction_y,
+        )
+        return True
+
     def publish_all_enabled_mappers(self):
         """
         Publish gaze data to e.g. render it in Player or to trigger other plugins
@@ -113,25 +192,12 @@ class GazeMapperController(Observable):
         self._publish_gaze_bisector(gaze_bisector)
 
     def _create_gaze_bisector_from_all_enabled_mappers(self):
-        gaze_data = list(
-            chain.from_iterable(
-                (
-                    mapper.gaze
-                    for mapper in self._gaze_mapper_storage
-                    if mapper.activate_gaze
-                )
-            )
-        )
-        gaze_ts = list(
-            chain.from_iterable(
-                (
-                    mapper.gaze_ts
-                    for mapper in self._gaze_mapper_storage
-                    if mapper.activate_gaze
-                )
-            )
+        # the gaze of each mapper is sorted by timestamp already
+        return player_methods.Bisector.from_sorted_streams(
+            (mapper.gaze, mapper.gaze_ts)
+            for mapper in self._gaze_mapper_storage
+            if mapper.activate_gaze
         )
-        return player_methods.Bisector(gaze_data, gaze_ts)
 
     def on_gaze_mapping_calculated(self, gaze_mapper):
         pass
@@ -24,8 +24,8 @@ class GazeFromRecording(GazeProducerBase):
         self._gaze_changed_announcer.announce_existing()
 
     def _load_gaze_data(self):
-        gaze = fm.load_pldata_file(self.g_pool.rec_dir, "gaze")
-        return pm.Bisector(gaze.data, gaze.timestamps)
+        gaze = fm.load_pldata_columns(self.g_pool.rec_dir, "gaze")
+        return pm.Bisector(gaze, gaze.timestamps)
 
     def init_ui(self):
         super().init_ui()
@@ -44,11 +44,57 @@ class GazeMapper(StorageItem):
         self.status = status
         self.accuracy_result = accuracy_result
         self.precision_result = precision_result
-        self.gaze = gaze
-        self.gaze_ts = gaze_ts
+        self._gaze = gaze
+        self._gaze_ts = gaze_ts
+        self._load_gaze = None
+        self._num_unloaded_gaze = 0
+        # incremented whenever gaze or gaze_ts are replaced
+        self.gaze_version = 0
+
+    @property
+    def gaze(self):
+        self._load_gaze_if_needed()
+        return self._gaze
+
+    @gaze.setter
+    def gaze(self, gaze):
+        self._load_gaze = None
+        self._gaze = gaze
+        self.gaze_version += 1
+
+    @property
+    def gaze_ts(self):
+        self._load_gaze_if_needed()
+        return self._gaze_ts
+
+    @gaze_ts.setter
+    def gaze_ts(self, gaze_ts):
+        self._load_gaze = None
+        self._gaze_ts = gaze_ts
+        self.gaze_version += 1
+
+    @property
+    def gaze_loaded(self):
+        return self._load_gaze is None
+
+    def set_gaze_loader(self, load_gaze, num_gaze):
+        """Defers loading gaze and gaze_ts until they are accessed.
+
+        load_gaze: Callable that returns (gaze, gaze_ts)
+        num_gaze: Number of gaze data that load_gaze will return
+        """
+        self._load_gaze = load_gaze
+        self._num_unloaded_gaze = num_gaze
+
+    def _load_gaze_if_needed(self):
+        if self._load_gaze is not None:
+            load_gaze, self._load_gaze = self._load_gaze, None
+            self._gaze, self._gaze_ts = load_gaze()
 
     @property
     def calculate_complete(self):
+        if not self.gaze_loaded:
+            return self._num_unloaded_gaze > 0
         # we cannot just use `self.gaze and self.gaze_ts` because this ands the arrays
         return len(self.gaze) > 0 and len(self.gaze_ts) > 0
 
@@ -9,8 +9,16 @@ See COPYING and COPYING.LESSER for license details.
 ---------------------------------------------------------------------------~(*)
 """
 
+import collections
+import functools
+import hashlib
 import logging
 import os
+import shutil
+import struct
+
+import msgpack
+import numpy as np
 
 import file_methods as fm
 import make_unique
@@ -21,13 +29,28 @@ from observable import Observable
 
 logger = logging.getLogger(__name__)
 
+# State of the gaze in a mapping file, see GazeMapperStorage._is_gaze_saved()
+_SavedGaze = collections.namedtuple("_SavedGaze", ["gaze_version", "num", "digest"])
+
 
 class GazeMapperStorage(SingleFileStorage, Observable):
+    """Stores gaze mappers and writes their mapped gaze to pldata files.
+
+    Mapping files are only written if the gaze of a mapper changed since it was
+    loaded or written, which is decided by the gaze version of the mapper and a
+    content hash. Gaze that is being mapped can be streamed to its mapping file
+    while results arrive, see begin_gaze_stream(). Gaze of mappers that are not
+    activated is loaded when it is accessed for the first time.
+    """
+
     def __init__(self, calibration_storage, rec_dir, plugin, get_recording_index_range):
         super().__init__(rec_dir, plugin)
         self._calibration_storage = calibration_storage
         self._get_recording_index_range = get_recording_index_range
         self._gaze_mappers = []
+        self._uncorrected_gaze_by_id = {}
+        self._saved_gaze_by_id = {}
+        self._gaze_streams_by_id = {}
         self._load_from_disk()
         if not self._gaze_mappers:
             self._add_default_gaze_mapper()
@@ -76,14 +99,20 @@ class GazeMapperStorage(SingleFileStorage, Observable):
         self._delete_mapping_file(gaze_mapper)
 
     def _delete_mapping_file(self, gaze_mapper):
+        self.end_gaze_stream(gaze_mapper)
+        self._saved_gaze_by_id.pop(gaze_mapper.unique_id, None)
         mapping_file_path = self._gaze_mapping_file_path(gaze_mapper)
         try:
             os.remove(mapping_file_path + ".pldata")
             os.remove(mapping_file_path + "_timestamps.npy")
         except FileNotFoundError:
             pass
+        shutil.rmtree(mapping_file_path + "_columns", ignore_errors=True)
+        self.delete_uncorrected_gaze(gaze_mapper)
 
     def rename(self, gaze_mapper, new_name):
+        # remaining results are written on the next save
+        self.end_gaze_stream(gaze_mapper)
         old_mapping_file_path = self._gaze_mapping_file_path(gaze_mapper)
         gaze_mapper.name = new_name
         new_mapping_file_path = self._gaze_mapping_file_path(gaze_mapper)
@@ -100,6 +129,13 @@ class GazeMapperStorage(SingleFileStorage, Observable):
             )
         except FileNotFoundError:
             pass
+        for suffix in ("_uncorrected.npz", "_columns"):
+            try:
+                os.rename(
+                    old_mapping_file_path + suffix, new_mapping_file_path + suffix
+                )
+            except FileNotFoundError:
+                pass
 
     def save_to_disk(self):
         # this will save everything except gaze and gaze_ts
@@ -108,15 +144,93 @@ class GazeMapperStorage(SingleFileStorage, Observable):
         self._save_gaze_and_ts_to_disk()
 
     def _save_gaze_and_ts_to_disk(self):
+        for gaze_mapper in self._gaze_mappers:
+            self.end_gaze_stream(gaze_mapper)
+            if self._is_gaze_saved(gaze_mapper):
+                continue
+            digest = _GazeDigest()
+            digest.update(gaze_mapper.gaze_ts, gaze_mapper.gaze)
+            saved = self._saved_gaze_by_id.get(gaze_mapper.unique_id)
+            if saved is None or saved.digest != digest.hexdigest():
+                self._write_mapping_file(gaze_mapper)
+            self._set_gaze_saved(gaze_mapper, digest.hexdigest())
+
+    def _write_mapping_file(self, gaze_mapper):
         directory = self._gaze_mappings_directory
         os.makedirs(directory, exist_ok=True)
-        for gaze_mapper in self._gaze_mappers:
-            file_name = self._gaze_mapping_file_name(gaze_mapper)
-            with fm.PLData_Writer(directory, file_name) as writer:
-                for gaze_ts, gaze in zip(gaze_mapper.gaze_ts, gaze_mapper.gaze):
-                    writer.append_serialized(
-                        gaze_ts, topic="gaze", datum_serialized=gaze.serialized
-                    )
+        file_name = self._gaze_mapping_file_name(gaze_mapper)
+        with fm.PLData_Writer(directory, file_name) as writer:
+            for gaze_ts, gaze in zip(gaze_mapper.gaze_ts, gaze_mapper.gaze):
+                writer.append_serialized(
+                    gaze_ts, topic="gaze", datum_serialized=gaze.serialized, datum=gaze
+                )
+
+    def _is_gaze_saved(self, gaze_mapper):
+        """True if the mapping file contains the current gaze of the mapper"""
+        if not gaze_mapper.gaze_loaded:
+            return True  # unchanged since it is still on disk
+        saved = self._saved_gaze_by_id.get(gaze_mapper.unique_id)
+        return (
+            saved is not None
+            and saved.gaze_version == gaze_mapper.gaze_version
+            and saved.num == len(gaze_mapper.gaze)
+            and saved.num == len(gaze_mapper.gaze_ts)
+        )
+
+    def _set_gaze_saved(self, gaze_mapper, digest):
+        self._saved_gaze_by_id[gaze_mapper.unique_id] = _SavedGaze(
+            gaze_mapper.gaze_version, len(gaze_mapper.gaze), digest
+        )
+
+    def begin_gaze_stream(self, gaze_mapper):
+        """Writes gaze to the mapping file while it is being mapped.
+
+        Reset the gaze of the mapper before, then pass new results to
+        stream_gaze() in addition to appending them to the gaze of the mapper.
+        """
+        self.end_gaze_stream(gaze_mapper)
+        directory = self._gaze_mappings_directory
+        os.makedirs(directory, exist_ok=True)
+        writer = fm.PLData_Writer(directory, self._gaze_mapping_file_name(gaze_mapper))
+        self._saved_gaze_by_id.pop(gaze_mapper.unique_id, None)
+        self._gaze_streams_by_id[gaze_mapper.unique_id] = (
+            writer,
+            _GazeDigest(),
+            gaze_mapper.gaze_version,
+        )
+
+    def stream_gaze(self, gaze_mapper, gaze_ts, gaze, column_fields=None):
+        """column_fields: `fm.pldata_column_fields()` of the gaze, if available"""
+        try:
+            writer, digest, _ = self._gaze_streams_by_id[gaze_mapper.unique_id]
+        except KeyError:
+            return
+        if column_fields is None:
+            column_fields = gaze
+        for timestamp, gaze_datum, fields in zip(gaze_ts, gaze, column_fields):
+            writer.append_serialized(
+                timestamp,
+                topic="gaze",
+                datum_serialized=gaze_datum.serialized,
+                datum=fields,
+            )
+        digest.update(gaze_ts, gaze)
+
+    def end_gaze_stream(self, gaze_mapper):
+        """Closes the mapping file of a gaze stream, if there is one"""
+        try:
+            writer, digest, gaze_version = self._gaze_streams_by_id.pop(
+                gaze_mapper.unique_id
+            )
+        except KeyError:
+            return
+        writer.close()
+        if (
+            gaze_version == gaze_mapper.gaze_version
+            and len(writer) == len(gaze_mapper.gaze)
+            and len(writer) == len(gaze_mapper.gaze_ts)
+        ):
+            self._set_gaze_saved(gaze_mapper, digest.hexdigest())
 
     def _load_from_disk(self):
         # this will load everything except gaze and gaze_ts
@@ -125,12 +239,88 @@ class GazeMapperStorage(SingleFileStorage, Observable):
         self._load_gaze_and_ts_from_disk()
 
     def _load_gaze_and_ts_from_disk(self):
-        directory = self._gaze_mappings_directory
         for gaze_mapper in self._gaze_mappers:
-            file_name = self._gaze_mapping_file_name(gaze_mapper)
-            pldata = fm.load_pldata_file(directory, file_name)
-            gaze_mapper.gaze = pldata.data
-            gaze_mapper.gaze_ts = pldata.timestamps
+            ts_file = self._gaze_mapping_file_path(gaze_mapper) + "_timestamps.npy"
+            try:
+                num_gaze = len(np.load(ts_file, mmap_mode="r"))
+            except (FileNotFoundError, ValueError):
+                num_gaze = 0
+            gaze_mapper.set_gaze_loader(
+                functools.partial(self._load_gaze, gaze_mapper), num_gaze
+            )
+            if gaze_mapper.activate_gaze:
+                gaze_mapper.gaze  # load now, inactive mappers are loaded on access
+
+    def _load_gaze(self, gaze_mapper):
+        directory = self._gaze_mappings_directory
+        file_name = self._gaze_mapping_file_name(gaze_mapper)
+        pldata = fm.load_pldata_file(directory, file_name)
+        digest = _GazeDigest()
+        digest.update(pldata.timestamps, pldata.data)
+        self._saved_gaze_by_id[gaze_mapper.unique_id] = _SavedGaze(
+            gaze_mapper.gaze_version, len(pldata.data), digest.hexdigest()
+        )
+        return pldata.data, pldata.timestamps
+
+    @staticmethod
+    def uncorrected_gaze_key(gaze_mapper, calibration):
+        """Identifies the inputs that the uncorrected gaze was mapped from"""
+        key_data = (
+            calibration.unique_id,
+            calibration.result,
+            gaze_mapper.mapping_index_range,
+        )
+        # tuples and lists are packed identically, such that the key is stable
+        # for calibrations that were loaded from disk
+        packed = msgpack.packb(key_data, use_bin_type=True, default=_array_to_list)
+        return hashlib.sha1(packed).hexdigest()
+
+    def save_uncorrected_gaze(self, gaze_mapper, key, norm_pos, norm_pos_offsets):
+        """Stores norm_pos of mapped gaze before applying the manual correction.
+
+        `norm_pos_offsets` are the byte offsets of norm_pos within the serialized
+        gaze datums, such that changes of the correction can be applied in place.
+        """
+        uncorrected_gaze = (
+            key,
+            np.asarray(norm_pos, dtype=np.float64).reshape(-1, 2),
+            np.asarray(norm_pos_offsets, dtype=np.int64),
+        )
+        self._uncorrected_gaze_by_id[gaze_mapper.unique_id] = uncorrected_gaze
+        os.makedirs(self._gaze_mappings_directory, exist_ok=True)
+        np.savez(
+            self._uncorrected_gaze_file_path(gaze_mapper),
+            key=key,
+            norm_pos=uncorrected_gaze[1],
+            norm_pos_offsets=uncorrected_gaze[2],
+        )
+
+    def load_uncorrected_gaze(self, gaze_mapper, key):
+        """Returns (norm_pos, norm_pos_offsets) or None if nothing is stored for key"""
+        uncorrected_gaze = self._uncorrected_gaze_by_id.get(gaze_mapper.unique_id)
+        if uncorrected_gaze is None:
+            try:
+                with np.load(self._uncorrected_gaze_file_path(gaze_mapper)) as npz:
+                    uncorrected_gaze = (
+                        str(npz["key"]),
+                        npz["norm_pos"],
+                        npz["norm_pos_offsets"],
+                    )
+            except (FileNotFoundError, KeyError, ValueError):
+                return None
+            self._uncorrected_gaze_by_id[gaze_mapper.unique_id] = uncorrected_gaze
+
+        stored_key, norm_pos, norm_pos_offsets = uncorrected_gaze
+        if stored_key != key or len(norm_pos) != len(gaze_mapper.gaze):
+            return None
+        return norm_pos, norm_pos_offsets
+
+    def delete_uncorrected_gaze(self, gaze_mapper):
+        self._uncorrected_gaze_by_id.pop(gaze_mapper.unique_id, None)
+        try:
+            os.remove(self._uncorrected_gaze_file_path(gaze_mapper))
+        except FileNotFoundError:
+            pass
 
     @property
     def _storage_file_name(self):
@@ -160,3 +350,31 @@ class GazeMapperStorage(SingleFileStorage, Observable):
         return os.path.join(
             self._gaze_mappings_directory, self._gaze_mapping_file_name(gaze_mapper)
         )
+
+    def _uncorrected_gaze_file_path(self, gaze_mapper):
+        return self._gaze_mapping_file_path(gaze_mapper) + "_uncorrected.npz"
+
+
+_DIGEST_HEADER = struct.Struct("<dI")
+
+
+class _GazeDigest:
+    """Content hash of gaze timestamps and serialized gaze data"""
+
+    def __init__(self):
+        self._hash = hashlib.blake2b(digest_size=16)
+
+    def update(self, gaze_ts, gaze):
+        for timestamp, gaze_datum in zip(gaze_ts, gaze):
+            serialized = gaze_datum.serialized
+            self._hash.update(_DIGEST_HEADER.pack(timestamp, len(serialized)))
+            self._hash.update(serialized)
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+
+def _array_to_list(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError("can't serialize {}({})".format(type(obj), repr(obj)))
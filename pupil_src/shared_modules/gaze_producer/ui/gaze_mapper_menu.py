@@ -130,6 +130,7 @@ class GazeMapperMenu(plugin_ui.StorageEditMenu):
             step=0.01,
             max=0.5,
             label="Manual Correction " + axis.upper(),
+            setter=lambda value: self._on_manual_correction_changed(axis, value),
         )
 
     def _create_validation_submenu(self, gaze_mapper):
@@ -210,6 +211,10 @@ class GazeMapperMenu(plugin_ui.StorageEditMenu):
         self.current_item.validation_outlier_threshold_deg = new_threshold
         self._gaze_mapper_controller.validate_gaze_mapper(self.current_item)
 
+    def _on_manual_correction_changed(self, axis, new_value):
+        setattr(self.current_item, "manual_correction_" + axis, new_value)
+        self._gaze_mapper_controller.apply_manual_correction(self.current_item)
+
     def _on_activate_gaze_changed(self, new_value):
         self.current_item.activate_gaze = new_value
         self._gaze_mapper_controller.publish_all_enabled_mappers()
@@ -14,6 +14,7 @@ from types import SimpleNamespace
 
 import player_methods as pm
 import tasklib.background
+from tasklib.background.scheduler import PRIORITY_DEFAULT
 from calibration_routines.finish_calibration import (
     select_method_and_perform_calibration,
 )
@@ -50,7 +51,9 @@ def create_task(calibration, all_reference_locations):
 
     args = (fake_gpool, ref_dicts_in_calib_range, pupil_pos_in_calib_range)
     name = "Create calibration {}".format(calibration.name)
-    return tasklib.background.create(name, _create_calibration, args=args)
+    return tasklib.background.create(
+        name, _create_calibration, args=args, priority=PRIORITY_DEFAULT
+    )
 
 
 def _create_ref_dict(ref):
@@ -10,10 +10,15 @@ See COPYING and COPYING.LESSER for license details.
 """
 from time import time
 
+import msgpack
+import numpy as np
+
 import file_methods as fm
 import player_methods as pm
 import tasklib
+from tasklib.background.scheduler import PRIORITY_DEFAULT
 from calibration_routines import gaze_mapping_plugins
+from calibration_routines.gaze_mappers import pupil_data_array
 from types import SimpleNamespace
 
 g_pool = None  # set by the plugin
@@ -44,6 +49,7 @@ def create_task(gaze_mapper, calibration):
         _map_gaze,
         args=args,
         pass_shared_memory=True,
+        priority=PRIORITY_DEFAULT,
     )
 
 
@@ -74,17 +80,26 @@ def _map_gaze(
     ]
     gaze_mapper = gaze_mapper_cls(fake_gpool, **calibration_result.mapper_args)
 
+    if gaze_mapper.supports_batch_mapping:
+        yield from _map_gaze_batch(
+            gaze_mapper,
+            pupil_pos_in_mapping_range,
+            manual_correction_x,
+            manual_correction_y,
+            shared_memory,
+        )
+        return
+
     for idx_incoming, pupil_pos in enumerate(pupil_pos_in_mapping_range):
         mapped_gaze = gaze_mapper.on_pupil_datum(pupil_pos)
 
         output_gaze = []
         for gaze_datum in mapped_gaze:
+            uncorrected_norm_pos = tuple(gaze_datum["norm_pos"])
             _apply_manual_correction(
                 gaze_datum, manual_correction_x, manual_correction_y
             )
-            output_gaze.append(
-                (gaze_datum["timestamp"], fm.Serialized_Dict(gaze_datum))
-            )
+            output_gaze.append(_output_gaze_datum(gaze_datum, uncorrected_norm_pos))
 
         shared_memory.progress = (idx_incoming + 1) / len(pupil_pos_in_mapping_range)
 
@@ -92,6 +107,127 @@ def _map_gaze(
             yield output_gaze
 
 
+def _map_gaze_batch(
+    gaze_mapper,
+    pupil_pos_in_mapping_range,
+    manual_correction_x,
+    manual_correction_y,
+    shared_memory,
+    chunk_size=10000,
+):
+    """Maps all pupil data at once and yields the resulting gaze in chunks"""
+    pupil_data = pupil_data_array(
+        pupil_pos_in_mapping_range, gaze_mapper.requires_3d_pupil_data
+    )
+    gaze_data = gaze_mapper.map_batch_array(pupil_data)
+    uncorrected_norm_pos = gaze_data["norm_pos"].copy()
+    gaze_data["norm_pos"] += (manual_correction_x, manual_correction_y)
+
+    for start in range(0, len(gaze_data), chunk_size):
+        gaze_chunk = gaze_data[start : start + chunk_size]
+        output_gaze = [
+            _output_gaze_datum(gaze_datum, uncorrected)
+            for gaze_datum, uncorrected in zip(
+                gaze_mapper.gaze_data_from_array(
+                    gaze_chunk, pupil_data, pupil_pos_in_mapping_range
+                ),
+                uncorrected_norm_pos[start : start + chunk_size].tolist(),
+            )
+        ]
+        last_mapped_idx = gaze_chunk["base_idc"].max()
+        shared_memory.progress = (last_mapped_idx + 1) / len(pupil_data)
+        yield output_gaze
+
+
+def _output_gaze_datum(gaze_datum, uncorrected_norm_pos):
+    """Serializes a mapped gaze datum for the task output.
+
+    Returns (timestamp, serialized datum, column fields, uncorrected norm_pos,
+    norm_pos offset). The column fields allow writing the serialized datum without
+    deserializing it again, see `fm.pldata_column_fields()`. The last two allow
+    changing the manual correction later on without mapping again, see
+    `apply_manual_correction_to_serialized()`.
+    """
+    gaze_serialized = fm.Serialized_Dict(gaze_datum)
+    return (
+        gaze_datum["timestamp"],
+        gaze_serialized,
+        fm.pldata_column_fields(gaze_datum),
+        uncorrected_norm_pos,
+        _norm_pos_offset(gaze_serialized.serialized),
+    )
+
+
+# msgpack encoding of a norm_pos value: fixarray of two float64
+_NORM_POS_ARRAY_HEADER = 0x92
+_FLOAT64_HEADER = 0xCB
+_FLOAT64_SIZE = 8
+
+
+def _norm_pos_offset(gaze_msgpack_bytes):
+    """Byte offset of the top-level norm_pos value in a serialized gaze datum.
+
+    Returns -1 if the datum has no norm_pos that is encoded as two float64 values.
+    """
+    unpacker = msgpack.Unpacker(raw=False)
+    unpacker.feed(gaze_msgpack_bytes)
+    for _ in range(unpacker.read_map_header()):
+        if unpacker.unpack() != "norm_pos":
+            unpacker.skip()
+            continue
+        offset = unpacker.tell()
+        encoded = gaze_msgpack_bytes[offset : offset + 2 * _FLOAT64_SIZE + 3]
+        if (
+            len(encoded) == 2 * _FLOAT64_SIZE + 3
+            and encoded[0] == _NORM_POS_ARRAY_HEADER
+            and encoded[1] == _FLOAT64_HEADER
+            and encoded[2 + _FLOAT64_SIZE] == _FLOAT64_HEADER
+        ):
+            return offset
+        break
+    return -1
+
+
+def apply_manual_correction_to_serialized(
+    gaze,
+    uncorrected_norm_pos,
+    norm_pos_offsets,
+    manual_correction_x,
+    manual_correction_y,
+):
+    """Applies a manual correction to serialized gaze without mapping again.
+
+    The corrected norm_pos values are written directly into the msgpack bytes of
+    the gaze datums, at the offsets returned by `_norm_pos_offset()`.
+
+    Returns a list of new Serialized_Dict gaze datums.
+    """
+    serialized = [gaze_datum.serialized for gaze_datum in gaze]
+    sizes = np.fromiter(map(len, serialized), dtype=np.int64, count=len(serialized))
+    ends = np.cumsum(sizes)
+    starts = ends - sizes
+    buffer = np.frombuffer(b"".join(serialized), dtype=np.uint8).copy()
+
+    corrected_norm_pos = np.asarray(uncorrected_norm_pos) + (
+        manual_correction_x,
+        manual_correction_y,
+    )
+    # msgpack stores floats as big-endian
+    corrected_bytes = corrected_norm_pos.astype(">f8").view(np.uint8)
+    corrected_bytes = corrected_bytes.reshape(-1, 2, _FLOAT64_SIZE)
+    value_idc = np.arange(_FLOAT64_SIZE)
+    x_starts = starts + np.asarray(norm_pos_offsets) + 2
+    y_starts = x_starts + _FLOAT64_SIZE + 1
+    buffer[x_starts[:, np.newaxis] + value_idc] = corrected_bytes[:, 0]
+    buffer[y_starts[:, np.newaxis] + value_idc] = corrected_bytes[:, 1]
+
+    buffer = buffer.tobytes()
+    return [
+        fm.Serialized_Dict(msgpack_bytes=buffer[start:end])
+        for start, end in zip(starts.tolist(), ends.tolist())
+    ]
+
+
 def _apply_manual_correction(gaze_datum, manual_correction_x, manual_correction_y):
     # ["norm_pos"] is a tuple by default
     gaze_norm_pos = list(gaze_datum["norm_pos"])
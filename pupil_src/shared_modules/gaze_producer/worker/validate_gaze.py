@@ -9,6 +9,7 @@ See COPYING and COPYING.LESSER for license details.
 ---------------------------------------------------------------------------~(*)
 """
 import tasklib
+from tasklib.background.scheduler import PRIORITY_DEFAULT
 from accuracy_visualizer import Accuracy_Visualizer
 from methods import normalize
 
@@ -29,6 +30,7 @@ def create_bg_task(gaze_mapper, reference_location_storage):
             file_source.intrinsics,
             file_source.frame_size,
         ),
+        priority=PRIORITY_DEFAULT,
     )
 
 
@@ -73,7 +73,7 @@ class OnlineController:
         if self._general_settings.optimize_markers_3d_model:
             self._optimization_storage.all_key_markers += pick_key_markers.run(
                 self._detection_storage.current_markers,
-                self._optimization_storage.all_key_markers,
+                self._optimization_storage.key_marker_bins,
             )
 
     def _calculate_markers_3d_model(self):
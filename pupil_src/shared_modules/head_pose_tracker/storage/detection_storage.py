@@ -76,7 +76,10 @@ class OfflineDetectionStorage(Observable, OfflineMarkerLocation):
                 self.markers_bisector.timestamps, self.markers_bisector.data
             ):
                 writer.append_serialized(
-                    timestamp=marker_ts, topic="", datum_serialized=marker.serialized
+                    timestamp=marker_ts,
+                    topic="",
+                    datum_serialized=marker.serialized,
+                    datum=marker,
                 )
         self._save_frame_index_to_num_markers()
 
@@ -92,7 +92,7 @@ class OfflineLocalizationStorage(Observable, OfflineCameraLocalization):
                 self.pose_bisector.timestamps, self.pose_bisector.data
             ):
                 writer.append_serialized(
-                    pose_ts, topic="pose", datum_serialized=pose.serialized
+                    pose_ts, topic="pose", datum_serialized=pose.serialized, datum=pose
                 )
 
     def load_pldata_from_disk(self):
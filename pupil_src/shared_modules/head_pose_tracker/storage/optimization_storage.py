@@ -16,7 +16,7 @@ import re
 import numpy as np
 
 import file_methods as fm
-from head_pose_tracker.function import utils
+from head_pose_tracker.function import pick_key_markers, utils
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +36,7 @@ class Markers3DModel:
 
         self.frame_id_to_extrinsics = {}
         self.all_key_markers = []
+        self.key_marker_bins = pick_key_markers.KeyMarkerBins()
 
     def load_model(self, marker_id_to_extrinsics):
         self.origin_marker_id = utils.find_origin_marker_id(marker_id_to_extrinsics)
@@ -107,6 +108,7 @@ class Markers3DModel:
             for marker in self.all_key_markers
             if marker.frame_id not in frame_ids_failed
         ]
+        self.key_marker_bins = pick_key_markers.KeyMarkerBins(self.all_key_markers)
 
     @property
     def calculated(self):
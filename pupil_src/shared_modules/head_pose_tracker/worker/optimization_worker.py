@@ -95,10 +95,11 @@ def offline_optimization(
     bundle_adjustment = BundleAdjustment(camera_intrinsics, optimize_camera_intrinsics)
 
     all_key_markers = []
+    key_marker_bins = pick_key_markers.KeyMarkerBins()
     for idx, frame_index in enumerate(frame_indices_valid):
         markers_in_frame = find_markers_in_frame(frame_index)
         all_key_markers += pick_key_markers.run(
-            markers_in_frame, all_key_markers, select_key_markers_interval=1
+            markers_in_frame, key_marker_bins, select_key_markers_interval=1
         )
 
     all_key_markers = sorted(
@@ -72,6 +72,48 @@ def nearest_intersection(line0, line1):
         return None, None  # parallel lines
 
 
+def nearest_intersections(lines0, lines1):
+    """ Vectorized `nearest_intersection` for arrays of lines.
+
+    Each line is given as pair of (N, 3) point arrays. Returns the (N, 3) nearest
+    intersection points and the (N,) shortest distances of the line pairs.
+    """
+
+    p1, p2 = (np.asarray(p, dtype=np.float64) for p in lines0)
+    p3, p4 = (np.asarray(p, dtype=np.float64) for p in lines1)
+
+    def dot(a, b):
+        return np.einsum("ij,ij->i", a, b)
+
+    def normalise(p1, p2):
+        p = p2 - p1
+        m = np.sqrt(dot(p, p))[:, np.newaxis]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(m == 0, 0.0, p / m)
+
+    d1 = normalise(p1, p2)
+    d2 = normalise(p3, p4)
+
+    diff = p1 - p3
+    a01 = -dot(d1, d2)
+    b0 = dot(diff, d1)
+    b1 = -dot(diff, d2)
+
+    # Lines are parallel if not np.abs(a01) < 1.0: select any pair of closest points.
+    not_parallel = np.abs(a01) < 1.0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        det = 1.0 - a01 * a01
+        s0 = np.where(not_parallel, (a01 * b1 - b0) / det, -b0)
+        s1 = np.where(not_parallel, (a01 * b0 - b1) / det, 0.0)
+
+    closest_points0 = p1 + s0[:, np.newaxis] * d1
+    closest_points1 = p3 + s1[:, np.newaxis] * d2
+    distance = closest_points1 - closest_points0
+    distance = np.sqrt(dot(distance, distance))
+    intersections = closest_points1 + (closest_points0 - closest_points1) * 0.5
+    return intersections, distance
+
+
 def nearest_linepoint_to_point(ref_point, line):
 
     p1 = line[0]
@@ -8,11 +8,20 @@ Lesser General Public License (LGPL v3.0).
 See COPYING and COPYING.LESSER for license details.
 ---------------------------------------------------------------------------~(*)
 """
+import bisect
+import collections
+import collections.abc
+import heapq
+import itertools
 import logging
+import math
+import operator
 
 import cv2
 import numpy as np
 
+import file_methods as fm
+
 logger = logging.getLogger(__name__)
 
 
@@ -43,6 +52,17 @@ class Bisector(object):
             self.data = []
             self.data_ts = np.asarray([])
             self.sorted_idc = []
+        elif isinstance(data, fm.PLData_Columns):
+            # Keep the lazy columnar store instead of materializing every datum.
+            # Timestamps are copied once into a contiguous array for fast lookups.
+            self.data_ts = np.array(data_ts, dtype=np.float64)
+            if np.all(self.data_ts[:-1] <= self.data_ts[1:]):
+                self.sorted_idc = slice(None)
+                self.data = data
+            else:
+                self.sorted_idc = np.argsort(self.data_ts, kind="stable")
+                self.data_ts = self.data_ts[self.sorted_idc]
+                self.data = data[self.sorted_idc]
         else:
             self.data_ts = np.asarray(data_ts)
             self.data = np.asarray(data, dtype=object)
@@ -52,6 +72,41 @@ class Bisector(object):
             self.data_ts = self.data_ts[self.sorted_idc]
             self.data = self.data[self.sorted_idc].tolist()
 
+    @classmethod
+    def from_sorted_streams(cls, streams):
+        """Merges multiple (data, data_ts) streams, each sorted by timestamp.
+
+        The timestamps are merged with a stable sort, which merges the sorted runs
+        in linear time per stream. Data of multiple streams is not copied, but looked
+        up in the original sequences, which must not be modified afterwards except
+        for appending. Unsorted streams are supported, but take longer to merge.
+        """
+        streams = [(data, data_ts) for data, data_ts in streams if len(data)]
+        for data, data_ts in streams:
+            if len(data) != len(data_ts):
+                raise ValueError(
+                    "Each element in `data` requires a corresponding timestamp"
+                )
+        bisector = cls()
+        if not streams:
+            return bisector
+
+        data_ts = np.concatenate(
+            [np.asarray(data_ts, dtype=np.float64) for _, data_ts in streams]
+        )
+        if len(streams) == 1 and np.all(data_ts[:-1] <= data_ts[1:]):
+            bisector.sorted_idc = slice(None)
+            bisector.data_ts = data_ts
+            bisector.data = list(streams[0][0])
+            return bisector
+
+        bisector.sorted_idc = np.argsort(data_ts, kind="stable")
+        bisector.data_ts = data_ts[bisector.sorted_idc]
+        bisector.data = _Merged_Sequence(
+            [data for data, _ in streams], bisector.sorted_idc
+        )
+        return bisector
+
     def by_ts(self, ts):
         """
         :param ts: timestamp to extract.
@@ -93,6 +148,20 @@ class Bisector(object):
     def timestamps(self):
         return self.data_ts
 
+    def column(self, key, idc=slice(None)):
+        """Field values for data at `idc` as array.
+
+        Reads directly from the columnar store if possible instead of accessing
+        every datum.
+        """
+        if isinstance(self.data, fm.PLData_Columns) and key in fm.PLDATA_COLUMNS:
+            return np.asarray(self.data.column(key)[idc])
+        if isinstance(idc, slice):
+            data = self.data[idc]
+        else:
+            data = (self.data[idx] for idx in idc)
+        return np.asarray([datum[key] for datum in data])
+
     def init_dict_for_window(self, ts_window):
         start_idx, stop_idx = self._start_stop_idc_for_window(ts_window)
         return {
@@ -101,34 +170,294 @@ class Bisector(object):
         }
 
 
-class Mutable_Bisector(Bisector):
-    def insert(self, timestamp, datum):
-        insert_idx = np.searchsorted(self.data_ts, timestamp)
-        self.data_ts = np.insert(self.data_ts, insert_idx, timestamp)
-        self.data.insert(insert_idx, datum)
+class _Merged_Sequence(object):
+    """Read-only sequence of items of multiple sequences in the given order.
 
+    `merged_idc` index into the concatenation of all sequences. Items are looked up
+    in their original sequence on access instead of being copied.
+    """
 
-class Affiliator(Bisector):
-    """docstring for ClassName"""
+    def __init__(self, sequences, merged_idc):
+        # deques are slow to index
+        self._sequences = [
+            list(seq) if isinstance(seq, collections.deque) else seq
+            for seq in sequences
+        ]
+        self._offsets = np.cumsum([0] + [len(seq) for seq in self._sequences])
+        self._merged_idc = np.asarray(merged_idc, dtype=np.int64)
 
-    def __init__(self, data=(), start_ts=(), stop_ts=()):
-        super().__init__(data, start_ts)
-        self.stop_ts = np.asarray(stop_ts)
-        self.stop_ts = self.stop_ts[self.sorted_idc]
+    def __len__(self):
+        return len(self._merged_idc)
 
-    def _start_stop_idc_for_window(self, ts_window):
-        start_idx = np.searchsorted(self.stop_ts, ts_window[0])
-        stop_idx = np.searchsorted(self.data_ts, ts_window[1])
-        return start_idx, stop_idx
+    def __bool__(self):
+        return len(self._merged_idc) > 0
+
+    def __iter__(self):
+        chunk_size = 10000
+        for start in range(0, len(self._merged_idc), chunk_size):
+            yield from self._items(self._merged_idc[start : start + chunk_size])
+
+    def __getitem__(self, key):
+        if isinstance(key, slice) or np.ndim(key) > 0:
+            return self._items(self._merged_idc[key])
+        idx = int(self._merged_idc[key])
+        seq_idx = int(np.searchsorted(self._offsets, idx, side="right")) - 1
+        return self._sequences[seq_idx][idx - int(self._offsets[seq_idx])]
+
+    def _items(self, idc):
+        seq_idc = np.searchsorted(self._offsets, idc, side="right") - 1
+        positions = idc - self._offsets[seq_idc]
+        sequences = self._sequences
+        return [
+            sequences[seq_idx][pos]
+            for seq_idx, pos in zip(seq_idc.tolist(), positions.tolist())
+        ]
+
+
+class _Sorted_Chunks(object):
+    """Items sorted by their first element, stored in chunks of limited size.
+
+    Inserts only move the items of a single chunk instead of all items.
+    """
+
+    def __init__(self, sorted_items, chunk_size):
+        self._chunk_size = chunk_size
+        self._items = [
+            sorted_items[idx : idx + chunk_size]
+            for idx in range(0, len(sorted_items), chunk_size)
+        ]
+        self._keys = [[item[0] for item in chunk] for chunk in self._items]
+        self._first_keys = [keys[0] for keys in self._keys]
+        self._len = len(sorted_items)
+        self._offsets = None
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self._items)
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += self._len
+        if not 0 <= idx < self._len:
+            raise IndexError("index out of range")
+        if self._offsets is None:
+            self._offsets = [0]
+            self._offsets.extend(itertools.accumulate(map(len, self._items)))
+        chunk_idx = bisect.bisect_right(self._offsets, idx) - 1
+        return self._items[chunk_idx][idx - self._offsets[chunk_idx]]
+
+    def keys(self):
+        return itertools.chain.from_iterable(self._keys)
+
+    def insert(self, item):
+        """Inserts item after all items with the same key"""
+        key = item[0]
+        self._len += 1
+        self._offsets = None
+        if not self._items:
+            self._items.append([item])
+            self._keys.append([key])
+            self._first_keys.append(key)
+            return
+        chunk_idx = max(bisect.bisect_right(self._first_keys, key) - 1, 0)
+        items = self._items[chunk_idx]
+        keys = self._keys[chunk_idx]
+        idx = bisect.bisect_right(keys, key)
+        items.insert(idx, item)
+        keys.insert(idx, key)
+        self._first_keys[chunk_idx] = keys[0]
+        if len(items) > 2 * self._chunk_size:
+            half = len(items) // 2
+            self._items[chunk_idx : chunk_idx + 1] = items[:half], items[half:]
+            self._keys[chunk_idx : chunk_idx + 1] = keys[:half], keys[half:]
+            self._first_keys.insert(chunk_idx + 1, keys[half])
+
+    def irange(self, min_key, max_key):
+        """Yields items with `min_key <= key < max_key` in order"""
+        # the chunk before the first one starting at `min_key` might end with it
+        chunk_idx = max(bisect.bisect_left(self._first_keys, min_key) - 1, 0)
+        for items, keys in zip(self._items[chunk_idx:], self._keys[chunk_idx:]):
+            if keys[0] >= max_key:
+                break
+            start_idx = bisect.bisect_left(keys, min_key)
+            stop_idx = bisect.bisect_left(keys, max_key)
+            yield from itertools.islice(items, start_idx, stop_idx)
+
+
+class Timeline_Index(object):
+    """Stores data with [start, stop] time intervals, sorted by start timestamp.
+
+    Point events have identical start and stop timestamps. Window queries return all
+    data that overlaps the window, i.e. that starts before the window ends and stops
+    at or after the window start, regardless of how long the intervals are.
+
+    Data is stored in chunked sorted lists, such that inserts are fast. For window
+    queries, data is additionally grouped by duration in powers of two. This bounds
+    how far before the window each group needs to be searched.
+    """
+
+    chunk_size = 1024
+
+    def __init__(self, data=(), start_ts=(), stop_ts=None):
+        if stop_ts is None:
+            stop_ts = start_ts
+        if not len(data) == len(start_ts) == len(stop_ts):
+            raise ValueError(
+                "Each element in `data` requires a corresponding start and stop"
+                " timestamp"
+            )
+        start_ts = np.asarray(start_ts, dtype=np.float64)
+        stop_ts = np.asarray(stop_ts, dtype=np.float64)
+        sorted_idc = np.argsort(start_ts, kind="stable")
+        data = list(data)
+        # items are (start_ts, stop_ts, insertion sequence number, datum)
+        items = list(
+            zip(
+                start_ts[sorted_idc].tolist(),
+                stop_ts[sorted_idc].tolist(),
+                range(len(data)),
+                (data[idx] for idx in sorted_idc.tolist()),
+            )
+        )
+        self._next_seq = len(items)
+        self._all = _Sorted_Chunks(items, self.chunk_size)
+
+        items_by_duration_group = collections.defaultdict(list)
+        for item in items:
+            items_by_duration_group[self._duration_group(item)].append(item)
+        self._by_duration_group = {
+            group: _Sorted_Chunks(group_items, self.chunk_size)
+            for group, group_items in items_by_duration_group.items()
+        }
+        self._reset_cache()
+
+    @staticmethod
+    def _duration_group(item):
+        """Exponent e such that the duration is smaller than 2**e, None for points"""
+        duration = item[1] - item[0]
+        if duration > 0.0:
+            return math.frexp(duration)[1]
+        return None
+
+    def _reset_cache(self):
+        self._data = None
+        self._start_ts = None
+        self._stop_ts = None
+
+    def insert(self, start_ts, datum, stop_ts=None):
+        """Inserts datum after all data with the same start timestamp"""
+        if stop_ts is None:
+            stop_ts = start_ts
+        item = (float(start_ts), float(stop_ts), self._next_seq, datum)
+        self._next_seq += 1
+        self._all.insert(item)
+        group = self._duration_group(item)
+        if group not in self._by_duration_group:
+            self._by_duration_group[group] = _Sorted_Chunks([], self.chunk_size)
+        self._by_duration_group[group].insert(item)
+        self._reset_cache()
+
+    def _overlapping(self, ts_window):
+        """Yields (start_ts, stop_ts, seq, datum) for all data overlapping `ts_window`"""
+        window_start, window_stop = ts_window
+        overlapping_by_group = []
+        for group, items in self._by_duration_group.items():
+            max_duration = 0.0 if group is None else math.ldexp(1.0, group)
+            overlapping_by_group.append(
+                item
+                for item in items.irange(window_start - max_duration, window_stop)
+                if item[1] >= window_start
+            )
+        return heapq.merge(*overlapping_by_group, key=operator.itemgetter(0, 2))
+
+    def by_ts(self, ts):
+        """
+        :param ts: start timestamp to extract.
+        :return: datum that is matching
+        :raises: ValueError if no matching datum is found
+        """
+        for item in self._all.irange(ts, np.inf):
+            if item[0] == ts:
+                return item[3]
+            break
+        raise ValueError
+
+    def by_ts_window(self, ts_window):
+        return [item[3] for item in self._overlapping(ts_window)]
 
     def init_dict_for_window(self, ts_window):
-        start_idx, stop_idx = self._start_stop_idc_for_window(ts_window)
+        items = list(self._overlapping(ts_window))
         return {
-            "data": self.data[start_idx:stop_idx],
-            "start_ts": self.data_ts[start_idx:stop_idx],
-            "stop_ts": self.stop_ts[start_idx:stop_idx],
+            "data": [item[3] for item in items],
+            "start_ts": np.array([item[0] for item in items], dtype=np.float64),
+            "stop_ts": np.array([item[1] for item in items], dtype=np.float64),
         }
 
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.data[key]
+        return self._all[key][3]
+
+    def __len__(self):
+        return len(self._all)
+
+    def __iter__(self):
+        return (item[3] for item in self._all)
+
+    def __bool__(self):
+        return len(self._all) > 0
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = list(self)
+        return self._data
+
+    @property
+    def timestamps(self):
+        """Start timestamps"""
+        if self._start_ts is None:
+            self._start_ts = np.fromiter(self._all.keys(), dtype=np.float64)
+        return self._start_ts
+
+    @property
+    def stop_ts(self):
+        if self._stop_ts is None:
+            self._stop_ts = np.fromiter(
+                (item[1] for item in self._all), dtype=np.float64
+            )
+        return self._stop_ts
+
+
+class Mutable_Bisector(Timeline_Index):
+    """Stores point data sorted by timestamp, supports fast inserts."""
+
+    def __init__(self, data=(), data_ts=()):
+        if len(data) != len(data_ts):
+            raise ValueError(
+                (
+                    "Each element in `data` requires a corresponding"
+                    " timestamp in `data_ts`"
+                )
+            )
+        super().__init__(data, data_ts)
+
+    def insert(self, timestamp, datum):
+        super().insert(timestamp, datum)
+
+    def init_dict_for_window(self, ts_window):
+        init_dict = super().init_dict_for_window(ts_window)
+        return {"data": init_dict["data"], "data_ts": init_dict["start_ts"]}
+
+
+class Affiliator(Timeline_Index):
+    """Stores data with start and stop timestamps, e.g. fixations or blinks."""
+
+    def __init__(self, data=(), start_ts=(), stop_ts=()):
+        super().__init__(data, start_ts, stop_ts)
+
 
 def find_closest(target, source):
     """Find indeces of closest `target` elements for elements in `source`.
@@ -147,6 +476,60 @@ def find_closest(target, source):
     return idx
 
 
+def correlate_data_idc(data_ts, timestamps):
+    """Index ranges of sorted `data_ts` that correlate to each of `timestamps`.
+
+    A datum belongs to the first frame whose midpoint to the next frame is not
+    before the datum, i.e. frame `i` receives all data in
+    `(midpoint(i - 1, i), midpoint(i, i + 1)]`. Data before the first frame is
+    assigned to the first frame. The last frame has no midpoint and remains empty.
+
+    Returns `(start_idc, stop_idc)`, such that `data[start_idc[i]:stop_idc[i]]` are
+    the data correlated to frame `i`.
+    """
+    data_ts = np.asarray(data_ts, dtype=np.float64)
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    if len(timestamps) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    # we can take the midpoint between two frames in time: More appropriate for SW timestamps
+    frame_midpoints = (timestamps[:-1] + timestamps[1:]) / 2.0
+    # or the time of the next frame: More appropriate for Sart Of Exposure Timestamps (HW timestamps).
+    # frame_midpoints = timestamps[1:]
+    stop_idc = np.empty(len(timestamps), dtype=np.int64)
+    stop_idc[:-1] = np.searchsorted(data_ts, frame_midpoints, side="right")
+    # we might loose data points at the end but we dont care
+    stop_idc[-1] = stop_idc[-2] if len(timestamps) > 1 else 0
+    start_idc = np.empty_like(stop_idc)
+    start_idc[0] = 0
+    start_idc[1:] = stop_idc[:-1]
+    return start_idc, stop_idc
+
+
+class Correlated_Data(collections.abc.Sequence):
+    """Lazy per-frame view onto data correlated by `correlate_data_idc()`.
+
+    Indexing with a frame index returns the list of data correlated to that frame.
+    """
+
+    def __init__(self, data, start_idc, stop_idc):
+        self.data = data
+        self.start_idc = start_idc
+        self.stop_idc = stop_idc
+
+    def __len__(self):
+        return len(self.start_idc)
+
+    def __getitem__(self, frame_idx):
+        if isinstance(frame_idx, slice):
+            return [self[idx] for idx in range(len(self))[frame_idx]]
+        return self.data[self.start_idc[frame_idx] : self.stop_idc[frame_idx]]
+
+    def counts(self):
+        """Number of data per frame"""
+        return self.stop_idc - self.start_idc
+
+
 def correlate_data(data, timestamps):
     """
     data:  list of data :
@@ -155,39 +538,18 @@ def correlate_data(data, timestamps):
 
     timestamps: timestamps list to correlate  data to
 
-    this takes a data list and a timestamps list and makes a new list
-    with the length of the number of timestamps.
+    this sorts the data list by timestamp and returns a per-frame view with
+    the length of the number of timestamps.
     Each slot contains a list that will have 0, 1 or more assosiated data points.
-
-    Finally we add an index field to the datum with the associated index
+    See `correlate_data_idc()` for the assignment rules.
     """
-    timestamps = list(timestamps)
-    data_by_frame = [[] for i in timestamps]
-
-    frame_idx = 0
-    data_index = 0
-
-    data.sort(key=lambda d: d["timestamp"])
-
-    while True:
-        try:
-            datum = data[data_index]
-            # we can take the midpoint between two frames in time: More appropriate for SW timestamps
-            ts = (timestamps[frame_idx] + timestamps[frame_idx + 1]) / 2.0
-            # or the time of the next frame: More appropriate for Sart Of Exposure Timestamps (HW timestamps).
-            # ts = timestamps[frame_idx+1]
-        except IndexError:
-            # we might loose a data point at the end but we dont care
-            break
-
-        if datum["timestamp"] <= ts:
-            # datum['index'] = frame_idx
-            data_by_frame[frame_idx].append(datum)
-            data_index += 1
-        else:
-            frame_idx += 1
-
-    return data_by_frame
+    data_ts = np.fromiter(
+        (datum["timestamp"] for datum in data), dtype=np.float64, count=len(data)
+    )
+    sorted_idc = np.argsort(data_ts, kind="stable")
+    data[:] = [data[idx] for idx in sorted_idc.tolist()]
+    start_idc, stop_idc = correlate_data_idc(data_ts[sorted_idc], timestamps)
+    return Correlated_Data(data, start_idc, stop_idc)
 
 
 def transparent_circle(img, center, radius, color, thickness):
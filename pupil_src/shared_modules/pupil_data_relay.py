@@ -26,19 +26,70 @@ class Pupil_Data_Relay(System_Plugin_Base):
         self.pupil_sub = zmq_tools.Msg_Receiver(
             self.g_pool.zmq_ctx, self.g_pool.ipc_sub_url, topics=("pupil",)
         )
+        self.g_pool.recent_serialized_data = {}
 
     def recent_events(self, events):
         recent_pupil_data = []
         recent_gaze_data = []
+        # Serialized payloads of the data above, such that the recorder can write
+        # them without serializing again. Items are (timestamp, topic, bytes, datum)
+        recent_pupil_serialized = []
+        recent_gaze_serialized = []
         while self.pupil_sub.new_data:
-            topic, pupil_datum = self.pupil_sub.recv()
+            topic, pupil_serialized, extra_frames = self.pupil_sub.recv_serialized()
+            pupil_datum = self.pupil_sub.deserialize_payload(
+                pupil_serialized, *extra_frames
+            )
             recent_pupil_data.append(pupil_datum)
+            if not extra_frames:
+                recent_pupil_serialized.append(
+                    (pupil_datum["timestamp"], topic, pupil_serialized, pupil_datum)
+                )
             new_gaze_data = self.g_pool.active_gaze_mapping_plugin.on_pupil_datum(
                 pupil_datum
             )
             for gaze_datum in new_gaze_data:
-                self.gaze_pub.send(gaze_datum)
+                gaze_serialized = self.gaze_pub.serialize_payload(gaze_datum)
+                self.gaze_pub.send_serialized(gaze_datum["topic"], gaze_serialized)
+                recent_gaze_serialized.append(
+                    (
+                        gaze_datum["timestamp"],
+                        gaze_datum["topic"],
+                        gaze_serialized,
+                        gaze_datum,
+                    )
+                )
             recent_gaze_data.extend(new_gaze_data)
 
         events["pupil"] = recent_pupil_data
         events["gaze"] = recent_gaze_data
+        # not part of `events`, since all events are sent to the IPC
+        self.g_pool.recent_serialized_data = {
+            "pupil": recent_pupil_serialized,
+            "gaze": recent_gaze_serialized,
+        }
+
+
+def send_recent_events(ipc_pub, events):
+    """Sends the events of a world loop iteration that were not sent already.
+
+    Pupil and gaze data are sent by `Pupil_Data_Relay`. Frames are sent explicitly
+    by the frame publisher. All other events need to be lists of data.
+    """
+    # "blacklisted" events that were already sent
+    del events["pupil"]
+    del events["gaze"]
+    # delete if exists. More expensive than del, so only use it when key might not exist
+    events.pop("annotation", None)
+
+    if "frame" in events:
+        del events["frame"]  # send explicitly with frame publisher
+    if "depth_frame" in events:
+        del events["depth_frame"]
+    if "audio_packets" in events:
+        del events["audio_packets"]
+    del events["dt"]  # no need to send this
+    for data in events.values():
+        assert isinstance(data, (list, tuple))
+        for d in data:
+            ipc_pub.send(d)
@@ -144,12 +144,12 @@ class Pupil_Producer_Base(Observable, Producer_Plugin_Base):
                         pupil_positions.timestamps, timestamps_target
                     )
                     data_indeces = np.unique(data_indeces)
-                    for idx in data_indeces:
-                        ts_data_pair = (
-                            pupil_positions.timestamps[idx],
-                            pupil_positions[idx][key],
+                    ts_data_pairs_right_left[eye_id].extend(
+                        zip(
+                            pupil_positions.timestamps[data_indeces].tolist(),
+                            pupil_positions.column(key, data_indeces).tolist(),
                         )
-                        ts_data_pairs_right_left[eye_id].append(ts_data_pair)
+                    )
 
             # max_val must not be 0, else gl will crash
             all_pupil_data_chained = chain.from_iterable(ts_data_pairs_right_left)
@@ -238,13 +238,12 @@ class Pupil_From_Recording(Pupil_Producer_Base):
     def __init__(self, g_pool):
         super().__init__(g_pool)
 
-        pupil_data_file = fm.load_pldata_file(g_pool.rec_dir, "pupil")
-        g_pool.pupil_positions = pm.Bisector(
-            pupil_data_file.data, pupil_data_file.timestamps
-        )
-        g_pool.pupil_positions_by_id = self.create_pupil_positions_by_id_iterative(
-            zip(
-                pupil_data_file.topics, pupil_data_file.data, pupil_data_file.timestamps
+        pupil_data = fm.load_pldata_columns(g_pool.rec_dir, "pupil")
+        g_pool.pupil_positions = pm.Bisector(pupil_data, pupil_data.timestamps)
+        g_pool.pupil_positions_by_id = tuple(
+            pm.Bisector(pupil_data_by_id, pupil_data_by_id.timestamps)
+            for pupil_data_by_id in (
+                pupil_data[pupil_data.column("id") == eye_id] for eye_id in (0, 1)
             )
         )
 
@@ -412,7 +411,7 @@ class Offline_Pupil_Detection(Pupil_Producer_Base):
         )
         with fm.PLData_Writer(self.data_dir, "offline_pupil") as writer:
             for topic, datum, timestamp in topic_data_ts:
-                writer.append_serialized(timestamp, topic, datum.serialized)
+                writer.append_serialized(timestamp, topic, datum.serialized, datum)
 
         session_data = {}
         session_data["detection_method"] = self.detection_method
@@ -10,8 +10,10 @@ See COPYING and COPYING.LESSER for license details.
 """
 
 import logging
+from pathlib import Path
 from types import SimpleNamespace
 
+import file_methods as fm
 from video_capture.file_backend import File_Source
 
 from ..recording import PupilRecording
@@ -69,6 +71,8 @@ def update_recording(rec_dir: str):
 
     _assert_compatible_meta_version(rec_dir)
 
+    _recover_incomplete_pldata_files(rec_dir)
+
     check_for_worldless_recording_new_style(rec_dir)
 
     # update to latest
@@ -85,6 +89,13 @@ def _assert_compatible_meta_version(rec_dir: str):
     PupilRecording(rec_dir)
 
 
+def _recover_incomplete_pldata_files(rec_dir: str):
+    # Capture writes timestamp files only when closing pldata files. They are
+    # missing if Capture crashed during a recording.
+    for pldata_path in Path(rec_dir).glob("*.pldata"):
+        fm.recover_pldata_file(rec_dir, pldata_path.stem)
+
+
 def _generate_all_lookup_tables(rec_dir: str):
     recording = PupilRecording(rec_dir)
     videosets = [
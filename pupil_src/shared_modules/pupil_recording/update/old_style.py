@@ -429,7 +429,9 @@ def update_recording_v18_v19(rec_dir):
                 if topic == "notify.annotation":
                     annotation = notifications.data[idx]
                     ts = notifications.timestamps[idx]
-                    writer.append_serialized(ts, "annotation", annotation.serialized)
+                    writer.append_serialized(
+                        ts, "annotation", annotation.serialized, annotation
+                    )
 
     copy_cached_annotations()
     copy_recorded_annotations()
@@ -15,6 +15,7 @@ import logging
 import os
 import typing
 
+import numpy as np
 from pyglui import ui
 
 import csv_utils
@@ -24,6 +25,16 @@ from plugin import Analysis_Plugin_Base
 # logging
 logger = logging.getLogger(__name__)
 
+try:
+    import pyarrow
+    import pyarrow.feather
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+    logger.debug("Install pyarrow to export raw data as Parquet or Arrow files")
+
+COLUMNAR_EXPORT_FORMATS = ("npz", "parquet", "arrow") if pyarrow else ("npz",)
+
 
 class Raw_Data_Exporter(Analysis_Plugin_Base):
     """
@@ -114,11 +125,15 @@ class Raw_Data_Exporter(Analysis_Plugin_Base):
         should_export_pupil_positions=True,
         should_export_field_info=True,
         should_export_gaze_positions=True,
+        columnar_export_format=None,
     ):
         super().__init__(g_pool)
         self.should_export_pupil_positions = should_export_pupil_positions
         self.should_export_field_info = should_export_field_info
         self.should_export_gaze_positions = should_export_gaze_positions
+        if columnar_export_format not in COLUMNAR_EXPORT_FORMATS:
+            columnar_export_format = None
+        self.columnar_export_format = columnar_export_format
 
     def init_ui(self):
         self.add_menu()
@@ -146,6 +161,15 @@ class Raw_Data_Exporter(Analysis_Plugin_Base):
                 "should_export_gaze_positions", self, label="Export Gaze Positions"
             )
         )
+        self.menu.append(
+            ui.Selector(
+                "columnar_export_format",
+                self,
+                selection=[None, *COLUMNAR_EXPORT_FORMATS],
+                labels=["None", *(f".{fmt}" for fmt in COLUMNAR_EXPORT_FORMATS)],
+                label="Additional columnar format",
+            )
+        )
         self.menu.append(
             ui.Info_Text("Press the export button or type 'e' to start the export.")
         )
@@ -165,6 +189,7 @@ class Raw_Data_Exporter(Analysis_Plugin_Base):
                 timestamps=self.g_pool.timestamps,
                 export_window=export_window,
                 export_dir=export_dir,
+                columnar_export_format=self.columnar_export_format,
             )
 
         if self.should_export_gaze_positions:
@@ -174,6 +199,7 @@ class Raw_Data_Exporter(Analysis_Plugin_Base):
                 timestamps=self.g_pool.timestamps,
                 export_window=export_window,
                 export_dir=export_dir,
+                columnar_export_format=self.columnar_export_format,
             )
 
         if self.should_export_field_info:
@@ -194,6 +220,19 @@ class _Base_Positions_Exporter(abc.ABC):
     def csv_export_labels(cls) -> typing.Tuple[csv_utils.CSV_EXPORT_LABEL_TYPE, ...]:
         pass
 
+    @classmethod
+    def csv_export_types(cls) -> typing.Mapping[csv_utils.CSV_EXPORT_LABEL_TYPE, type]:
+        """Value types of the columns that are not float (int or str)"""
+        return {}
+
+    @classmethod
+    @abc.abstractmethod
+    def row_export(
+        cls, raw_value: csv_utils.CSV_EXPORT_RAW_TYPE, world_index: int
+    ) -> tuple:
+        """Values of a single datum in the order of csv_export_labels()"""
+        pass
+
     @classmethod
     @abc.abstractmethod
     def dict_export(
@@ -201,26 +240,92 @@ class _Base_Positions_Exporter(abc.ABC):
     ) -> dict:
         pass
 
+    @classmethod
+    def rows_export(
+        cls, raw_values: typing.Sequence[csv_utils.CSV_EXPORT_RAW_TYPE], world_indices
+    ) -> typing.List[tuple]:
+        return [cls.row_export(*args) for args in zip(raw_values, world_indices)]
+
+    @classmethod
+    def columns_export(
+        cls, rows: typing.Sequence[tuple]
+    ) -> typing.Dict[csv_utils.CSV_EXPORT_LABEL_TYPE, np.ndarray]:
+        """
+        Converts exported rows to one array per column.
+
+        Missing float values are NaN, missing strings are empty. Int columns with
+        missing values are returned as float columns, same as pandas does.
+        """
+        labels = cls.csv_export_labels()
+        types = cls.csv_export_types()
+        columns = zip(*rows) if rows else ([] for _ in labels)
+        return {
+            label: _column_array(values, types.get(label, float))
+            for label, values in zip(labels, columns)
+        }
+
     def csv_export_write(
-        self, positions_bisector, timestamps, export_window, export_dir
+        self,
+        positions_bisector,
+        timestamps,
+        export_window,
+        export_dir,
+        columnar_export_format=None,
     ):
         export_file = type(self).csv_export_filename()
         export_path = os.path.join(export_dir, export_file)
 
         export_section = positions_bisector.init_dict_for_window(export_window)
         export_world_idc = pm.find_closest(timestamps, export_section["data_ts"])
+        rows = type(self).rows_export(export_section["data"], export_world_idc)
 
         with open(export_path, "w", encoding="utf-8", newline="") as csvfile:
             csv_header = type(self).csv_export_labels()
-            dict_writer = csv.DictWriter(csvfile, fieldnames=csv_header)
-            dict_writer.writeheader()
-
-            for g, idx in zip(export_section["data"], export_world_idc):
-                dict_row = type(self).dict_export(raw_value=g, world_index=idx)
-                dict_writer.writerow(dict_row)
+            # csv.writer formats floats with repr() and None as empty field
+            csv_writer = csv.writer(csvfile)
+            csv_writer.writerow(csv_header)
+            csv_writer.writerows(rows)
 
         logger.info(f"Created '{export_file}' file.")
 
+        if columnar_export_format is not None:
+            columns = type(self).columns_export(rows)
+            export_stem = os.path.splitext(export_path)[0]
+            columnar_path = _write_columnar_export(
+                columns, export_stem, columnar_export_format
+            )
+            logger.info(f"Created '{os.path.basename(columnar_path)}' file.")
+
+
+def _column_array(values: typing.Sequence, value_type: type) -> np.ndarray:
+    if value_type is str:
+        return np.array(["" if v is None else str(v) for v in values], dtype=str)
+    # None is converted to NaN
+    column = np.array(values, dtype=np.float64)
+    if value_type is int and not np.isnan(column).any():
+        column = column.astype(np.int64)
+    return column
+
+
+def _write_columnar_export(
+    columns: typing.Dict[str, np.ndarray], export_stem: str, export_format: str
+) -> str:
+    """Writes the export columns with the same labels as the csv file"""
+    if export_format not in COLUMNAR_EXPORT_FORMATS:
+        raise ValueError(f"Unsupported columnar export format: {export_format}")
+    export_path = f"{export_stem}.{export_format}"
+    if export_format == "npz":
+        np.savez(export_path, **columns)
+        return export_path
+    table = pyarrow.table(
+        {label: pyarrow.array(column) for label, column in columns.items()}
+    )
+    if export_format == "parquet":
+        pyarrow.parquet.write_table(table, export_path)
+    else:
+        pyarrow.feather.write_feather(table, export_path)
+    return export_path
+
 
 class Pupil_Positions_Exporter(_Base_Positions_Exporter):
     @classmethod
@@ -269,12 +374,26 @@ class Pupil_Positions_Exporter(_Base_Positions_Exporter):
             "projected_sphere_angle",
         )
 
+    @classmethod
+    def csv_export_types(cls) -> typing.Mapping[csv_utils.CSV_EXPORT_LABEL_TYPE, type]:
+        return {"world_index": int, "eye_id": int, "method": str, "model_id": int}
+
     @classmethod
     def dict_export(
         cls, raw_value: csv_utils.CSV_EXPORT_RAW_TYPE, world_index: int
     ) -> dict:
+        dict_row = dict(
+            zip(cls.csv_export_labels(), cls.row_export(raw_value, world_index))
+        )
+        dict_row["pupil_timestamp"] = str(dict_row["pupil_timestamp"])
+        return dict_row
+
+    @classmethod
+    def row_export(
+        cls, raw_value: csv_utils.CSV_EXPORT_RAW_TYPE, world_index: int
+    ) -> tuple:
         # 2d data
-        pupil_timestamp = str(raw_value["timestamp"])
+        pupil_timestamp = raw_value["timestamp"]
         eye_id = raw_value["id"]
         confidence = raw_value["confidence"]
         norm_pos_x = raw_value["norm_pos"][0]
@@ -322,45 +441,45 @@ class Pupil_Positions_Exporter(_Base_Positions_Exporter):
             projected_sphere_axis = [None, None]
             projected_sphere_angle = None
 
-        return {
+        return (
             # 2d data
-            "pupil_timestamp": pupil_timestamp,
-            "world_index": world_index,
-            "eye_id": eye_id,
-            "confidence": confidence,
-            "norm_pos_x": norm_pos_x,
-            "norm_pos_y": norm_pos_y,
-            "diameter": diameter,
-            "method": method,
+            pupil_timestamp,
+            world_index,
+            eye_id,
+            confidence,
+            norm_pos_x,
+            norm_pos_y,
+            diameter,
+            method,
             # ellipse data
-            "ellipse_center_x": ellipse_center[0],
-            "ellipse_center_y": ellipse_center[1],
-            "ellipse_axis_a": ellipse_axis[0],
-            "ellipse_axis_b": ellipse_axis[1],
-            "ellipse_angle": ellipse_angle,
+            ellipse_center[0],
+            ellipse_center[1],
+            ellipse_axis[0],
+            ellipse_axis[1],
+            ellipse_angle,
             # 3d data
-            "diameter_3d": diameter_3d,
-            "model_confidence": model_confidence,
-            "model_id": model_id,
-            "sphere_center_x": sphere_center[0],
-            "sphere_center_y": sphere_center[1],
-            "sphere_center_z": sphere_center[2],
-            "sphere_radius": sphere_radius,
-            "circle_3d_center_x": circle_3d_center[0],
-            "circle_3d_center_y": circle_3d_center[1],
-            "circle_3d_center_z": circle_3d_center[2],
-            "circle_3d_normal_x": circle_3d_normal[0],
-            "circle_3d_normal_y": circle_3d_normal[1],
-            "circle_3d_normal_z": circle_3d_normal[2],
-            "circle_3d_radius": circle_3d_radius,
-            "theta": theta,
-            "phi": phi,
-            "projected_sphere_center_x": projected_sphere_center[0],
-            "projected_sphere_center_y": projected_sphere_center[1],
-            "projected_sphere_axis_a": projected_sphere_axis[0],
-            "projected_sphere_axis_b": projected_sphere_axis[1],
-            "projected_sphere_angle": projected_sphere_angle,
-        }
+            diameter_3d,
+            model_confidence,
+            model_id,
+            sphere_center[0],
+            sphere_center[1],
+            sphere_center[2],
+            sphere_radius,
+            circle_3d_center[0],
+            circle_3d_center[1],
+            circle_3d_center[2],
+            circle_3d_normal[0],
+            circle_3d_normal[1],
+            circle_3d_normal[2],
+            circle_3d_radius,
+            theta,
+            phi,
+            projected_sphere_center[0],
+            projected_sphere_center[1],
+            projected_sphere_axis[0],
+            projected_sphere_axis[1],
+            projected_sphere_angle,
+        )
 
 
 class Gaze_Positions_Exporter(_Base_Positions_Exporter):
@@ -394,12 +513,25 @@ class Gaze_Positions_Exporter(_Base_Positions_Exporter):
             "gaze_normal1_z",
         )
 
+    @classmethod
+    def csv_export_types(cls) -> typing.Mapping[csv_utils.CSV_EXPORT_LABEL_TYPE, type]:
+        return {"world_index": int, "base_data": str}
+
     @classmethod
     def dict_export(
         cls, raw_value: csv_utils.CSV_EXPORT_RAW_TYPE, world_index: int
     ) -> dict:
+        dict_row = dict(
+            zip(cls.csv_export_labels(), cls.row_export(raw_value, world_index))
+        )
+        dict_row["gaze_timestamp"] = str(dict_row["gaze_timestamp"])
+        return dict_row
 
-        gaze_timestamp = str(raw_value["timestamp"])
+    @classmethod
+    def row_export(
+        cls, raw_value: csv_utils.CSV_EXPORT_RAW_TYPE, world_index: int
+    ) -> tuple:
+        gaze_timestamp = raw_value["timestamp"]
         confidence = raw_value["confidence"]
         norm_pos = raw_value["norm_pos"]
         base_data = None
@@ -446,26 +578,26 @@ class Gaze_Positions_Exporter(_Base_Positions_Exporter):
                         eye_centers1_3d = raw_value["eye_center_3d"]
                         gaze_normals1_3d = raw_value["gaze_normal_3d"]
 
-        return {
-            "gaze_timestamp": gaze_timestamp,
-            "world_index": world_index,
-            "confidence": confidence,
-            "norm_pos_x": norm_pos[0],
-            "norm_pos_y": norm_pos[1],
-            "base_data": base_data,
-            "gaze_point_3d_x": gaze_points_3d[0],
-            "gaze_point_3d_y": gaze_points_3d[1],
-            "gaze_point_3d_z": gaze_points_3d[2],
-            "eye_center0_3d_x": eye_centers0_3d[0],
-            "eye_center0_3d_y": eye_centers0_3d[1],
-            "eye_center0_3d_z": eye_centers0_3d[2],
-            "gaze_normal0_x": gaze_normals0_3d[0],
-            "gaze_normal0_y": gaze_normals0_3d[1],
-            "gaze_normal0_z": gaze_normals0_3d[2],
-            "eye_center1_3d_x": eye_centers1_3d[0],
-            "eye_center1_3d_y": eye_centers1_3d[1],
-            "eye_center1_3d_z": eye_centers1_3d[2],
-            "gaze_normal1_x": gaze_normals1_3d[0],
-            "gaze_normal1_y": gaze_normals1_3d[1],
-            "gaze_normal1_z": gaze_normals1_3d[2],
-        }
+        return (
+            gaze_timestamp,
+            world_index,
+            confidence,
+            norm_pos[0],
+            norm_pos[1],
+            base_data,
+            gaze_points_3d[0],
+            gaze_points_3d[1],
+            gaze_points_3d[2],
+            eye_centers0_3d[0],
+            eye_centers0_3d[1],
+            eye_centers0_3d[2],
+            gaze_normals0_3d[0],
+            gaze_normals0_3d[1],
+            gaze_normals0_3d[2],
+            eye_centers1_3d[0],
+            eye_centers1_3d[1],
+            eye_centers1_3d[2],
+            gaze_normals1_3d[0],
+            gaze_normals1_3d[1],
+            gaze_normals1_3d[2],
+        )
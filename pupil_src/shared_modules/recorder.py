@@ -24,7 +24,12 @@ from ndsi import H264Writer
 from pyglui import ui
 
 import csv_utils
-from av_writer import MPEG_Writer, JPEG_Writer, NonMonotonicTimestampError
+from av_writer import (
+    MPEG_Writer,
+    JPEG_Writer,
+    Async_Writer,
+    NonMonotonicTimestampError,
+)
 from file_methods import PLData_Writer, load_object
 from methods import get_system_info, timer
 from video_capture.ndsi_backend import NDSI_Source
@@ -39,6 +44,16 @@ from threading import Thread
 logger = logging.getLogger(__name__)
 
 
+def _is_serialized(serialized, data):
+    """True if `serialized` holds the payloads of exactly the datums in `data`.
+
+    This is not the case if a plugin replaced data after it was received.
+    """
+    return len(serialized) == len(data) and all(
+        item[3] is datum for item, datum in zip(serialized, data)
+    )
+
+
 def get_auto_name():
     return strftime("%Y_%m_%d", localtime())
 
@@ -57,6 +72,7 @@ class Recorder(System_Plugin_Base):
     icon_font = "pupil_icons"
     warning_low_disk_space_th = 5.0  # threshold in GB
     stop_rec_low_disk_space_th = 1.0  # threshold in GB
+    fsync_interval = 5.0  # seconds between flushing recorded data to disk
 
     def __init__(
         self,
@@ -68,6 +84,8 @@ class Recorder(System_Plugin_Base):
         show_info_menu=False,
         record_eye=True,
         raw_jpeg=True,
+        video_writer_queue_size=30,
+        video_writer_backpressure="block",
     ):
         super().__init__(g_pool)
         # receiver.receive()
@@ -107,6 +125,9 @@ class Recorder(System_Plugin_Base):
             self.rec_root_dir = default_rec_root_dir
 
         self.raw_jpeg = raw_jpeg
+        # Frames are encoded in a background thread if the queue size is positive
+        self.video_writer_queue_size = video_writer_queue_size
+        self.video_writer_backpressure = video_writer_backpressure
         self.order = 0.9
         self.record_eye = record_eye
         self.session_name = session_name
@@ -159,6 +180,8 @@ class Recorder(System_Plugin_Base):
         d["show_info_menu"] = self.show_info_menu
         d["rec_root_dir"] = self.rec_root_dir
         d["raw_jpeg"] = self.raw_jpeg
+        d["video_writer_queue_size"] = self.video_writer_queue_size
+        d["video_writer_backpressure"] = self.video_writer_backpressure
         return d
 
     def init_ui(self):
@@ -271,6 +294,8 @@ class Recorder(System_Plugin_Base):
         Emits notifications:
             ``recording.started``: New recording session started
             ``recording.stopped``: Current recording session stopped
+            ``recording.video_writer_stats``: Frame counters of the background
+                video encoders, emitted once per video when recording stops
 
         Args:
             notification (dictionary): Notification dictionary
@@ -284,7 +309,9 @@ class Recorder(System_Plugin_Base):
                 try:
                     writer = self.pldata_writers["notify"]
                 except KeyError:
-                    writer = PLData_Writer(self.rec_path, "notify")
+                    writer = PLData_Writer(
+                        self.rec_path, "notify", fsync_interval=self.fsync_interval
+                    )
                     self.pldata_writers["notify"] = writer
                 writer.append(notification)
 
@@ -345,6 +372,7 @@ class Recorder(System_Plugin_Base):
 
         self.pldata_writers = {}
         self.frame_count = 0
+        self.frames_dropped = 0
         self.running = True
         self.menu.read_only = True
         recording_uuid = uuid.uuid4()
@@ -386,6 +414,14 @@ class Recorder(System_Plugin_Base):
             )
         else:
             self.writer = MPEG_Writer(self.video_path, start_time_synced)
+        if self.video_writer_queue_size > 0 and not isinstance(
+            self.writer, H264Writer
+        ):
+            self.writer = Async_Writer(
+                self.writer,
+                queue_size=self.video_writer_queue_size,
+                backpressure=self.video_writer_backpressure,
+            )
 
         try:
             cal_pt_path = os.path.join(self.g_pool.user_dir, "user_calibration_data")
@@ -394,7 +430,9 @@ class Recorder(System_Plugin_Base):
             notification.update(cal_data)
             notification["topic"] = "notify." + notification["subject"]
 
-            writer = PLData_Writer(self.rec_path, "notify")
+            writer = PLData_Writer(
+                self.rec_path, "notify", fsync_interval=self.fsync_interval
+            )
             writer.append(notification)
             self.pldata_writers["notify"] = writer
         except FileNotFoundError:
@@ -411,6 +449,8 @@ class Recorder(System_Plugin_Base):
                 "record_eye": self.record_eye,
                 "compression": self.raw_jpeg,
                 "start_time_synced": float(start_time_synced),
+                "video_writer_queue_size": self.video_writer_queue_size,
+                "video_writer_backpressure": self.video_writer_backpressure,
             }
         )
 
@@ -465,14 +505,25 @@ class Recorder(System_Plugin_Base):
                 self.stop()
                 logger.error("Recording was stopped due to low disk space!")
 
+            if self.running and isinstance(self.writer, Async_Writer):
+                self.warn_about_dropped_frames(self.writer.stats())
+
         if self.running:
+            serialized_data = getattr(self.g_pool, "recent_serialized_data", {})
             for key, data in events.items():
-                if key not in ("dt", "depth_frame") and not key.startswith("frame"):
-                    try:
-                        writer = self.pldata_writers[key]
-                    except KeyError:
-                        writer = PLData_Writer(self.rec_path, key)
-                        self.pldata_writers[key] = writer
+                if key in ("dt", "depth_frame") or key.startswith("frame"):
+                    continue
+                try:
+                    writer = self.pldata_writers[key]
+                except KeyError:
+                    writer = PLData_Writer(
+                        self.rec_path, key, fsync_interval=self.fsync_interval
+                    )
+                    self.pldata_writers[key] = writer
+                serialized = serialized_data.get(key)
+                if serialized is not None and _is_serialized(serialized, data):
+                    writer.extend_serialized(serialized)
+                else:
                     writer.extend(data)
             if "frame" in events:
                 frame = events["frame"]
@@ -497,6 +548,7 @@ class Recorder(System_Plugin_Base):
         duration_s = self.g_pool.get_timestamp() - self.meta_info.start_time_synced_s
 
         # explicit release of VideoWriter
+        writer = self.writer
         try:
             self.writer.release()
         except RuntimeError:
@@ -506,6 +558,7 @@ class Recorder(System_Plugin_Base):
             self.g_pool.capture.intrinsics.save(self.rec_path, custom_name="world")
         finally:
             self.writer = None
+        self.notify_video_writer_stats(writer)
 
         for writer in self.pldata_writers.values():
             writer.close()
@@ -547,6 +600,23 @@ class Recorder(System_Plugin_Base):
         logger.info("Saved Recording.")
         self.notify_all({"subject": "recording.stopped", "rec_path": self.rec_path})
 
+    def warn_about_dropped_frames(self, stats):
+        """Logs a warning if the world video encoder dropped further frames."""
+        if stats["dropped"] > self.frames_dropped:
+            logger.warning(
+                f"World video encoder dropped {stats['dropped']} frames so far."
+            )
+            self.frames_dropped = stats["dropped"]
+
+    def notify_video_writer_stats(self, writer):
+        """Emits ``recording.video_writer_stats`` for background encoding."""
+        if isinstance(writer, Async_Writer):
+            stats = writer.stats()
+            self.warn_about_dropped_frames(stats)
+            self.notify_all(
+                {"subject": "recording.video_writer_stats", "source": "world", **stats}
+            )
+
     def cleanup(self):
         """gets called when the plugin get terminated.
            either volunatily or forced.
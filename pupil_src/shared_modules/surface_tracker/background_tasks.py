@@ -9,6 +9,7 @@ See COPYING and COPYING.LESSER for license details.
 ---------------------------------------------------------------------------~(*)
 """
 
+import collections
 import csv
 import itertools
 import logging
@@ -16,25 +17,185 @@ import os
 import types
 
 import cv2
+import numpy as np
 
 import background_helper
 import player_methods
+from tasklib.background.scheduler import PRIORITY_DEFAULT, PRIORITY_INTERACTIVE
+
+from .cache import Unvisited_Index
 
 logger = logging.getLogger(__name__)
 
 
 def background_video_processor(
-    video_file_path, callable, visited_list, seek_idx, mp_context
+    video_file_path, callable, visited_list, seek_idx, mp_context, worker_count=None
 ):
-    return background_helper.IPC_Logging_Task_Proxy(
+    return Segmented_Video_Processing_Proxy(
         "Background Video Processor",
-        video_processing_generator,
-        (video_file_path, callable, seek_idx, visited_list),
-        context=mp_context,
+        video_file_path,
+        callable,
+        visited_list,
+        seek_idx,
+        mp_context,
+        worker_count=worker_count,
     )
 
 
-def video_processing_generator(video_file_path, callable, seek_idx, visited_list):
+class _Video_Segment(object):
+    __slots__ = ("start", "stop", "task", "priority")
+
+    def __init__(self, start, stop, priority=PRIORITY_DEFAULT):
+        self.start = start
+        self.stop = stop
+        self.task = None
+        self.priority = priority
+
+    def __contains__(self, frame_idx):
+        return self.start <= frame_idx < self.stop
+
+
+class Segmented_Video_Processing_Proxy(object):
+    """Processes a video in segments of frames with multiple background tasks.
+
+    Every segment is decoded and processed by its own `video_processing_generator`,
+    i.e. each task uses its own `File_Source`. The tasks run on the shared pool of
+    worker processes. User seeks are honored by queueing the frames from the seek
+    index to the end of its segment first, with interactive priority. The rest of
+    that segment is processed later. If all workers are busy, the most recently
+    started segment is stopped and queued again.
+
+    Provides the same interface as `background_helper.Task_Proxy`.
+    """
+
+    segment_size = 600  # frames
+
+    def __init__(
+        self,
+        name,
+        video_file_path,
+        callable,
+        visited_list,
+        seek_idx,
+        mp_context,
+        worker_count=None,
+    ):
+        self.name = name
+        self.video_file_path = video_file_path
+        self.callable = callable
+        self.seek_idx = seek_idx
+        self.mp_context = mp_context
+        self.worker_count = worker_count or max(1, mp_context.cpu_count() - 1)
+
+        self.visited = np.array([x is not None for x in visited_list], dtype=bool)
+        self.pending = collections.deque(
+            _Video_Segment(start, min(start + self.segment_size, self.visited.size))
+            for start in range(0, self.visited.size, self.segment_size)
+        )
+        self.running = []
+
+        self._completed = False
+        self._canceled = False
+
+    def _start_tasks(self):
+        while self.pending and len(self.running) < self.worker_count:
+            segment = self.pending.popleft()
+            visited = self.visited[segment.start : segment.stop]
+            if visited.all():
+                continue
+            segment.task = background_helper.Pooled_Task_Proxy(
+                f"{self.name} [{segment.start}, {segment.stop})",
+                video_processing_generator,
+                args=(
+                    self.video_file_path,
+                    self.callable,
+                    visited.tolist(),
+                    segment.start,
+                ),
+                priority=segment.priority,
+            )
+            self.running.append(segment)
+
+    def _handle_seek(self):
+        seek_idx = self.seek_idx.value
+        if seek_idx == -1:
+            return
+        self.seek_idx.value = -1
+        if not 0 <= seek_idx < self.visited.size or self.visited[seek_idx]:
+            return
+
+        segment = next(
+            (s for s in itertools.chain(self.running, self.pending) if seek_idx in s),
+            None,
+        )
+        if segment is None:
+            return  # beyond the end of the video
+        if segment in self.running:
+            # restarted from the seek index below
+            self.running.remove(segment)
+            segment.task.cancel()
+        else:
+            self.pending.remove(segment)
+        if seek_idx > segment.start:
+            # frames before the seek index are processed later
+            self.pending.append(_Video_Segment(segment.start, seek_idx))
+        if len(self.running) >= self.worker_count:
+            preempted = self.running.pop()
+            preempted.task.cancel()
+            self.pending.appendleft(_Video_Segment(preempted.start, preempted.stop))
+        self.pending.appendleft(
+            _Video_Segment(seek_idx, segment.stop, priority=PRIORITY_INTERACTIVE)
+        )
+
+    def fetch(self):
+        """Fetches processed frames from all running segments in turns"""
+        if self.completed or self.canceled:
+            return
+
+        self._handle_seek()
+        self._start_tasks()
+
+        fetchers = [(segment, segment.task.fetch()) for segment in self.running]
+        while fetchers:
+            for segment, fetcher in fetchers[:]:
+                result = next(fetcher, None)
+                if result is not None:
+                    self.visited[result[0]] = True
+                    yield result
+                    continue
+                fetchers.remove((segment, fetcher))
+                if segment.task.canceled:
+                    self._canceled = True
+                    return
+                if segment.task.completed:
+                    self.running.remove(segment)
+
+        if not self.running and not self.pending:
+            logger.debug("Caching completed.")
+            self._completed = True
+
+    def cancel(self, timeout=1):
+        for segment in self.running:
+            segment.task.cancel(timeout)
+        self.running = []
+        self.pending.clear()
+        if not self.completed:
+            self._canceled = True
+
+    @property
+    def completed(self):
+        return self._completed
+
+    @property
+    def canceled(self):
+        return self._canceled
+
+
+def video_processing_generator(video_file_path, callable, visited_list, start_idx=0):
+    """Processes all frames that were not visited yet.
+
+    `visited_list` contains a flag for every frame starting at `start_idx`.
+    """
     import os
     import logging
 
@@ -51,9 +212,8 @@ def video_processing_generator(video_file_path, callable, seek_idx, visited_list
 
     # Ensure that indiced are not generated beyond video frame count
     frame_count = cap.get_frame_count()
-    visited_list = visited_list[:frame_count]
-
-    visited_list = [x is not None for x in visited_list]
+    unvisited = Unvisited_Index(visited_list[: frame_count - start_idx])
+    next_decoded_idx = None
 
     def next_unvisited_idx(frame_idx):
         """
@@ -66,65 +226,47 @@ def video_processing_generator(video_file_path, callable, seek_idx, visited_list
         Returns: Next index that requires processing.
 
         """
-        try:
-            visited = visited_list[frame_idx]
-        except IndexError:
-            visited = True  # trigger search from the start
-
-        if not visited:
-            next_unvisited = frame_idx
-        else:
-            # find next unvisited site in the future
-            try:
-                next_unvisited = visited_list.index(False, frame_idx)
-            except ValueError:
-                # any thing in the past?
-                try:
-                    next_unvisited = visited_list.index(False, 0, frame_idx)
-                except ValueError:
-                    # no unvisited sites left. Done!
-                    logger.debug("Caching completed.")
-                    next_unvisited = None
-        return next_unvisited
+        next_unvisited = unvisited.next_unvisited(frame_idx - start_idx)
+        if next_unvisited is None:
+            # no unvisited sites left. Done!
+            logger.debug("Caching completed.")
+            return None
+        return start_idx + next_unvisited
 
     def handle_frame(frame_idx):
-        if frame_idx != cap.get_frame_index() + 1:
+        nonlocal next_decoded_idx
+        if frame_idx != next_decoded_idx:
             # we need to seek:
             logger.debug("Seeking to Frame {}".format(frame_idx))
             try:
                 cap.seek_to_frame(frame_idx)
             except video_capture.FileSeekError:
                 logger.warning("Could not evaluate frame: {}.".format(frame_idx))
-                visited_list[frame_idx] = True  # this frame is now visited.
+                next_decoded_idx = None
                 return []
 
         try:
             frame = cap.get_frame()
         except video_capture.EndofVideoError:
             logger.warning("Could not evaluate frame: {}.".format(frame_idx))
-            visited_list[frame_idx] = True
+            next_decoded_idx = None
             return []
+        next_decoded_idx = frame.index + 1
         return callable(frame)
 
-    while True:
-        last_frame_idx = cap.get_frame_index()
-        if seek_idx.value != -1:
-            assert seek_idx.value < len(
-                visited_list
-            ), "The requested seek index is outside of the predefined cache range!"
-            last_frame_idx = seek_idx.value
-            seek_idx.value = -1
-            logger.debug(
-                "User required seek. Marker caching at Frame: {}".format(last_frame_idx)
-            )
+    if unvisited.size == 0:
+        return
 
+    last_frame_idx = start_idx
+    while True:
         next_frame_idx = next_unvisited_idx(last_frame_idx)
 
         if next_frame_idx is None:
             break
         else:
             res = handle_frame(next_frame_idx)
-            visited_list[next_frame_idx] = True
+            unvisited.visit(next_frame_idx - start_idx)
+            last_frame_idx = next_frame_idx + 1
             yield next_frame_idx, res
 
 
@@ -139,37 +281,7 @@ def background_data_processor(data, callable, seek_idx, mp_context):
 
 def data_processing_generator(data, callable, seek_idx):
     # We treat frames without marker detections as already processed from the start.
-    visited_list = [x is None for x in data]
-
-    def next_unvisited_idx(sample_idx):
-        """
-        Starting from the given index, find the next sample that has not been
-        processed yet. If no future samples need processing, check from the start.
-
-        Args:
-            sample_idx: Index to start search from.
-
-        Returns: Next index that requires processing.
-
-        """
-        try:
-            visited = visited_list[sample_idx]
-        except IndexError:
-            visited = True  # trigger search from the start
-
-        if visited is False:
-            next_unvisited = sample_idx
-        else:
-            # find next unvisited site in the future
-            try:
-                next_unvisited = visited_list.index(False, sample_idx)
-            except ValueError:
-                # any thing in the past?
-                try:
-                    next_unvisited = visited_list.index(False, 0, sample_idx)
-                except ValueError:
-                    next_unvisited = None
-        return next_unvisited
+    unvisited = Unvisited_Index([x is None for x in data])
 
     def handle_sample(sample_idx):
         sample = data[sample_idx]
@@ -181,13 +293,13 @@ def data_processing_generator(data, callable, seek_idx):
             next_sample_idx = seek_idx.value
             seek_idx.value = -1
 
-        next_sample_idx = next_unvisited_idx(next_sample_idx)
+        next_sample_idx = unvisited.next_unvisited(next_sample_idx)
 
         if next_sample_idx is None:
             break
         else:
             res = handle_sample(next_sample_idx)
-            visited_list[next_sample_idx] = True
+            unvisited.visit(next_sample_idx)
             yield next_sample_idx, res
             next_sample_idx += 1
 
@@ -9,20 +9,24 @@ See COPYING and COPYING.LESSER for license details.
 ---------------------------------------------------------------------------~(*)
 """
 
+import bisect
 import logging
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
-import itertools
 
 
 class Cache(list):
-    """Cache list is a list of False
-        [False,False,False]
-        with update() 'False' can be overwritten with a result (anything not 'False')
-        self.visited_ranges show ranges where the cache content is False
-        self.positive_ranges show ranges where the cache does not evaluate as 'False' using eval_fn
+    """Cache list is a list of None
+        [None,None,None]
+        with update() 'None' can be overwritten with a result (anything not 'None')
+        self.visited_ranges show ranges where the cache content is not None
+        self.positive_ranges show ranges where the cache does evaluate as 'True' using eval_fn
         this allows to use ranges a a way of showing where no caching has happed (default) or whatever you do with eval_fn
-        self.complete indicated that the cache list has no unknowns aka False
+
+    The ranges are maintained incrementally on update(), such that neither updates
+    nor reading the ranges scan the cache.
     """
 
     def __init__(self, init_list):
@@ -30,36 +34,38 @@ class Cache(list):
 
         self.length = len(self)
 
-        self._positive_ranges = self.recompute_ranges(self.positive_eval_fn)
-        self._visited_ranges = self.recompute_ranges(self.visited_eval_fn)
+        self._visited = bytearray(self.visited_eval_fn(x) for x in self)
+        self._positive = bytearray(self.positive_eval_fn(x) for x in self)
+        self._visited_ranges = Ranges.from_flags(self._visited)
+        self._positive_ranges = Ranges.from_flags(self._positive)
 
     @property
     def visited_ranges(self):
-        return self._visited_ranges
+        return self._visited_ranges.ranges
 
     @property
     def positive_ranges(self):
-        return self._positive_ranges
+        return self._positive_ranges.ranges
 
     def update(self, key, item, force=False):
-        if self[key] is not None:
-            if not force:
-                raise IndexError(
-                    "Can not overwrite an already cached position without force!"
-                )
-            self[key] = item
-            self._visited_ranges = self.recompute_ranges(self.visited_eval_fn)
-            self._positive_ranges = self.recompute_ranges(self.positive_eval_fn)
-
-        elif item is not None:
-            # unvisited
-            self[key] = item
-
-            self.update_ranges(self._visited_ranges, key)
-            if self.positive_eval_fn(item):
-                self.update_ranges(self._positive_ranges, key)
-        else:
+        if item is None:
             raise ValueError("`None` is not a valid value to be assigned in the cache!")
+        if self._visited[key] and not force:
+            raise IndexError(
+                "Can not overwrite an already cached position without force!"
+            )
+        self[key] = item
+
+        if not self._visited[key]:
+            self._visited[key] = True
+            self._visited_ranges.add(key)
+
+        positive = self.positive_eval_fn(item)
+        if positive and not self._positive[key]:
+            self._positive_ranges.add(key)
+        elif not positive and self._positive[key]:
+            self._positive_ranges.remove(key)
+        self._positive[key] = positive
 
     @staticmethod
     def visited_eval_fn(x):
@@ -69,38 +75,112 @@ class Cache(list):
     def positive_eval_fn(x):
         return bool(x)
 
-    def recompute_ranges(self, eval_fn):
-        group_end_index = -1
-        ranges = []
-        for key, group in itertools.groupby(self, eval_fn):
-            group_start_index = group_end_index + 1
-            group_end_index += sum(1 for _ in group)
-            if key:
-                ranges.append([group_start_index, group_end_index])
-        return ranges
 
-    @staticmethod
-    def update_ranges(ranges, index):
-        for _range in ranges:
-            # most common case: extend a range
-            if index == _range[0] - 1:
-                _range[0] = index
-                Cache.merge_ranges(ranges)
-                return
-            elif index == _range[1] + 1:
-                _range[1] = index
-                Cache.merge_ranges(ranges)
-                return
-        # somewhere outside of range proximity
-        ranges.append([index, index])
-        ranges.sort(key=lambda x: x[0])
+class Ranges:
+    """Sorted list of disjoint, inclusive index ranges [[0,1],[3,4]]
+
+    Ranges are looked up by bisection and merged or split in place when single
+    indices are added or removed.
+    """
+
+    def __init__(self, ranges=()):
+        self.ranges = [list(r) for r in ranges]
+        self._starts = [r[0] for r in self.ranges]
 
     @staticmethod
-    def merge_ranges(ranges):
-        for i in range(len(ranges) - 1):
-            if ranges[i][1] == ranges[i + 1][0] - 1:
-                # merge touching fields
-                ranges[i] = [ranges[i][0], ranges[i + 1][1]]
-                # del second field
-                del ranges[i + 1]
-                return
+    def from_flags(flags):
+        flags = np.frombuffer(bytes(flags), dtype=np.uint8).astype(bool)
+        edges = np.flatnonzero(np.diff(np.concatenate(([False], flags, [False]))))
+        return Ranges(zip(edges[::2].tolist(), (edges[1::2] - 1).tolist()))
+
+    def __contains__(self, index):
+        pos = bisect.bisect_right(self._starts, index) - 1
+        return pos >= 0 and index <= self.ranges[pos][1]
+
+    def add(self, index):
+        pos = bisect.bisect_right(self._starts, index)
+        extends_previous = pos > 0 and self.ranges[pos - 1][1] >= index - 1
+        extends_next = pos < len(self.ranges) and self._starts[pos] == index + 1
+        if extends_previous and self.ranges[pos - 1][1] >= index:
+            return  # already contained
+        if extends_previous and extends_next:
+            self.ranges[pos - 1][1] = self.ranges[pos][1]
+            del self.ranges[pos]
+            del self._starts[pos]
+        elif extends_previous:
+            self.ranges[pos - 1][1] = index
+        elif extends_next:
+            self.ranges[pos][0] = index
+            self._starts[pos] = index
+        else:
+            self.ranges.insert(pos, [index, index])
+            self._starts.insert(pos, index)
+
+    def remove(self, index):
+        pos = bisect.bisect_right(self._starts, index) - 1
+        if pos < 0 or index > self.ranges[pos][1]:
+            return  # not contained
+        start, end = self.ranges[pos]
+        if start == end:
+            del self.ranges[pos]
+            del self._starts[pos]
+        elif index == start:
+            self.ranges[pos][0] = index + 1
+            self._starts[pos] = index + 1
+        elif index == end:
+            self.ranges[pos][1] = index - 1
+        else:
+            self.ranges[pos][1] = index - 1
+            self.ranges.insert(pos + 1, [index + 1, end])
+            self._starts.insert(pos + 1, index + 1)
+
+
+class Unvisited_Index:
+    """Finds the next unvisited index in amortized constant time.
+
+    Visited indices point towards the next unvisited index. The pointers are
+    shortened on every lookup, such that long runs of visited indices are skipped
+    without scanning them again.
+    """
+
+    def __init__(self, visited):
+        visited = np.asarray(visited, dtype=bool)
+        self.size = visited.size
+        self.num_unvisited = int(self.size - np.count_nonzero(visited))
+        # self._next[i] == i for unvisited indices, self._next[self.size] == self.size
+        next_idx = np.arange(self.size + 1)
+        next_idx[:-1][visited] += 1
+        self._next = next_idx.tolist()
+
+    def is_visited(self, idx):
+        return self._next[idx] != idx
+
+    def visit(self, idx):
+        if self._next[idx] == idx:
+            self._next[idx] = idx + 1
+            self.num_unvisited -= 1
+
+    def next_unvisited(self, idx):
+        """
+        Starting from the given index, find the next index that has not been
+        visited yet. If no later indices are unvisited, check from the start.
+
+        Returns: Next unvisited index or None if all indices were visited.
+        """
+        if not self.num_unvisited:
+            return None
+        if not 0 <= idx < self.size:
+            idx = 0
+        next_unvisited = self._find(idx)
+        if next_unvisited == self.size:
+            next_unvisited = self._find(0)
+        return next_unvisited
+
+    def _find(self, idx):
+        next_idx = self._next
+        root = idx
+        while next_idx[root] != root:
+            root = next_idx[root]
+        while next_idx[idx] != root:
+            next_idx[idx], idx = root, next_idx[idx]
+        return root
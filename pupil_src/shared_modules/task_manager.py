@@ -16,6 +16,7 @@ from pyglui import ui
 
 import background_helper as bh
 from plugin import Plugin
+from tasklib.background.scheduler import PRIORITY_EXPORT
 
 logger = logging.getLogger(__name__)
 
@@ -242,8 +243,8 @@ class ManagedTask:
 
     def start(self):
         assert self.task_proxy is None
-        self.task_proxy = bh.IPC_Logging_Task_Proxy(
-            self.heading, self.task, args=self.args
+        self.task_proxy = bh.Pooled_Task_Proxy(
+            self.heading, self.task, args=self.args, priority=PRIORITY_EXPORT
         )
 
     def cancel(self):
@@ -13,6 +13,7 @@ import inspect
 
 from tasklib.background.task import BackgroundGeneratorFunction
 from tasklib.background.task import BackgroundRoutine
+from tasklib.background.scheduler import PooledTask, default_scheduler
 from tasklib.background.patches import IPCLoggingPatch, KeyboardInterruptHandlerPatch
 
 
@@ -23,6 +24,7 @@ def create(
     args=None,
     kwargs=None,
     patches=None,
+    priority=None,
 ):
     """
     Creates the right background task for your type of task.
@@ -35,6 +37,7 @@ def create(
     See the docstring for PluginTaskManager.create_background_task()
     (in tasklib.manager.py) for information about the different parameters!
     """
+
     if args is None:
         args = ()
     if kwargs is None:
@@ -45,7 +48,25 @@ def create(
             KeyboardInterruptHandlerPatch(),
         ]
 
-    if inspect.isgeneratorfunction(routine_or_generator_function):
+    if priority is not None:
+        if not inspect.isroutine(routine_or_generator_function):
+            raise TypeError(
+                "Cannot create background task from {}. It must be a "
+                "routine (function, method, lambda) or generator "
+                "function!".format(routine_or_generator_function)
+            )
+        return PooledTask(
+            name,
+            routine_or_generator_function,
+            inspect.isgeneratorfunction(routine_or_generator_function),
+            pass_shared_memory,
+            args,
+            kwargs,
+            patches,
+            priority,
+            default_scheduler(),
+        )
+    elif inspect.isgeneratorfunction(routine_or_generator_function):
         return BackgroundGeneratorFunction(
             name,
             routine_or_generator_function,
@@ -0,0 +1,382 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+
+import heapq
+import itertools
+import logging
+import multiprocessing as mp
+import time
+from collections import namedtuple
+
+from tasklib.background.shared_memory import SharedMemory
+from tasklib.background.task import (
+    SignalHandlingTask,
+    _TaskCanceledSignal,
+    _TaskCompletedSignal,
+    _TaskExceptionSignal,
+    _TaskYieldSignal,
+)
+from tasklib.background.transport import BatchReceiver, BatchSender
+
+logger = logging.getLogger(__name__)
+
+# Queued tasks with lower values are started first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_DEFAULT = 10
+PRIORITY_EXPORT = 20
+
+_TaskAccountingSignal = namedtuple("_TaskAccountingSignal", ["cpu_time", "peak_memory"])
+_Job = namedtuple(
+    "_Job",
+    ["function", "is_generator", "args", "kwargs", "patches", "pass_shared_memory"],
+)
+
+
+class WorkerDiedError(RuntimeError):
+    """Raised for tasks whose worker process terminated unexpectedly."""
+
+    pass
+
+
+class PooledTask(SignalHandlingTask):
+    """
+    Background task that runs on a worker process of a Scheduler.
+
+    Provides the same interface as BackgroundTask. Additionally, the CPU time
+    (seconds) and the peak memory (bytes, sampled periodically while the task
+    yields) of the task are available after it ended.
+    """
+
+    def __init__(
+        self,
+        name,
+        function,
+        is_generator,
+        pass_shared_memory,
+        args,
+        kwargs,
+        patches,
+        priority,
+        scheduler,
+    ):
+        super().__init__()
+        self.name = name
+        self.priority = priority
+        self.cpu_time = None
+        self.peak_memory = None
+        self._job = _Job(
+            function, is_generator, args, kwargs, patches, pass_shared_memory
+        )
+        self._scheduler = scheduler
+        self._worker = None
+        self._cancel_requested = False
+
+    @property
+    def queued(self):
+        """True if the task was started, but waits for a free worker."""
+        return self.started and self._worker is None and not self.ended
+
+    @property
+    def progress(self):
+        if self._worker is None:
+            return 0.0
+        return self._worker.shared_memory.progress
+
+    def start(self):
+        super().start()
+        self._scheduler.submit(self)
+
+    def cancel_gracefully(self):
+        super().cancel_gracefully()
+        self._cancel_requested = True
+        self._scheduler.cancel(self)
+
+    def kill(self, grace_period):
+        super().kill(grace_period)
+        self._cancel_requested = True
+        self._scheduler.kill(self, grace_period)
+        self.on_canceled_or_killed()
+
+    def update(self):
+        super().update()
+        self._scheduler.update()
+
+    def _handle_signal(self, signal):
+        if self._cancel_requested:
+            self._handle_signal_if_canceled(signal)
+        else:
+            self._handle_signal_normally(signal)
+
+
+class _Worker:
+    def __init__(self, context):
+        self.shared_memory = SharedMemory()
+        self.connection, worker_connection = context.Pipe(duplex=True)
+        self.process = context.Process(
+            target=_worker_loop,
+            name="Pupil Worker",
+            args=(worker_connection, self.shared_memory),
+        )
+        self.process.daemon = True
+        self.receiver = BatchReceiver(self.connection)
+        self.process.start()
+        worker_connection.close()
+        self.task = None
+
+    def assign(self, task):
+        self.shared_memory.should_terminate_flag = False
+        self.shared_memory.progress = 0.0
+        self.connection.send(task._job)
+        self.task = task
+        task._worker = self
+
+    def release(self):
+        # Keep the worker referenced by the task, such that its progress remains
+        # readable until the next task is assigned.
+        self.task = None
+
+    def terminate(self):
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join()
+        self.receiver.discard()
+
+
+class Scheduler:
+    """
+    Runs PooledTasks on a bounded pool of reusable worker processes.
+
+    Tasks that are started while all workers are busy wait in a queue ordered by
+    priority. Workers are started when needed and run until shutdown() or until
+    they are killed together with their task.
+
+    Functions and arguments of tasks are pickled to be sent to the workers, i.e.
+    only module-level functions can be used, same as for the "spawn" start method.
+    """
+
+    def __init__(self, max_workers=None, context=None):
+        if max_workers is None:
+            max_workers = max(1, mp.cpu_count() - 1)
+        if context is None:
+            context = mp.get_context()
+        self.max_workers = max_workers
+        self._context = context
+        self._workers = []
+        self._queue = []
+        self._queue_counter = itertools.count()
+        self._canceled_while_queued = []
+        self._updating = False
+
+    @property
+    def num_queued(self):
+        return sum(1 for _, _, task in self._queue if task.queued)
+
+    @property
+    def num_running(self):
+        return sum(1 for worker in self._workers if worker.task is not None)
+
+    def submit(self, task):
+        heapq.heappush(self._queue, (task.priority, next(self._queue_counter), task))
+
+    def cancel(self, task):
+        if task.queued:
+            self._remove_from_queue(task)
+            self._canceled_while_queued.append(task)
+        elif task._worker is not None:
+            task._worker.shared_memory.should_terminate_flag = True
+
+    def kill(self, task, grace_period):
+        if task.queued:
+            self._remove_from_queue(task)
+            return
+        worker = task._worker
+        worker.shared_memory.should_terminate_flag = True
+        deadline = time.monotonic() + (grace_period or 0.0)
+        while worker.task is task:
+            timeout = max(0.0, deadline - time.monotonic())
+            if not worker.receiver.poll(timeout):
+                break
+            try:
+                signal = worker.receiver.recv()
+            except EOFError:
+                break
+            if isinstance(signal, _TaskAccountingSignal):
+                task.cpu_time, task.peak_memory = signal
+            elif not isinstance(signal, _TaskYieldSignal):
+                worker.release()
+        if worker.task is task:
+            logger.debug(f"Terminating worker of task {task.name}")
+            worker.release()
+            worker.terminate()
+            self._workers.remove(worker)
+
+    def update(self):
+        """Dispatches results of running tasks and starts queued tasks."""
+        if self._updating:
+            return
+        self._updating = True
+        try:
+            while self._canceled_while_queued:
+                task = self._canceled_while_queued.pop(0)
+                # the task might have been killed in the meantime
+                if not task.ended:
+                    task.on_canceled_or_killed()
+            for worker in self._workers[:]:
+                self._dispatch_signals(worker)
+            self._start_queued_tasks()
+        finally:
+            self._updating = False
+
+    def shutdown(self):
+        for worker in self._workers:
+            worker.terminate()
+        self._workers = []
+
+    def _remove_from_queue(self, task):
+        self._queue = [entry for entry in self._queue if entry[2] is not task]
+        heapq.heapify(self._queue)
+
+    def _dispatch_signals(self, worker):
+        while worker.task is not None:
+            task = worker.task
+            try:
+                if not worker.receiver.poll(0):
+                    if not worker.process.is_alive():
+                        raise EOFError
+                    return
+                signal = worker.receiver.recv()
+            except (EOFError, OSError):
+                worker.release()
+                worker.terminate()
+                self._workers.remove(worker)
+                task._handle_signal(
+                    _TaskExceptionSignal(
+                        WorkerDiedError(f"Worker of task {task.name} died"), ""
+                    )
+                )
+                return
+            if isinstance(signal, _TaskAccountingSignal):
+                task.cpu_time, task.peak_memory = signal
+                logger.debug(
+                    f"Task {task.name} used {signal.cpu_time:.2f}s CPU time and "
+                    f"{signal.peak_memory / 1e6:.1f}MB memory"
+                )
+                continue
+            if not isinstance(signal, _TaskYieldSignal):
+                worker.release()
+            task._handle_signal(signal)
+
+    def _start_queued_tasks(self):
+        while self._queue:
+            worker = self._free_worker()
+            if worker is None:
+                return
+            _, _, task = heapq.heappop(self._queue)
+            if task.ended:
+                continue
+            try:
+                worker.assign(task)
+            except Exception as err:
+                # e.g. the task cannot be pickled
+                worker.release()
+                task._worker = None
+                task._handle_signal(_TaskExceptionSignal(err, ""))
+
+    def _free_worker(self):
+        for worker in self._workers:
+            if worker.task is None:
+                return worker
+        if len(self._workers) < self.max_workers:
+            worker = _Worker(self._context)
+            self._workers.append(worker)
+            return worker
+        return None
+
+
+_default_scheduler = None
+
+
+def default_scheduler():
+    """The Scheduler shared by all pooled tasks of this process."""
+    global _default_scheduler
+    if _default_scheduler is None:
+        _default_scheduler = Scheduler()
+    return _default_scheduler
+
+
+def _worker_loop(connection, shared_memory):
+    """Executed in background, runs jobs until the connection is closed"""
+    applied_patch_types = set()
+    sender = BatchSender(connection)
+    while True:
+        try:
+            job = connection.recv()
+        except (EOFError, OSError):
+            return
+
+        kwargs = dict(job.kwargs)
+        if job.pass_shared_memory:
+            kwargs["shared_memory"] = shared_memory
+        accounting = _Job_Accounting()
+        try:
+            # patches modify the process environment and only need to run once
+            for patch in job.patches:
+                if type(patch) not in applied_patch_types:
+                    patch.apply()
+                    applied_patch_types.add(type(patch))
+            if job.is_generator:
+                final_signal = _TaskCompletedSignal(return_value=None)
+                for datum in job.function(*job.args, **kwargs):
+                    accounting.sample_memory()
+                    if shared_memory.should_terminate_flag:
+                        final_signal = _TaskCanceledSignal()
+                        break
+                    sender.send(_TaskYieldSignal(datum))
+            else:
+                return_value = job.function(*job.args, **kwargs)
+                final_signal = _TaskCompletedSignal(return_value)
+        except Exception as e:
+            import traceback
+
+            final_signal = _TaskExceptionSignal(e, traceback.format_exc())
+        # a yielded datum that cannot be pickled is reported as exception
+        sender.send_final([accounting.signal(), final_signal], _TaskExceptionSignal)
+
+
+class _Job_Accounting:
+    # seconds between two samples of the memory usage while a job runs
+    memory_sample_interval = 0.5
+
+    def __init__(self):
+        import psutil
+
+        self._process = psutil.Process()
+        self._cpu_start = time.process_time()
+        self._peak_memory = 0
+        self._next_sample_time = 0.0
+        self.sample_memory()
+
+    def sample_memory(self):
+        """Samples the memory usage if the sample interval passed."""
+        now = time.monotonic()
+        if now >= self._next_sample_time:
+            self._sample_memory()
+            self._next_sample_time = now + self.memory_sample_interval
+
+    def _sample_memory(self):
+        self._peak_memory = max(self._peak_memory, self._process.memory_info().rss)
+
+    def signal(self):
+        self._sample_memory()
+        return _TaskAccountingSignal(
+            cpu_time=time.process_time() - self._cpu_start,
+            peak_memory=self._peak_memory,
+        )
@@ -17,6 +17,7 @@ from collections import namedtuple
 from tasklib.interface import TaskInterface
 from tasklib.background.shared_memory import SharedMemory
 from tasklib.background.patches import Patch
+from tasklib.background.transport import BatchReceiver, BatchSender
 
 _TaskYieldSignal = namedtuple("_TaskYieldSignal", "datum")
 _TaskCompletedSignal = namedtuple("_TaskCompletedSignal", "return_value")
@@ -24,7 +25,46 @@ _TaskCanceledSignal = namedtuple("_TaskCanceledSignal", "")
 _TaskExceptionSignal = namedtuple("_TaskExceptionSignal", ["exception", "traceback"])
 
 
-class BackgroundTask(TaskInterface, metaclass=abc.ABCMeta):
+class SignalHandlingTask(TaskInterface, metaclass=abc.ABCMeta):
+    """Base class for tasks that receive signals from a background process."""
+
+    def _handle_signal_normally(self, signal):
+        if isinstance(signal, _TaskCompletedSignal):
+            self.on_completed(signal.return_value)
+            return False
+        elif isinstance(signal, _TaskExceptionSignal):
+            # Unfortunately, background exceptions raised in the foreground don't
+            # have a proper traceback.
+            # If you are debugging an exception, you can print datum.traceback to
+            # get the traceback in the other process. Just uncomment:
+            # print(signal.traceback)
+            # If this happens often, we can consider using tblib to send tracebacks
+            # to the foreground (see https://stackoverflow.com/a/26096355)
+            self.on_exception(signal.exception)
+            return False
+        elif isinstance(signal, _TaskYieldSignal):
+            self.on_yield(signal.datum)
+            return True
+        else:
+            raise ValueError(
+                "Received unknown signal {} from background " "process".format(signal)
+            )
+
+    def _handle_signal_if_canceled(self, signal):
+        if isinstance(
+            signal, (_TaskCanceledSignal, _TaskCompletedSignal, _TaskExceptionSignal)
+        ):
+            self.on_canceled_or_killed()
+            return False
+        elif isinstance(signal, _TaskYieldSignal):
+            return True
+        else:
+            raise ValueError(
+                "Received unknown signal {} from background " "process".format(signal)
+            )
+
+
+class BackgroundTask(SignalHandlingTask, metaclass=abc.ABCMeta):
     def __init__(
         self, name, generator_function, pass_shared_memory, args, kwargs, patches
     ):
@@ -39,7 +79,8 @@ class BackgroundTask(TaskInterface, metaclass=abc.ABCMeta):
             name, generator_function, args, kwargs, pipe_send, patches
         )
         self.process.daemon = True
-        self.pipe_recv = pipe_recv
+        self.pipe_recv = BatchReceiver(pipe_recv)
+        self._pipe_send = pipe_send
 
     @abc.abstractmethod
     def get_process(self, name, generator_function, args, kwargs, pipe_send):
@@ -49,9 +90,15 @@ class BackgroundTask(TaskInterface, metaclass=abc.ABCMeta):
     def progress(self):
         return self._shared_memory.progress
 
+    @property
+    def transport_stats(self):
+        """Throughput of the results received from the background process"""
+        return self.pipe_recv.stats()
+
     def start(self):
         super().start()
         self.process.start()
+        self._pipe_send.close()
 
     def cancel_gracefully(self):
         super().cancel_gracefully()
@@ -67,6 +114,8 @@ class BackgroundTask(TaskInterface, metaclass=abc.ABCMeta):
             self.process.join(grace_period)
         if self.process.is_alive():
             self.process.terminate()
+            self.process.join()
+        self.pipe_recv.discard()
         self.on_canceled_or_killed()
 
     def _ask_process_to_shut_down(self):
@@ -84,41 +133,6 @@ class BackgroundTask(TaskInterface, metaclass=abc.ABCMeta):
             if not should_continue:
                 return
 
-    def _handle_signal_normally(self, signal):
-        if isinstance(signal, _TaskCompletedSignal):
-            self.on_completed(signal.return_value)
-            return False
-        elif isinstance(signal, _TaskExceptionSignal):
-            # Unfortunately, background exceptions raised in the foreground don't
-            # have a proper traceback.
-            # If you are debugging an exception, you can print datum.traceback to
-            # get the traceback in the other process. Just uncomment:
-            # print(signal.traceback)
-            # If this happens often, we can consider using tblib to send tracebacks
-            # to the foreground (see https://stackoverflow.com/a/26096355)
-            self.on_exception(signal.exception)
-            return False
-        elif isinstance(signal, _TaskYieldSignal):
-            self.on_yield(signal.datum)
-            return True
-        else:
-            raise ValueError(
-                "Received unknown signal {} from background " "process".format(signal)
-            )
-
-    def _handle_signal_if_canceled(self, signal):
-        if isinstance(
-            signal, (_TaskCanceledSignal, _TaskCompletedSignal, _TaskExceptionSignal)
-        ):
-            self.on_canceled_or_killed()
-            return False
-        elif isinstance(signal, _TaskYieldSignal):
-            return True
-        else:
-            raise ValueError(
-                "Received unknown signal {} from background " "process".format(signal)
-            )
-
 
 class BackgroundGeneratorFunction(BackgroundTask):
     def get_process(self, name, generator_function, args, kwargs, pipe_send, patches):
@@ -142,22 +156,24 @@ def _generator_wrapper(
     pipe_send, generator_function, args, kwargs, patches, shared_memory
 ):
     """Executed in background, pipes results to foreground"""
+    sender = BatchSender(pipe_send)
     try:
         for patch in patches:
             patch.apply()
         for datum in generator_function(*args, **kwargs):
             if shared_memory.should_terminate_flag:
-                pipe_send.send(_TaskCanceledSignal())
-                return  # will also trigger "finally"
-            pipe_send.send(_TaskYieldSignal(datum))
+                final_signal = _TaskCanceledSignal()
+                break
+            sender.send(_TaskYieldSignal(datum))
+        else:
+            final_signal = _TaskCompletedSignal(return_value=None)
     except Exception as e:
         import traceback
 
-        pipe_send.send(_TaskExceptionSignal(e, traceback.format_exc()))
-    else:
-        pipe_send.send(_TaskCompletedSignal(return_value=None))
-    finally:
-        pipe_send.close()
+        final_signal = _TaskExceptionSignal(e, traceback.format_exc())
+    # a yielded datum that cannot be pickled is reported as exception
+    sender.send_final([final_signal], _TaskExceptionSignal)
+    pipe_send.close()
 
 
 class BackgroundRoutine(BackgroundTask):
@@ -174,17 +190,19 @@ class BackgroundRoutine(BackgroundTask):
 
 
 def _routine_wrapper(pipe_send, routine, args, kwargs, patches):
+    sender = BatchSender(pipe_send)
     try:
         for patch in patches:
             patch.apply()
         return_value = routine(*args, **kwargs)
-        pipe_send.send(_TaskCompletedSignal(return_value))
+        final_signal = _TaskCompletedSignal(return_value)
     except Exception as e:
         import traceback
 
-        pipe_send.send(_TaskExceptionSignal(e, traceback.format_exc()))
-    finally:
-        pipe_send.close()
+        final_signal = _TaskExceptionSignal(e, traceback.format_exc())
+    # a return value that cannot be pickled is reported as exception
+    sender.send_final([final_signal], _TaskExceptionSignal)
+    pipe_send.close()
 
 
 GFY = typing.TypeVar("GFY")  # Generator function yield type
@@ -0,0 +1,271 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+
+import collections
+import threading
+import time
+from collections import namedtuple
+from multiprocessing.reduction import ForkingPickler
+
+import numpy as np
+
+try:
+    from multiprocessing import resource_tracker
+    from multiprocessing import shared_memory as mp_shared_memory
+except ImportError:  # Python < 3.8, arrays are pickled instead
+    mp_shared_memory = None
+
+_SharedArray = namedtuple("_SharedArray", ["name", "dtype", "shape"])
+
+
+class BatchSender:
+    """
+    Sends items through a multiprocessing connection in batches.
+
+    Items are buffered until either max_batch_size items are collected or
+    max_batch_delay seconds passed since the last batch was sent. The first item
+    after a quiet period is sent immediately, and a daemon thread sends batches that
+    would otherwise wait for the next item. Call flush() or send_final() before the
+    connection is closed to send the remaining items!
+
+    If a batch cannot be pickled, all of its items are dropped and the pickling error
+    is raised by the call that sent the batch, or by the next send() or flush() if
+    the batch was sent in the background.
+
+    NumPy arrays of at least shared_array_min_bytes are passed through shared memory
+    instead of the pipe, if they are sent directly or as part of (nested) tuples.
+    """
+
+    def __init__(
+        self,
+        connection,
+        max_batch_size=1000,
+        max_batch_delay=0.05,
+        shared_array_min_bytes=2 ** 16,
+    ):
+        self._connection = connection
+        self._batch = []
+        self._shared_indices = []
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+        self._flush_thread = None
+        self._flush_error = None
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay
+        self.shared_array_min_bytes = shared_array_min_bytes
+
+    def send(self, item):
+        shared_item = self._share_arrays(item, depth=3)
+        with self._lock:
+            self._raise_flush_error()
+            if shared_item is not item:
+                self._shared_indices.append(len(self._batch))
+            self._batch.append(shared_item)
+            if (
+                len(self._batch) >= self.max_batch_size
+                or time.monotonic() - self._last_flush >= self.max_batch_delay
+            ):
+                self._flush()
+            elif self._flush_thread is None:
+                self._flush_thread = threading.Thread(
+                    target=self._flush_delayed_batches, daemon=True
+                )
+                self._flush_thread.start()
+
+    def flush(self):
+        """Sends all buffered items and stops the thread until the next send()."""
+        with self._lock:
+            self._flush_thread = None
+            self._raise_flush_error()
+            self._flush()
+
+    def send_final(self, items, error_item):
+        """Sends the last items and flushes all buffered items.
+
+        If the buffered items cannot be sent, e.g. because one of them cannot be
+        pickled, error_item(exception, traceback) is sent instead.
+        """
+        try:
+            for item in items:
+                self.send(item)
+            self.flush()
+        except Exception as err:
+            import traceback
+
+            self.send(error_item(err, traceback.format_exc()))
+            self.flush()
+
+    def _flush(self):
+        if self._batch:
+            try:
+                message = ForkingPickler.dumps((self._batch, self._shared_indices))
+            except Exception:
+                for idx in self._shared_indices:
+                    _unlink_arrays(self._batch[idx])
+                raise
+            finally:
+                self._batch = []
+                self._shared_indices = []
+            self._connection.send_bytes(message)
+        self._last_flush = time.monotonic()
+
+    def _flush_delayed_batches(self):
+        while True:
+            time.sleep(self.max_batch_delay)
+            with self._lock:
+                if self._flush_thread is not threading.current_thread():
+                    return
+                if (
+                    self._batch
+                    and time.monotonic() - self._last_flush >= self.max_batch_delay
+                ):
+                    try:
+                        self._flush()
+                    except Exception as err:
+                        self._flush_error = err
+                        self._flush_thread = None
+                        return
+
+    def _raise_flush_error(self):
+        if self._flush_error is not None:
+            err, self._flush_error = self._flush_error, None
+            raise err
+
+    def _share_arrays(self, obj, depth):
+        if isinstance(obj, np.ndarray):
+            if mp_shared_memory is None or obj.nbytes < self.shared_array_min_bytes:
+                return obj
+            if obj.dtype.hasobject:
+                return obj
+            try:
+                block = mp_shared_memory.SharedMemory(create=True, size=obj.nbytes)
+            except OSError:
+                return obj
+            # The block stays registered with the resource tracker until the
+            # receiving process unlinks it, such that the tracker cleans it up if
+            # it is never received.
+            shared = np.ndarray(obj.shape, dtype=obj.dtype, buffer=block.buf)
+            shared[...] = obj
+            del shared
+            block.close()
+            return _SharedArray(block.name, obj.dtype, obj.shape)
+        if depth and isinstance(obj, tuple) and not isinstance(obj, _SharedArray):
+            items = [self._share_arrays(item, depth - 1) for item in obj]
+            if any(new is not old for new, old in zip(items, obj)):
+                return obj._make(items) if hasattr(obj, "_make") else tuple(items)
+        return obj
+
+
+class BatchReceiver:
+    """
+    Receives items sent by a BatchSender one by one.
+
+    Mirrors the poll() and recv() interface of the wrapped connection.
+
+    Create the receiver before starting the sending process, such that both share
+    the resource tracker of this process.
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._items = collections.deque()
+        self._num_items = 0
+        self._num_batches = 0
+        self._num_bytes = 0
+        self._num_shared_bytes = 0
+        self._first_recv = None
+        self._last_recv = None
+        if mp_shared_memory is not None:
+            resource_tracker.ensure_running()
+
+    def poll(self, timeout=0.0):
+        return bool(self._items) or self._connection.poll(timeout)
+
+    def recv(self):
+        if not self._items:
+            self._recv_batch()
+        return self._items.popleft()
+
+    def close(self):
+        self._connection.close()
+
+    def discard(self):
+        """Closes the connection and unlinks shared arrays of unread batches.
+
+        Call only after the sending process ended, otherwise this might block on
+        a partially sent batch.
+        """
+        try:
+            while self._connection.poll(0):
+                message = self._connection.recv_bytes()
+                batch, shared_indices = ForkingPickler.loads(message)
+                for idx in shared_indices:
+                    _unlink_arrays(batch[idx])
+        except (EOFError, OSError):
+            pass
+        self._connection.close()
+
+    def stats(self):
+        """Number of received items, batches, bytes, and the item throughput"""
+        duration = 0.0
+        if self._first_recv is not None:
+            duration = self._last_recv - self._first_recv
+        return {
+            "items": self._num_items,
+            "batches": self._num_batches,
+            "bytes": self._num_bytes,
+            "shared_bytes": self._num_shared_bytes,
+            "items_per_second": self._num_items / duration if duration else None,
+        }
+
+    def _recv_batch(self):
+        message = self._connection.recv_bytes()
+        batch, shared_indices = ForkingPickler.loads(message)
+        for idx in shared_indices:
+            batch[idx] = self._restore_arrays(batch[idx])
+
+        now = time.monotonic()
+        if self._first_recv is None:
+            self._first_recv = now
+        self._last_recv = now
+        self._num_items += len(batch)
+        self._num_batches += 1
+        self._num_bytes += len(message)
+        self._items.extend(batch)
+
+    def _restore_arrays(self, obj):
+        if isinstance(obj, _SharedArray):
+            block = mp_shared_memory.SharedMemory(name=obj.name)
+            shared = np.ndarray(obj.shape, dtype=obj.dtype, buffer=block.buf)
+            array = shared.copy()
+            del shared
+            block.close()
+            block.unlink()
+            self._num_shared_bytes += array.nbytes
+            return array
+        if isinstance(obj, tuple):
+            items = [self._restore_arrays(item) for item in obj]
+            return obj._make(items) if hasattr(obj, "_make") else tuple(items)
+        return obj
+
+
+def _unlink_arrays(obj):
+    """Unlinks the shared memory of all shared arrays in obj that were not received"""
+    if isinstance(obj, _SharedArray):
+        try:
+            block = mp_shared_memory.SharedMemory(name=obj.name)
+        except FileNotFoundError:
+            return
+        block.close()
+        block.unlink()
+    elif isinstance(obj, tuple):
+        for item in obj:
+            _unlink_arrays(item)
@@ -10,6 +10,7 @@ See COPYING and COPYING.LESSER for license details.
 """
 
 import tasklib.background
+from tasklib.background.scheduler import PRIORITY_DEFAULT
 
 
 class PluginTaskManager:
@@ -44,6 +45,7 @@ class PluginTaskManager:
         args=None,
         kwargs=None,
         patches=None,
+        priority=PRIORITY_DEFAULT,
     ):
         """
         Creates a managed background task.
@@ -71,6 +73,10 @@ class PluginTaskManager:
                 something in the environment of the new process (see
                 tasklib.background.patches.py).
                 Per default, the IPC logging is patched.
+            priority (int): The task runs on the shared pool of worker processes
+                (see tasklib.background.scheduler.py). Queued tasks with lower
+                priority values are started first, e.g. PRIORITY_INTERACTIVE before
+                PRIORITY_EXPORT. If None, the task runs in a new process instead.
 
         Returns:
             A new task with base class TaskInterface.
@@ -83,6 +89,7 @@ class PluginTaskManager:
             args,
             kwargs,
             patches,
+            priority,
         )
         self._recently_added_tasks.append(task)
         return task
@@ -15,6 +15,7 @@ import os
 import os.path
 import typing as T
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 from multiprocessing import cpu_count
 from time import sleep
 
@@ -210,6 +211,10 @@ class File_Source(Playback_Source, Base_Source):
         show_plugin_menu (bool): enable to show regular capture UI with source selection
     """
 
+    # Number of decoded frames kept around the playhead. Should cover a typical GOP,
+    # such that stepping backwards does not require decoding from the keyframe again.
+    frame_cache_size = 30
+
     def __init__(
         self,
         g_pool,
@@ -243,6 +248,7 @@ class File_Source(Playback_Source, Base_Source):
             # TODO: where does the fallback framerate of 1/20 come from?
             self._frame_rate = 20
         self.buffering = buffered_decoding
+        self._frame_cache = OrderedDict()
         # Load video split for first frame
         self.reset_video()
         self._intrinsics = load_intrinsics(rec, set_name, self.frame_size)
@@ -310,6 +316,20 @@ class File_Source(Playback_Source, Base_Source):
         self.current_container_index = container_index
         self.frame_iterator = self.video_stream.get_frame_iterator()
 
+        # map decoded pts back to lookup indices in order to cache every frame
+        container_idc = np.flatnonzero(
+            self.videoset.lookup.container_idx == container_index
+        )
+        container_pts = self.videoset.lookup.pts[container_idc]
+        order = np.argsort(container_pts, kind="stable")
+        self._container_pts = container_pts[order]
+        self._container_lookup_idc = container_idc[order]
+
+        # Lowest pts that frame_iterator yields next, i.e. the container start, the
+        # keyframe that was seeked to, or the frame after the last decoded frame.
+        # None if unknown, in which case every target requires seeking.
+        self._decoder_pts = self._container_start_pts()
+
     def _get_streams(self, container, should_buffer):
         """Get Video stream from containers."""
         try:
@@ -384,14 +404,29 @@ class File_Source(Playback_Source, Base_Source):
         if target_entry.container_idx == -1:
             return self._get_fake_frame_and_advance(target_entry)
 
+        cached_av_frame = self._get_cached_av_frame(self.target_frame_idx)
+        if cached_av_frame is not None:
+            self.current_frame_idx = self.target_frame_idx
+            self.target_frame_idx += 1
+            return Frame(
+                timestamp=target_entry.timestamp,
+                av_frame=cached_av_frame,
+                index=self.current_frame_idx,
+            )
+
         if target_entry.container_idx != self.current_container_index:
             # Contained index changed, need to load other video split
             self._setup_video(target_entry.container_idx)
+        if not self._can_decode_forward_to(target_entry):
+            # Target lies behind the decoder or beyond the GOP being decoded
+            self._seek_stream(target_entry)
 
         # advance frame iterator until we hit the target frame
         for av_frame in self.frame_iterator:
             if not av_frame:
                 raise EndofVideoError
+            self._decoder_pts = av_frame.pts + 1
+            self._cache_av_frame(av_frame)
             if av_frame.pts == target_entry.pts:
                 break
             elif av_frame.pts < target_entry.pts:
@@ -422,6 +457,59 @@ class File_Source(Playback_Source, Base_Source):
             index=self.current_frame_idx,
         )
 
+    def _get_cached_av_frame(self, frame_idx):
+        try:
+            self._frame_cache.move_to_end(frame_idx)
+        except KeyError:
+            return None
+        return self._frame_cache[frame_idx]
+
+    def _cache_av_frame(self, av_frame):
+        pos = np.searchsorted(self._container_pts, av_frame.pts)
+        if pos == self._container_pts.size or self._container_pts[pos] != av_frame.pts:
+            return
+        frame_idx = int(self._container_lookup_idc[pos])
+        self._frame_cache[frame_idx] = av_frame
+        self._frame_cache.move_to_end(frame_idx)
+        while len(self._frame_cache) > self.frame_cache_size:
+            self._frame_cache.popitem(last=False)
+
+    def _can_decode_forward_to(self, target_entry):
+        """True if decoding from the current position reaches the target frame
+        without passing through more keyframes than seeking would."""
+        if target_entry.container_idx != self.current_container_index:
+            return False
+        if self._decoder_pts is None or target_entry.pts < self._decoder_pts:
+            return False
+        keyframe_pts = self._preceding_keyframe_pts(target_entry)
+        return keyframe_pts <= self._decoder_pts
+
+    def _preceding_keyframe_pts(self, target_entry):
+        keyframe_pts = self.videoset.preceding_keyframe_pts(
+            target_entry.container_idx, target_entry.pts
+        )
+        if keyframe_pts is None:
+            # target precedes all known keyframes, seeking ends up at the start
+            keyframe_pts = self._container_start_pts()
+        return keyframe_pts
+
+    def _container_start_pts(self):
+        if not self._container_pts.size:
+            return None
+        return int(self._container_pts[0])
+
+    def _seek_stream(self, target_entry):
+        try:
+            # explicit conversion to python int required, else:
+            # TypeError: ('Container.seek only accepts integer offset.')
+            self.video_stream.seek(int(target_entry.pts))
+        except av.AVError as e:
+            raise FileSeekError() from e
+        # need to re-initialize frame_iterator at the new seek position
+        self.frame_iterator = self.video_stream.get_frame_iterator()
+        # seeking ends up at the keyframe preceding the target
+        self._decoder_pts = self._preceding_keyframe_pts(target_entry)
+
     def _get_fake_frame_and_advance(self, target_entry):
         self.current_frame_idx = self.target_frame_idx
         self.target_frame_idx += 1
@@ -497,19 +585,23 @@ class File_Source(Playback_Source, Base_Source):
             logger.warning("Seeking to invalid position!")
             return
         if target_entry.container_idx > -1:
-            if target_entry.container_idx != self.current_container_index:
-                self._setup_video(target_entry.container_idx)
-            try:
-                # explicit conversion to python int required, else:
-                # TypeError: ('Container.seek only accepts integer offset.')
-                self.video_stream.seek(int(target_entry.pts))
-            except av.AVError as e:
-                raise FileSeekError() from e
+            if seek_pos in self._frame_cache:
+                # get_frame() will serve the target without touching the decoder
+                pass
+            elif self._can_decode_forward_to(target_entry):
+                # Target lies within the GOP being decoded, seeking would restart
+                # decoding at its keyframe
+                pass
+            else:
+                if target_entry.container_idx != self.current_container_index:
+                    self._setup_video(target_entry.container_idx)
+                self._seek_stream(target_entry)
         else:
             # TODO: Why seek here? Might be inefficient.
             self.video_stream.seek(0)
-        # need to re-initialize frame_iterator at the new seek position
-        self.frame_iterator = self.video_stream.get_frame_iterator()
+            # need to re-initialize frame_iterator at the new seek position
+            self.frame_iterator = self.video_stream.get_frame_iterator()
+            self._decoder_pts = self._container_start_pts()
         self.finished_sleep = 0
         self.target_frame_idx = seek_pos
 
@@ -8,6 +8,7 @@ Lesser General Public License (LGPL v3.0).
 See COPYING and COPYING.LESSER for license details.
 ---------------------------------------------------------------------------~(*)
 """
+import hashlib
 import logging
 import os
 import pathlib as pl
@@ -173,11 +174,134 @@ class InvalidContainerError(RuntimeError):
     pass
 
 
+class VideoIndex(T.NamedTuple):
+    """Per-packet information of a video, in demuxing order"""
+
+    pts: np.ndarray
+    is_keyframe: np.ndarray
+    # byte offset of the packet in the file, -1 if unknown
+    pos: np.ndarray
+
+    @staticmethod
+    def from_container(container) -> "VideoIndex":
+        packets = [
+            (packet.pts, packet.is_keyframe, -1 if packet.pos is None else packet.pos)
+            for packet in container.demux(video=0)
+        ]
+        # last pts is invalid
+        packets = packets[:-1]
+        if not packets:
+            return VideoIndex(
+                np.empty(0, dtype=np.int64),
+                np.empty(0, dtype=bool),
+                np.empty(0, dtype=np.int64),
+            )
+        pts, is_keyframe, pos = zip(*packets)
+        return VideoIndex(
+            np.array(pts, dtype=np.int64),
+            np.array(is_keyframe, dtype=bool),
+            np.array(pos, dtype=np.int64),
+        )
+
+
+class _VideoIndexCache:
+    """
+    Persists a VideoIndex next to its video, such that videos are demuxed only once.
+
+    Cached indices are valid as long as the size and modification time of the video
+    do not change. If only the modification time changed, e.g. because the
+    recording was copied, a fingerprint of the video content is compared instead.
+    Indices are kept in memory as well, such that all File_Sources of a process
+    share them.
+    """
+
+    version = 1
+    fingerprint_chunk_size = 2 ** 20
+
+    def __init__(self):
+        self._indices = {}
+
+    def get(self, video_path: str, build: T.Callable[[], VideoIndex]) -> VideoIndex:
+        stat = os.stat(video_path)
+        key = (stat.st_size, stat.st_mtime_ns)
+        try:
+            cached_key, index = self._indices[video_path]
+        except KeyError:
+            pass
+        else:
+            if cached_key == key:
+                return index
+
+        index = self._load(video_path, key)
+        if index is None:
+            index = build()
+            self._save(video_path, key, index)
+        self._indices[video_path] = key, index
+        return index
+
+    def clear(self):
+        self._indices.clear()
+
+    @staticmethod
+    def index_loc(video_path: str) -> str:
+        return os.path.splitext(video_path)[0] + "_index.npz"
+
+    def _load(self, video_path, key) -> T.Optional[VideoIndex]:
+        try:
+            with np.load(self.index_loc(video_path)) as cache:
+                if cache["version"] != self.version or cache["size"] != key[0]:
+                    return None
+                index = VideoIndex(cache["pts"], cache["is_keyframe"], cache["pos"])
+                if cache["mtime_ns"] == key[1]:
+                    return index
+                fingerprint = str(cache["fingerprint"])
+        except (OSError, KeyError, ValueError):
+            return None
+
+        if fingerprint != self._fingerprint(video_path):
+            return None
+        # video content is unchanged, skip fingerprinting next time
+        self._save(video_path, key, index)
+        return index
+
+    def _save(self, video_path, key, index: VideoIndex):
+        index_loc = self.index_loc(video_path)
+        index_loc_tmp = index_loc + ".writing"
+        try:
+            with open(index_loc_tmp, "wb") as cache_file:
+                np.savez(
+                    cache_file,
+                    version=self.version,
+                    size=key[0],
+                    mtime_ns=key[1],
+                    fingerprint=self._fingerprint(video_path),
+                    **index._asdict(),
+                )
+            os.replace(index_loc_tmp, index_loc)
+        except OSError as err:
+            # e.g. read-only recordings, the index will be built again next time
+            logger.debug(f"Could not save video index {index_loc}: {err}")
+
+    def _fingerprint(self, video_path) -> str:
+        """Hash of the size and of the first and last MiB of the video"""
+        size = os.path.getsize(video_path)
+        fingerprint = hashlib.blake2b(str(size).encode(), digest_size=16)
+        with open(video_path, "rb") as video_file:
+            fingerprint.update(video_file.read(self.fingerprint_chunk_size))
+            video_file.seek(max(0, size - self.fingerprint_chunk_size))
+            fingerprint.update(video_file.read(self.fingerprint_chunk_size))
+        return fingerprint.hexdigest()
+
+
+video_index_cache = _VideoIndexCache()
+
+
 class Video:
-    def __init__(self, path: str) -> None:
+    def __init__(self, path: str, cache_index: bool = False) -> None:
         self.path = path
+        self.cache_index = cache_index
         self.ts = None
-        self._pts = None
+        self._index = None
         self._is_valid = None  # calculated on demand
 
     @property
@@ -218,11 +342,30 @@ class Video:
             return
         self.ts = self._fix_negative_time_jumps(self.ts)
 
-    def load_pts(self, container):
-        packets = container.demux(video=0)
-        # last pts is invalid
-        self._pts = np.array([packet.pts for packet in packets][:-1])
-        return self._pts
+    def load_index(self, container=None) -> VideoIndex:
+        """Packet index of the video, demuxes the video if it is not cached
+
+        Raises:
+            InvalidContainerError: If the video needs to be demuxed but is broken.
+        """
+        if self._index is None:
+
+            def build():
+                return VideoIndex.from_container(container or self.load_container())
+
+            if self.cache_index:
+                self._index = video_index_cache.get(self.path, build)
+            else:
+                self._index = build()
+        return self._index
+
+    def load_pts(self, container=None):
+        return self.load_index(container).pts
+
+    def load_keyframe_pts(self, container=None):
+        """Sorted pts of all keyframes in the container, collected while demuxing"""
+        index = self.load_index(container)
+        return np.sort(index.pts[index.is_keyframe])
 
     @property
     def name(self) -> str:
@@ -245,9 +388,7 @@ class Video:
 
     @property
     def pts(self) -> np.ndarray:
-        if self._pts is None:
-            self.load_pts()
-        return self._pts
+        return self.load_pts()
 
     @staticmethod
     def _fix_negative_time_jumps(timestamps: np.ndarray) -> np.ndarray:
@@ -301,10 +442,14 @@ class VideoSet:
     def lookup_loc(self) -> str:
         return os.path.join(self.rec, f"{self.name}_lookup.npy")
 
+    @property
+    def keyframes_loc(self) -> str:
+        return os.path.join(self.rec, f"{self.name}_keyframes.npy")
+
     def fetch_videos(self) -> T.Iterator[Video]:
         for ext in self.video_exts:
             for loc in Path(self.rec).glob(f"{self.name}*.{ext}"):
-                yield Video(str(loc))
+                yield Video(str(loc), cache_index=True)
 
     def build_lookup(self, fallback_timestamps=None):
         """
@@ -351,14 +496,12 @@ class VideoSet:
         lookup = self._setup_lookup(loaded_ts)
         for container_idx, vid in enumerate(self.videos):
             try:
-                container = vid.load_container()
-
                 # NOTE: For unknown reasons we sometimes have more timestamps than
                 # frames. We don't know how to match non-matching timestamps and
                 # pts, so we might introduce a systematic bias when fixing this! The
                 # idea is to keep only data for timestamps that were recorded, but
                 # leave frames blank if we don't have frame information.
-                vid_pts = vid.load_pts(container)
+                vid_pts = vid.load_pts()
                 npts = vid_pts.size
                 ntime = vid.timestamps.size
                 if npts < ntime:
@@ -390,6 +533,8 @@ class VideoSet:
         # filter gaps (after saving!)
         if not self.fill_gaps:
             self._remove_filled_gaps()
+        # video indices were loaded above already, keyframes come for free
+        self.build_keyframe_index()
 
     def load_lookup(self):
         self.lookup = np.load(self.lookup_loc).view(np.recarray)
@@ -397,11 +542,91 @@ class VideoSet:
             self._remove_filled_gaps()
 
     def load_or_build_lookup(self):
-        try:
+        if os.path.exists(self.lookup_loc) and not self._lookup_is_outdated():
             self.load_lookup()
-        except FileNotFoundError:
+        else:
             self.build_lookup()
 
+    def _lookup_is_outdated(self) -> bool:
+        """True if a video or its timestamps changed after the lookup was saved
+
+        Rebuilding the lookup is cheap, since the videos are not demuxed again as long
+        as their content did not change (see VideoIndex).
+        """
+        lookup_mtime = os.path.getmtime(self.lookup_loc)
+        for vid in self.videos:
+            for loc in (vid.path, vid.ts_loc):
+                try:
+                    if os.path.getmtime(loc) > lookup_mtime:
+                        return True
+                except FileNotFoundError:
+                    pass
+        return False
+
+    @property
+    def keyframes(self) -> np.recarray:
+        """Keyframe pts per container, sorted by (container_idx, pts)
+
+        Loaded lazily, since it is only required for random access. Lookup tables
+        of older recordings do not come with a keyframe index, in which case it is
+        built and saved on first access.
+        """
+        try:
+            return self._keyframes
+        except AttributeError:
+            try:
+                self.load_keyframe_index()
+            except FileNotFoundError:
+                self.build_keyframe_index()
+            return self._keyframes
+
+    def build_keyframe_index(self):
+        """
+        The keyframe index is a np.recarray containing one entry per keyframe:
+            - container_idx: Corresponding self.videos index
+            - pts: Keyframe PTS within the container
+
+        Decoding a frame requires decoding all frames since the preceding
+        keyframe. Use `preceding_keyframe_pts()` to find out if a frame can be
+        reached by decoding forward from the current decoder position.
+        """
+        keyframe_entry = np.dtype([("container_idx", "<i8"), ("pts", "<i8")])
+        per_container = []
+        for container_idx, vid in enumerate(self.videos):
+            try:
+                keyframe_pts = vid.load_keyframe_pts()
+            except InvalidContainerError:
+                continue
+            keyframes = np.empty(keyframe_pts.size, dtype=keyframe_entry)
+            keyframes["container_idx"] = container_idx
+            keyframes["pts"] = keyframe_pts
+            per_container.append(keyframes)
+
+        if per_container:
+            keyframes = np.concatenate(per_container)
+        else:
+            keyframes = np.empty(0, dtype=keyframe_entry)
+        self._keyframes = keyframes.view(np.recarray)
+        if self.videos:
+            np.save(self.keyframes_loc, self._keyframes)
+
+    def load_keyframe_index(self):
+        self._keyframes = np.load(self.keyframes_loc).view(np.recarray)
+
+    def preceding_keyframe_pts(self, container_idx: int, pts: int) -> T.Optional[int]:
+        """PTS of the last keyframe at or before `pts` in the given container
+
+        Returns None if the keyframe is unknown, e.g. for virtual frames.
+        """
+        keyframes = self.keyframes
+        start, stop = np.searchsorted(
+            keyframes.container_idx, [container_idx, container_idx + 1]
+        )
+        idx = np.searchsorted(keyframes.pts[start:stop], pts, side="right") - 1
+        if idx < 0:
+            return None
+        return int(keyframes.pts[start + idx])
+
     def _loaded_ts_sorted(self) -> np.ndarray:
         if not self.videos:
             return np.array([])
@@ -9,13 +9,19 @@ See COPYING and COPYING.LESSER for license details.
 ---------------------------------------------------------------------------~(*)
 """
 
+import collections
 import logging
+import multiprocessing as mp
 import os
 
+from pyglui import ui
+
+import background_helper as bh
 import player_methods as pm
 from task_manager import ManagedTask
 from video_export.plugin_base.video_exporter import VideoExporter
 from pupil_recording import PupilRecording
+from tasklib.background.scheduler import PRIORITY_EXPORT
 
 logger = logging.getLogger(__name__)
 
@@ -23,20 +29,51 @@ logger = logging.getLogger(__name__)
 class World_Video_Exporter(VideoExporter):
     """
     Exports the world video as seen in Player (i.e. including all plugin renderings).
+
+    Long exports are split into frame range segments that are rendered by up to
+    `num_workers` processes in parallel and concatenated afterwards. Every segment
+    runs its own plugin instances, i.e. plugins that depend on previous frames
+    (e.g. to draw a history of gaze or fixations) start without history at each
+    segment boundary. Use a single export process to avoid this.
     """
 
     icon_chr = chr(0xEC09)
     icon_font = "pupil_icons"
+    # Exports are only split into segments of at least this many frames
+    min_segment_frames = 600
 
-    def __init__(self, g_pool):
+    def __init__(self, g_pool, num_workers=None):
         super().__init__(g_pool, max_concurrent_tasks=1)
+        if num_workers is None:
+            num_workers = max(1, mp.cpu_count() - 1)
+        self.num_workers = num_workers
         self.logger = logging.getLogger(__name__)
         self.logger.info("World Video Exporter has been launched.")
         self.rec_name = "world.mp4"
 
+    def get_init_dict(self):
+        return {"num_workers": self.num_workers}
+
     def customize_menu(self):
         self.menu.label = "World Video Exporter"
         super().customize_menu()
+        self.menu.append(
+            ui.Info_Text(
+                "Long videos are split into segments that are rendered in parallel. "
+                "Plugins that show data of previous frames restart at the beginning "
+                "of each segment. Use a single export process to avoid this."
+            )
+        )
+        self.menu.append(
+            ui.Slider(
+                "num_workers",
+                self,
+                min=1,
+                max=mp.cpu_count(),
+                step=1,
+                label="Export processes",
+            )
+        )
 
     def export_data(self, export_range, export_dir):
         rec_dir = self.g_pool.rec_dir
@@ -50,25 +87,66 @@ class World_Video_Exporter(VideoExporter):
         out_file_path = os.path.join(export_dir, self.rec_name)
         pre_computed_eye_data = self._precomputed_eye_data_for_range(export_range)
 
-        args = (
-            rec_dir,
-            user_dir,
-            self.g_pool.min_data_confidence,
-            start_frame,
-            end_frame,
-            plugins,
-            out_file_path,
-            pre_computed_eye_data,
-        )
-        task = ManagedTask(
-            _export_world_video,
-            args=args,
+        segment_ranges = self._segment_ranges(start_frame, end_frame)
+        if len(segment_ranges) == 1:
+            args = (
+                rec_dir,
+                user_dir,
+                self.g_pool.min_data_confidence,
+                start_frame,
+                end_frame,
+                plugins,
+                out_file_path,
+                pre_computed_eye_data,
+            )
+            task = ManagedTask(
+                _export_world_video,
+                args=args,
+                heading="Export World Video",
+                min_progress=0.0,
+                max_progress=end_frame - start_frame,
+            )
+            self.add_task(task)
+            return
+
+        name, ext = os.path.splitext(self.rec_name)
+        segment_args = []
+        segment_paths = []
+        for idx, (segment_start, segment_end) in enumerate(segment_ranges):
+            segment_path = os.path.join(export_dir, f"{name}_segment_{idx:03d}{ext}")
+            segment_args.append(
+                (
+                    rec_dir,
+                    user_dir,
+                    self.g_pool.min_data_confidence,
+                    segment_start,
+                    segment_end,
+                    plugins,
+                    segment_path,
+                    pre_computed_eye_data,
+                    start_frame,
+                )
+            )
+            segment_paths.append(segment_path)
+        task = _Segmented_Export_Task(
+            segment_args,
+            concat_args=(segment_paths, out_file_path, rec_dir),
+            num_workers=int(self.num_workers),
             heading="Export World Video",
-            min_progress=0.0,
             max_progress=end_frame - start_frame,
         )
         self.add_task(task)
 
+    def _segment_ranges(self, start_frame, end_frame):
+        num_frames = end_frame - start_frame
+        num_segments = min(int(self.num_workers), num_frames // self.min_segment_frames)
+        num_segments = max(1, num_segments)
+        bounds = [
+            start_frame + num_frames * idx // num_segments
+            for idx in range(num_segments + 1)
+        ]
+        return list(zip(bounds[:-1], bounds[1:]))
+
     def _precomputed_eye_data_for_range(self, export_range):
         export_window = pm.exact_window(self.g_pool.timestamps, export_range)
         pre_computed = {
@@ -87,10 +165,156 @@ class World_Video_Exporter(VideoExporter):
         return pre_computed
 
 
+class _Segmented_Export_Task(ManagedTask):
+    """
+    A single managed export that renders its segments as sub-tasks.
+
+    Up to `num_workers` segments are exported at the same time. The segments are
+    concatenated when all of them are done.
+    """
+
+    def __init__(self, segment_args, concat_args, num_workers, heading, max_progress):
+        super().__init__(
+            task=None,
+            args=None,
+            heading=heading,
+            min_progress=0.0,
+            max_progress=max_progress,
+        )
+        self.segment_args = segment_args
+        self.concat_args = concat_args
+        self.num_workers = num_workers
+
+    def start(self):
+        assert self.task_proxy is None
+        self.task_proxy = _Segmented_Export_Proxy(
+            self.heading, self.segment_args, self.concat_args, self.num_workers
+        )
+
+
+class _Segmented_Export_Proxy:
+    """
+    Runs the segment tasks of an export and the concatenation afterwards.
+
+    Yields (status, number of exported frames of all segments).
+    Provides the same interface as `background_helper.Task_Proxy`.
+    """
+
+    def __init__(self, name, segment_args, concat_args, num_workers):
+        self.name = name
+        self.concat_args = concat_args
+        self.num_workers = num_workers
+        self.pending = collections.deque(enumerate(segment_args))
+        self.running = {}
+        self.num_segments = len(segment_args)
+        self.num_completed = 0
+        self.exported_frames = [0] * self.num_segments
+        self.concat_task = None
+
+        self._completed = False
+        self._canceled = False
+
+    def _start_segment_tasks(self):
+        while self.pending and len(self.running) < self.num_workers:
+            idx, args = self.pending.popleft()
+            self.running[idx] = bh.Pooled_Task_Proxy(
+                f"{self.name} ({idx + 1}/{self.num_segments})",
+                _export_world_video,
+                args=args,
+                priority=PRIORITY_EXPORT,
+            )
+
+    def fetch(self):
+        """Fetches the progress of all segments or of the concatenation"""
+        if self.completed or self.canceled:
+            return
+
+        if self.concat_task is None:
+            self._start_segment_tasks()
+            for idx, task in list(self.running.items()):
+                for _, exported_frames in task.fetch():
+                    self.exported_frames[idx] = exported_frames
+                if task.canceled:
+                    logger.warning("World video export was canceled.")
+                    self.cancel()
+                    return
+                if task.completed:
+                    del self.running[idx]
+                    self.num_completed += 1
+            status = "Exporting segments ({}/{} done)".format(
+                self.num_completed, self.num_segments
+            )
+            yield status, sum(self.exported_frames)
+            if self.num_completed < self.num_segments:
+                return
+            self.concat_task = bh.Pooled_Task_Proxy(
+                f"{self.name} (concatenating segments)",
+                _concatenate_world_video_segments,
+                args=self.concat_args,
+                priority=PRIORITY_EXPORT,
+            )
+
+        for status, _ in self.concat_task.fetch():
+            yield status, sum(self.exported_frames)
+        if self.concat_task.canceled:
+            self._canceled = True
+        elif self.concat_task.completed:
+            self._completed = True
+
+    def cancel(self, timeout=1):
+        for task in self.running.values():
+            task.cancel(timeout)
+        self.running = {}
+        self.pending.clear()
+        if self.concat_task is not None:
+            self.concat_task.cancel(timeout)
+        if not self.completed:
+            self._canceled = True
+
+    @property
+    def completed(self):
+        return self._completed
+
+    @property
+    def canceled(self):
+        return self._canceled
+
+
 class GlobalContainer(object):
     pass
 
 
+def _concatenate_world_video_segments(segment_paths, out_file_path, rec_dir):
+    from av_writer import concatenate_segments
+
+    PID = str(os.getpid())
+    logger = logging.getLogger(__name__ + " with pid: " + PID)
+    yield "Concatenating video segments with pid {}".format(PID), 0
+
+    segment_paths = [path for path in segment_paths if os.path.isfile(path)]
+    if not segment_paths:
+        warn = "No video segments were exported."
+        logger.warning(warn)
+        yield warn, 0
+        return
+
+    if os.path.isfile(out_file_path):
+        logger.warning("Video out file already exsists. I will overwrite!")
+        os.remove(out_file_path)
+
+    for num_concatenated in concatenate_segments(
+        segment_paths, out_file_path, audio_dir=rec_dir, timestamp_export_format="all"
+    ):
+        yield "Concatenating video segments", num_concatenated
+
+    for path in segment_paths:
+        os.remove(path)
+        os.remove(os.path.splitext(path)[0] + "_timestamps.npy")
+
+    logger.info("Export done: Concatenated segments to {}".format(out_file_path))
+    yield "Export done.", len(segment_paths)
+
+
 def _export_world_video(
     rec_dir,
     user_dir,
@@ -100,17 +324,22 @@ def _export_world_video(
     plugin_initializers,
     out_file_path,
     pre_computed_eye_data,
+    export_start_frame=None,
 ):
     """
     Simulates the generation for the world video and saves a certain time range as a video.
     It simulates a whole g_pool such that all plugins run as normal.
+
+    If `export_start_frame` is given, the range is exported as a segment of a larger
+    export starting at that frame: The video is written without audio and with pts
+    relative to the export start, such that segments can be concatenated.
     """
     from glob import glob
     from time import time
 
     import file_methods as fm
     import player_methods as pm
-    from av_writer import MPEG_Audio_Writer
+    from av_writer import MPEG_Audio_Writer, MPEG_Writer
 
     # we are not importing manual gaze correction. In Player corrections have already been applied.
     # in batch exporter this plugin makes little sense.
@@ -211,9 +440,18 @@ def _export_world_video(
         )
 
         # setup of writer
-        writer = MPEG_Audio_Writer(
-            out_file_path, start_time_synced=trimmed_timestamps[0], audio_dir=rec_dir
-        )
+        if export_start_frame is None:
+            writer = MPEG_Audio_Writer(
+                out_file_path,
+                start_time_synced=trimmed_timestamps[0],
+                audio_dir=rec_dir,
+            )
+            timestamp_export_format = "all"
+        else:
+            writer = MPEG_Writer(
+                out_file_path, start_time_synced=timestamps[export_start_frame]
+            )
+            timestamp_export_format = "npy"
 
         cap.seek_to_frame(start_frame)
 
@@ -278,7 +516,7 @@ def _export_world_video(
             current_frame += 1
             yield "Exporting with pid {}".format(PID), current_frame
 
-        writer.close(timestamp_export_format="all")
+        writer.close(timestamp_export_format=timestamp_export_format)
 
         duration = time() - start_time
         effective_fps = float(current_frame) / duration
@@ -19,6 +19,8 @@ class OverlayManager(SingleFileStorage):
     def __init__(self, rec_dir, plugin):
         super().__init__(rec_dir, plugin)
         self._overlays = []
+        # the world video exporter runs without seek control and decodes in-place
+        self._seek_control = getattr(plugin.g_pool, "seek_control", None)
         self._load_from_disk()
         self._patch_on_cleanup(plugin)
 
@@ -31,13 +33,14 @@ class OverlayManager(SingleFileStorage):
         return Configuration
 
     def add(self, item):
-        overlay = OverlayRenderer(item)
+        overlay = OverlayRenderer(item, seek_control=self._seek_control)
         self._overlays.append(overlay)
 
     def delete(self, item):
         for overlay in self._overlays.copy():
             if overlay.config is item:
                 self._overlays.remove(overlay)
+                overlay.cleanup()
 
     @property
     def items(self):
@@ -53,8 +56,13 @@ class OverlayManager(SingleFileStorage):
 
     def remove_overlay(self, overlay):
         self._overlays.remove(overlay)
+        overlay.cleanup()
         self.save_to_disk()
 
+    def cleanup_overlays(self):
+        for overlay in self._overlays:
+            overlay.cleanup()
+
     def _patch_on_cleanup(self, plugin):
         """Patches cleanup observer to trigger on get_init_dict().
 
@@ -83,6 +83,10 @@ class Eye_Overlay(Observable, Plugin):
         self.ui.teardown()
         self.remove_menu()
 
+    def cleanup(self):
+        self.eye0.cleanup()
+        self.eye1.cleanup()
+
     def _setup_eye(self, eye_id, prefilled_config):
         video_path = self._video_path_for_eye(eye_id)
         prefilled_config["video_path"] = video_path
@@ -90,7 +94,11 @@ class Eye_Overlay(Observable, Plugin):
         prefilled_config["alpha"] = self.alpha
         config = Configuration(**prefilled_config)
         overlay = EyeOverlayRenderer(
-            config, self.show_ellipses, self.make_current_pupil_datum_getter(eye_id)
+            config,
+            self.show_ellipses,
+            self.make_current_pupil_datum_getter(eye_id),
+            # the world video exporter runs without seek control and decodes in-place
+            seek_control=getattr(self.g_pool, "seek_control", None),
         )
         return overlay
 
@@ -78,3 +78,6 @@ class Video_Overlay(Observable, Plugin):
     def deinit_ui(self):
         self.ui.teardown()
         self.remove_menu()
+
+    def cleanup(self):
+        self.manager.cleanup_overlays()
@@ -56,6 +56,9 @@ class PupilRenderer(ImageManipulator):
         if parameter and not is_fake_frame:
             pupil_position = self.pupil_getter()
             if pupil_position:
+                # frame fetchers return the same frame for repeated requests, do
+                # not draw into the image of the frame
+                image = image.copy()
                 self.render_pupil(image, pupil_position)
         return image
 
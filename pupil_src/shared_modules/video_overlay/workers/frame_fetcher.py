@@ -9,11 +9,14 @@ See COPYING and COPYING.LESSER for license details.
 ---------------------------------------------------------------------------~(*)
 """
 
+import collections
 import logging
+import math
+import threading
 from types import SimpleNamespace
 
 import player_methods as pm
-from video_capture import EndofVideoError, File_Source
+from video_capture import EndofVideoError, File_Source, FileSeekError
 
 logger = logging.getLogger(__name__)
 
@@ -47,3 +50,211 @@ class FrameFetcher:
             except EndofVideoError:
                 logger.info("End of video {}.".format(self.source.source_path))
         return self.current_frame
+
+    def cleanup(self):
+        self.source.cleanup()
+
+
+class PrefetchingFrameFetcher:
+    """
+    Decodes frames ahead of the playhead on a background thread.
+
+    Requests are served from an LRU cache of decoded frames, which is limited to
+    cache_budget bytes of image data. During playback, requests do not wait for the
+    decoder. Instead, the closest decoded frame is returned while the decoder thread
+    catches up. Frames are read ahead in the direction of the recent requests, and
+    the read-ahead window covers readahead_duration seconds of playback at the
+    current playback speed. While playback is paused, requests wait up to max_wait
+    seconds for the exact frame.
+
+    The decoder thread owns the File_Source. Only read its static properties from
+    other threads.
+    """
+
+    def __init__(
+        self,
+        video_path,
+        seek_control,
+        cache_budget=64 * 1024 ** 2,
+        readahead_duration=0.5,
+        max_wait=1.0,
+    ):
+        self.source = File_Source(
+            SimpleNamespace(), source_path=video_path, timing=None, fill_gaps=True
+        )
+        if not self.source.initialised:
+            raise FileNotFoundError(video_path)
+        self.seek_control = seek_control
+        self.cache_budget = cache_budget
+        self.readahead_duration = readahead_duration
+        self.max_wait = max_wait
+
+        timestamps = self.source.timestamps
+        self._num_frames = len(timestamps)
+        if self._num_frames > 1 and timestamps[-1] > timestamps[0]:
+            self._fps = (self._num_frames - 1) / (timestamps[-1] - timestamps[0])
+        else:
+            self._fps = 1.0
+
+        self.current_frame = self.source.get_frame()
+        self._max_cached_frames = max(
+            2, self.cache_budget // max(1, self.current_frame.img.nbytes)
+        )
+        self._cache = collections.OrderedDict()
+        self._cache_bytes = 0
+        self._failed_indices = set()
+        self._cache_frame(self.current_frame)
+
+        self._target_idx = self.current_frame.index
+        self._direction = 1
+        self._window = 1
+        self._stopped = False
+        self._num_requests = 0
+        self._num_exact = 0
+        self._num_decoded = 1
+
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._decode_ahead,
+            name="Frame Prefetcher {}".format(video_path),
+            daemon=True,
+        )
+        self._thread.start()
+
+    def closest_frame_to_ts(self, ts):
+        closest_idx = pm.find_closest(self.source.timestamps, ts)
+        return self.frame_for_idx(closest_idx)
+
+    def frame_for_idx(self, requested_frame_idx):
+        requested_frame_idx = int(requested_frame_idx)
+        playing = self.seek_control.play
+        with self._condition:
+            self._request(requested_frame_idx)
+            self._num_requests += 1
+            frame = self._cached_frame(requested_frame_idx)
+            if frame is None and not playing:
+                self._condition.wait_for(
+                    lambda: self._is_ready(requested_frame_idx), timeout=self.max_wait
+                )
+                frame = self._cached_frame(requested_frame_idx)
+            if frame is None:
+                frame = self._closest_cached_frame(requested_frame_idx)
+            else:
+                self._num_exact += 1
+        if frame is not None:
+            self.current_frame = frame
+        return self.current_frame
+
+    def stats(self):
+        """Request and cache counters, e.g. to judge the size of the cache budget"""
+        with self._condition:
+            return {
+                "requests": self._num_requests,
+                "exact": self._num_exact,
+                "closest": self._num_requests - self._num_exact,
+                "decoded": self._num_decoded,
+                "cached_frames": len(self._cache),
+                "cached_bytes": self._cache_bytes,
+            }
+
+    def cleanup(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        self._thread.join()
+        self.source.cleanup()
+
+    def _request(self, frame_idx):
+        if frame_idx > self._target_idx:
+            self._direction = 1
+        elif frame_idx < self._target_idx:
+            self._direction = -1
+        window = math.ceil(
+            self.readahead_duration * self.seek_control.playback_speed * self._fps
+        )
+        self._window = max(1, min(window, self._max_cached_frames // 2))
+        if frame_idx != self._target_idx:
+            self._target_idx = frame_idx
+            self._condition.notify_all()
+
+    def _is_ready(self, frame_idx):
+        return (
+            self._stopped
+            or frame_idx in self._cache
+            or frame_idx in self._failed_indices
+        )
+
+    def _cached_frame(self, frame_idx):
+        try:
+            self._cache.move_to_end(frame_idx)
+        except KeyError:
+            return None
+        return self._cache[frame_idx]
+
+    def _closest_cached_frame(self, frame_idx):
+        if not self._cache:
+            return None
+        closest_idx = min(self._cache, key=lambda idx: abs(idx - frame_idx))
+        return self._cached_frame(closest_idx)
+
+    def _cache_frame(self, frame):
+        if frame.index in self._cache:
+            self._cache_bytes -= self._cache[frame.index].img.nbytes
+        self._cache[frame.index] = frame
+        self._cache.move_to_end(frame.index)
+        self._cache_bytes += frame.img.nbytes
+        while self._cache_bytes > self.cache_budget and len(self._cache) > 1:
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_bytes -= evicted.img.nbytes
+
+    def _next_missing_idx(self):
+        """Target frame first, then the read-ahead window in decoding order"""
+        if not self._is_ready(self._target_idx):
+            return self._target_idx
+        if self._direction > 0:
+            start = self._target_idx + 1
+            stop = min(self._target_idx + self._window, self._num_frames)
+        else:
+            # decode backwards windows front to back, decoding is sequential
+            start = max(self._target_idx - self._window + 1, 0)
+            stop = self._target_idx
+        for frame_idx in range(start, stop):
+            if not self._is_ready(frame_idx):
+                return frame_idx
+        return None
+
+    def _decode_ahead(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._stopped or self._next_missing_idx() is not None
+                )
+                if self._stopped:
+                    return
+                frame_idx = self._next_missing_idx()
+
+            frame = self._decode(frame_idx)
+
+            with self._condition:
+                if frame is not None:
+                    self._cache_frame(frame)
+                    self._num_decoded += 1
+                if frame is None or frame.index != frame_idx:
+                    self._failed_indices.add(frame_idx)
+                self._condition.notify_all()
+
+    def _decode(self, frame_idx):
+        try:
+            if frame_idx != self.source.get_frame_index() + 1:
+                self.source.seek_to_frame(frame_idx)
+            frame = self.source.get_frame()
+        except (EndofVideoError, FileSeekError):
+            logger.info(
+                "Could not decode frame {} of {}.".format(
+                    frame_idx, self.source.source_path
+                )
+            )
+            return None
+        # convert in the background, the overlay renderer reads the BGR image
+        frame.img
+        return frame
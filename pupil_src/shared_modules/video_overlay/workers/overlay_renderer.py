@@ -18,26 +18,37 @@ from observable import Observable
 import video_overlay.utils.image_manipulation as IM
 from video_overlay.utils.constraints import InclusiveConstraint
 from video_overlay.models.config import Configuration
-from video_overlay.workers.frame_fetcher import FrameFetcher
+from video_overlay.workers.frame_fetcher import FrameFetcher, PrefetchingFrameFetcher
 
 logger = logging.getLogger(__name__)
 
 
 class OverlayRenderer:
-    def __init__(self, config):
+    def __init__(self, config, seek_control=None):
+        """Frames are prefetched during playback if seek_control is given."""
         self.config = config
+        self.seek_control = seek_control
         self.attempt_to_load_video()
         self.pipeline = self.setup_pipeline()
 
     def attempt_to_load_video(self):
         try:
-            self.video = FrameFetcher(self.config.video_path)
+            if self.seek_control is None:
+                self.video = FrameFetcher(self.config.video_path)
+            else:
+                self.video = PrefetchingFrameFetcher(
+                    self.config.video_path, self.seek_control
+                )
             self.valid_video_loaded = True
         except FileNotFoundError:
             logger.debug("Could not load overlay: {}".format(self.config.video_path))
             self.valid_video_loaded = False
         return self.valid_video_loaded
 
+    def cleanup(self):
+        if self.valid_video_loaded:
+            self.video.cleanup()
+
     def setup_pipeline(self):
         return [
             (self.config.scale, IM.ScaleTransform()),
@@ -86,7 +97,7 @@ class OverlayRenderer:
 
 
 class EyeOverlayRenderer(OverlayRenderer):
-    def __init__(self, config, should_render_pupil_data, pupil_getter):
-        super().__init__(config)
+    def __init__(self, config, should_render_pupil_data, pupil_getter, **kwargs):
+        super().__init__(config, **kwargs)
         pupil_renderer = (should_render_pupil_data, IM.PupilRenderer(pupil_getter))
         self.pipeline.insert(0, pupil_renderer)
@@ -110,6 +110,18 @@ class Msg_Receiver(ZMQ_Socket):
         payload = self.deserialize_payload(*remaining_frames)
         return topic, payload
 
+    def recv_serialized(self):
+        """Recv a message with topic, serialized payload, and extra frames.
+
+        Topic is a utf-8 encoded string. Returned as unicode object.
+        Payload is returned as msgpack serialized bytes. Use deserialize_payload()
+        to get the payload dict.
+        Any additional message frames are returned as a list.
+        """
+        topic = self.recv_topic()
+        payload_serialized, *extra_frames = self.recv_remaining_frames()
+        return topic, payload_serialized, extra_frames
+
     def recv_topic(self):
         return self.socket.recv_string()
 
@@ -156,19 +168,30 @@ class Msg_Streamer(ZMQ_Socket):
         if "__raw_data__" not in payload:
             # IMPORTANT: serialize first! Else if there is an exception
             # the next message will have an extra prepended frame
-            serialized_payload = serializer.packb(payload, use_bin_type=True)
-            self.socket.send_string(payload["topic"], flags=zmq.SNDMORE)
-            self.socket.send(serialized_payload)
+            serialized_payload = self.serialize_payload(payload)
+            self.send_serialized(payload["topic"], serialized_payload)
         else:
             extra_frames = payload.pop("__raw_data__")
             assert isinstance(extra_frames, (list, tuple))
             self.socket.send_string(payload["topic"], flags=zmq.SNDMORE)
-            serialized_payload = serializer.packb(payload, use_bin_type=True)
+            serialized_payload = self.serialize_payload(payload)
             self.socket.send(serialized_payload, flags=zmq.SNDMORE)
             for frame in extra_frames[:-1]:
                 self.socket.send(frame, flags=zmq.SNDMORE, copy=True)
             self.socket.send(extra_frames[-1], copy=True)
 
+    def serialize_payload(self, payload):
+        return serializer.packb(payload, use_bin_type=True)
+
+    def send_serialized(self, topic, payload_serialized):
+        """Send a message with topic and a payload that was serialized already.
+
+        Use serialize_payload() to serialize a payload dict, e.g. to reuse the
+        serialized payload for recording.
+        """
+        self.socket.send_string(topic, flags=zmq.SNDMORE)
+        self.socket.send(payload_serialized)
+
 
 class Msg_Dispatcher(Msg_Streamer):
     """
@@ -0,0 +1,126 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+# Compares the calibration matching in `calibration_routines.data_processing` to
+# the previous per-reference loop.
+#
+# Usage: python pupil_src/tests/benchmarks/bench_calibration_matching.py [ref_count]
+import importlib.util
+import os
+import sys
+import timeit
+
+import numpy as np
+
+shared_modules = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "..", "shared_modules")
+)
+sys.path.insert(0, shared_modules)
+
+# load the module directly, the calibration_routines package requires a GUI
+spec = importlib.util.spec_from_file_location(
+    "data_processing",
+    os.path.join(shared_modules, "calibration_routines", "data_processing.py"),
+)
+dp = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(dp)
+
+
+def find_nearest_idx(array, value):
+    idx = np.searchsorted(array, value, side="left")
+    try:
+        if abs(value - array[idx - 1]) < abs(value - array[idx]):
+            return idx - 1
+        else:
+            return idx
+    except IndexError:
+        return idx - 1
+
+
+def closest_matches_binocular_loop(ref_pts, pupil0, pupil1, max_dispersion=1 / 15.0):
+    pupil0_ts = np.array([p["timestamp"] for p in pupil0])
+    pupil1_ts = np.array([p["timestamp"] for p in pupil1])
+
+    matched = []
+    for r in ref_pts:
+        closest_p0 = pupil0[find_nearest_idx(pupil0_ts, r["timestamp"])]
+        closest_p1 = pupil1[find_nearest_idx(pupil1_ts, r["timestamp"])]
+        dispersion = max(
+            closest_p0["timestamp"], closest_p1["timestamp"], r["timestamp"]
+        ) - min(closest_p0["timestamp"], closest_p1["timestamp"], r["timestamp"])
+        if dispersion < max_dispersion:
+            matched.append({"ref": r, "pupil": closest_p0, "pupil1": closest_p1})
+    return matched
+
+
+def closest_matches_monocular_loop(ref_pts, pupil, max_dispersion=1 / 15.0):
+    pupil_ts = np.array([p["timestamp"] for p in pupil])
+
+    matched = []
+    for r in ref_pts:
+        closest_p = pupil[find_nearest_idx(pupil_ts, r["timestamp"])]
+        dispersion = max(closest_p["timestamp"], r["timestamp"]) - min(
+            closest_p["timestamp"], r["timestamp"]
+        )
+        if dispersion < max_dispersion:
+            matched.append({"ref": r, "pupil": closest_p})
+    return matched
+
+
+def main(ref_count=100_000):
+    # 30 Hz reference locations against 200 Hz binocular pupil data
+    duration = ref_count / 30
+    rng = np.random.RandomState(0)
+    ref_pts = [{"timestamp": ts} for ts in np.sort(rng.uniform(0, duration, ref_count))]
+    pupil0, pupil1 = (
+        [{"timestamp": ts} for ts in np.sort(rng.uniform(0, duration, num))]
+        for num in (int(duration * 200),) * 2
+    )
+    ref_ts, pupil0_ts, pupil1_ts = (
+        dp._extract_field(data, "timestamp") for data in (ref_pts, pupil0, pupil1)
+    )
+
+    assert closest_matches_binocular_loop(
+        ref_pts, pupil0, pupil1
+    ) == dp.closest_matches_binocular(ref_pts, pupil0, pupil1)
+    assert closest_matches_monocular_loop(
+        ref_pts, pupil0
+    ) == dp.closest_matches_monocular(ref_pts, pupil0)
+
+    print(f"{ref_count} reference points, 2 x {len(pupil0)} pupil datums")
+    for name, func in (
+        (
+            "binocular loop",
+            lambda: closest_matches_binocular_loop(ref_pts, pupil0, pupil1),
+        ),
+        (
+            "closest_matches_binocular",
+            lambda: dp.closest_matches_binocular(ref_pts, pupil0, pupil1),
+        ),
+        (
+            "closest_matches_binocular_idc",
+            lambda: dp.closest_matches_binocular_idc(ref_ts, pupil0_ts, pupil1_ts),
+        ),
+        ("monocular loop", lambda: closest_matches_monocular_loop(ref_pts, pupil0)),
+        (
+            "closest_matches_monocular",
+            lambda: dp.closest_matches_monocular(ref_pts, pupil0),
+        ),
+        (
+            "closest_matches_monocular_idc",
+            lambda: dp.closest_matches_monocular_idc(ref_ts, pupil0_ts),
+        ),
+    ):
+        seconds = min(timeit.repeat(func, number=1, repeat=3))
+        print(f"{name:>40}: {seconds:.4f} s")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,77 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+# Compares `player_methods.correlate_data` to the previous per-datum loop.
+#
+# Usage: python pupil_src/tests/benchmarks/bench_correlate_data.py [datum_count]
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(
+    0,
+    os.path.abspath(
+        os.path.join(os.path.dirname(__file__), "..", "..", "shared_modules")
+    ),
+)
+import player_methods as pm  # noqa: E402
+
+
+def correlate_data_loop(data, timestamps):
+    timestamps = list(timestamps)
+    data_by_frame = [[] for i in timestamps]
+    frame_idx = 0
+    data_index = 0
+    data.sort(key=lambda d: d["timestamp"])
+    while True:
+        try:
+            datum = data[data_index]
+            ts = (timestamps[frame_idx] + timestamps[frame_idx + 1]) / 2.0
+        except IndexError:
+            break
+        if datum["timestamp"] <= ts:
+            data_by_frame[frame_idx].append(datum)
+            data_index += 1
+        else:
+            frame_idx += 1
+    return data_by_frame
+
+
+def main(datum_count=1_000_000):
+    # 200 Hz binocular pupil data against a 30 Hz world camera
+    duration = datum_count / 400
+    rng = np.random.RandomState(0)
+    frame_ts = np.arange(0, duration, 1 / 30) + rng.uniform(0, 1e-3)
+    data = [{"timestamp": ts} for ts in rng.uniform(0, duration, datum_count)]
+    data_ts = np.sort([datum["timestamp"] for datum in data])
+
+    def run_loop():
+        correlate_data_loop(list(data), frame_ts)
+
+    def run_vectorized():
+        pm.correlate_data(list(data), frame_ts)
+
+    def run_idc():
+        pm.correlate_data_idc(data_ts, frame_ts)
+
+    print(f"{datum_count} datums, {len(frame_ts)} frames")
+    for name, func in (
+        ("per-datum loop", run_loop),
+        ("correlate_data", run_vectorized),
+        ("correlate_data_idc (sorted timestamps)", run_idc),
+    ):
+        seconds = min(timeit.repeat(func, number=1, repeat=3))
+        print(f"{name:>40}: {seconds:.4f} s")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
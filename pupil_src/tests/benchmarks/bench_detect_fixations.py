@@ -0,0 +1,175 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+# Compares `fixation_detector.detect_fixations` with pre-computed gaze vectors and
+# incremental dispersion updates to the previous queue based detection, which
+# recomputes the dispersion from scratch for every window change.
+#
+# Usage: python pupil_src/tests/benchmarks/bench_detect_fixations.py [duration_s]
+import os
+import sys
+import time
+from collections import deque
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(
+    0,
+    os.path.abspath(
+        os.path.join(os.path.dirname(__file__), "..", "..", "shared_modules")
+    ),
+)
+import file_methods as fm  # noqa: E402
+import fixation_detector as fd  # noqa: E402
+from camera_models import Dummy_Camera  # noqa: E402
+
+
+def detect_fixations_by_queue(
+    capture, gaze_data, max_dispersion, min_duration, max_duration, min_data_confidence
+):
+    yield "Detecting fixations...", ()
+    gaze_data = (
+        fm.Serialized_Dict(msgpack_bytes=serialized) for serialized in gaze_data
+    )
+    gaze_data = [
+        datum for datum in gaze_data if datum["confidence"] > min_data_confidence
+    ]
+    if not gaze_data:
+        return "Fixation detection failed", ()
+
+    method = (
+        fd.FixationDetectionMethod.GAZE_3D
+        if fd.can_use_3d_gaze_mapping(gaze_data)
+        else fd.FixationDetectionMethod.GAZE_2D
+    )
+    fixation_result = fd.Fixation_Result_Factory()
+
+    working_queue = deque()
+    remaining_gaze = deque(gaze_data)
+
+    while remaining_gaze:
+        # check if working_queue contains enough data
+        if (
+            len(working_queue) < 2
+            or (working_queue[-1]["timestamp"] - working_queue[0]["timestamp"])
+            < min_duration
+        ):
+            datum = remaining_gaze.popleft()
+            working_queue.append(datum)
+            continue
+
+        # min duration reached, check for fixation
+        dispersion = fd.gaze_dispersion(capture, working_queue, method)
+        if dispersion > max_dispersion:
+            # not a fixation, move forward
+            working_queue.popleft()
+            continue
+
+        left_idx = len(working_queue)
+
+        # minimal fixation found. collect maximal data
+        # to perform binary search for fixation end
+        while remaining_gaze:
+            datum = remaining_gaze[0]
+            if datum["timestamp"] > working_queue[0]["timestamp"] + max_duration:
+                break  # maximum data found
+            working_queue.append(remaining_gaze.popleft())
+
+        # check for fixation with maximum duration
+        dispersion = fd.gaze_dispersion(capture, working_queue, method)
+        if dispersion <= max_dispersion:
+            fixation = fixation_result.from_data(
+                dispersion, method, working_queue, capture.timestamps
+            )
+            yield "Detecting fixations...", fixation
+            working_queue.clear()  # discard old Q
+            continue
+
+        slicable = list(working_queue)  # deque does not support slicing
+        right_idx = len(working_queue)
+
+        # binary search
+        while left_idx < right_idx - 1:
+            middle_idx = (left_idx + right_idx) // 2
+            dispersion = fd.gaze_dispersion(capture, slicable[: middle_idx + 1], method)
+            if dispersion <= max_dispersion:
+                left_idx = middle_idx
+            else:
+                right_idx = middle_idx
+
+        # left_idx-1 is last valid base datum
+        final_base_data = slicable[:left_idx]
+        to_be_placed_back = slicable[left_idx:]
+        dispersion_result = fd.gaze_dispersion(capture, final_base_data, method)
+
+        fixation = fixation_result.from_data(
+            dispersion_result, method, final_base_data, capture.timestamps
+        )
+        yield "Detecting fixations...", fixation
+        working_queue.clear()  # clear queue
+        remaining_gaze.extendleft(reversed(to_be_placed_back))
+
+    yield "Fixation detection complete", ()
+
+
+def synthetic_gaze_stream(duration_s, rate=200.0, with_3d=True, seed=0):
+    """Serialized gaze data alternating between fixations and saccades"""
+    rng = np.random.RandomState(seed)
+    timestamps = np.arange(0.0, duration_s, 1.0 / rate)
+    target = np.array([0.0, 0.0, 500.0])
+    next_saccade = 0.0
+    gaze_data = []
+    for ts in timestamps:
+        if ts >= next_saccade:
+            target = np.array([*rng.uniform(-200.0, 200.0, 2), 500.0])
+            next_saccade = ts + rng.uniform(0.1, 0.6)
+        point = target + rng.normal(scale=2.0, size=3)
+        datum = {
+            "topic": "gaze.3d.01." if with_3d else "gaze.2d.01.",
+            "timestamp": float(ts),
+            "confidence": float(rng.uniform(0.5, 1.0)),
+            "norm_pos": (0.5 + point[:2] / point[2]).tolist(),
+        }
+        if with_3d:
+            datum["gaze_point_3d"] = point.tolist()
+        gaze_data.append(fm.Serialized_Dict(python_dict=datum).serialized)
+    return gaze_data, timestamps
+
+
+def main(duration_s=300):
+    print(f"{duration_s} s of gaze at 200 Hz")
+    for with_3d in (True, False):
+        gaze_data, timestamps = synthetic_gaze_stream(duration_s, with_3d=with_3d)
+        capture = SimpleNamespace(
+            frame_size=(1280, 720),
+            intrinsics=Dummy_Camera((1280, 720), "bench"),
+            timestamps=timestamps[::6],
+        )
+        args = (capture, gaze_data, np.deg2rad(1.5), 0.08, 0.22, 0.6)
+
+        results = {}
+        for detector in (detect_fixations_by_queue, fd.detect_fixations):
+            start = time.perf_counter()
+            fixations = [fix for _, fix in detector(*args) if fix]
+            seconds = time.perf_counter() - start
+            print(
+                f"{'3d' if with_3d else '2d'} {detector.__name__:>26}:"
+                f" {len(fixations)} fixations in {seconds:.2f} s"
+            )
+            results[detector.__name__] = fixations
+
+        reference, incremental = results.values()
+        assert reference == incremental, "Fixation results differ"
+    print("Results are identical")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
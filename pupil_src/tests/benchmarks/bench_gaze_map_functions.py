@@ -0,0 +1,149 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+# Compares the mapping throughput of the 2d polynomial map functions of
+# `calibrate_2d` to the previous closures evaluated per datum and on arrays.
+#
+# Usage: python pupil_src/tests/benchmarks/bench_gaze_map_functions.py [point_count]
+import importlib.util
+import os
+import sys
+import timeit
+
+import numpy as np
+
+shared_modules = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "..", "shared_modules")
+)
+sys.path.insert(0, shared_modules)
+
+# load the module directly, the calibration_routines package requires a GUI
+spec = importlib.util.spec_from_file_location(
+    "calibrate_2d",
+    os.path.join(
+        shared_modules,
+        "calibration_routines",
+        "optimization_calibration",
+        "calibrate_2d.py",
+    ),
+)
+calibrate_2d = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(calibrate_2d)
+
+
+def make_map_function_closure(cx, cy, n):
+    if n == 7:
+
+        def fn(pt):
+            X, Y = pt
+            x2 = (
+                cx[0] * X
+                + cx[1] * Y
+                + cx[2] * X * X
+                + cx[3] * Y * Y
+                + cx[4] * X * Y
+                + cx[5] * Y * Y * X * X
+                + cx[6]
+            )
+            y2 = (
+                cy[0] * X
+                + cy[1] * Y
+                + cy[2] * X * X
+                + cy[3] * Y * Y
+                + cy[4] * X * Y
+                + cy[5] * Y * Y * X * X
+                + cy[6]
+            )
+            return x2, y2
+
+    elif n == 13:
+
+        def fn(pt_0, pt_1):
+            X0, Y0 = pt_0
+            X1, Y1 = pt_1
+            x2 = (
+                cx[0] * X0
+                + cx[1] * Y0
+                + cx[2] * X1
+                + cx[3] * Y1
+                + cx[4] * X0 * X0
+                + cx[5] * Y0 * Y0
+                + cx[6] * X0 * Y0
+                + cx[7] * X0 * X0 * Y0 * Y0
+                + cx[8] * X1 * X1
+                + cx[9] * Y1 * Y1
+                + cx[10] * X1 * Y1
+                + cx[11] * X1 * X1 * Y1 * Y1
+                + cx[12]
+            )
+            y2 = (
+                cy[0] * X0
+                + cy[1] * Y0
+                + cy[2] * X1
+                + cy[3] * Y1
+                + cy[4] * X0 * X0
+                + cy[5] * Y0 * Y0
+                + cy[6] * X0 * Y0
+                + cy[7] * X0 * X0 * Y0 * Y0
+                + cy[8] * X1 * X1
+                + cy[9] * Y1 * Y1
+                + cy[10] * X1 * Y1
+                + cy[11] * X1 * X1 * Y1 * Y1
+                + cy[12]
+            )
+            return x2, y2
+
+    return fn
+
+
+def main(point_count=1_000_000):
+    rng = np.random.RandomState(0)
+    points = rng.uniform(0, 1, (point_count, 4))
+    point_list = points.tolist()
+    # per-datum mapping is timed on a subset and extrapolated
+    loop_count = min(point_count, 100_000)
+
+    print(f"{point_count} points")
+    for n, point_size in ((7, 2), (13, 4)):
+        cx, cy = rng.normal(size=(2, n)).tolist()
+        closure = make_map_function_closure(cx, cy, n)
+        map_fn = calibrate_2d.make_map_function(cx, cy, n)
+        batch_map_fn = calibrate_2d.make_batch_map_function(cx, cy, n)
+        pts = points[:, :point_size]
+        if point_size == 2:
+            pt_list = [pt[:2] for pt in point_list[:loop_count]]
+            coordinates = (pts.T,)
+            per_datum = lambda fn: lambda: [fn(pt) for pt in pt_list]
+        else:
+            pt_list = [(pt[:2], pt[2:]) for pt in point_list[:loop_count]]
+            coordinates = (pts[:, :2].T, pts[:, 2:].T)
+            per_datum = lambda fn: lambda: [fn(*pt) for pt in pt_list]
+
+        assert np.allclose(np.column_stack(closure(*coordinates)), batch_map_fn(pts))
+
+        for name, func, scale in (
+            ("closure per datum", per_datum(closure), point_count / loop_count),
+            (
+                "make_map_function per datum",
+                per_datum(map_fn),
+                point_count / loop_count,
+            ),
+            ("closure on arrays", lambda: closure(*coordinates), 1),
+            ("make_batch_map_function", lambda: batch_map_fn(pts), 1),
+        ):
+            seconds = min(timeit.repeat(func, number=1, repeat=3)) * scale
+            print(
+                f"n={n:<2} {name:>28}: {seconds:.4f} s, "
+                f"{point_count / seconds / 1e6:.2f} M points/s"
+            )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,120 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+# Compares `head_pose_tracker.function.pick_key_markers.run` with counted key marker
+# bins to the previous scan over all key markers, as used by the offline
+# optimization.
+#
+# Usage: python pupil_src/tests/benchmarks/bench_pick_key_markers.py [frame_count]
+import importlib.util
+import os
+import sys
+import time
+
+import numpy as np
+
+shared_modules = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "..", "shared_modules")
+)
+sys.path.insert(0, shared_modules)
+
+# load the module directly, the head_pose_tracker package requires a GUI
+spec = importlib.util.spec_from_file_location(
+    "pick_key_markers",
+    os.path.join(
+        shared_modules, "head_pose_tracker", "function", "pick_key_markers.py"
+    ),
+)
+pkm = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(pkm)
+
+
+def get_bin_digitize(detection):
+    centroid = detection["centroid"]
+    bin_x = int(np.digitize(centroid[0], np.array(pkm._bins_x)))
+    bin_y = int(np.digitize(centroid[1], np.array(pkm._bins_y)))
+    return bin_x, bin_y
+
+
+def run_scan(markers_in_frame, all_key_markers):
+    if len(markers_in_frame) < pkm.min_n_markers_per_frame:
+        return []
+    for marker in markers_in_frame:
+        n_same_markers_in_bin = len(
+            [
+                key_marker
+                for key_marker in all_key_markers
+                if key_marker.marker_id == marker["id"]
+                and key_marker.bin == get_bin_digitize(marker)
+            ]
+        )
+        if n_same_markers_in_bin < pkm.max_n_same_markers_per_bin:
+            return [
+                pkm.KeyMarker(
+                    marker["timestamp"],
+                    marker["id"],
+                    marker["verts"],
+                    get_bin_digitize(marker),
+                )
+                for marker in markers_in_frame
+            ]
+    return []
+
+
+def synthetic_detections(frame_count, marker_count):
+    # A moving camera sees a few markers of a large marker set per frame
+    rng = np.random.RandomState(0)
+    frames = []
+    for frame_idx in range(frame_count):
+        first_id = (frame_idx // 300) % marker_count
+        marker_ids = (first_id + rng.choice(8, rng.randint(0, 6), replace=False)) % (
+            marker_count
+        )
+        frames.append(
+            [
+                {
+                    "id": int(marker_id),
+                    "timestamp": frame_idx / 30,
+                    "verts": None,
+                    "centroid": rng.uniform(0, 1, 2).tolist(),
+                }
+                for marker_id in marker_ids
+            ]
+        )
+    return frames
+
+
+def main(frame_count=100_000, marker_count=2_000):
+    frames = synthetic_detections(frame_count, marker_count)
+    print(f"{frame_count} frames, {marker_count} marker ids")
+
+    start = time.perf_counter()
+    all_key_markers = []
+    for markers_in_frame in frames:
+        all_key_markers += run_scan(markers_in_frame, all_key_markers)
+    scan_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    key_markers = []
+    key_marker_bins = pkm.KeyMarkerBins()
+    for markers_in_frame in frames:
+        key_markers += pkm.run(
+            markers_in_frame, key_marker_bins, select_key_markers_interval=1
+        )
+    bins_seconds = time.perf_counter() - start
+
+    assert key_markers == all_key_markers
+    print(f"{len(key_markers)} key markers")
+    print(f"{'scan over all key markers':>30}: {scan_seconds:.4f} s")
+    print(f"{'KeyMarkerBins':>30}: {bins_seconds:.4f} s")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,294 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import file_methods as fm
+from gaze_producer import model
+from gaze_producer.worker import map_gaze
+
+RECORDING_INDEX_RANGE = (0, 100)
+
+
+def _gaze(count, seed=0):
+    rng = np.random.RandomState(seed)
+    gaze_ts = np.sort(rng.uniform(0, 10, count)).tolist()
+    gaze = [
+        fm.Serialized_Dict(
+            python_dict={
+                "topic": "gaze.2d.0.",
+                "norm_pos": tuple(rng.uniform(0, 1, 2).tolist()),
+                "confidence": 1.0,
+                "timestamp": ts,
+            }
+        )
+        for ts in gaze_ts
+    ]
+    return gaze, gaze_ts
+
+
+def _calibration(unique_id="calibration", mapper_args=None):
+    return model.Calibration(
+        unique_id=unique_id,
+        name="Calibration",
+        recording_uuid="recording",
+        mapping_method="2d",
+        frame_index_range=RECORDING_INDEX_RANGE,
+        minimum_confidence=0.8,
+        result=model.CalibrationResult(
+            "Monocular_Gaze_Mapper",
+            mapper_args or {"params": ((0.1, 0.2), (0.3, 0.4), 2)},
+        ),
+    )
+
+
+@pytest.fixture
+def create_storage(tmpdir):
+    plugin = SimpleNamespace(add_observer=lambda *args: None)
+    calibration_storage = SimpleNamespace(get_first_or_none=lambda: None)
+
+    def create_storage():
+        return model.GazeMapperStorage(
+            calibration_storage, str(tmpdir), plugin, lambda: RECORDING_INDEX_RANGE,
+        )
+
+    return create_storage
+
+
+@pytest.fixture
+def mapped_gaze_mapper(create_storage):
+    """A saved gaze mapper with gaze and its uncorrected norm_pos"""
+    storage = create_storage()
+    gaze_mapper = storage.items[0]
+    gaze_mapper.gaze, gaze_mapper.gaze_ts = _gaze(20)
+    key = storage.uncorrected_gaze_key(gaze_mapper, _calibration())
+    norm_pos = [datum["norm_pos"] for datum in gaze_mapper.gaze]
+    offsets = [map_gaze._norm_pos_offset(d.serialized) for d in gaze_mapper.gaze]
+    storage.save_uncorrected_gaze(gaze_mapper, key, norm_pos, offsets)
+    storage.save_to_disk()
+    return storage, gaze_mapper, norm_pos, offsets
+
+
+@pytest.mark.parametrize("reload", [False, True])
+def test_uncorrected_gaze_is_loaded_for_same_key(
+    create_storage, mapped_gaze_mapper, reload
+):
+    storage, gaze_mapper, norm_pos, offsets = mapped_gaze_mapper
+    if reload:
+        storage = create_storage()
+        (gaze_mapper,) = storage.items
+    # calibrations loaded from disk contain lists instead of tuples
+    calibration = _calibration(mapper_args={"params": [[0.1, 0.2], [0.3, 0.4], 2]})
+    key = storage.uncorrected_gaze_key(gaze_mapper, calibration)
+
+    uncorrected_gaze = storage.load_uncorrected_gaze(gaze_mapper, key)
+    assert uncorrected_gaze is not None
+    np.testing.assert_array_equal(uncorrected_gaze[0], norm_pos)
+    np.testing.assert_array_equal(uncorrected_gaze[1], offsets)
+
+
+@pytest.mark.parametrize("reload", [False, True])
+@pytest.mark.parametrize(
+    "changed", ["calibration_unique_id", "calibration_result", "mapping_range"]
+)
+def test_uncorrected_gaze_is_ignored_for_changed_key(
+    create_storage, mapped_gaze_mapper, reload, changed
+):
+    storage, gaze_mapper, _, _ = mapped_gaze_mapper
+    if reload:
+        storage = create_storage()
+        (gaze_mapper,) = storage.items
+    calibration = _calibration()
+    if changed == "calibration_unique_id":
+        calibration = _calibration(unique_id="other calibration")
+    elif changed == "calibration_result":
+        calibration = _calibration(mapper_args={"params": ((0.1, 0.2), (0.3, 0.5), 2)})
+    else:
+        gaze_mapper.mapping_index_range = (10, 100)
+    key = storage.uncorrected_gaze_key(gaze_mapper, calibration)
+
+    assert storage.load_uncorrected_gaze(gaze_mapper, key) is None
+
+
+def test_uncorrected_gaze_is_ignored_for_different_gaze_count(mapped_gaze_mapper):
+    storage, gaze_mapper, _, _ = mapped_gaze_mapper
+    key = storage.uncorrected_gaze_key(gaze_mapper, _calibration())
+    gaze_mapper.gaze, gaze_mapper.gaze_ts = _gaze(10)
+    assert storage.load_uncorrected_gaze(gaze_mapper, key) is None
+
+
+def test_delete_removes_uncorrected_gaze(mapped_gaze_mapper):
+    storage, gaze_mapper, _, _ = mapped_gaze_mapper
+    uncorrected_file = storage._uncorrected_gaze_file_path(gaze_mapper)
+    assert os.path.exists(uncorrected_file)
+    storage.delete(gaze_mapper)
+    assert not os.path.exists(uncorrected_file)
+
+
+@pytest.fixture
+def count_writes(monkeypatch):
+    written = []
+    write_mapping_file = model.GazeMapperStorage._write_mapping_file
+
+    def counting_write_mapping_file(storage, gaze_mapper):
+        written.append(gaze_mapper.unique_id)
+        write_mapping_file(storage, gaze_mapper)
+
+    monkeypatch.setattr(
+        model.GazeMapperStorage, "_write_mapping_file", counting_write_mapping_file
+    )
+    return written
+
+
+def _mapping_file_path(storage, gaze_mapper):
+    return storage._gaze_mapping_file_path(gaze_mapper)
+
+
+def _assert_mapping_file_contains(storage, gaze_mapper, gaze, gaze_ts):
+    path = _mapping_file_path(storage, gaze_mapper)
+    directory, name = os.path.split(path)
+    pldata = fm.load_pldata_file(directory, name)
+    assert [d.serialized for d in pldata.data] == [d.serialized for d in gaze]
+    np.testing.assert_array_equal(pldata.timestamps, gaze_ts)
+    # the column sidecar matches the pldata file, i.e. it is not rebuilt
+    pldata_size = os.path.getsize(path + ".pldata")
+    assert fm._open_pldata_columns(path + "_columns", pldata_size) is not None
+
+
+def test_unchanged_gaze_is_not_saved_again(create_storage, count_writes):
+    storage = create_storage()
+    (gaze_mapper,) = storage.items
+    gaze_mapper.gaze, gaze_mapper.gaze_ts = _gaze(20)
+    storage.save_to_disk()
+    assert len(count_writes) == 1
+
+    storage.save_to_disk()
+    assert len(count_writes) == 1
+
+    # gaze that was loaded from disk is not written either
+    storage = create_storage()
+    (gaze_mapper,) = storage.items
+    assert len(gaze_mapper.gaze) == 20
+    storage.save_to_disk()
+    assert len(count_writes) == 1
+
+
+def test_replaced_gaze_is_only_saved_if_content_changed(create_storage, count_writes):
+    storage = create_storage()
+    (gaze_mapper,) = storage.items
+    gaze_mapper.gaze, gaze_mapper.gaze_ts = _gaze(20)
+    storage.save_to_disk()
+
+    # same content, e.g. mapped again with the same calibration
+    gaze_mapper.gaze, gaze_mapper.gaze_ts = _gaze(20)
+    storage.save_to_disk()
+    assert len(count_writes) == 1
+
+    gaze, gaze_ts = _gaze(20, seed=1)
+    gaze_mapper.gaze, gaze_mapper.gaze_ts = gaze, gaze_ts
+    storage.save_to_disk()
+    assert len(count_writes) == 2
+    _assert_mapping_file_contains(storage, gaze_mapper, gaze, gaze_ts)
+
+    (gaze_mapper,) = create_storage().items
+    assert [d.serialized for d in gaze_mapper.gaze] == [d.serialized for d in gaze]
+
+
+def _stream_gaze(storage, gaze_mapper, gaze, gaze_ts, batch_size=7):
+    for start in range(0, len(gaze), batch_size):
+        gaze_mapper.gaze.extend(gaze[start : start + batch_size])
+        gaze_mapper.gaze_ts.extend(gaze_ts[start : start + batch_size])
+        storage.stream_gaze(
+            gaze_mapper,
+            gaze_ts[start : start + batch_size],
+            gaze[start : start + batch_size],
+            [fm.pldata_column_fields(d) for d in gaze[start : start + batch_size]],
+        )
+
+
+def test_canceled_gaze_stream_leaves_consistent_file(create_storage, count_writes):
+    storage = create_storage()
+    (gaze_mapper,) = storage.items
+    gaze, gaze_ts = _gaze(30)
+    gaze_mapper.gaze, gaze_mapper.gaze_ts = [], []
+    storage.begin_gaze_stream(gaze_mapper)
+    _stream_gaze(storage, gaze_mapper, gaze[:16], gaze_ts[:16])
+    # canceling the mapping task ends the stream
+    storage.end_gaze_stream(gaze_mapper)
+    _assert_mapping_file_contains(storage, gaze_mapper, gaze[:16], gaze_ts[:16])
+
+    storage.save_to_disk()
+    assert count_writes == []
+    (gaze_mapper,) = create_storage().items
+    assert [d.serialized for d in gaze_mapper.gaze] == [d.serialized for d in gaze[:16]]
+
+
+def test_gaze_changed_during_stream_is_saved(create_storage, count_writes):
+    storage = create_storage()
+    (gaze_mapper,) = storage.items
+    gaze, gaze_ts = _gaze(30)
+    gaze_mapper.gaze, gaze_mapper.gaze_ts = [], []
+    storage.begin_gaze_stream(gaze_mapper)
+    _stream_gaze(storage, gaze_mapper, gaze[:16], gaze_ts[:16])
+    # e.g. the manual correction was applied while mapping
+    gaze_mapper.gaze, gaze_mapper.gaze_ts = _gaze(10, seed=1)
+    storage.end_gaze_stream(gaze_mapper)
+
+    storage.save_to_disk()
+    assert len(count_writes) == 1
+    _assert_mapping_file_contains(
+        storage, gaze_mapper, gaze_mapper.gaze, gaze_mapper.gaze_ts
+    )
+
+
+def _mapping_files(storage, gaze_mapper):
+    path = _mapping_file_path(storage, gaze_mapper)
+    return [
+        path + suffix
+        for suffix in (".pldata", "_timestamps.npy", "_uncorrected.npz", "_columns")
+    ]
+
+
+def test_rename_moves_mapping_files(create_storage, mapped_gaze_mapper, count_writes):
+    storage, gaze_mapper, norm_pos, _ = mapped_gaze_mapper
+    gaze = list(gaze_mapper.gaze)
+    old_files = _mapping_files(storage, gaze_mapper)
+    assert all(os.path.exists(path) for path in old_files)
+
+    storage.rename(gaze_mapper, "Renamed Gaze Mapper")
+    new_files = _mapping_files(storage, gaze_mapper)
+    assert not any(os.path.exists(path) for path in old_files)
+    assert all(os.path.exists(path) for path in new_files)
+    _assert_mapping_file_contains(
+        storage, gaze_mapper, gaze_mapper.gaze, gaze_mapper.gaze_ts
+    )
+
+    storage.save_to_disk()
+    assert count_writes == []
+    storage = create_storage()
+    (gaze_mapper,) = storage.items
+    assert gaze_mapper.name == "Renamed Gaze Mapper"
+    assert [d.serialized for d in gaze_mapper.gaze] == [d.serialized for d in gaze]
+    key = storage.uncorrected_gaze_key(gaze_mapper, _calibration())
+    np.testing.assert_array_equal(
+        storage.load_uncorrected_gaze(gaze_mapper, key)[0], norm_pos
+    )
+
+
+def test_delete_removes_mapping_files(mapped_gaze_mapper):
+    storage, gaze_mapper, _, _ = mapped_gaze_mapper
+    files = _mapping_files(storage, gaze_mapper)
+    assert all(os.path.exists(path) for path in files)
+    storage.delete(gaze_mapper)
+    assert not any(os.path.exists(path) for path in files)
@@ -0,0 +1,102 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import msgpack
+import numpy as np
+import pytest
+
+import file_methods as fm
+from gaze_producer.worker import map_gaze
+
+
+def _gaze_datum(rng, norm_pos):
+    # base data contains a nested norm_pos, which must not be corrected
+    pupil_datum = {
+        "topic": "pupil.0",
+        "norm_pos": tuple(rng.uniform(0, 1, 2).tolist()),
+        "confidence": 1.0,
+    }
+    return {
+        "topic": "gaze.3d.0.",
+        "base_data": (pupil_datum,),
+        "norm_pos": norm_pos,
+        "confidence": rng.uniform(0, 1),
+        "timestamp": rng.uniform(0, 100),
+    }
+
+
+def _unpack(gaze_datum):
+    return msgpack.unpackb(gaze_datum.serialized, raw=False, use_list=False)
+
+
+@pytest.fixture
+def gaze():
+    rng = np.random.RandomState(0)
+    norm_pos = [tuple(rng.uniform(-0.5, 1.5, 2).tolist()) for _ in range(50)]
+    norm_pos.append((0.0, 1.0))
+    return [fm.Serialized_Dict(python_dict=_gaze_datum(rng, p)) for p in norm_pos]
+
+
+def test_corrected_serialized_gaze_unpacks_to_uncorrected_plus_correction(gaze):
+    norm_pos = [datum["norm_pos"] for datum in gaze]
+    offsets = [map_gaze._norm_pos_offset(datum.serialized) for datum in gaze]
+    assert all(offset > 0 for offset in offsets)
+
+    corrected = map_gaze.apply_manual_correction_to_serialized(
+        gaze, norm_pos, offsets, 0.1, -0.25
+    )
+    # corrections are always applied to the uncorrected norm_pos
+    corrected = map_gaze.apply_manual_correction_to_serialized(
+        corrected, norm_pos, offsets, -0.125, 0.5
+    )
+
+    assert len(corrected) == len(gaze)
+    for datum, corrected_datum in zip(gaze, corrected):
+        assert len(corrected_datum.serialized) == len(datum.serialized)
+        expected = _unpack(datum)
+        expected["norm_pos"] = (
+            datum["norm_pos"][0] - 0.125,
+            datum["norm_pos"][1] + 0.5,
+        )
+        assert _unpack(corrected_datum) == expected
+        assert corrected_datum["norm_pos"] == expected["norm_pos"]
+
+
+def test_uncorrected_correction_restores_serialized_gaze(gaze):
+    norm_pos = [datum["norm_pos"] for datum in gaze]
+    offsets = [map_gaze._norm_pos_offset(datum.serialized) for datum in gaze]
+    corrected = map_gaze.apply_manual_correction_to_serialized(
+        gaze, norm_pos, offsets, 0.0, 0.0
+    )
+    assert [d.serialized for d in corrected] == [d.serialized for d in gaze]
+
+
+@pytest.mark.parametrize(
+    "norm_pos",
+    [(0, 1), (0.5, 1), (0.5, 0.5, 0.5), (0.5,), None, "norm_pos"],
+    ids=["int", "mixed", "3d", "1d", "none", "string"],
+)
+def test_norm_pos_offset_of_non_float64_norm_pos(norm_pos):
+    datum = _gaze_datum(np.random.RandomState(0), norm_pos)
+    assert map_gaze._norm_pos_offset(msgpack.packb(datum, use_bin_type=True)) == -1
+
+
+def test_norm_pos_offset_of_float32_norm_pos():
+    datum = _gaze_datum(np.random.RandomState(0), (0.25, 0.75))
+    assert map_gaze._norm_pos_offset(msgpack.packb(datum, use_bin_type=True)) > 0
+    serialized = msgpack.packb(datum, use_bin_type=True, use_single_float=True)
+    assert map_gaze._norm_pos_offset(serialized) == -1
+
+
+def test_norm_pos_offset_without_norm_pos():
+    datum = _gaze_datum(np.random.RandomState(0), (0.25, 0.75))
+    del datum["norm_pos"]
+    # only the top level norm_pos is considered, not the one of base_data
+    assert map_gaze._norm_pos_offset(msgpack.packb(datum, use_bin_type=True)) == -1
@@ -0,0 +1,98 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+
+import numpy as np
+import pytest
+
+from head_pose_tracker.function import pick_key_markers
+
+
+@pytest.fixture(autouse=True)
+def reset_frame_counter(monkeypatch):
+    monkeypatch.setattr(pick_key_markers, "_n_frames_passed", 0)
+
+
+def _detections(num_frames, seed=0):
+    rng = np.random.RandomState(seed)
+    frames = []
+    for frame_idx in range(num_frames):
+        marker_ids = rng.choice(20, size=rng.randint(0, 5), replace=False)
+        frames.append(
+            [
+                {
+                    "id": int(marker_id),
+                    "timestamp": frame_idx / 30,
+                    "verts": rng.uniform(0, 1, (4, 2)).tolist(),
+                    "centroid": rng.uniform(0, 1, 2).tolist(),
+                }
+                for marker_id in marker_ids
+            ]
+        )
+    return frames
+
+
+def _is_available(markers_in_frame, all_key_markers):
+    for marker in markers_in_frame:
+        bin = (
+            int(np.digitize(marker["centroid"][0], [0.5])),
+            int(np.digitize(marker["centroid"][1], [0.5])),
+        )
+        n_same_markers_in_bin = sum(
+            key_marker.marker_id == marker["id"] and key_marker.bin == bin
+            for key_marker in all_key_markers
+        )
+        if n_same_markers_in_bin < pick_key_markers.max_n_same_markers_per_bin:
+            return True
+    return False
+
+
+@pytest.mark.parametrize("interval", [1, 2])
+def test_run_picks_frames_with_available_bins(interval):
+    key_marker_bins = pick_key_markers.KeyMarkerBins()
+    all_key_markers = []
+    for frame_idx, markers_in_frame in enumerate(_detections(500)):
+        expected = (
+            (frame_idx + 1) % interval == 0
+            and len(markers_in_frame) >= pick_key_markers.min_n_markers_per_frame
+            and _is_available(markers_in_frame, all_key_markers)
+        )
+        key_markers = pick_key_markers.run(
+            markers_in_frame, key_marker_bins, select_key_markers_interval=interval
+        )
+        assert bool(key_markers) == expected
+        all_key_markers += key_markers
+
+    assert all_key_markers
+    for marker_id in range(20):
+        for bin in ((0, 0), (0, 1), (1, 0), (1, 1)):
+            n_same_markers_in_bin = sum(
+                key_marker.marker_id == marker_id and key_marker.bin == bin
+                for key_marker in all_key_markers
+            )
+            assert key_marker_bins.count(marker_id, bin) == n_same_markers_in_bin
+
+
+def test_key_marker_bins_can_be_rebuilt():
+    key_marker_bins = pick_key_markers.KeyMarkerBins()
+    all_key_markers = []
+    for markers_in_frame in _detections(100):
+        all_key_markers += pick_key_markers.run(
+            markers_in_frame, key_marker_bins, select_key_markers_interval=1
+        )
+    kept_key_markers = [km for km in all_key_markers if km.frame_id % 2]
+    rebuilt = pick_key_markers.KeyMarkerBins(kept_key_markers)
+    for km in all_key_markers:
+        assert key_marker_bins.count(km.marker_id, km.bin) == sum(
+            (k.marker_id, k.bin) == (km.marker_id, km.bin) for k in all_key_markers
+        )
+        assert rebuilt.count(km.marker_id, km.bin) == sum(
+            (k.marker_id, k.bin) == (km.marker_id, km.bin) for k in kept_key_markers
+        )
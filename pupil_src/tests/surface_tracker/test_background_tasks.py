@@ -0,0 +1,172 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from surface_tracker import background_tasks
+from surface_tracker.cache import Unvisited_Index
+from tasklib.background.scheduler import PRIORITY_DEFAULT, PRIORITY_INTERACTIVE
+
+
+class _Fake_Segment_Task:
+    """Yields `results_per_fetch` unvisited frames of its segment per fetch"""
+
+    results_per_fetch = 2
+    started = []
+
+    def __init__(self, name, generator, args=(), kwargs={}, priority=None):
+        _, _, visited_list, self.start = args
+        self.priority = priority
+        self.unvisited = Unvisited_Index(visited_list)
+        self.next_idx = self.start
+        self.completed = False
+        self.canceled = False
+        self.started.append((self.start, self.start + len(visited_list), priority))
+
+    def fetch(self):
+        for _ in range(self.results_per_fetch):
+            next_unvisited = self.unvisited.next_unvisited(self.next_idx - self.start)
+            if next_unvisited is None:
+                self.completed = True
+                return
+            self.unvisited.visit(next_unvisited)
+            self.next_idx = self.start + next_unvisited + 1
+            yield self.start + next_unvisited, f"result {self.start + next_unvisited}"
+
+    def cancel(self, timeout=1):
+        self.canceled = True
+
+
+def _value(value):
+    return SimpleNamespace(value=value)
+
+
+def _started_ranges():
+    return [(start, stop) for start, stop, _ in _Fake_Segment_Task.started]
+
+
+@pytest.fixture
+def proxy_factory(monkeypatch):
+    monkeypatch.setattr(
+        background_tasks.background_helper, "Pooled_Task_Proxy", _Fake_Segment_Task
+    )
+    monkeypatch.setattr(_Fake_Segment_Task, "started", [])
+    monkeypatch.setattr(
+        background_tasks.Segmented_Video_Processing_Proxy, "segment_size", 10
+    )
+    mp_context = SimpleNamespace(cpu_count=lambda: 4)
+
+    def proxy_factory(visited_list, worker_count=2):
+        seek_idx = _value(-1)
+        proxy = background_tasks.Segmented_Video_Processing_Proxy(
+            "test",
+            "video.mp4",
+            None,
+            visited_list,
+            seek_idx,
+            mp_context,
+            worker_count=worker_count,
+        )
+        return proxy, seek_idx
+
+    return proxy_factory
+
+
+def _fetch_all(proxy):
+    results = []
+    while not proxy.completed:
+        results.extend(proxy.fetch())
+    return results
+
+
+def test_segments_fetched_in_turns(proxy_factory):
+    visited_list = [None] * 45
+    # already visited frames and segments are skipped
+    visited_list[10:20] = [[]] * 10
+    visited_list[22] = []
+    proxy, _ = proxy_factory(visited_list)
+
+    first_fetch = [idx for idx, _ in proxy.fetch()]
+    assert first_fetch == [0, 20, 1, 21]
+    assert _started_ranges() == [(0, 10), (20, 30)]
+
+    results = _fetch_all(proxy)
+    assert _started_ranges() == [(0, 10), (20, 30), (30, 40), (40, 45)]
+    assert all(p == PRIORITY_DEFAULT for _, _, p in _Fake_Segment_Task.started)
+    frame_idc = first_fetch + [idx for idx, _ in results]
+    expected_idc = [idx for idx, visited in enumerate(visited_list) if visited is None]
+    assert sorted(frame_idc) == expected_idc
+    assert all(result == f"result {idx}" for idx, result in results)
+    assert not proxy.canceled
+
+
+def test_all_visited_completes_without_tasks(proxy_factory):
+    proxy, _ = proxy_factory([[]] * 25)
+    assert _fetch_all(proxy) == []
+    assert _started_ranges() == []
+
+
+def test_seek_into_pending_segment_preempts_latest_segment(proxy_factory):
+    proxy, seek_idx = proxy_factory([None] * 45)
+    frame_idc = [idx for idx, _ in proxy.fetch()]
+    preempted = proxy.running[-1]
+
+    seek_idx.value = 33
+    frame_idc += [idx for idx, _ in proxy.fetch()]
+    assert frame_idc == [0, 10, 1, 11, 2, 33, 3, 34]
+    assert preempted.task.canceled
+    assert _Fake_Segment_Task.started[-1] == (33, 40, PRIORITY_INTERACTIVE)
+
+    frame_idc += [idx for idx, _ in _fetch_all(proxy)]
+    # frames before the seek index and the preempted segment are processed later
+    assert _Fake_Segment_Task.started == [
+        (0, 10, PRIORITY_DEFAULT),
+        (10, 20, PRIORITY_DEFAULT),
+        (33, 40, PRIORITY_INTERACTIVE),
+        (10, 20, PRIORITY_DEFAULT),
+        (20, 30, PRIORITY_DEFAULT),
+        (40, 45, PRIORITY_DEFAULT),
+        (30, 33, PRIORITY_DEFAULT),
+    ]
+    assert sorted(frame_idc) == list(range(45))
+    assert not proxy.canceled
+
+
+def test_seek_into_running_segment_restarts_it(proxy_factory):
+    proxy, seek_idx = proxy_factory([None] * 45)
+    frame_idc = [idx for idx, _ in proxy.fetch()]
+    restarted = proxy.running[-1]
+
+    seek_idx.value = 17
+    frame_idc += [idx for idx, _ in proxy.fetch()]
+    assert frame_idc == [0, 10, 1, 11, 2, 17, 3, 18]
+    assert restarted.task.canceled
+    assert _Fake_Segment_Task.started == [
+        (0, 10, PRIORITY_DEFAULT),
+        (10, 20, PRIORITY_DEFAULT),
+        (17, 20, PRIORITY_INTERACTIVE),
+    ]
+
+    frame_idc += [idx for idx, _ in _fetch_all(proxy)]
+    # frames before the seek index are processed later, visited frames are skipped
+    assert _Fake_Segment_Task.started[-1] == (10, 17, PRIORITY_DEFAULT)
+    assert sorted(frame_idc) == list(range(45))
+
+
+def test_canceled_task_cancels_proxy(proxy_factory):
+    proxy, _ = proxy_factory([None] * 45)
+    list(proxy.fetch())
+    proxy.running[0].task.canceled = True
+    list(proxy.fetch())
+    assert proxy.canceled
+    assert list(proxy.fetch()) == []
@@ -0,0 +1,92 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+
+import itertools
+import random
+
+import pytest
+
+from surface_tracker.cache import Cache, Unvisited_Index
+
+
+def _ranges(cache, eval_fn):
+    ranges = []
+    start = 0
+    for key, group in itertools.groupby(cache, eval_fn):
+        length = sum(1 for _ in group)
+        if key:
+            ranges.append([start, start + length - 1])
+        start += length
+    return ranges
+
+
+def test_cache_ranges_are_updated_incrementally():
+    rng = random.Random(0)
+    cache = Cache([None, [], ["marker"], None, None, ["marker"], None])
+    assert cache.visited_ranges == [[1, 2], [5, 5]]
+    assert cache.positive_ranges == [[2, 2], [5, 5]]
+
+    for _ in range(2000):
+        key = rng.randrange(len(cache))
+        item = rng.choice([[], ["marker"]])
+        cache.update(key, item, force=True)
+        assert cache.visited_ranges == _ranges(cache, Cache.visited_eval_fn)
+        assert cache.positive_ranges == _ranges(cache, Cache.positive_eval_fn)
+
+
+def test_cache_update_checks_arguments():
+    cache = Cache([None, None])
+    cache.update(0, [])
+    with pytest.raises(IndexError):
+        cache.update(0, ["marker"])
+    with pytest.raises(ValueError):
+        cache.update(1, None)
+    cache.update(0, ["marker"], force=True)
+    assert cache == [["marker"], None]
+    assert cache.positive_ranges == [[0, 0]]
+
+
+def test_unvisited_index_wraps_around():
+    unvisited = Unvisited_Index([True, False, True, True, False, True])
+    assert unvisited.next_unvisited(0) == 1
+    assert unvisited.next_unvisited(2) == 4
+    assert unvisited.next_unvisited(5) == 1
+    assert unvisited.next_unvisited(-1) == 1
+
+    unvisited.visit(1)
+    assert unvisited.is_visited(1)
+    assert unvisited.next_unvisited(0) == 4
+    unvisited.visit(4)
+    assert unvisited.num_unvisited == 0
+    assert unvisited.next_unvisited(0) is None
+
+
+def test_unvisited_index_visits_each_index_once():
+    rng = random.Random(0)
+    visited = [rng.random() < 0.5 for _ in range(1000)]
+    unvisited = Unvisited_Index(visited)
+
+    order = []
+    idx = 0
+    while True:
+        if rng.random() < 0.05:
+            idx = rng.randrange(len(visited))  # seek
+        idx = unvisited.next_unvisited(idx)
+        if idx is None:
+            break
+        assert not visited[idx]
+        visited[idx] = True
+        unvisited.visit(idx)
+        order.append(idx)
+        idx += 1
+
+    assert all(visited)
+    assert len(order) == len(set(order))
@@ -0,0 +1,206 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import threading
+from types import SimpleNamespace
+
+import av
+import numpy as np
+import pytest
+
+from av_writer import (
+    Async_Writer,
+    MPEG_Writer,
+    NonMonotonicTimestampError,
+    concatenate_segments,
+)
+
+
+class _Fake_AV_Writer:
+    """Records written frames, encoding is paused until `encoding` is set"""
+
+    def __init__(self, fail_at_ts=None):
+        self.output_file_path = "/tmp/world.mp4"
+        self.start_time = 0.0
+        self.timestamps = []
+        self.encoding = threading.Event()
+        self.encoding.set()
+        self.fail_at_ts = fail_at_ts
+        self.closed_with = None
+
+    def write_video_frame(self, input_frame):
+        self.encoding.wait()
+        if input_frame.timestamp == self.fail_at_ts:
+            raise RuntimeError("Encoding failed")
+        self.timestamps.append(input_frame.timestamp)
+
+    def close(self, timestamp_export_format="npy"):
+        self.closed_with = timestamp_export_format
+
+
+def _frame(ts):
+    return SimpleNamespace(timestamp=float(ts))
+
+
+def _wait_for_empty_queue(async_writer):
+    with async_writer._condition:
+        assert async_writer._condition.wait_for(
+            lambda: not async_writer._queue, timeout=5
+        )
+
+
+def test_close_drains_queue():
+    writer = _Fake_AV_Writer()
+    writer.encoding.clear()
+    async_writer = Async_Writer(writer, queue_size=50)
+    for ts in range(1, 41):
+        async_writer.write_video_frame(_frame(ts))
+    assert writer.timestamps == []
+    assert async_writer.stats()["queue_fill"] >= 39
+
+    writer.encoding.set()
+    async_writer.close(timestamp_export_format="all")
+    assert async_writer.closed
+    assert writer.closed_with == "all"
+    assert writer.timestamps == list(range(1, 41))
+    assert async_writer.stats()["queue_fill"] == 0
+    assert async_writer.stats()["encoded"] == 40
+
+
+def test_drop_oldest_counts_dropped_frames():
+    writer = _Fake_AV_Writer()
+    writer.encoding.clear()
+    async_writer = Async_Writer(writer, queue_size=5, backpressure="drop_oldest")
+    async_writer.write_video_frame(_frame(1))
+    # the encoder thread takes the first frame and waits for `encoding`
+    _wait_for_empty_queue(async_writer)
+
+    for ts in range(2, 22):
+        async_writer.write_video_frame(_frame(ts))
+    stats = async_writer.stats()
+    assert stats["queued"] == 21
+    assert stats["dropped"] == 15
+    assert stats["queue_fill"] == stats["max_queue_fill"] == 5
+
+    writer.encoding.set()
+    async_writer.close()
+    assert writer.timestamps == [1, 17, 18, 19, 20, 21]
+
+
+def test_block_waits_for_encoder():
+    writer = _Fake_AV_Writer()
+    writer.encoding.clear()
+    async_writer = Async_Writer(writer, queue_size=2, backpressure="block")
+    async_writer.write_video_frame(_frame(1))
+    _wait_for_empty_queue(async_writer)
+    async_writer.write_video_frame(_frame(2))
+    async_writer.write_video_frame(_frame(3))
+
+    blocked_writer = threading.Thread(
+        target=async_writer.write_video_frame, args=(_frame(4),)
+    )
+    blocked_writer.start()
+    blocked_writer.join(timeout=0.2)
+    assert blocked_writer.is_alive()
+    assert async_writer.stats()["queued"] == 3
+
+    writer.encoding.set()
+    blocked_writer.join(timeout=5)
+    assert not blocked_writer.is_alive()
+    async_writer.close()
+    assert writer.timestamps == [1, 2, 3, 4]
+    assert async_writer.stats()["dropped"] == 0
+
+
+@pytest.mark.parametrize("backpressure", Async_Writer.backpressure_policies)
+def test_encoder_error_is_raised_in_caller(backpressure):
+    writer = _Fake_AV_Writer(fail_at_ts=3)
+    async_writer = Async_Writer(writer, queue_size=5, backpressure=backpressure)
+    for ts in range(1, 4):
+        async_writer.write_video_frame(_frame(ts))
+    with async_writer._condition:
+        assert async_writer._condition.wait_for(
+            lambda: async_writer._encoder_error is not None, timeout=5
+        )
+    with pytest.raises(RuntimeError, match="Encoding failed"):
+        async_writer.write_video_frame(_frame(4))
+    assert writer.timestamps == [1, 2]
+
+    # the error is raised only once, closing still closes the writer
+    async_writer.close()
+    assert writer.closed_with == "npy"
+
+
+def test_encoder_error_is_raised_on_close():
+    writer = _Fake_AV_Writer(fail_at_ts=2)
+    writer.encoding.clear()
+    async_writer = Async_Writer(writer, queue_size=10)
+    for ts in range(1, 6):
+        async_writer.write_video_frame(_frame(ts))
+
+    writer.encoding.set()
+    with pytest.raises(RuntimeError, match="Encoding failed"):
+        async_writer.close()
+    assert async_writer.closed
+    assert writer.closed_with == "npy"
+    assert writer.timestamps == [1]
+
+
+def test_non_monotonic_timestamps_raise_in_caller():
+    writer = _Fake_AV_Writer()
+    async_writer = Async_Writer(writer)
+    async_writer.write_video_frame(_frame(2))
+    with pytest.raises(NonMonotonicTimestampError):
+        async_writer.write_video_frame(_frame(1))
+    assert async_writer.closed
+    assert writer.timestamps == [2]
+
+
+def _video_frame(ts, index, size=(96, 64)):
+    img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+    img[:, index % size[0]] = 255
+    return SimpleNamespace(
+        timestamp=ts,
+        index=index,
+        img=img,
+        yuv_buffer=None,
+        width=size[0],
+        height=size[1],
+    )
+
+
+def test_concatenate_segments(tmpdir):
+    timestamps = 100.0 + np.cumsum(np.random.RandomState(0).uniform(0.02, 0.05, 50))
+    segment_ranges = [(0, 20), (20, 50)]
+    segment_paths = []
+    for idx, (start, stop) in enumerate(segment_ranges):
+        segment_path = str(tmpdir / f"world_segment_{idx:03d}.mp4")
+        # segments of an export share the start time of the whole export
+        writer = MPEG_Writer(segment_path, start_time_synced=timestamps[0])
+        for index in range(start, stop):
+            writer.write_video_frame(_video_frame(timestamps[index], index))
+        writer.close()
+        segment_paths.append(segment_path)
+
+    output_path = str(tmpdir / "world.mp4")
+    progress = list(concatenate_segments(segment_paths, output_path))
+    assert progress == [1, 2]
+
+    np.testing.assert_array_equal(
+        np.load(str(tmpdir / "world_timestamps.npy")), timestamps
+    )
+    container = av.open(output_path)
+    stream = container.streams.video[0]
+    pts = [frame.pts for frame in container.decode(stream)]
+    frame_ts = np.array(pts) * float(stream.time_base)
+    container.close()
+    assert len(pts) == len(timestamps)
+    assert np.all(np.diff(pts) > 0)
+    np.testing.assert_allclose(frame_ts, timestamps - timestamps[0], atol=1e-3)
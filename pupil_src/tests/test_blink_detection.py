@@ -0,0 +1,94 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+from collections import deque
+
+import numpy as np
+import pytest
+
+from blink_detection import Confidence_Step_Filter
+
+
+class _Full_Window_Filter:
+    """Step filter that convolves the whole window for every response"""
+
+    def __init__(self):
+        self.history = deque()
+
+    def extend(self, pupil_data, history_length):
+        self.history.extend(pupil_data)
+        try:
+            ts_oldest = self.history[0]["timestamp"]
+            ts_newest = self.history[-1]["timestamp"]
+            if ts_newest < ts_oldest:
+                self.history.clear()
+                return None
+            age_threshold = ts_newest - history_length
+            while self.history[1]["timestamp"] < age_threshold:
+                self.history.popleft()
+        except IndexError:
+            pass
+
+        filter_size = len(self.history)
+        if filter_size < 2 or ts_newest - ts_oldest < history_length:
+            return None
+        activity = np.fromiter((pp["confidence"] for pp in self.history), dtype=float)
+        blink_filter = np.ones(filter_size) / filter_size
+        blink_filter[filter_size // 2 :] *= -1
+        if filter_size % 2 == 1:
+            blink_filter[filter_size // 2] = 0.0
+        return activity @ blink_filter / 0.45
+
+
+def _pupil_stream(rng, count):
+    intervals = rng.uniform(0.002, 0.012, count)
+    # occasional gaps drop several data from the window at once
+    intervals[rng.uniform(size=count) < 0.02] = 0.5
+    # and occasional timestamp resets require clearing the window
+    resets = rng.uniform(size=count) < 0.002
+    intervals[resets] = -rng.uniform(1.0, 10.0, resets.sum())
+    for ts, confidence in zip(
+        np.cumsum(intervals).tolist(), rng.uniform(0, 1, count).tolist()
+    ):
+        yield {"timestamp": ts, "confidence": confidence}
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_step_filter_matches_full_window_response(seed):
+    rng = np.random.RandomState(seed)
+    history_length = rng.uniform(0.05, 0.4)
+    stream = _pupil_stream(rng, 5000)
+    # a small capacity exercises growing the ring buffer and wrapping around it
+    step_filter = Confidence_Step_Filter(capacity=2)
+    reference = _Full_Window_Filter()
+
+    num_responses = num_resets = 0
+    for batch_size in rng.randint(0, 6, 2000):
+        pupil_data = [datum for _, datum in zip(range(batch_size), stream)]
+        expected = reference.extend(pupil_data, history_length)
+        if not step_filter.extend(pupil_data, history_length):
+            step_filter.clear()
+            num_resets += 1
+            assert len(reference.history) == 0
+            assert step_filter.response(history_length) is None
+            continue
+
+        assert step_filter.data() == list(reference.history)
+        response = step_filter.response(history_length)
+        if expected is None:
+            assert response is None
+            continue
+        num_responses += 1
+        assert response == pytest.approx(expected, rel=0.0, abs=1e-14)
+        assert step_filter.center() is reference.history[len(reference.history) // 2]
+
+    assert num_responses > 1000
+    assert num_resets > 0
+    assert step_filter._capacity > 2
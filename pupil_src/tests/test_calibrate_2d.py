@@ -0,0 +1,87 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+
+import numpy as np
+import pytest
+
+from calibration_routines.optimization_calibration import calibrate_2d
+
+MONOCULAR_MODELS = (3, 7, 9)
+BINOCULAR_MODELS = (5, 13, 17)
+
+
+def _polynomial(c, X0, Y0, X1=None, Y1=None):
+    terms = [X0, Y0]
+    if X1 is not None:
+        terms += [X1, Y1]
+    terms += [X0 * X0, Y0 * Y0, X0 * Y0, X0 * X0 * Y0 * Y0]
+    if X1 is None:
+        terms += [X0 * X0 * Y0, Y0 * Y0 * X0]
+    else:
+        terms += [X1 * X1, Y1 * Y1, X1 * Y1, X1 * X1 * Y1 * Y1]
+        terms += [X0 * X1, X0 * Y1, Y0 * X1, Y0 * Y1]
+    return sum(ci * t for ci, t in zip(c[:-1], terms)) + c[-1]
+
+
+@pytest.fixture
+def points():
+    return np.random.RandomState(0).uniform(0, 1, (1000, 4))
+
+
+@pytest.mark.parametrize("n", MONOCULAR_MODELS + BINOCULAR_MODELS)
+def test_batch_map_function_evaluates_polynomial(points, n):
+    rng = np.random.RandomState(n)
+    cx, cy = rng.normal(size=(2, n)).tolist()
+    if n in MONOCULAR_MODELS:
+        points = points[:, :2]
+
+    batch_map_fn = calibrate_2d.make_batch_map_function(cx, cy, n)
+    gaze_points = batch_map_fn(points)
+    assert gaze_points.shape == (len(points), 2)
+    expected = np.column_stack((_polynomial(cx, *points.T), _polynomial(cy, *points.T)))
+    assert np.allclose(gaze_points, expected, rtol=0, atol=1e-12)
+
+    map_fn = calibrate_2d.make_map_function(cx, cy, n)
+    for point, gaze_point in zip(points[:10].tolist(), gaze_points.tolist()):
+        if n in MONOCULAR_MODELS:
+            mapped = map_fn(point)
+        else:
+            mapped = map_fn(point[:2], point[2:])
+        assert isinstance(mapped, tuple)
+        assert mapped == pytest.approx(gaze_point, rel=0, abs=1e-12)
+
+    assert batch_map_fn(np.empty((0, points.shape[1]))).shape == (0, 2)
+
+
+@pytest.mark.parametrize("binocular", (False, True))
+def test_calibrate_2d_polynomial_params_reproduce_map_function(points, binocular):
+    if binocular:
+        gaze = (points[:, :2] + points[:, 2:]) / 2 + 0.01 * points[:, :2] ** 2
+    else:
+        points = points[:, :2]
+        gaze = 0.8 * points + 0.1 * points ** 2
+    cal_pt_cloud = np.column_stack((points, gaze))
+
+    map_fn, inliers, params = calibrate_2d.calibrate_2d_polynomial(
+        cal_pt_cloud, binocular=binocular
+    )
+    assert inliers.all()
+    batch_map_fn = calibrate_2d.make_batch_map_function(*params)
+    assert np.allclose(batch_map_fn(points), gaze, atol=1e-3)
+    if binocular:
+        assert map_fn(points[0, :2], points[0, 2:]) == pytest.approx(gaze[0], abs=1e-3)
+    else:
+        assert map_fn(points[0]) == pytest.approx(gaze[0], abs=1e-3)
+
+
+def test_unsupported_model_raises():
+    with pytest.raises(Exception):
+        calibrate_2d.make_batch_map_function([0] * 4, [0] * 4, 4)
@@ -0,0 +1,106 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+
+import numpy as np
+import pytest
+
+from calibration_routines import data_processing as dp
+
+
+def _nearest_idx(array, value):
+    idx = np.searchsorted(array, value, side="left")
+    if idx == len(array):
+        return idx - 1
+    if idx > 0 and abs(value - array[idx - 1]) < abs(value - array[idx]):
+        return idx - 1
+    return idx
+
+
+def _closest_matches_loop(ref_pts, *pupils, max_dispersion=1 / 15.0):
+    pupils_ts = [np.array([p["timestamp"] for p in pupil]) for pupil in pupils]
+    matched = []
+    for r in ref_pts:
+        closest = [
+            pupil[_nearest_idx(ts, r["timestamp"])]
+            for pupil, ts in zip(pupils, pupils_ts)
+        ]
+        matched_ts = [p["timestamp"] for p in closest] + [r["timestamp"]]
+        if max(matched_ts) - min(matched_ts) < max_dispersion:
+            matched.append(dict(zip(("ref", "pupil", "pupil1"), (r, *closest))))
+    return matched
+
+
+def _data(timestamps, **fields):
+    return [dict(timestamp=ts, **fields) for ts in timestamps]
+
+
+@pytest.fixture
+def recording():
+    rng = np.random.RandomState(0)
+    ref_pts = _data(np.sort(rng.uniform(0, 60, 1000)))
+    pupil0 = _data(np.sort(rng.uniform(0, 60, 3000)))
+    # quantized timestamps to produce ties and exact matches
+    pupil1 = _data(np.round(np.sort(rng.uniform(-1, 61, 1000)), 2))
+    return ref_pts, pupil0, pupil1
+
+
+def test_closest_matches_monocular(recording):
+    ref_pts, pupil0, pupil1 = recording
+    for pupil in (pupil0, pupil1):
+        for max_dispersion in (1 / 15.0, 0.01, np.inf):
+            matched = dp.closest_matches_monocular(ref_pts, pupil, max_dispersion)
+            expected = _closest_matches_loop(
+                ref_pts, pupil, max_dispersion=max_dispersion
+            )
+            assert matched == expected
+    assert dp.closest_matches_monocular(ref_pts, []) == []
+    assert dp.closest_matches_monocular([], pupil0) == []
+
+
+def test_closest_matches_binocular(recording):
+    ref_pts, pupil0, pupil1 = recording
+    for max_dispersion in (1 / 15.0, 0.01, np.inf):
+        matched = dp.closest_matches_binocular(ref_pts, pupil0, pupil1, max_dispersion)
+        expected = _closest_matches_loop(
+            ref_pts, pupil0, pupil1, max_dispersion=max_dispersion
+        )
+        assert matched == expected
+    assert dp.closest_matches_binocular(ref_pts, pupil0, []) == []
+
+
+def test_find_nearest_idc_resolves_ties_towards_later_element():
+    array = np.array([0.0, 1.0, 2.0, 2.0, 4.0])
+    values = np.array([-1.0, 0.0, 0.5, 1.4, 2.0, 3.0, 3.1, 5.0])
+    idc = dp._find_nearest_idc(array, values)
+    assert idc.tolist() == [_nearest_idx(array, v) for v in values]
+    assert idc.tolist() == [0, 0, 1, 1, 2, 4, 4, 4]
+
+
+def test_match_data_splits_by_id(recording):
+    ref_pts, pupil0, pupil1 = recording
+    pupil_list = sorted(
+        [dict(p, id=0) for p in pupil0] + [dict(p, id=1) for p in pupil1],
+        key=lambda p: p["timestamp"],
+    )
+    binocular, monocular, matched0, matched1 = dp._match_data(pupil_list, ref_pts)
+    pupil0 = [p for p in pupil_list if p["id"] == 0]
+    pupil1 = [p for p in pupil_list if p["id"] == 1]
+    assert binocular == _closest_matches_loop(ref_pts, pupil0, pupil1)
+    assert matched0 == _closest_matches_loop(ref_pts, pupil0)
+    assert matched1 == _closest_matches_loop(ref_pts, pupil1)
+    assert monocular is (matched0 if len(matched0) > len(matched1) else matched1)
+
+
+def test_filter_pupil_list_by_confidence():
+    pupil_list = [{"confidence": c} for c in (0.0, 0.8, 0.6, 1.0, 0.59)]
+    filtered = dp._filter_pupil_list_by_confidence(pupil_list, 0.6)
+    assert filtered == [pupil_list[1], pupil_list[2], pupil_list[3]]
+    assert dp._filter_pupil_list_by_confidence([], 0.6) == []
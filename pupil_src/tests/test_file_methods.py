@@ -0,0 +1,182 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import os
+import pickle
+import shutil
+
+import numpy as np
+import pytest
+
+import file_methods as fm
+
+
+def _write_pupil_data(directory, count=100):
+    os.makedirs(directory, exist_ok=True)
+    with fm.PLData_Writer(directory, "pupil") as writer:
+        for idx in range(count):
+            writer.append(
+                {
+                    "topic": f"pupil.{idx % 2}",
+                    "timestamp": idx * 0.01,
+                    "confidence": idx / count,
+                    "norm_pos": [0.1, 0.2],
+                    "diameter": 30.0,
+                    "id": idx % 2,
+                }
+            )
+
+
+def test_pldata_columns_match_pldata_file(tmp_path):
+    _write_pupil_data(str(tmp_path))
+    pldata = fm.load_pldata_file(str(tmp_path), "pupil")
+    columns = fm.load_pldata_columns(str(tmp_path), "pupil")
+
+    assert len(columns) == len(pldata.data)
+    assert np.array_equal(columns.timestamps, pldata.timestamps)
+    assert columns.column("confidence")[42] == pldata.data[42]["confidence"]
+    assert columns[42]["norm_pos"] == pldata.data[42]["norm_pos"]
+    assert columns.topic(3) == pldata.topics[3]
+
+
+def test_pldata_columns_views(tmp_path):
+    _write_pupil_data(str(tmp_path))
+    columns = fm.load_pldata_columns(str(tmp_path), "pupil")
+
+    window = columns[10:20]
+    assert len(window) == 10
+    assert [d["timestamp"] for d in window] == pytest.approx(window.timestamps)
+
+    eye1 = columns[columns.column("id") == 1]
+    assert len(eye1) == 50
+    assert all(d["id"] == 1 for d in eye1[5:10])
+
+    unpickled = pickle.loads(pickle.dumps(eye1[5:10]))
+    assert np.array_equal(unpickled.timestamps, eye1[5:10].timestamps)
+
+
+def test_pldata_columns_built_lazily(tmp_path):
+    _write_pupil_data(str(tmp_path))
+    shutil.rmtree(tmp_path / "pupil_columns")
+
+    columns = fm.load_pldata_columns(str(tmp_path), "pupil")
+    assert len(columns) == 100
+    assert columns.column("diameter")[7] == 30.0
+    assert (tmp_path / "pupil_columns" / "timestamp.bin").exists()
+
+
+def test_pldata_columns_missing_file(tmp_path):
+    assert len(fm.load_pldata_columns(str(tmp_path), "gaze")) == 0
+
+
+def test_pldata_writer_extend_serialized(tmp_path):
+    _write_pupil_data(str(tmp_path / "packed"))
+    pldata = fm.load_pldata_file(str(tmp_path / "packed"), "pupil")
+
+    serialized = [
+        (ts, topic, datum.serialized, dict(datum) if idx % 2 else None)
+        for idx, (ts, topic, datum) in enumerate(
+            zip(pldata.timestamps, pldata.topics, pldata.data)
+        )
+    ]
+    with fm.PLData_Writer(str(tmp_path), "pupil") as writer:
+        writer.extend_serialized(serialized[:60])
+        writer.append_serialized(*serialized[60])
+        writer.extend_serialized(serialized[61:])
+
+    for name in ("pupil.pldata", "pupil_timestamps.npy", "pupil_columns/id.bin"):
+        packed = (tmp_path / "packed" / name).read_bytes()
+        assert (tmp_path / name).read_bytes() == packed
+
+
+def test_pldata_writer_uses_passed_datum(tmp_path):
+    _write_pupil_data(str(tmp_path / "packed"))
+    pldata = fm.load_pldata_file(str(tmp_path / "packed"), "pupil")
+
+    with fm.PLData_Writer(str(tmp_path), "pupil") as writer:
+        for idx, (ts, topic, datum) in enumerate(
+            zip(pldata.timestamps, pldata.topics, pldata.data)
+        ):
+            if idx % 3 == 0:
+                # decoded Serialized_Dict
+                datum["confidence"]
+                writer.append_serialized(ts, topic, datum.serialized, datum)
+            elif idx % 3 == 1:
+                fields = fm.pldata_column_fields(dict(datum))
+                writer.append_serialized(ts, topic, datum.serialized, fields)
+            else:
+                # not yet decoded Serialized_Dict
+                datum = fm.Serialized_Dict(msgpack_bytes=datum.serialized)
+                writer.append_serialized(ts, topic, datum.serialized, datum)
+
+    assert fm.pldata_column_fields(pldata.data[0]) == {
+        "confidence": 0.0,
+        "norm_pos": (0.1, 0.2),
+        "diameter": 30.0,
+        "id": 0,
+    }
+    for packed in (tmp_path / "packed" / "pupil_columns").iterdir():
+        assert (tmp_path / "pupil_columns" / packed.name).read_bytes() == (
+            packed.read_bytes()
+        )
+
+
+def test_pldata_columns_cached(tmp_path):
+    _write_pupil_data(str(tmp_path))
+    columns = fm.load_pldata_columns(str(tmp_path), "pupil")
+
+    confidence = columns.column("confidence")
+    assert columns.column("confidence") is confidence
+    with pytest.raises(ValueError):
+        confidence[0] = 1.0
+
+    datum = columns[42]
+    assert columns[42] is datum
+    window = columns[40:50]
+    assert window[2] is datum
+    assert columns[columns.column("id") == 0][21] is datum
+
+
+def test_pldata_writer_saves_timestamps(tmp_path):
+    with fm.PLData_Writer(str(tmp_path), "pupil", fsync_interval=60.0) as writer:
+        for idx in range(3000):
+            writer.append({"topic": "pupil.0", "timestamp": idx * 0.5})
+            if idx == 1500:
+                writer.sync()
+        assert len(writer) == 3000
+
+    timestamps = np.load(str(tmp_path / "pupil_timestamps.npy"))
+    assert timestamps.dtype == np.float64
+    assert np.array_equal(timestamps, np.arange(3000) * 0.5)
+
+    with fm.PLData_Writer(str(tmp_path), "empty"):
+        pass
+    assert np.load(str(tmp_path / "empty_timestamps.npy")).shape == (0,)
+
+
+def test_recover_pldata_file(tmp_path):
+    _write_pupil_data(str(tmp_path))
+    expected = fm.load_pldata_file(str(tmp_path), "pupil")
+    assert not fm.recover_pldata_file(str(tmp_path), "pupil")
+
+    # simulate a crash: no timestamp file, a partially written datum, stale columns
+    (tmp_path / "pupil_timestamps.npy").unlink()
+    with open(str(tmp_path / "pupil.pldata"), "ab") as fh:
+        fh.write(b"\x92\xa7pupil.0\xc4\x30")
+    with open(str(tmp_path / "pupil_columns" / "size.bin"), "r+b") as fh:
+        fh.truncate(40)
+
+    assert fm.recover_pldata_file(str(tmp_path), "pupil")
+    recovered = fm.load_pldata_file(str(tmp_path), "pupil")
+    assert np.array_equal(recovered.timestamps, expected.timestamps)
+    assert list(recovered.topics) == list(expected.topics)
+    columns = fm.load_pldata_columns(str(tmp_path), "pupil")
+    assert len(columns) == 100
+    assert columns[99]["confidence"] == expected.data[99]["confidence"]
@@ -0,0 +1,195 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import file_methods as fm
+import fixation_detector as fd
+import player_methods as pm
+from camera_models import Dummy_Camera
+
+MAX_DISPERSION = np.deg2rad(1.5)
+MIN_DURATION = 0.08
+MAX_DURATION = 0.22
+MIN_DATA_CONFIDENCE = 0.6
+
+
+def _synthetic_gaze_stream(duration_s, with_3d, rate=200.0, seed=0):
+    """Serialized gaze data alternating between fixations and saccades"""
+    rng = np.random.RandomState(seed)
+    timestamps = np.arange(0.0, duration_s, 1.0 / rate)
+    target = np.array([0.0, 0.0, 500.0])
+    next_saccade = 0.0
+    gaze_data = []
+    for ts in timestamps:
+        if ts >= next_saccade:
+            target = np.array([*rng.uniform(-200.0, 200.0, 2), 500.0])
+            next_saccade = ts + rng.uniform(0.1, 0.6)
+        point = target + rng.normal(scale=2.0, size=3)
+        datum = {
+            "topic": "gaze.3d.01." if with_3d else "gaze.2d.01.",
+            "timestamp": float(ts),
+            "confidence": float(rng.uniform(0.5, 1.0)),
+            "norm_pos": (0.5 + point[:2] / point[2]).tolist(),
+        }
+        if with_3d:
+            datum["gaze_point_3d"] = point.tolist()
+        gaze_data.append(fm.Serialized_Dict(python_dict=datum).serialized)
+    return gaze_data, timestamps
+
+
+def _fixation_windows_loop(vectors, timestamps):
+    """I-DT detection recomputing the dispersion for every window change"""
+    start = stop = 0
+    while stop < len(timestamps):
+        if stop - start < 2 or timestamps[stop - 1] - timestamps[start] < MIN_DURATION:
+            stop += 1
+            continue
+        if fd.vector_dispersion(vectors[start:stop]) > MAX_DISPERSION:
+            start += 1
+            continue
+        left = stop - start
+        while stop < len(timestamps) and (
+            timestamps[stop] <= timestamps[start] + MAX_DURATION
+        ):
+            stop += 1
+        dispersion = fd.vector_dispersion(vectors[start:stop])
+        if dispersion <= MAX_DISPERSION:
+            yield start, stop, dispersion
+            start = stop
+            continue
+        right = stop - start
+        while left < right - 1:
+            middle = (left + right) // 2
+            if fd.vector_dispersion(vectors[start : start + middle + 1]) <= (
+                MAX_DISPERSION
+            ):
+                left = middle
+            else:
+                right = middle
+        yield start, start + left, fd.vector_dispersion(vectors[start : start + left])
+        start = stop = start + left
+
+
+@pytest.fixture(params=["3d", "2d", "mixed"])
+def recording(request):
+    duration_s = 20.0
+    if request.param == "mixed":
+        # 3d gaze is only used if available in all chunks
+        gaze_3d, timestamps = _synthetic_gaze_stream(duration_s, with_3d=True)
+        gaze_2d, _ = _synthetic_gaze_stream(duration_s, with_3d=False)
+        gaze_data = gaze_3d[: len(gaze_3d) // 2] + gaze_2d[len(gaze_2d) // 2 :]
+    else:
+        with_3d = request.param == "3d"
+        gaze_data, timestamps = _synthetic_gaze_stream(duration_s, with_3d)
+    capture = SimpleNamespace(
+        frame_size=(1280, 720),
+        intrinsics=Dummy_Camera((1280, 720), "test"),
+        timestamps=timestamps[::6],
+    )
+    method = (
+        fd.FixationDetectionMethod.GAZE_3D
+        if request.param == "3d"
+        else fd.FixationDetectionMethod.GAZE_2D
+    )
+    return capture, gaze_data, timestamps, method
+
+
+def _detect_fixations(capture, gaze_data):
+    results = fd.detect_fixations(
+        capture,
+        gaze_data,
+        MAX_DISPERSION,
+        MIN_DURATION,
+        MAX_DURATION,
+        MIN_DATA_CONFIDENCE,
+    )
+    return [fixation for _, fixation in results if fixation]
+
+
+def test_detect_fixations_matches_full_dispersion_loop(recording):
+    capture, gaze_data, _, method = recording
+    gaze = [fm.Serialized_Dict(msgpack_bytes=serialized) for serialized in gaze_data]
+    gaze = [datum for datum in gaze if datum["confidence"] > MIN_DATA_CONFIDENCE]
+    timestamps = np.array([datum["timestamp"] for datum in gaze])
+    vectors = fd.gaze_vectors(capture, gaze, method)
+
+    factory = fd.Fixation_Result_Factory()
+    expected = [
+        factory.from_data(dispersion, method, gaze[start:stop], capture.timestamps)
+        for start, stop, dispersion in _fixation_windows_loop(vectors, timestamps)
+    ]
+    assert len(expected) > 50
+    assert _detect_fixations(capture, gaze_data) == expected
+
+
+class _Synchronous_Task_Proxy:
+    """Runs the task generator to completion on the first fetch"""
+
+    def __init__(self, name, generator, args=(), kwargs={}, priority=None):
+        self._results = generator(*args, **kwargs)
+        self.completed = False
+        self.canceled = False
+
+    def fetch(self):
+        if not self.completed:
+            yield from self._results
+            self.completed = True
+
+    def cancel(self, timeout=1):
+        self._results.close()
+
+
+@pytest.mark.parametrize("worker_count", [1, 2, 7])
+# chunks without common fixations due to short overlaps are detected again
+@pytest.mark.parametrize("sync_duration", [10.0, 0.1])
+def test_chunked_fixation_detection_matches_serial_run(
+    recording, worker_count, sync_duration, monkeypatch
+):
+    capture, gaze_data, timestamps, _ = recording
+    monkeypatch.setattr(fd.bh, "Pooled_Task_Proxy", _Synchronous_Task_Proxy)
+    monkeypatch.setattr(fd.Chunked_Fixation_Detection_Proxy, "min_chunk_duration", 1.0)
+    monkeypatch.setattr(
+        fd.Chunked_Fixation_Detection_Proxy, "sync_duration", sync_duration
+    )
+
+    gaze_positions = pm.Bisector(
+        [fm.Serialized_Dict(msgpack_bytes=serialized) for serialized in gaze_data],
+        timestamps,
+    )
+    proxy = fd.Chunked_Fixation_Detection_Proxy(
+        "test",
+        capture,
+        gaze_positions,
+        MAX_DISPERSION,
+        MIN_DURATION,
+        MAX_DURATION,
+        MIN_DATA_CONFIDENCE,
+        worker_count=worker_count,
+    )
+    assert len(proxy.chunks) == worker_count
+    chunk_start_ts = [timestamps[chunk.start] for chunk in proxy.chunks[1:]]
+
+    fixations = []
+    while not proxy.completed:
+        fixations.extend(fixation for _, fixation in proxy.fetch() if fixation)
+    assert not proxy.canceled
+
+    expected = _detect_fixations(capture, gaze_data)
+    assert fixations == expected
+    spanning_chunk_starts = [
+        start_ts
+        for start_ts in chunk_start_ts
+        if any(start < start_ts < stop for _, start, stop in expected)
+    ]
+    assert bool(spanning_chunk_starts) == (worker_count > 1)
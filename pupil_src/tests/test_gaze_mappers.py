@@ -0,0 +1,188 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+from collections import deque
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import pytest
+
+import camera_models
+from calibration_routines import gaze_mappers as gm
+
+
+def _eye_timestamps(rng, count, frame_rate, offset):
+    intervals = rng.uniform(0.8, 1.2, count) / frame_rate
+    # occasional frame drops exceed the temporal cutoff of binocular pairing
+    intervals[rng.uniform(size=count) < 0.01] = 0.2
+    return offset + np.cumsum(intervals)
+
+
+def _synthetic_pupil_data(count=3000, seed=0):
+    """Pupil data of two eye cameras with different frame rates"""
+    rng = np.random.RandomState(seed)
+    timestamps = [
+        _eye_timestamps(rng, count * 2 // 5, 120.0, 0.0),
+        _eye_timestamps(rng, count * 3 // 5, 200.0, 0.0013),
+    ]
+    pupil_list = []
+    for eye_id, eye_timestamps in enumerate(timestamps):
+        for ts in eye_timestamps.tolist():
+            normal = rng.normal(size=3)
+            normal[2] = -abs(normal[2]) - 1
+            normal /= np.linalg.norm(normal)
+            low_confidence = rng.uniform() < 0.2
+            pupil_list.append(
+                {
+                    "topic": f"pupil.{eye_id}",
+                    "id": eye_id,
+                    "timestamp": ts,
+                    "confidence": rng.uniform(0.0, 0.6)
+                    if low_confidence
+                    else rng.uniform(0.6, 1.0),
+                    "norm_pos": tuple(rng.uniform(0.2, 0.8, 2).tolist()),
+                    "method": "3d c++",
+                    "sphere": {
+                        "center": (rng.normal(0, 5, 3) + [0, 0, 35]).tolist(),
+                        "radius": 12.0,
+                    },
+                    "circle_3d": {"normal": normal.tolist()},
+                }
+            )
+    pupil_list.sort(key=lambda p: p["timestamp"])
+    return pupil_list
+
+
+def _g_pool():
+    intrinsics = camera_models.Radial_Dist_Camera(
+        [[800, 0, 640], [0, 800, 360], [0, 0, 1]],
+        [[-0.1, 0.05, 0.001, 0.001, 0.0]],
+        (1280, 720),
+        "world",
+    )
+    return SimpleNamespace(
+        capture=SimpleNamespace(intrinsics=intrinsics, frame_size=(1280, 720))
+    )
+
+
+def _params(rng, n):
+    return rng.normal(size=n).tolist(), rng.normal(size=n).tolist(), n
+
+
+def _eye_to_world(rng, tx):
+    matrix = np.eye(4)
+    matrix[:3, :3] = cv2.Rodrigues(rng.normal(0, 0.2, 3))[0]
+    matrix[:3, 3] = [tx, 15, -20]
+    return matrix.tolist()
+
+
+MAPPER_FACTORIES = {
+    "monocular": lambda g_pool, rng: gm.Monocular_Gaze_Mapper(g_pool, _params(rng, 7)),
+    "dual_monocular": lambda g_pool, rng: gm.Dual_Monocular_Gaze_Mapper(
+        g_pool, _params(rng, 9), _params(rng, 7)
+    ),
+    "binocular": lambda g_pool, rng: gm.Binocular_Gaze_Mapper(
+        g_pool, _params(rng, 13), _params(rng, 7), _params(rng, 9)
+    ),
+    "vector": lambda g_pool, rng: gm.Vector_Gaze_Mapper(
+        g_pool, _eye_to_world(rng, 30), [], [], []
+    ),
+    "binocular_vector": lambda g_pool, rng: gm.Binocular_Vector_Gaze_Mapper(
+        g_pool, _eye_to_world(rng, 30), _eye_to_world(rng, -30)
+    ),
+    "binocular_vector_no_backprojection": lambda g_pool, rng: (
+        gm.Binocular_Vector_Gaze_Mapper(
+            g_pool, _eye_to_world(rng, 30), _eye_to_world(rng, -30), backproject=False
+        )
+    ),
+}
+
+
+def _assert_gaze_equal(expected, actual):
+    if isinstance(expected, dict):
+        assert list(expected) == list(actual)
+        for key in expected:
+            _assert_gaze_equal(expected[key], actual[key])
+    elif isinstance(expected, (list, tuple)):
+        assert len(expected) == len(actual)
+        for expected_item, actual_item in zip(expected, actual):
+            _assert_gaze_equal(expected_item, actual_item)
+    elif isinstance(expected, float):
+        assert actual == pytest.approx(expected, rel=1e-6, abs=1e-8, nan_ok=True)
+    else:
+        assert actual == expected
+
+
+@pytest.fixture(scope="module")
+def pupil_list():
+    return _synthetic_pupil_data()
+
+
+@pytest.mark.parametrize("mapper_name", list(MAPPER_FACTORIES))
+def test_map_batch_matches_on_pupil_datum(pupil_list, mapper_name):
+    make_mapper = MAPPER_FACTORIES[mapper_name]
+    mapper = make_mapper(_g_pool(), np.random.RandomState(1))
+    batch_mapper = make_mapper(_g_pool(), np.random.RandomState(1))
+    assert batch_mapper.supports_batch_mapping
+
+    expected = []
+    for p in pupil_list:
+        expected.extend(mapper.on_pupil_datum(p))
+    gaze = batch_mapper.map_batch(pupil_list)
+
+    assert len(gaze) == len(expected)
+    for expected_datum, gaze_datum in zip(expected, gaze):
+        _assert_gaze_equal(expected_datum, gaze_datum)
+        assert all(
+            actual is original
+            for actual, original in zip(
+                gaze_datum["base_data"], expected_datum["base_data"]
+            )
+        )
+    if hasattr(mapper, "last_gaze_distance"):
+        assert batch_mapper.last_gaze_distance == pytest.approx(
+            mapper.last_gaze_distance
+        )
+
+    if isinstance(mapper, gm.Binocular_Gaze_Mapper_Base):
+        base_data_counts = [len(g["base_data"]) for g in expected]
+        assert base_data_counts.count(2) > len(expected) // 4
+        # low confidence data and frame drops are mapped monocularly
+        monocular = [g["base_data"][0] for g in expected if len(g["base_data"]) == 1]
+        assert any(p["confidence"] < mapper.min_pupil_confidence for p in monocular)
+        assert any(p["confidence"] >= mapper.min_pupil_confidence for p in monocular)
+
+
+def test_estimate_framerate_smoothed_matches_mean_of_differences():
+    # the online mapping path estimates the frame rate for every pupil datum
+    mapper = gm.Binocular_Gaze_Mapper_Base(_g_pool())
+    expected_framerate = mapper.recently_estimated_framerate
+    rng = np.random.RandomState(0)
+    for _ in range(200):
+        caches = [
+            deque(
+                {"timestamp": ts}
+                for ts in (np.cumsum(rng.uniform(0.001, 0.2, count)) + 1e4).tolist()
+            )
+            for count in rng.randint(0, 12, 2)
+        ]
+        framerates_raw = [
+            np.mean(np.diff([p["timestamp"] for p in cache]))
+            for cache in caches
+            if len(cache) >= 2
+        ]
+        if framerates_raw:
+            expected_framerate += (
+                max(framerates_raw) - expected_framerate
+            ) * mapper.framerate_estimation_smoothing_factor
+
+        framerate = mapper.estimate_framerate_smoothed(*caches)
+        assert framerate == pytest.approx(expected_framerate, rel=1e-9)
@@ -0,0 +1,177 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import pickle
+
+import numpy as np
+import pytest
+
+import player_methods as pm
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(pm.Timeline_Index, "chunk_size", 4)
+
+
+def _overlapping(intervals, ts_window):
+    return [
+        datum
+        for datum, start, stop in sorted(intervals, key=lambda i: i[1])
+        if start < ts_window[1] and stop >= ts_window[0]
+    ]
+
+
+def test_timeline_index_overlap_with_long_intervals(small_chunks):
+    rng = np.random.RandomState(0)
+    start_ts = rng.uniform(0, 100, 200)
+    # mostly short intervals, some spanning large parts of the timeline
+    durations = np.where(rng.rand(200) < 0.1, 50.0, rng.uniform(0, 1, 200))
+    intervals = list(zip(range(200), start_ts, start_ts + durations))
+
+    index = pm.Affiliator(*zip(*intervals))
+
+    for _ in range(100):
+        ts_window = np.sort(rng.uniform(-10, 160, 2))
+        assert index.by_ts_window(ts_window) == _overlapping(intervals, ts_window)
+
+
+def test_timeline_index_insert(small_chunks):
+    rng = np.random.RandomState(1)
+    index = pm.Timeline_Index()
+    intervals = []
+    for datum in range(100):
+        start = rng.uniform(0, 10)
+        stop = start + rng.uniform(0, 3)
+        intervals.append((datum, start, stop))
+        index.insert(start, datum, stop)
+
+    expected = [datum for datum, _, _ in sorted(intervals, key=lambda i: i[1])]
+    assert list(index) == expected
+    assert [index[idx] for idx in range(len(index))] == expected
+    assert index[-1] == expected[-1]
+    assert np.all(np.diff(index.timestamps) >= 0)
+    for _ in range(50):
+        ts_window = np.sort(rng.uniform(-1, 14, 2))
+        assert index.by_ts_window(ts_window) == _overlapping(intervals, ts_window)
+
+
+def test_mutable_bisector_matches_bisector(small_chunks):
+    rng = np.random.RandomState(2)
+    timestamps = rng.uniform(0, 10, 50)
+    data = list(range(50))
+    bisector = pm.Bisector(data, timestamps)
+    mutable = pm.Mutable_Bisector()
+    for ts, datum in zip(timestamps, data):
+        mutable.insert(ts, datum)
+
+    assert list(mutable) == list(bisector)
+    assert mutable.by_ts(timestamps[7]) == 7
+    with pytest.raises(ValueError):
+        mutable.by_ts(-1.0)
+    for _ in range(50):
+        ts_window = np.sort(rng.uniform(-1, 11, 2))
+        assert mutable.by_ts_window(ts_window) == list(
+            bisector.by_ts_window(ts_window)
+        )
+        expected = bisector.init_dict_for_window(ts_window)
+        init_dict = mutable.init_dict_for_window(ts_window)
+        assert init_dict["data"] == list(expected["data"])
+        assert np.array_equal(init_dict["data_ts"], expected["data_ts"])
+
+
+def test_bisector_from_sorted_streams_matches_bisector():
+    rng = np.random.RandomState(3)
+    streams = []
+    for stream_idx in range(3):
+        timestamps = np.sort(rng.uniform(0, 10, 100 + stream_idx))
+        data = ["{}-{}".format(stream_idx, idx) for idx in range(len(timestamps))]
+        streams.append((data, timestamps))
+    streams.append(([], []))
+    all_data = [datum for data, _ in streams for datum in data]
+    all_ts = np.concatenate([timestamps for _, timestamps in streams[:3]])
+    bisector = pm.Bisector(all_data, all_ts)
+    merged = pm.Bisector.from_sorted_streams(streams)
+
+    assert len(merged) == len(bisector)
+    assert list(merged) == list(bisector)
+    assert np.array_equal(merged.timestamps, bisector.timestamps)
+    assert merged[-1] == bisector[-1]
+    assert merged.by_ts(all_ts[42]) == all_data[42]
+    for _ in range(50):
+        ts_window = np.sort(rng.uniform(-1, 11, 2))
+        assert merged.by_ts_window(ts_window) == list(bisector.by_ts_window(ts_window))
+
+    restored = pickle.loads(pickle.dumps(merged))
+    assert list(restored) == list(bisector)
+
+
+def test_bisector_from_sorted_streams_single_and_empty():
+    data = ["a", "b", "c"]
+    merged = pm.Bisector.from_sorted_streams([(data, [0.0, 1.0, 2.0])])
+    data.append("d")  # mappers append to their gaze while mapping
+    assert list(merged) == ["a", "b", "c"]
+    # unsorted streams are sorted
+    merged = pm.Bisector.from_sorted_streams([(["b", "a"], [1.0, 0.0])])
+    assert list(merged) == ["a", "b"]
+    assert not pm.Bisector.from_sorted_streams([])
+    assert pm.Bisector.from_sorted_streams([([], [])]).by_ts_window((0, 1)) == []
+    with pytest.raises(ValueError):
+        pm.Bisector.from_sorted_streams([(["a"], [])])
+
+
+def test_affiliator_init_dict_roundtrip():
+    affiliator = pm.Affiliator(["a", "b", "c"], [0.0, 1.0, 2.0], [5.0, 1.5, 2.5])
+    init_dict = affiliator.init_dict_for_window((1.2, 3.0))
+    assert init_dict["data"] == ["a", "b", "c"]
+
+    restored = pickle.loads(pickle.dumps(pm.Affiliator(**init_dict)))
+    assert restored.by_ts_window((3.0, 4.0)) == ["a"]
+    assert not pm.Affiliator()
+    assert pm.Affiliator().by_ts_window((0.0, 1.0)) == []
+
+
+def _correlate_data_loop(data, timestamps):
+    """Previous per-datum implementation of `correlate_data` as reference"""
+    timestamps = list(timestamps)
+    data_by_frame = [[] for i in timestamps]
+    frame_idx = 0
+    data_index = 0
+    data.sort(key=lambda d: d["timestamp"])
+    while True:
+        try:
+            datum = data[data_index]
+            ts = (timestamps[frame_idx] + timestamps[frame_idx + 1]) / 2.0
+        except IndexError:
+            break
+        if datum["timestamp"] <= ts:
+            data_by_frame[frame_idx].append(datum)
+            data_index += 1
+        else:
+            frame_idx += 1
+    return data_by_frame
+
+
+@pytest.mark.parametrize("frame_count", [0, 1, 2, 50])
+def test_correlate_data_matches_loop(frame_count):
+    rng = np.random.RandomState(3)
+    timestamps = np.sort(rng.uniform(0, 10, frame_count))
+    # include data before, after, and exactly on frame midpoints
+    data_ts = list(rng.uniform(-1, 11, 500))
+    data_ts.extend((timestamps[:-1] + timestamps[1:]) / 2.0)
+    data = [{"timestamp": ts, "idx": idx} for idx, ts in enumerate(data_ts)]
+
+    expected = _correlate_data_loop(list(data), timestamps)
+    correlated = pm.correlate_data(data, timestamps)
+
+    assert len(correlated) == len(expected)
+    assert list(correlated) == expected
+    assert correlated[1:3] == expected[1:3]
+    assert correlated.counts().tolist() == [len(frame) for frame in expected]
@@ -0,0 +1,138 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+from types import SimpleNamespace
+
+import pytest
+
+import pupil_data_relay
+import zmq_tools
+from pupil_data_relay import Pupil_Data_Relay, send_recent_events
+
+
+class _Fake_Socket:
+    def close(self):
+        pass
+
+
+class _Fake_Msg_Receiver(zmq_tools.Msg_Receiver):
+    """Receives serialized pupil data from a list instead of a socket"""
+
+    messages = []
+
+    def __init__(self, ctx, url, topics=()):
+        self.socket = _Fake_Socket()
+
+    @property
+    def new_data(self):
+        return bool(self.messages)
+
+    def recv_serialized(self):
+        return self.messages.pop(0)
+
+
+class _Fake_Msg_Streamer(zmq_tools.Msg_Streamer):
+    """Records sent messages instead of sending them"""
+
+    def __init__(self, ctx=None, url=None):
+        self.socket = _Fake_Socket()
+        self.sent = []
+
+    def send_serialized(self, topic, payload_serialized):
+        self.sent.append((topic, payload_serialized))
+
+
+class _Gaze_Mapper:
+    def on_pupil_datum(self, pupil_datum):
+        return [
+            {
+                "topic": "gaze.2d.0.",
+                "norm_pos": pupil_datum["norm_pos"],
+                "confidence": pupil_datum["confidence"],
+                "timestamp": pupil_datum["timestamp"],
+                "base_data": [pupil_datum],
+            }
+        ]
+
+
+@pytest.fixture
+def relay(monkeypatch):
+    monkeypatch.setattr(pupil_data_relay.zmq_tools, "Msg_Receiver", _Fake_Msg_Receiver)
+    monkeypatch.setattr(pupil_data_relay.zmq_tools, "Msg_Streamer", _Fake_Msg_Streamer)
+    monkeypatch.setattr(_Fake_Msg_Receiver, "messages", [])
+    g_pool = SimpleNamespace(
+        zmq_ctx=None,
+        ipc_pub_url="ipc_pub_url",
+        ipc_sub_url="ipc_sub_url",
+        active_gaze_mapping_plugin=_Gaze_Mapper(),
+    )
+    return Pupil_Data_Relay(g_pool)
+
+
+def _receive_pupil(timestamps):
+    streamer = _Fake_Msg_Streamer()
+    for ts in timestamps:
+        pupil_datum = {
+            "topic": "pupil.0",
+            "norm_pos": (0.5, 0.5),
+            "confidence": 1.0,
+            "timestamp": ts,
+            "id": 0,
+        }
+        _Fake_Msg_Receiver.messages.append(
+            ("pupil.0", streamer.serialize_payload(pupil_datum), [])
+        )
+
+
+def test_world_loop_sends_only_events_that_were_not_sent(relay):
+    ipc_pub = _Fake_Msg_Streamer()
+    for iteration in range(3):
+        _receive_pupil([iteration + 0.1, iteration + 0.2])
+        events = {"dt": 0.03, "frame": object()}
+        relay.recent_events(events)
+        notification = {"topic": "notify.test", "subject": "test"}
+        events["fixations"] = [notification]
+
+        send_recent_events(ipc_pub, events)
+
+        assert events == {"fixations": [notification]}
+        assert ipc_pub.sent == [
+            ("notify.test", ipc_pub.serialize_payload(notification))
+        ]
+        ipc_pub.sent.clear()
+
+    # gaze is sent by the relay itself
+    assert [topic for topic, _ in relay.gaze_pub.sent] == ["gaze.2d.0."] * 6
+
+
+def test_relayed_data_is_recorded_from_serialized_payloads(relay):
+    _receive_pupil([1.0, 2.0, 3.0])
+    events = {"dt": 0.03}
+    relay.recent_events(events)
+
+    serialized_data = relay.g_pool.recent_serialized_data
+    for key in ("pupil", "gaze"):
+        assert len(serialized_data[key]) == len(events[key]) == 3
+        for (ts, topic, payload, datum), event_datum in zip(
+            serialized_data[key], events[key]
+        ):
+            assert datum is event_datum
+            assert ts == datum["timestamp"]
+            assert topic == datum["topic"]
+            assert relay.pupil_sub.deserialize_payload(payload) == datum
+    assert relay.gaze_pub.sent == [
+        (topic, payload) for _, topic, payload, _ in serialized_data["gaze"]
+    ]
+
+    # no data received in the next iteration
+    events = {"dt": 0.03}
+    relay.recent_events(events)
+    assert events == {"dt": 0.03, "pupil": [], "gaze": []}
+    assert relay.g_pool.recent_serialized_data == {"pupil": [], "gaze": []}
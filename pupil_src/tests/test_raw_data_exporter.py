@@ -8,10 +8,12 @@ Lesser General Public License (LGPL v3.0).
 See COPYING and COPYING.LESSER for license details.
 ---------------------------------------------------------------------------~(*)
 """
+import numpy as np
 import pytest
 
 from raw_data_exporter import Pupil_Positions_Exporter
 from raw_data_exporter import Gaze_Positions_Exporter
+from raw_data_exporter import _write_columnar_export
 
 
 def _test_exporter(exporter, positions, expected_dict_export, world_index=123):
@@ -52,6 +54,49 @@ def test_gaze_positions_exporter_pi():
     )
 
 
+def test_gaze_positions_columns_export(tmpdir):
+    exporter = Gaze_Positions_Exporter()
+    raw_values = [PUPIL_CAPTURE_GAZE_POSITION_0, PUPIL_INVISIBLE_GAZE_POSITION_0]
+    expected = [PUPIL_CAPTURE_GAZE_EXPORT_DICT_0, PUPIL_INVISIBLE_GAZE_EXPORT_DICT_0]
+
+    rows = exporter.rows_export(raw_values, world_indices=[123, 123])
+    columns = exporter.columns_export(rows)
+    assert tuple(columns.keys()) == exporter.csv_export_labels()
+    assert columns["world_index"].dtype == np.int64
+    assert columns["base_data"].tolist() == [expected[0]["base_data"], ""]
+    assert columns["gaze_timestamp"].tolist() == [
+        float(d["gaze_timestamp"]) for d in expected
+    ]
+    assert columns["gaze_point_3d_x"][0] == expected[0]["gaze_point_3d_x"]
+    assert np.isnan(columns["gaze_point_3d_x"][1])
+
+    export_path = _write_columnar_export(columns, str(tmpdir / "gaze"), "npz")
+    loaded = np.load(export_path)
+    assert list(loaded.keys()) == list(columns.keys())
+    for label, column in columns.items():
+        np.testing.assert_array_equal(loaded[label], column)
+
+
+def test_pupil_positions_columns_export_nullable_int():
+    exporter = Pupil_Positions_Exporter()
+    pupil_2d = {
+        key: PUPIL_CAPTURE_PUPIL_POSITION_0[key]
+        for key in ("timestamp", "id", "confidence", "norm_pos", "diameter")
+    }
+    pupil_2d["method"] = "2d c++"
+
+    rows = exporter.rows_export(
+        [PUPIL_CAPTURE_PUPIL_POSITION_0, pupil_2d], world_indices=[1, 2]
+    )
+    columns = exporter.columns_export(rows)
+    assert columns["eye_id"].dtype == np.int64
+    assert columns["method"].tolist() == ["3d c++", "2d c++"]
+    # missing model ids turn the column into floats
+    assert columns["model_id"][0] == 14
+    assert np.isnan(columns["model_id"][1])
+    assert np.isnan(columns["ellipse_center_x"][1])
+
+
 PUPIL_CAPTURE_PUPIL_TIMESTAMP_0 = 18147.38145
 PUPIL_CAPTURE_PUPIL_POSITION_0 = {
     'topic': 'pupil.0',
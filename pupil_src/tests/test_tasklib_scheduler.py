@@ -0,0 +1,173 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import tasklib.background.scheduler as sch
+
+# workers account the memory usage of their tasks with psutil
+pytest.importorskip("psutil")
+
+
+def _count(n, delay=0.0):
+    for i in range(n):
+        time.sleep(delay)
+        yield i
+
+
+def _square(x):
+    return x * x
+
+
+def _fail():
+    raise ZeroDivisionError("background failure")
+
+
+def _yield_unpicklable():
+    yield 0
+    yield lambda: None
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = sch.Scheduler(max_workers=1)
+    yield scheduler
+    scheduler.shutdown()
+
+
+def _pooled_task(scheduler, function, args=(), priority=sch.PRIORITY_DEFAULT):
+    is_generator = function in (_count, _yield_unpicklable)
+    task = sch.PooledTask(
+        function.__name__,
+        function,
+        is_generator,
+        False,
+        args,
+        {},
+        [],
+        priority,
+        scheduler,
+    )
+    events = []
+    task.add_observer("on_yield", events.append)
+    task.add_observer("on_completed", lambda value: events.append(("done", value)))
+    task.add_observer("on_exception", lambda err: events.append(err))
+    task.add_observer("on_canceled_or_killed", lambda: events.append("canceled"))
+    task.start()
+    return task, events
+
+
+def _wait_for(tasks, scheduler, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while any(not task.ended for task in tasks):
+        assert time.monotonic() < deadline, "tasks did not end in time"
+        scheduler.update()
+        time.sleep(0.01)
+
+
+def test_scheduler_runs_queued_tasks_by_priority(scheduler):
+    order = []
+    blocker, _ = _pooled_task(scheduler, _count, args=(3, 0.05))
+    scheduler.update()
+    export, _ = _pooled_task(
+        scheduler, _square, args=(2,), priority=sch.PRIORITY_EXPORT
+    )
+    interactive, events = _pooled_task(
+        scheduler, _square, args=(3,), priority=sch.PRIORITY_INTERACTIVE
+    )
+    for task in (blocker, export, interactive):
+        task.add_observer("on_ended", lambda task=task: order.append(task))
+
+    scheduler.update()
+    assert blocker.running and not blocker.queued
+    assert export.queued and interactive.queued
+
+    _wait_for([blocker, export, interactive], scheduler)
+    assert order == [blocker, interactive, export]
+    assert events == [("done", 9)]
+    assert interactive.cpu_time >= 0.0
+    assert interactive.peak_memory > 0
+    # all tasks ran on the same, reused worker process
+    assert len(scheduler._workers) == 1
+
+
+def test_scheduler_cancels_running_and_queued_tasks(scheduler):
+    running, running_events = _pooled_task(scheduler, _count, args=(1000, 0.01))
+    queued, queued_events = _pooled_task(scheduler, _square, args=(2,))
+    scheduler.update()
+
+    running.cancel_gracefully()
+    queued.cancel_gracefully()
+    _wait_for([running, queued], scheduler)
+
+    assert running_events[-1] == "canceled"
+    assert queued_events == ["canceled"]
+
+    # the worker is reused after a graceful cancellation
+    task, events = _pooled_task(scheduler, _count, args=(3,))
+    _wait_for([task], scheduler)
+    assert events == [0, 1, 2, ("done", None)]
+
+
+def test_scheduler_forwards_exceptions_and_kills(scheduler):
+    failing, events = _pooled_task(scheduler, _fail)
+    _wait_for([failing], scheduler)
+    assert isinstance(events[0], ZeroDivisionError)
+
+    endless, events = _pooled_task(scheduler, _count, args=(10 ** 6, 0.01))
+    scheduler.update()
+    endless.kill(grace_period=0.1)
+    assert endless.canceled_or_killed and events[-1] == "canceled"
+
+
+def test_scheduler_forwards_unpicklable_results_as_exception(scheduler):
+    task, events = _pooled_task(scheduler, _yield_unpicklable)
+    _wait_for([task], scheduler)
+    assert events[0] == 0
+    assert len(events) == 2 and isinstance(events[1], Exception)
+    assert not isinstance(events[1], sch.WorkerDiedError)
+
+    # the worker is reused afterwards
+    (worker,) = scheduler._workers
+    task, events = _pooled_task(scheduler, _count, args=(3,))
+    _wait_for([task], scheduler)
+    assert events == [0, 1, 2, ("done", None)]
+    assert scheduler._workers == [worker]
+
+
+def test_job_accounting_samples_memory_periodically(monkeypatch):
+    monkeypatch.setattr(sch._Job_Accounting, "memory_sample_interval", 60.0)
+    accounting = sch._Job_Accounting()
+    rss_values = [100, 300, 200]
+
+    class _Process:
+        num_calls = 0
+
+        def memory_info(self):
+            rss = rss_values[min(self.num_calls, len(rss_values) - 1)]
+            self.num_calls += 1
+            return SimpleNamespace(rss=rss)
+
+    accounting._process = _Process()
+    accounting._peak_memory = 0
+    for _ in range(1000):
+        accounting.sample_memory()
+    assert accounting._process.num_calls == 0
+
+    accounting._next_sample_time = 0.0
+    accounting.sample_memory()
+    accounting.sample_memory()
+    assert accounting._process.num_calls == 1
+    # the final signal always samples the memory usage
+    assert accounting.signal().peak_memory == 300
+    assert accounting._process.num_calls == 2
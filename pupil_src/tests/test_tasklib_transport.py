@@ -0,0 +1,185 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import multiprocessing as mp
+from collections import namedtuple
+
+import numpy as np
+import pytest
+
+from tasklib.background import transport
+from tasklib.background.transport import BatchReceiver, BatchSender
+
+_Signal = namedtuple("_Signal", "datum")
+
+
+@pytest.fixture
+def pipe():
+    pipe_recv, pipe_send = mp.Pipe(duplex=False)
+    yield BatchReceiver(pipe_recv), pipe_send
+    pipe_recv.close()
+    pipe_send.close()
+
+
+def _drain(receiver):
+    items = []
+    while receiver.poll(0):
+        items.append(receiver.recv())
+    return items
+
+
+def test_batch_sender_batches_by_count(pipe):
+    receiver, pipe_send = pipe
+    sender = BatchSender(pipe_send, max_batch_size=10, max_batch_delay=60.0)
+    for i in range(25):
+        sender.send({"index": i})
+
+    # the first item is sent right away, then batches of ten
+    assert [d["index"] for d in _drain(receiver)] == list(range(21))
+    sender.flush()
+    assert [d["index"] for d in _drain(receiver)] == list(range(21, 25))
+
+    stats = receiver.stats()
+    assert stats["items"] == 25
+    assert stats["batches"] == 4
+
+
+def test_batch_sender_sends_delayed_items(pipe):
+    receiver, pipe_send = pipe
+    sender = BatchSender(pipe_send, max_batch_size=1000, max_batch_delay=0.01)
+    sender.send(0)
+    sender.send(1)
+    assert receiver.poll(1.0) and receiver.recv() == 0
+    # the second item is sent without waiting for a third one
+    assert receiver.poll(1.0) and receiver.recv() == 1
+    sender.flush()
+
+
+def test_batch_sender_shares_large_arrays(pipe):
+    receiver, pipe_send = pipe
+    sender = BatchSender(pipe_send, shared_array_min_bytes=1024)
+    structured = np.zeros(500, dtype=[("ts", "<f8"), ("conf", "<f4")])
+    structured["ts"] = np.arange(500)
+    large = np.random.rand(100, 50)[:, ::2]
+    small = np.arange(3)
+    items = [
+        _Signal((0.5, large)),
+        _Signal(structured),
+        (small, "small"),
+    ]
+    for item in items:
+        sender.send(item)
+    sender.flush()
+
+    received = _drain(receiver)
+    assert isinstance(received[0], _Signal)
+    assert received[0].datum[0] == 0.5
+    assert np.array_equal(received[0].datum[1], large)
+    assert received[1].datum.dtype == structured.dtype
+    assert np.array_equal(received[1].datum, structured)
+    assert np.array_equal(received[2][0], small)
+
+    stats = receiver.stats()
+    if stats["shared_bytes"]:
+        assert stats["shared_bytes"] == large.nbytes + structured.nbytes
+        assert stats["bytes"] < stats["shared_bytes"]
+
+
+class _Recording_Sender(BatchSender):
+    """Records the names of shared memory blocks"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.shared_names = []
+
+    def _share_arrays(self, obj, depth):
+        shared = super()._share_arrays(obj, depth)
+        if isinstance(shared, transport._SharedArray):
+            self.shared_names.append(shared.name)
+        return shared
+
+
+def _shared_block_exists(name):
+    try:
+        block = transport.mp_shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return False
+    block.close()
+    return True
+
+
+def _send_arrays_and_wait(pipe_send, names_send, num_arrays):
+    sender = _Recording_Sender(pipe_send, shared_array_min_bytes=1024)
+    for i in range(num_arrays):
+        sender.send(_Signal(np.full(1000, i)))
+    sender.flush()
+    names_send.send(sender.shared_names)
+    names_send.recv()  # blocks until the process is terminated
+
+
+@pytest.mark.skipif(transport.mp_shared_memory is None, reason="no shared memory")
+def test_discard_unlinks_unread_shared_arrays(pipe):
+    receiver, pipe_send = pipe
+    sender = _Recording_Sender(pipe_send, shared_array_min_bytes=1024)
+    for i in range(5):
+        sender.send(_Signal((i, np.full(1000, i))))
+    sender.flush()
+    assert len(sender.shared_names) == 5
+
+    first = receiver.recv()
+    assert np.array_equal(first.datum[1], np.full(1000, 0))
+    assert not _shared_block_exists(sender.shared_names[0])
+    assert all(_shared_block_exists(name) for name in sender.shared_names[1:])
+
+    pipe_send.close()
+    receiver.discard()
+    assert not any(_shared_block_exists(name) for name in sender.shared_names)
+
+
+@pytest.mark.skipif(transport.mp_shared_memory is None, reason="no shared memory")
+def test_discard_unlinks_shared_arrays_of_killed_sender(pipe):
+    receiver, pipe_send = pipe
+    names_recv, names_send = mp.Pipe()
+    process = mp.Process(
+        target=_send_arrays_and_wait, args=(pipe_send, names_send, 5), daemon=True
+    )
+    process.start()
+    pipe_send.close()
+    assert names_recv.poll(10.0)
+    shared_names = names_recv.recv()
+    assert len(shared_names) == 5
+
+    process.terminate()
+    process.join()
+    # blocks stay available until they are received or discarded
+    assert all(_shared_block_exists(name) for name in shared_names)
+    receiver.discard()
+    assert not any(_shared_block_exists(name) for name in shared_names)
+
+
+@pytest.mark.skipif(transport.mp_shared_memory is None, reason="no shared memory")
+def test_unpicklable_batch_is_replaced_by_error(pipe):
+    receiver, pipe_send = pipe
+    sender = _Recording_Sender(
+        pipe_send, max_batch_delay=60.0, shared_array_min_bytes=1024
+    )
+    sender.send(_Signal(0))
+    sender.send(_Signal(np.full(1000, 1)))
+    sender.send(_Signal(lambda: None))
+    sender.send_final([_Signal("done")], lambda err, tb: ("error", err, tb))
+
+    first, error = _drain(receiver)
+    assert first == _Signal(0)
+    assert error[0] == "error"
+    assert isinstance(error[1], Exception)
+    assert "Traceback" in error[2]
+    # shared arrays of the unpicklable batch are not leaked
+    assert len(sender.shared_names) == 1
+    assert not _shared_block_exists(sender.shared_names[0])
@@ -0,0 +1,183 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from tasklib.background.scheduler import PRIORITY_EXPORT
+from video_export.plugins import world_video_exporter
+from video_export.plugins.world_video_exporter import World_Video_Exporter
+
+
+def _segment_ranges(start_frame, end_frame, num_workers):
+    exporter = SimpleNamespace(
+        num_workers=num_workers,
+        min_segment_frames=World_Video_Exporter.min_segment_frames,
+    )
+    return World_Video_Exporter._segment_ranges(exporter, start_frame, end_frame)
+
+
+@pytest.mark.parametrize(
+    "start_frame, end_frame, num_workers, expected",
+    [
+        (0, 0, 4, [(0, 0)]),
+        (0, 1199, 4, [(0, 1199)]),
+        (0, 1200, 4, [(0, 600), (600, 1200)]),
+        (0, 1200, 1, [(0, 1200)]),
+        (10, 1811, 4, [(10, 610), (610, 1210), (1210, 1811)]),
+        (100, 10100, 3, [(100, 3433), (3433, 6766), (6766, 10100)]),
+    ],
+)
+def test_segment_ranges(start_frame, end_frame, num_workers, expected):
+    assert _segment_ranges(start_frame, end_frame, num_workers) == expected
+
+
+@pytest.mark.parametrize("num_workers", [1, 2, 3, 7, 16])
+@pytest.mark.parametrize("num_frames", [0, 1, 599, 600, 1201, 4799, 4800, 100003])
+def test_segment_ranges_cover_export_range(num_workers, num_frames):
+    start_frame = 37
+    end_frame = start_frame + num_frames
+    segment_ranges = _segment_ranges(start_frame, end_frame, num_workers)
+
+    assert 1 <= len(segment_ranges) <= num_workers
+    assert segment_ranges[0][0] == start_frame
+    assert segment_ranges[-1][1] == end_frame
+    for (_, stop), (next_start, _) in zip(segment_ranges, segment_ranges[1:]):
+        assert stop == next_start
+    if len(segment_ranges) > 1:
+        sizes = [stop - start for start, stop in segment_ranges]
+        assert min(sizes) >= World_Video_Exporter.min_segment_frames
+        assert max(sizes) - min(sizes) <= 1
+
+
+class _Stepping_Task_Proxy:
+    """Runs its generator by one step per fetch"""
+
+    created = []
+
+    def __init__(self, name, generator, args=(), kwargs={}, priority=None):
+        self.name = name
+        self.generator = generator
+        self.args = args
+        self.priority = priority
+        self._results = generator(*args, **kwargs)
+        self.completed = False
+        self.canceled = False
+        self.created.append(self)
+
+    def fetch(self):
+        if self.completed or self.canceled:
+            return
+        try:
+            yield next(self._results)
+        except StopIteration:
+            self.completed = True
+
+    def cancel(self, timeout=1):
+        self._results.close()
+        self.canceled = True
+
+
+def _fake_export_world_video(*args):
+    start_frame, end_frame = args[3:5]
+    for exported_frames in range(0, end_frame - start_frame + 1, 300):
+        yield "Exporting", exported_frames
+
+
+def _fake_concatenate_world_video_segments(segment_paths, out_file_path, rec_dir):
+    yield "Concatenating video segments", 0
+    yield "Export done.", len(segment_paths)
+
+
+@pytest.fixture
+def create_proxy(monkeypatch):
+    monkeypatch.setattr(
+        world_video_exporter.bh, "Pooled_Task_Proxy", _Stepping_Task_Proxy
+    )
+    monkeypatch.setattr(_Stepping_Task_Proxy, "created", [])
+    monkeypatch.setattr(
+        world_video_exporter, "_export_world_video", _fake_export_world_video
+    )
+    monkeypatch.setattr(
+        world_video_exporter,
+        "_concatenate_world_video_segments",
+        _fake_concatenate_world_video_segments,
+    )
+
+    def create_proxy(segment_ranges, num_workers):
+        segment_args = [
+            (None, None, 0.6, start, end, [], f"world_segment_{idx:03d}.mp4", {}, 0)
+            for idx, (start, end) in enumerate(segment_ranges)
+        ]
+        concat_args = ([args[6] for args in segment_args], "world.mp4", "rec_dir")
+        return world_video_exporter._Segmented_Export_Proxy(
+            "Export World Video", segment_args, concat_args, num_workers
+        )
+
+    return create_proxy
+
+
+def test_segments_are_exported_by_one_task(create_proxy):
+    proxy = create_proxy([(0, 600), (600, 1200), (1200, 1800)], num_workers=2)
+    results = []
+    max_running = 0
+    while not proxy.completed:
+        results.extend(proxy.fetch())
+        max_running = max(max_running, len(proxy.running))
+        assert all(
+            task.generator is _fake_export_world_video
+            for task in _Stepping_Task_Proxy.created[:-1]
+        )
+    assert not proxy.canceled
+    assert max_running == 2
+
+    tasks = _Stepping_Task_Proxy.created
+    assert [task.args[3:5] for task in tasks[:3]] == [
+        (0, 600),
+        (600, 1200),
+        (1200, 1800),
+    ]
+    assert all(task.completed for task in tasks)
+    assert all(task.priority == PRIORITY_EXPORT for task in tasks)
+    # concatenated after all segments were exported
+    assert tasks[-1].generator is _fake_concatenate_world_video_segments
+    assert tasks[-1].args[0] == [
+        "world_segment_000.mp4",
+        "world_segment_001.mp4",
+        "world_segment_002.mp4",
+    ]
+    progress = [exported_frames for _, exported_frames in results]
+    assert progress == sorted(progress)
+    assert progress[-1] == 1800
+    assert results[-1][0] == "Export done."
+    assert list(proxy.fetch()) == []
+
+
+def test_canceled_segment_cancels_export(create_proxy):
+    proxy = create_proxy([(0, 600), (600, 1200), (1200, 1800)], num_workers=2)
+    list(proxy.fetch())
+    first, second = _Stepping_Task_Proxy.created
+    second.canceled = True
+    list(proxy.fetch())
+    assert proxy.canceled
+    assert first.canceled
+    assert len(_Stepping_Task_Proxy.created) == 2
+    assert list(proxy.fetch()) == []
+
+
+def test_cancel_stops_concatenation(create_proxy):
+    proxy = create_proxy([(0, 600), (600, 1200)], num_workers=2)
+    while proxy.concat_task is None:
+        list(proxy.fetch())
+    proxy.cancel()
+    assert proxy.canceled
+    assert proxy.concat_task.canceled
+    assert list(proxy.fetch()) == []
@@ -10,9 +10,12 @@ See COPYING and COPYING.LESSER for license details.
 """
 
 import logging
+import os
+import shutil
 from multiprocessing import cpu_count
 from types import SimpleNamespace
 
+import numpy as np
 import pytest
 
 import av
@@ -22,9 +25,16 @@ from video_capture.file_backend import Decoder, File_Source, OnDemandDecoder
 
 
 @pytest.fixture
-def single_fill_gaps():
+def single_recording(tmp_path):
+    """Returns a copy of single data, such that lookup tables are written to tmp"""
+    shutil.copytree(os.path.dirname(single_data), str(tmp_path / "single"))
+    return str(tmp_path / "single" / os.path.basename(single_data))
+
+
+@pytest.fixture
+def single_fill_gaps(single_recording):
     """Returns single data"""
-    return File_Source(SimpleNamespace(), source_path=single_data, fill_gaps=True)
+    return File_Source(SimpleNamespace(), source_path=single_recording, fill_gaps=True)
 
 
 @pytest.fixture
@@ -39,15 +49,17 @@ def broken_fill_gaps():
     return File_Source(SimpleNamespace(), source_path=broken_data)
 
 
-def test_file_source_recent_events():
+def test_file_source_recent_events(single_recording):
     """
     recent_events setup correct or not
     """
     file_source = File_Source(
-        SimpleNamespace(), source_path=single_data, timing="external"
+        SimpleNamespace(), source_path=single_recording, timing="external"
     )
     assert file_source.recent_events == file_source.recent_events_external_timing
-    file_source = File_Source(SimpleNamespace(), source_path=single_data, timing=None)
+    file_source = File_Source(
+        SimpleNamespace(), source_path=single_recording, timing=None
+    )
     assert file_source.recent_events == file_source.recent_events_own_timing
 
 
@@ -63,3 +75,83 @@ def test_get_rec_set_name(single_fill_gaps):
     assert ("/foo", "eye0_timestamp") == single_fill_gaps.get_rec_set_name(
         "/foo/eye0_timestamp.npy"
     )
+
+
+@pytest.fixture
+def gop_recording(tmp_path):
+    """Returns the path of a generated video with a keyframe every 30 frames"""
+    container = av.open(str(tmp_path / "eye0.mp4"), "w")
+    stream = container.add_stream("mpeg4", rate=30)
+    stream.width = stream.height = 64
+    stream.pix_fmt = "yuv420p"
+    stream.codec_context.gop_size = 30
+    for idx in range(300):
+        img = np.zeros((64, 64, 3), dtype=np.uint8)
+        img[:, idx % 64] = 255
+        for packet in stream.encode(av.VideoFrame.from_ndarray(img, format="bgr24")):
+            container.mux(packet)
+    for packet in stream.encode():
+        container.mux(packet)
+    container.close()
+    np.save(str(tmp_path / "eye0_timestamps.npy"), np.arange(300) / 30)
+    shutil.copy(
+        os.path.join(os.path.dirname(single_data), "info.player.json"), tmp_path
+    )
+    return str(tmp_path / "eye0.mp4")
+
+
+@pytest.fixture
+def gop_source(gop_recording):
+    """Returns a source counting the number of decoded frames"""
+    file_source = File_Source(SimpleNamespace(), source_path=gop_recording)
+    file_source.decoded_frame_count = 0
+    cache_av_frame = file_source._cache_av_frame
+
+    def counting_cache_av_frame(av_frame):
+        file_source.decoded_frame_count += 1
+        cache_av_frame(av_frame)
+
+    file_source._cache_av_frame = counting_cache_av_frame
+    return file_source
+
+
+def test_keyframe_index(gop_source, gop_recording):
+    videoset = gop_source.videoset
+    keyframes = videoset.keyframes
+    assert os.path.exists(videoset.keyframes_loc)
+    assert os.path.dirname(videoset.keyframes_loc) == os.path.dirname(gop_recording)
+    assert keyframes.container_idx.tolist() == [0] * 10
+    assert keyframes.pts.tolist() == videoset.lookup.pts[::30].tolist()
+
+    first = keyframes[0]
+    assert videoset.preceding_keyframe_pts(0, first.pts) == first.pts
+    assert videoset.preceding_keyframe_pts(0, first.pts - 1) is None
+    assert videoset.preceding_keyframe_pts(0, videoset.lookup.pts[299]) == (
+        keyframes.pts[-1]
+    )
+
+
+def test_seek_from_container_start_uses_keyframe(gop_source):
+    gop_source.seek_to_frame(290)
+    frame = gop_source.get_frame()
+    assert frame.index == 290
+    assert frame.timestamp == gop_source.videoset.lookup.timestamp[290]
+    # decoding starts at the preceding keyframe instead of the container start
+    assert gop_source.decoded_frame_count == 21
+
+
+def test_seek_back_before_decoding(gop_source, caplog):
+    gop_source.seek_to_frame(290)
+    gop_source.seek_to_frame(120)
+    frame = gop_source.get_frame()
+    assert frame.index == 120
+    assert frame.timestamp == gop_source.videoset.lookup.timestamp[120]
+    assert gop_source.decoded_frame_count == 1
+    assert "went past the target frame" not in caplog.text
+
+    # forward within the GOP continues decoding, backwards is cached
+    gop_source.seek_to_frame(125)
+    assert gop_source.get_frame().index == 125
+    gop_source.seek_to_frame(121)
+    assert gop_source.get_frame().index == 121
+    assert gop_source.decoded_frame_count == 6
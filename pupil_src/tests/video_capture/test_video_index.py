@@ -0,0 +1,89 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from .common import multiple_data
+from video_capture import utils
+from video_capture.utils import VideoIndex, VideoSet, video_index_cache
+
+
+@pytest.fixture
+def recording(tmpdir):
+    rec_dir = str(tmpdir.mkdir("recording"))
+    for offset, name in enumerate(("eye0", "eye0_001")):
+        video_path = os.path.join(os.path.dirname(multiple_data), f"{name}.mp4")
+        shutil.copy(video_path, rec_dir)
+        num_frames = utils.Video(os.path.join(rec_dir, f"{name}.mp4")).pts.size
+        timestamps = offset * 1000 + np.arange(num_frames) / 30
+        np.save(os.path.join(rec_dir, f"{name}_timestamps.npy"), timestamps)
+    yield rec_dir
+    video_index_cache.clear()
+
+
+@pytest.fixture
+def demux_count(monkeypatch):
+    demuxed = []
+    from_container = VideoIndex.from_container
+
+    def counting_from_container(container):
+        demuxed.append(container)
+        return from_container(container)
+
+    monkeypatch.setattr(VideoIndex, "from_container", counting_from_container)
+    return demuxed
+
+
+def _open_videoset(rec_dir):
+    videoset = VideoSet(rec_dir, "eye0", fill_gaps=False)
+    videoset.load_or_build_lookup()
+    return videoset
+
+
+def test_video_index_is_reused(recording, demux_count):
+    lookup = _open_videoset(recording).lookup
+    assert len(demux_count) == 2
+    assert os.path.exists(os.path.join(recording, "eye0_index.npz"))
+
+    _open_videoset(recording)
+    # other processes load the persisted index
+    video_index_cache.clear()
+    videoset = _open_videoset(recording)
+    assert len(demux_count) == 2
+    assert np.array_equal(videoset.lookup, lookup)
+    assert videoset.keyframes.size > 0
+
+
+def test_video_index_is_validated(recording, demux_count):
+    video_path = os.path.join(recording, "eye0_001.mp4")
+    pts = utils.Video(video_path, cache_index=True).load_pts()
+    assert len(demux_count) == 1
+
+    # copying a recording changes the modification time but not the content
+    os.utime(video_path, ns=(0, 0))
+    video_index_cache.clear()
+    assert np.array_equal(utils.Video(video_path, cache_index=True).load_pts(), pts)
+    assert len(demux_count) == 1
+
+    _open_videoset(recording)
+    assert len(demux_count) == 2
+    # the lookup is rebuilt for changed videos, but only those are demuxed again
+    shutil.copy(os.path.join(recording, "eye0.mp4"), video_path)
+    video_index_cache.clear()
+    videoset = _open_videoset(recording)
+    assert len(demux_count) == 3
+    replaced_pts = videoset.videos[1].load_pts()
+    assert replaced_pts.size != pts.size
+    assert np.count_nonzero(videoset.lookup.container_idx == 1) == replaced_pts.size
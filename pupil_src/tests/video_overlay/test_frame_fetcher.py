@@ -0,0 +1,155 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import os
+import shutil
+from types import SimpleNamespace
+
+import av
+import numpy as np
+import pytest
+
+from ..video_capture.common import single_data
+from video_overlay.workers.frame_fetcher import FrameFetcher, PrefetchingFrameFetcher
+
+NUM_FRAMES = 120
+FRAME_RATE = 30
+
+
+@pytest.fixture
+def video_path(tmp_path):
+    """Returns the path of a generated video with a keyframe every 30 frames"""
+    container = av.open(str(tmp_path / "eye0.mp4"), "w")
+    stream = container.add_stream("mpeg4", rate=FRAME_RATE)
+    stream.width = stream.height = 64
+    stream.pix_fmt = "yuv420p"
+    stream.codec_context.gop_size = 30
+    for idx in range(NUM_FRAMES):
+        img = np.zeros((64, 64, 3), dtype=np.uint8)
+        img[:, idx % 64] = 255
+        for packet in stream.encode(av.VideoFrame.from_ndarray(img, format="bgr24")):
+            container.mux(packet)
+    for packet in stream.encode():
+        container.mux(packet)
+    container.close()
+    np.save(str(tmp_path / "eye0_timestamps.npy"), np.arange(NUM_FRAMES) / FRAME_RATE)
+    shutil.copy(
+        os.path.join(os.path.dirname(single_data), "info.player.json"), tmp_path
+    )
+    return str(tmp_path / "eye0.mp4")
+
+
+@pytest.fixture
+def reference_images(video_path):
+    fetcher = FrameFetcher(video_path)
+    images = [fetcher.frame_for_idx(idx).img.copy() for idx in range(NUM_FRAMES)]
+    fetcher.cleanup()
+    return images
+
+
+@pytest.fixture
+def seek_control():
+    return SimpleNamespace(play=False, playback_speed=1.0)
+
+
+@pytest.fixture
+def create_fetcher(video_path, seek_control):
+    fetchers = []
+
+    def create_fetcher(**kwargs):
+        fetcher = PrefetchingFrameFetcher(video_path, seek_control, **kwargs)
+        fetchers.append(fetcher)
+        return fetcher
+
+    yield create_fetcher
+    for fetcher in fetchers:
+        fetcher.cleanup()
+
+
+def _wait_for_cached(fetcher, frame_indices, timeout=5.0):
+    with fetcher._condition:
+        assert fetcher._condition.wait_for(
+            lambda: all(idx in fetcher._cache for idx in frame_indices), timeout
+        ), "frames were not decoded in time"
+
+
+def test_paused_requests_return_exact_frames(create_fetcher, reference_images):
+    fetcher = create_fetcher()
+    frame_indices = [0, 57, 58, 119, 3, 90, 89, 30, 29, 58]
+    for idx in frame_indices:
+        frame = fetcher.frame_for_idx(idx)
+        assert frame.index == idx
+        assert np.array_equal(frame.img, reference_images[idx])
+
+    stats = fetcher.stats()
+    assert stats["requests"] == stats["exact"] == len(frame_indices)
+    assert stats["closest"] == 0
+
+
+def test_closest_frame_to_ts(create_fetcher):
+    fetcher = create_fetcher()
+    assert fetcher.closest_frame_to_ts(2.01).index == 60
+    assert fetcher.closest_frame_to_ts(100.0).index == NUM_FRAMES - 1
+
+
+@pytest.mark.parametrize("playback_speed", [1.0, 2.0])
+def test_reads_ahead_in_direction_of_requests(
+    create_fetcher, seek_control, reference_images, playback_speed
+):
+    seek_control.playback_speed = playback_speed
+    fetcher = create_fetcher()
+    window = int(0.5 * playback_speed * FRAME_RATE)
+
+    fetcher.frame_for_idx(40)
+    _wait_for_cached(fetcher, range(40, 40 + window))
+
+    fetcher.frame_for_idx(100)
+    fetcher.frame_for_idx(99)
+    _wait_for_cached(fetcher, range(99 - window + 1, 100))
+
+    seek_control.play = True
+    for idx in range(99, 99 - window, -1):
+        frame = fetcher.frame_for_idx(idx)
+        assert frame.index == idx
+        assert np.array_equal(frame.img, reference_images[idx])
+
+
+def test_playing_requests_return_closest_cached_frame(create_fetcher, seek_control):
+    fetcher = create_fetcher()
+    fetcher.frame_for_idx(10)
+    _wait_for_cached(fetcher, range(10, 25))
+
+    seek_control.play = True
+    frame = fetcher.frame_for_idx(100)
+    assert frame.index < 100
+    assert fetcher.stats()["closest"] == 1
+
+    _wait_for_cached(fetcher, [100])
+    assert fetcher.frame_for_idx(100).index == 100
+    assert fetcher.stats()["closest"] == 1
+
+
+def test_cache_is_limited_to_budget(create_fetcher):
+    frame_bytes = 64 * 64 * 3
+    fetcher = create_fetcher(cache_budget=10 * frame_bytes)
+    for idx in (5, 50, 100, 20, 21, 22):
+        assert fetcher.frame_for_idx(idx).index == idx
+        stats = fetcher.stats()
+        assert stats["cached_frames"] <= 10
+        assert stats["cached_bytes"] <= 10 * frame_bytes
+    # the read-ahead window is capped at half of the cache
+    assert fetcher._window == 5
+
+
+def test_cleanup_stops_decoder_thread(create_fetcher):
+    fetcher = create_fetcher()
+    fetcher.frame_for_idx(60)
+    fetcher.cleanup()
+    assert not fetcher._thread.is_alive()
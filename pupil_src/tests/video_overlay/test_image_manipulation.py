@@ -0,0 +1,46 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import numpy as np
+
+from video_overlay.utils.image_manipulation import PupilRenderer
+
+
+def _pupil_position(center):
+    return {
+        "ellipse": {"center": center, "axes": (20.0, 14.0), "angle": 30.0},
+        "confidence": 0.9,
+    }
+
+
+def test_pupil_renderer_does_not_draw_into_frame_image():
+    pupil_positions = [_pupil_position((20.0, 20.0)), _pupil_position((44.0, 40.0))]
+    renderer = PupilRenderer(lambda: pupil_positions[0])
+    frame_image = np.zeros((64, 64, 3), dtype=np.uint8)
+
+    first = renderer.apply_to(frame_image, True, is_fake_frame=False)
+    assert first.any()
+    assert not frame_image.any()
+
+    # rendering the same frame with new pupil data does not show the old ellipse
+    pupil_positions.pop(0)
+    second = renderer.apply_to(frame_image, True, is_fake_frame=False)
+    assert not frame_image.any()
+    expected = PupilRenderer(lambda: pupil_positions[0]).apply_to(
+        np.zeros_like(frame_image), True, is_fake_frame=False
+    )
+    assert np.array_equal(second, expected)
+
+
+def test_pupil_renderer_skips_disabled_and_fake_frames():
+    renderer = PupilRenderer(lambda: _pupil_position((20.0, 20.0)))
+    frame_image = np.zeros((64, 64, 3), dtype=np.uint8)
+    assert renderer.apply_to(frame_image, False, is_fake_frame=False) is frame_image
+    assert renderer.apply_to(frame_image, True, is_fake_frame=True) is frame_image